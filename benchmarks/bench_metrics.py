@@ -0,0 +1,96 @@
+"""Measures the overhead of the runtime metrics instrumentation.
+
+Reports the cost of one counter increment and one histogram observation,
+then the per-frame cost of the instrumented hot path (frame assembly plus
+`parse_raw_data`, which update the serial and parser counters) against the
+same path with the metric children replaced by no-op objects.
+
+Usage (from the project root):
+    python -m benchmarks.bench_metrics [--frames 200000] [--repeat 5]
+"""
+
+import argparse
+import time
+from unittest import mock
+
+from parsers import data_parser
+from utils import metrics
+from utils.frame_assembler import FrameAssembler
+from tests.test_data_parser import VALID_FRAME
+
+
+class _NullChild:
+    def inc(self, amount=1):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+def _best_ns_per_op(func, count, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(count)
+        best = min(best, (time.perf_counter() - start) / count * 1e9)
+    return best
+
+
+def _hot_path(count, bytes_child, frames_child):
+    """Per-port reader work for `count` frames arriving 4 per read."""
+    assembler = FrameAssembler()
+    chunk = VALID_FRAME * 4
+    parse = data_parser.parse_raw_data
+    for _ in range(count // 4):
+        bytes_child.inc(len(chunk))
+        frames = assembler.feed(chunk)
+        frames_child.inc(len(frames))
+        for frame in frames:
+            parse(frame)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=200000, help="frames (or operations) per run")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case (best is reported)")
+    args = parser.parse_args()
+
+    counter = metrics.Counter("bench_total", "Benchmark counter.").labels()
+    histogram = metrics.Histogram("bench_seconds", "Benchmark histogram.").labels()
+
+    def incs(count):
+        for _ in range(count):
+            counter.inc()
+
+    def observations(count):
+        for i in range(count):
+            histogram.observe(0.003)
+
+    def empty_loop(count):
+        for _ in range(count):
+            pass
+
+    loop = _best_ns_per_op(empty_loop, args.frames, args.repeat)
+    print(f"{'operation':<40} {'ns/op':>8}")
+    print(f"{'counter.inc()':<40} {_best_ns_per_op(incs, args.frames, args.repeat) - loop:>8.0f}")
+    print(f"{'histogram.observe()':<40} {_best_ns_per_op(observations, args.frames, args.repeat) - loop:>8.0f}")
+
+    bytes_child = metrics.SERIAL_BYTES.labels("bench")
+    frames_child = metrics.SERIAL_FRAMES.labels("bench")
+    null = _NullChild()
+    instrumented = bare = float("inf")
+    # Alternate both variants so machine noise affects them alike
+    for _ in range(args.repeat):
+        instrumented = min(instrumented, _best_ns_per_op(
+            lambda count: _hot_path(count, bytes_child, frames_child), args.frames, 1
+        ))
+        with mock.patch.object(data_parser, "_PARSED_OK", null), \
+                mock.patch.object(data_parser, "_PARSED_INVALID", null):
+            bare = min(bare, _best_ns_per_op(lambda count: _hot_path(count, null, null), args.frames, 1))
+    print(f"{'assemble + parse, no-op metrics':<40} {bare:>8.0f}")
+    print(f"{'assemble + parse, instrumented':<40} {instrumented:>8.0f}")
+    print(f"{'overhead per frame':<40} {instrumented - bare:>8.0f} ({(instrumented - bare) / bare:.1%})")
+
+
+if __name__ == "__main__":
+    main()
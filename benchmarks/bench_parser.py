@@ -0,0 +1,104 @@
+"""Micro-benchmark for the sensor frame parser.
+
+Compares frames per second of the current single-pass `parse_raw_data`
+(and `parse_many`) against the previous strip/split/decode implementation,
+using the fixtures from `tests/test_data_parser.py`.
+
+Usage (from the project root):
+    python -m benchmarks.bench_parser [--frames 200000] [--repeat 5]
+"""
+
+import argparse
+import re
+import time
+
+from config.station_mapping import STATION_NAMES
+from parsers.data_parser import parse_many, parse_raw_data
+from tests.test_data_parser import INVALID_FRAMES, MALFORMED_FRAME, VALID_FRAME
+
+
+def legacy_parse_raw_data(raw_bytes):
+    """The previous implementation, kept here only as a baseline."""
+    try:
+        if not raw_bytes.startswith(b'~') or b'~~' not in raw_bytes:
+            return None
+        parts = raw_bytes.strip().split(b'~~')
+        if len(parts) != 2:
+            return None
+        inclinometer_frame = parts[0]
+        if not inclinometer_frame.startswith(b'~'):
+            return None
+        station_type = inclinometer_frame[7]
+        station_number = inclinometer_frame[8]
+        network_id = inclinometer_frame[10]
+        inclinometer_ascii_part = inclinometer_frame[11:].decode('ascii', errors='ignore')
+        pattern = r'([+-]\d+\.\d+)'
+        inclinometer_values = re.findall(pattern, inclinometer_ascii_part)
+        pluviometer_frame = b'~' + parts[1]
+        pluviometer_ascii_part = pluviometer_frame[10:].decode('ascii', errors='ignore')
+        pluviometer_values = re.findall(pattern, pluviometer_ascii_part)
+        if len(inclinometer_values) != 4 or len(pluviometer_values) != 2:
+            return None
+        station_name = STATION_NAMES.get(station_number, f"Unknown_{station_number}")
+        return {
+            "type": "TILT_RAIN",
+            "station_name": station_name,
+            "station_type": station_type,
+            "station_number": station_number,
+            "network_id": network_id,
+            "inclinometer": {
+                "radial": float(inclinometer_values[0]),
+                "tangential": float(inclinometer_values[1]),
+                "temperature": float(inclinometer_values[2]),
+                "voltage": float(inclinometer_values[3])
+            },
+            "pluviometer": {
+                "rain_level": float(pluviometer_values[0]),
+                "voltage": float(pluviometer_values[1])
+            }
+        }
+    except (ValueError, IndexError, TypeError):
+        return None
+
+
+def _best_rate(func, frames, repeat):
+    best = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(frames)
+        elapsed = time.perf_counter() - start
+        best = max(best, len(frames) / elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=200000, help="frames per run")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case (best is reported)")
+    args = parser.parse_args()
+
+    # Sanity check: both implementations agree on every fixture
+    for frame in [VALID_FRAME, MALFORMED_FRAME] + INVALID_FRAMES:
+        assert legacy_parse_raw_data(frame) == parse_raw_data(frame), frame
+
+    cases = {
+        "valid": [VALID_FRAME] * args.frames,
+        "mixed (1 valid : 4 invalid)": ([VALID_FRAME, MALFORMED_FRAME] + INVALID_FRAMES) * (args.frames // 5),
+    }
+    runners = {
+        "legacy parse_raw_data": lambda frames: [legacy_parse_raw_data(f) for f in frames],
+        "parse_raw_data": lambda frames: [parse_raw_data(f) for f in frames],
+        "parse_many": lambda frames: list(parse_many(frames)),
+    }
+
+    print(f"{'case':<30} {'implementation':<24} {'frames/s':>12} {'speedup':>8}")
+    for case_name, frames in cases.items():
+        baseline = None
+        for runner_name, runner in runners.items():
+            rate = _best_rate(runner, frames, args.repeat)
+            baseline = baseline or rate
+            print(f"{case_name:<30} {runner_name:<24} {rate:>12,.0f} {rate / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
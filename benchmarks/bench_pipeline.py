@@ -0,0 +1,245 @@
+"""End-to-end load benchmark: pty-backed fake stations → gateway → fake trapper.
+
+The harness creates one pseudo-terminal per port and streams synthetic but
+valid `~...~~...~` frames on them from configurable station IDs at a
+configurable rate. It writes a `config.json` (based on the project's own,
+with `serial_ports`, `base_dir`, spool directory and log file pointed into a
+temporary directory, the native transport, and aggregation/deadband off so
+every frame reaches Zabbix) and starts a worker process that runs the real
+pipeline: `start_serial_readers` → `process_data` → TSV archive and Zabbix
+batcher/sender, against a local `FakeTrapperServer`.
+
+Every frame carries a sequence number in its radial value, so the time from
+the serial write to the item's arrival at the fake trapper can be measured.
+Reported: frames and items delivered, throughput, p50/p99/max latency, and
+the worker's CPU usage and peak RSS.
+
+Usage (from the project root, Linux only):
+    python -m benchmarks.bench_pipeline [--ports 5] [--rate 1] [--seconds 30]
+        [--stations 1,2,3] [--engine threads|selector] [--max-delay 1.0]
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tty
+
+from config.station_mapping import STATION_NAMES
+from tests.fake_trapper import FakeTrapperServer
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def build_frame(station_number: int, sequence: int, network_id: int = 1) -> bytes:
+    """A valid tiltmeter frame whose radial value is `sequence`."""
+    inclinometer = (
+        b"~" + bytes(range(6)) + bytes([1, station_number, 0, network_id])
+        + f"RD+{sequence}.00,TD-12.50,T+21.3,V+13.2".encode("ascii")
+    )
+    pluviometer = bytes(range(9)) + b"RAIN+0.2,V+13.1"
+    return inclinometer + b"~~" + pluviometer + b"~\n"
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float("nan")
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _thread_count(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("Threads:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return -1
+
+
+def _write_config(workdir, slave_paths, args):
+    with open(os.path.join(PROJECT_ROOT, "config.json")) as f:
+        config = json.load(f)
+    config["log_file"] = os.path.join(workdir, "app.log")
+    config["base_dir"] = os.path.join(workdir, "DTA")
+    config["serial_ports"] = [
+        {"port": path, "baudrate": 115200, "bytesize": 8, "parity": "N", "stopbits": 1, "timeout": 1}
+        for path in slave_paths
+    ]
+    config.setdefault("serial_reader", {})["engine"] = args.engine
+    config.setdefault("zabbix_sender", {}).update({
+        "transport": "native",
+        "spool_dir": os.path.join(workdir, "zbx_spool"),
+    })
+    config["zabbix_batcher"] = dict(config.get("zabbix_batcher", {}), enabled=True, max_delay_seconds=args.max_delay)
+    config["zabbix_aggregation"] = dict(config.get("zabbix_aggregation", {}), enabled=False)
+    config["zabbix_deadband"] = dict(config.get("zabbix_deadband", {}), enabled=False)
+    config["metrics"] = dict(config.get("metrics", {}), http_enabled=False, self_report_enabled=False)
+    with open(os.path.join(workdir, "config.json"), "w") as f:
+        json.dump(config, f, indent=4)
+
+
+def _run_worker(trapper_port: int, stats_path: str):
+    """Run the real pipeline until SIGTERM, then write CPU/RSS stats."""
+    from utils.data_storage import close_storage
+    from utils.logging_config import setup_logging
+    from utils.serial_reader import start_serial_readers
+    from utils import zabbix_sender
+
+    setup_logging()
+    zabbix_sender.ZABBIX_SERVER = "127.0.0.1"
+    zabbix_sender.ZABBIX_PORT = trapper_port
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    zabbix_sender.start_batcher()
+    try:
+        start_serial_readers(stop_event)
+    finally:
+        zabbix_sender.stop_batcher()
+        zabbix_sender.close_spool()
+        close_storage()
+        times = os.times()
+        with open(stats_path, "w") as f:
+            json.dump({
+                "cpu_seconds": times.user + times.system,
+                "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            }, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ports", type=int, default=5, help="number of pseudo-terminal ports")
+    parser.add_argument("--rate", type=float, default=1.0, help="frames per second per station")
+    parser.add_argument("--stations", default="", help="comma-separated station IDs per port (default: one per port)")
+    parser.add_argument("--seconds", type=float, default=30.0, help="streaming duration")
+    parser.add_argument("--engine", choices=("threads", "selector"), default="threads", help="serial reader engine")
+    parser.add_argument("--max-delay", type=float, default=1.0, help="batcher max_delay_seconds")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary directory")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--trapper-port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--stats", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        _run_worker(args.trapper_port, args.stats)
+        return
+
+    if args.stations:
+        station_ids = [int(s) for s in args.stations.split(",")]
+    else:
+        station_ids = list(range(1, args.ports + 1))
+    workdir = tempfile.mkdtemp(prefix="bench-pipeline-")
+    ptys = []
+    for _ in range(args.ports):
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        ptys.append((master, slave))
+    _write_config(workdir, [os.ttyname(slave) for _, slave in ptys], args)
+    stats_path = os.path.join(workdir, "worker_stats.json")
+
+    written = {}  # (host, sequence) -> write time
+    with FakeTrapperServer() as trapper:
+        env = dict(
+            os.environ,
+            PYTHONPATH=PROJECT_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""),
+            SERIAL_TILT_ZBX_CONFIG=os.path.join(workdir, "config.json"),
+        )
+        worker = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.bench_pipeline", "--worker",
+             "--trapper-port", str(trapper.port), "--stats", stats_path],
+            cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            time.sleep(2.0)  # let the worker import, open the ports and connect
+
+            # Stations are spread round-robin over the ports; each sends `rate` frames/s
+            schedule = [
+                (index % args.ports, station_ids[index % len(station_ids)])
+                for index in range(max(args.ports, len(station_ids)))
+            ]
+            interval = 1.0 / args.rate
+            sequence = 0
+            started = time.monotonic()
+            next_tick = started
+            while time.monotonic() - started < args.seconds:
+                for port_index, station_id in schedule:
+                    sequence += 1
+                    host = STATION_NAMES.get(station_id, f"Unknown_{station_id}") + "_IN"
+                    written[(host, sequence)] = time.time()
+                    os.write(ptys[port_index][0], build_frame(station_id, sequence))
+                next_tick += interval
+                time.sleep(max(0.0, next_tick - time.monotonic()))
+            stream_seconds = time.monotonic() - started
+            worker_threads = _thread_count(worker.pid)
+
+            # Wait until delivery stops progressing
+            last_count, idle_since = -1, time.monotonic()
+            while time.monotonic() - idle_since < 3.0:
+                count = len(trapper.items)
+                if count != last_count:
+                    last_count, idle_since = count, time.monotonic()
+                time.sleep(0.2)
+            worker_wall = time.monotonic() - started
+        finally:
+            worker.send_signal(signal.SIGTERM)
+            try:
+                worker.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                worker.kill()
+            for master, slave in ptys:
+                os.close(master)
+                os.close(slave)
+
+        with trapper.lock:
+            items = list(trapper.items)
+
+    latencies = []
+    for item in items:
+        if item.get("key") != "tilt.radial":
+            continue
+        try:
+            key = (item["host"], int(float(item["value"])))
+        except (KeyError, ValueError):
+            continue
+        sent_at = written.get(key)
+        if sent_at is not None:
+            latencies.append(item["_received_at"] - sent_at)
+    latencies.sort()
+
+    stats = {}
+    if os.path.exists(stats_path):
+        with open(stats_path) as f:
+            stats = json.load(f)
+
+    frames = len(written)
+    print(f"ports={args.ports} stations={len(set(station_ids))} rate={args.rate}/s engine={args.engine} "
+          f"max_delay={args.max_delay}s duration={stream_seconds:.1f}s")
+    print(f"  frames written         {frames}")
+    print(f"  frames delivered       {len(latencies)} ({100.0 * len(latencies) / max(frames, 1):.1f}%)")
+    print(f"  items received         {len(items)}")
+    print(f"  throughput             {len(latencies) / stream_seconds:.1f} frames/s, {len(items) / stream_seconds:.1f} items/s")
+    print(f"  latency write->trapper p50 {_percentile(latencies, 0.5) * 1000:.1f} ms, "
+          f"p99 {_percentile(latencies, 0.99) * 1000:.1f} ms, max {(latencies[-1] if latencies else float('nan')) * 1000:.1f} ms")
+    if stats:
+        print(f"  worker CPU             {100.0 * stats['cpu_seconds'] / worker_wall:.1f}% of one core "
+              f"({stats['cpu_seconds']:.2f}s, including startup)")
+        print(f"  worker max RSS         {stats['max_rss_kib'] / 1024:.1f} MiB, threads {worker_threads}")
+
+    if args.keep:
+        print(f"  workdir                {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
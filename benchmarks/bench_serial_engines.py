@@ -0,0 +1,134 @@
+"""Compares the serial reader engines ("threads" vs. "selector").
+
+For every port count, the benchmark creates that many pseudo-terminal pairs
+and starts a worker subprocess that reads the slave devices with the chosen
+engine (frames are only counted, not parsed or sent). The parent writes
+synthetic frames on the master sides at a fixed rate per port, then collects
+from the worker the number of frames read, its thread count, peak RSS and CPU
+time. Only the worker is measured, so the writer's cost does not count.
+
+Usage (from the project root, Linux only):
+    python -m benchmarks.bench_serial_engines [--ports 5 20 50] [--seconds 10] [--rate 5]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+import tty
+
+from tests.test_data_parser import VALID_FRAME
+
+
+def _port_config(path):
+    return {"port": path, "baudrate": 9600, "bytesize": 8, "parity": "N", "stopbits": 1, "timeout": 1}
+
+
+def _run_worker(engine, paths, seconds):
+    """Read `paths` with one engine for `seconds`, then print a JSON report."""
+    from utils import serial_reader
+
+    counts = {"frames": 0}
+    lock = threading.Lock()
+
+    def on_frame(raw_bytes, port_name, received_at=None, received_mono=None):
+        with lock:
+            counts["frames"] += 1
+
+    stop_event = threading.Event()
+    if engine == "selector":
+        from utils.serial_multiplexer import SerialMultiplexer
+
+        multiplexer = SerialMultiplexer(stop_event, on_frame=on_frame)
+        for path in paths:
+            multiplexer.add_port(_port_config(path))
+        threading.Thread(target=multiplexer.run, daemon=True).start()
+    else:
+        for path in paths:
+            threading.Thread(
+                target=serial_reader.read_serial_port, args=(_port_config(path), stop_event, on_frame), daemon=True
+            ).start()
+
+    print("ready", flush=True)
+    start_cpu = os.times()
+    time.sleep(seconds)
+    end_cpu = os.times()
+    threads = threading.active_count()
+    stop_event.set()
+    print(json.dumps({
+        "frames": counts["frames"],
+        "threads": threads,
+        "cpu_seconds": (end_cpu.user - start_cpu.user) + (end_cpu.system - start_cpu.system),
+        "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }), flush=True)
+
+
+def _run_case(engine, port_count, seconds, rate):
+    ptys = []
+    for _ in range(port_count):
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        ptys.append((master, slave))
+    paths = [os.ttyname(slave) for _, slave in ptys]
+
+    worker = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.bench_serial_engines", "--worker", "--engine", engine,
+         "--seconds", str(seconds), "--paths", *paths],
+        stdout=subprocess.PIPE, text=True,
+    )
+    try:
+        worker.stdout.readline()  # "ready"
+        time.sleep(0.5)  # let every port open
+        sent = 0
+        interval = 1.0 / rate
+        next_tick = time.monotonic()
+        deadline = next_tick + seconds - 1.0
+        while time.monotonic() < deadline:
+            for master, _ in ptys:
+                os.write(master, VALID_FRAME)
+            sent += port_count
+            next_tick += interval
+            time.sleep(max(0.0, next_tick - time.monotonic()))
+        report = json.loads(worker.stdout.readline())
+        worker.wait(timeout=10)
+    finally:
+        if worker.poll() is None:
+            worker.kill()
+        for master, slave in ptys:
+            os.close(master)
+            os.close(slave)
+    report["sent"] = sent
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ports", type=int, nargs="+", default=[5, 20, 50], help="port counts to compare")
+    parser.add_argument("--seconds", type=float, default=10.0, help="measurement window per case")
+    parser.add_argument("--rate", type=float, default=5.0, help="frames per second written to each port")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--engine", choices=("threads", "selector"), help=argparse.SUPPRESS)
+    parser.add_argument("--paths", nargs="*", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        _run_worker(args.engine, args.paths, args.seconds)
+        return
+
+    print(f"{'ports':>5} {'engine':<9} {'threads':>7} {'max RSS MiB':>11} {'CPU %':>7} {'frames read/sent':>17}")
+    for port_count in args.ports:
+        for engine in ("threads", "selector"):
+            report = _run_case(engine, port_count, args.seconds, args.rate)
+            cpu_percent = 100.0 * report["cpu_seconds"] / args.seconds
+            print(
+                f"{port_count:>5} {engine:<9} {report['threads']:>7} {report['max_rss_kib'] / 1024:>11.1f} "
+                f"{cpu_percent:>6.1f}% {report['frames']:>8}/{report['sent']:<8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -4,15 +4,25 @@ This module is responsible for loading the central `config.json` file.
 It defines a global `APP_CONFIG` dictionary that can be imported by other
 modules to access configuration parameters like log file paths, Zabbix key
 mappings, etc.
+
+The file is `config.json` in the project directory (next to `main.py`), or
+the path in the `SERIAL_TILT_ZBX_CONFIG` environment variable, so the
+application does not depend on the current working directory. The
+validated, immutable form used at runtime is `config.runtime_config`.
 """
 
 import json
 import logging
+import os
+
+CONFIG_PATH = os.environ.get("SERIAL_TILT_ZBX_CONFIG") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.json"
+)
 
-def load_app_config():
+def load_app_config(path=None):
     """Loads the main application configuration from the `config.json` file.
 
-    This function attempts to open and parse `config.json`. It includes error
+    This function attempts to open and parse `config.json` (`CONFIG_PATH`). It includes error
     handling for cases where the file is not found or contains invalid JSON,
     returning an empty dictionary in such cases to prevent crashes.
 
@@ -20,15 +30,16 @@ def load_app_config():
         dict: A dictionary containing the application configuration.
     """
     logger = logging.getLogger(__name__)
+    path = path or CONFIG_PATH
     try:
-        with open("config.json", "r") as f:
+        with open(path, "r") as f:
             config = json.load(f)
             return config
     except FileNotFoundError:
-        logger.error("The configuration file config.json was not found.")
+        logger.error(f"The configuration file {path} was not found.")
         return {}
     except json.JSONDecodeError:
-        logger.error("Error decoding the configuration file config.json.")
+        logger.error(f"Error decoding the configuration file {path}.")
         return {}
 
 APP_CONFIG = load_app_config()
@@ -0,0 +1,359 @@
+"""Validated, immutable runtime configuration with hot reload.
+
+`config.json` is parsed once into a `RuntimeConfig`: the serial ports with
+their retry policies resolved, the Zabbix key maps, and the station names
+(`config/station_mapping.py`, extended or overridden by an optional
+`station_names` object in config.json, e.g. `{"12": "NEWSTN"}`). Every value
+is validated when the object is built, and the result is read-only (tuples
+and `MappingProxyType`), so components can keep a reference to it without
+copying or re-deriving anything on the hot path.
+
+`get_runtime_config()` returns the current object. `reload_runtime_config()`
+(wired to SIGHUP in `main.py`) reads the file again, validates it, swaps the
+current object in one assignment, and notifies the listeners registered with
+`add_reload_listener` with a `ConfigDiff` of what changed. A frame being
+processed during a reload keeps the object it started with; the next one
+sees the new maps. An invalid file is rejected and the running configuration
+kept. Reloads are serialized, so two SIGHUPs in a row apply their diffs (and
+run the listeners) one after the other, each against the configuration the
+previous one installed.
+
+Only the serial ports, `zabbix_keys` and the station names are reloaded.
+The other sections (zabbix_sender, zabbix_endpoints, zabbix_batcher,
+zabbix_aggregation, serial_supervisor, the archive, metrics, latest_values
+and station_history) are read once when their component starts, as threads,
+sockets and HTTP servers are built from them; changing them needs a restart.
+
+The configuration file is `config.json` in the project directory, or the
+path in the `SERIAL_TILT_ZBX_CONFIG` environment variable, regardless of the
+current working directory.
+"""
+
+import json
+import logging
+import threading
+from types import MappingProxyType
+from typing import Callable, List, Mapping, NamedTuple, Optional, Tuple
+
+from config.app_config import APP_CONFIG, CONFIG_PATH
+from config.station_mapping import STATION_NAMES
+
+logger = logging.getLogger(__name__)
+
+PARITIES = ("N", "E", "O", "M", "S")
+BYTESIZES = (5, 6, 7, 8)
+STOPBITS = (1, 1.5, 2)
+SENSORS = ("inclinometer", "pluviometer")
+ENDPOINT_MODES = ("failover", "fanout")
+SHED_POLICIES = ("drop_oldest", "downsample", "pluviometer_only")
+
+
+class ConfigError(ValueError):
+    """Raised when config.json cannot be read or does not validate."""
+
+
+class RuntimeConfig(NamedTuple):
+    """One immutable, validated snapshot of the application configuration."""
+
+    path: str
+    raw: Mapping  # the whole parsed file, read-only
+    serial_ports: Tuple[Mapping, ...]
+    retry_policies: Mapping  # port name -> {"max_retries", "retry_delay", "on_fail"}
+    zabbix_keys: Mapping  # sensor -> {data key -> Zabbix item key}
+    station_names: Mapping  # station number -> name
+
+    def section(self, name: str) -> Mapping:
+        """A top-level object of config.json (empty if absent)."""
+        value = self.raw.get(name)
+        return value if isinstance(value, Mapping) else MappingProxyType({})
+
+
+class ConfigDiff(NamedTuple):
+    """What changed between two runtime configurations."""
+
+    ports_added: Tuple[Mapping, ...]
+    ports_removed: Tuple[str, ...]
+    ports_changed: Tuple[Mapping, ...]  # new settings of ports whose settings changed
+    zabbix_keys_changed: bool
+    station_names_changed: bool
+
+    def __bool__(self) -> bool:
+        return bool(
+            self.ports_added or self.ports_removed or self.ports_changed
+            or self.zabbix_keys_changed or self.station_names_changed
+        )
+
+
+_current: Optional[RuntimeConfig] = None
+_lock = threading.Lock()
+_reload_lock = threading.Lock()  # held over a whole reload, listeners included
+_listeners: List[Callable[[RuntimeConfig, RuntimeConfig, ConfigDiff], None]] = []
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def derive_retry_policy(port_config: Mapping, retry_cfg: Mapping) -> dict:
+    """Retry policy of a port: per-port overrides, else the `serial_retry` defaults.
+
+    Returns:
+        dict: {"max_retries": int (0 = infinite), "retry_delay": int, "on_fail": str}
+    """
+    default_max_retries = int(retry_cfg.get("max_attempts", 0) or 0)  # 0 means infinite
+    default_retry_delay = int(retry_cfg.get("delay_seconds", 5) or 5)
+    default_on_fail = str(retry_cfg.get("on_fail", "keep_retrying"))
+
+    return {
+        "max_retries": int(port_config.get("max_retries", default_max_retries) or 0),
+        "retry_delay": int(port_config.get("retry_delay", default_retry_delay) or default_retry_delay),
+        "on_fail": str(port_config.get("on_fail", default_on_fail) or default_on_fail).lower(),
+    }
+
+
+def _validate_port(index: int, port: object, errors: List[str]) -> Optional[dict]:
+    where = f"serial_ports[{index}]"
+    if not isinstance(port, dict):
+        errors.append(f"{where} must be an object")
+        return None
+    name = port.get("port")
+    if not isinstance(name, str) or not name:
+        errors.append(f"{where}.port must be a non-empty string")
+        return None
+    where = f"serial_ports[{index}] ({name})"
+    if not isinstance(port.get("baudrate"), int) or port["baudrate"] <= 0:
+        errors.append(f"{where}.baudrate must be a positive integer")
+    if port.get("bytesize") not in BYTESIZES:
+        errors.append(f"{where}.bytesize must be one of {BYTESIZES}")
+    if port.get("parity") not in PARITIES:
+        errors.append(f"{where}.parity must be one of {PARITIES}")
+    if port.get("stopbits") not in STOPBITS:
+        errors.append(f"{where}.stopbits must be one of {STOPBITS}")
+    timeout = port.get("timeout")
+    if timeout is not None and (not isinstance(timeout, (int, float)) or timeout < 0):
+        errors.append(f"{where}.timeout must be a non-negative number or null")
+    for key in ("max_retries", "retry_delay"):
+        if key in port and (not isinstance(port[key], int) or port[key] < 0):
+            errors.append(f"{where}.{key} must be a non-negative integer")
+    return port
+
+
+def _validate_endpoints(endpoints: object, errors: List[str]) -> None:
+    if not isinstance(endpoints, Mapping):
+        errors.append("zabbix_endpoints must be an object")
+        return
+    if endpoints.get("mode", "failover") not in ENDPOINT_MODES:
+        errors.append(f"zabbix_endpoints.mode must be one of {ENDPOINT_MODES}")
+    servers = endpoints.get("servers", [])
+    if not isinstance(servers, list):
+        errors.append("zabbix_endpoints.servers must be a list")
+        return
+    names = set()
+    for index, entry in enumerate(servers):
+        where = f"zabbix_endpoints.servers[{index}]"
+        if not isinstance(entry, Mapping):
+            errors.append(f"{where} must be an object")
+            continue
+        if not isinstance(entry.get("server"), str) or not entry["server"]:
+            errors.append(f"{where}.server must be a non-empty string")
+            continue
+        port = entry.get("port", 10051)
+        if not isinstance(port, int) or not 0 < port < 65536:
+            errors.append(f"{where}.port must be a TCP port number")
+        name = entry.get("name") or f"{entry['server']}:{port}"
+        if name in names:
+            errors.append(f"{where}: duplicate endpoint name {name}")
+        names.add(name)
+
+
+def build_runtime_config(raw: Mapping, path: str = "") -> RuntimeConfig:
+    """Validate a parsed config.json and build its immutable runtime form.
+
+    Raises:
+        ConfigError: Listing every invalid value found.
+    """
+    if not isinstance(raw, Mapping):
+        raise ConfigError("the configuration must be a JSON object")
+    errors: List[str] = []
+
+    ports = raw.get("serial_ports", [])
+    if not isinstance(ports, list):
+        errors.append("serial_ports must be a list")
+        ports = []
+    retry_cfg = raw.get("serial_retry", {})
+    if not isinstance(retry_cfg, Mapping):
+        errors.append("serial_retry must be an object")
+        retry_cfg = {}
+    serial_ports = []
+    retry_policies = {}
+    for index, port in enumerate(ports):
+        port = _validate_port(index, port, errors)
+        if port is None:
+            continue
+        if port["port"] in retry_policies:
+            errors.append(f"serial_ports[{index}]: duplicate port {port['port']}")
+            continue
+        try:
+            retry_policies[port["port"]] = MappingProxyType(derive_retry_policy(port, retry_cfg))
+        except (TypeError, ValueError) as e:
+            errors.append(f"serial_ports[{index}] ({port['port']}): invalid retry settings: {e}")
+        serial_ports.append(_freeze(port))
+
+    zabbix_keys = raw.get("zabbix_keys", {})
+    if not isinstance(zabbix_keys, Mapping):
+        errors.append("zabbix_keys must be an object")
+        zabbix_keys = {}
+    for sensor, key_map in zabbix_keys.items():
+        if sensor not in SENSORS:
+            errors.append(f"zabbix_keys.{sensor}: unknown sensor (expected one of {SENSORS})")
+        elif not isinstance(key_map, Mapping) or not all(
+            isinstance(key, str) and key for key in key_map.values()
+        ):
+            errors.append(f"zabbix_keys.{sensor} must map data keys to non-empty item keys")
+
+    if "zabbix_endpoints" in raw:
+        _validate_endpoints(raw["zabbix_endpoints"], errors)
+    backpressure = raw.get("zabbix_backpressure", {})
+    if not isinstance(backpressure, Mapping):
+        errors.append("zabbix_backpressure must be an object")
+    else:
+        if backpressure.get("policy", "downsample") not in SHED_POLICIES:
+            errors.append(f"zabbix_backpressure.policy must be one of {SHED_POLICIES}")
+        for key in ("max_spool_bytes", "max_spool_age_seconds", "downsample_factor"):
+            value = backpressure.get(key, 0)
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+                errors.append(f"zabbix_backpressure.{key} must be a non-negative number")
+
+    station_names = dict(STATION_NAMES)
+    overrides = raw.get("station_names", {})
+    if not isinstance(overrides, Mapping):
+        errors.append("station_names must be an object")
+        overrides = {}
+    for number, name in overrides.items():
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            errors.append(f"station_names: '{number}' is not a station number")
+            continue
+        if not isinstance(name, str) or not name:
+            errors.append(f"station_names.{number} must be a non-empty string")
+            continue
+        station_names[number] = name
+
+    if errors:
+        source = f" in {path}" if path else ""
+        raise ConfigError(f"Invalid configuration{source}: " + "; ".join(errors))
+    return RuntimeConfig(
+        path=path,
+        raw=_freeze(dict(raw)),
+        serial_ports=tuple(serial_ports),
+        retry_policies=MappingProxyType(retry_policies),
+        zabbix_keys=_freeze(dict(zabbix_keys)),
+        station_names=MappingProxyType(station_names),
+    )
+
+
+def load_runtime_config(path: Optional[str] = None) -> RuntimeConfig:
+    """Read, parse and validate a configuration file (default: `CONFIG_PATH`)."""
+    path = path or CONFIG_PATH
+    try:
+        with open(path, "r") as f:
+            raw = json.load(f)
+    except OSError as e:
+        raise ConfigError(f"Cannot read {path}: {e}") from e
+    except json.JSONDecodeError as e:
+        raise ConfigError(f"Cannot parse {path}: {e}") from e
+    return build_runtime_config(raw, path)
+
+
+def get_runtime_config() -> RuntimeConfig:
+    """The current runtime configuration, built from `APP_CONFIG` on first use.
+
+    Raises:
+        ConfigError: If the configuration loaded at startup does not validate.
+    """
+    config = _current
+    if config is None:
+        with _lock:
+            if _current is None:
+                _set_current(build_runtime_config(APP_CONFIG, CONFIG_PATH))
+            config = _current
+    return config
+
+
+def _set_current(config: RuntimeConfig) -> None:
+    global _current
+    _current = config
+
+
+def diff_runtime_configs(old: RuntimeConfig, new: RuntimeConfig) -> ConfigDiff:
+    """Compare the reloadable parts of two configurations."""
+    old_ports = {port["port"]: port for port in old.serial_ports}
+    new_ports = {port["port"]: port for port in new.serial_ports}
+    return ConfigDiff(
+        ports_added=tuple(port for name, port in new_ports.items() if name not in old_ports),
+        ports_removed=tuple(name for name in old_ports if name not in new_ports),
+        ports_changed=tuple(
+            port for name, port in new_ports.items()
+            if name in old_ports and (
+                port != old_ports[name] or new.retry_policies[name] != old.retry_policies[name]
+            )
+        ),
+        zabbix_keys_changed=old.zabbix_keys != new.zabbix_keys,
+        station_names_changed=old.station_names != new.station_names,
+    )
+
+
+def add_reload_listener(listener: Callable[[RuntimeConfig, RuntimeConfig, ConfigDiff], None]) -> None:
+    """Call `listener(old, new, diff)` after every successful reload that changed something."""
+    with _lock:
+        _listeners.append(listener)
+
+
+def remove_reload_listener(listener) -> None:
+    with _lock:
+        if listener in _listeners:
+            _listeners.remove(listener)
+
+
+def reload_runtime_config(path: Optional[str] = None) -> Optional[ConfigDiff]:
+    """Reload the configuration file and apply it.
+
+    Returns:
+        ConfigDiff | None: What changed, or None if the file was rejected
+        (the running configuration is kept).
+    """
+    with _reload_lock:
+        return _reload(path)
+
+
+def _reload(path: Optional[str]) -> Optional[ConfigDiff]:
+    old = get_runtime_config()
+    try:
+        new = load_runtime_config(path or old.path or None)
+    except ConfigError as e:
+        logger.error(f"Configuration reload rejected, keeping the running configuration: {e}")
+        return None
+    diff = diff_runtime_configs(old, new)
+    with _lock:
+        _set_current(new)
+        listeners = list(_listeners)
+    if not diff:
+        logger.info(f"Configuration reloaded from {new.path}: no changes to ports, keys or stations.")
+        return diff
+    logger.info(
+        f"Configuration reloaded from {new.path}: ports added {[p['port'] for p in diff.ports_added]}, "
+        f"removed {list(diff.ports_removed)}, changed {[p['port'] for p in diff.ports_changed]}; "
+        f"zabbix_keys {'changed' if diff.zabbix_keys_changed else 'unchanged'}, "
+        f"station names {'changed' if diff.station_names_changed else 'unchanged'}."
+    )
+    for listener in listeners:
+        try:
+            listener(old, new, diff)
+        except Exception as e:
+            logger.error(f"Error applying reloaded configuration in {listener}: {e}")
+    return diff
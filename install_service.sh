@@ -39,6 +39,8 @@ EnvironmentFile=-/etc/default/$SERVICE_NAME
 # Comando para iniciar el servicio
 # Usamos el intérprete de Python del entorno virtual
 ExecStart=$PYTHON_EXEC $MAIN_SCRIPT
+# Recarga de puertos, claves de Zabbix y estaciones (SIGHUP)
+ExecReload=/bin/kill -HUP \$MAINPID
 
 # Política de reinicio
 Restart=on-failure
@@ -4,20 +4,63 @@ Main entry point for the Serial Tiltmeter to Zabbix application.
 This script initializes the logging configuration and starts the serial port
 readers, which run indefinitely to collect, process, and send data from
 sensors to a Zabbix server.
+
+With `worker_processes.enabled` in config.json, the serial ports are read
+and parsed in worker processes and the records stored and sent by this
+process (see `utils.process_shards`).
+
+`python main.py backfill [options]` instead sends the local TSV archive to
+Zabbix with the original timestamps (see `utils.zabbix_backfill`).
+
+The configuration is validated before anything starts, and SIGHUP reloads
+the serial ports, Zabbix keys and station names without a restart (see
+`config.runtime_config`).
 """
 
 import logging
 import signal
+import sys
 import threading
-from utils.logging_config import setup_logging
+from config.runtime_config import ConfigError, get_runtime_config, reload_runtime_config
+from utils.archive_maintenance import start_archive_maintenance, stop_archive_maintenance
+from utils.data_processor import start_port_summaries, stop_port_summaries
+from utils.data_storage import close_storage
+from utils.diagnostics import dump_diagnostics, start_tracemalloc_if_configured, toggle_profiler
+from utils.latest_values import close_latest_values
+from utils.logging_config import setup_logging, stop_logging
+from utils.metrics import start_metrics_server, stop_metrics_server
+from utils.process_shards import start_sharded_readers, worker_processes_enabled
 from utils.serial_reader import start_serial_readers
-from utils.zabbix_sender import preflight_check
+from utils.station_history import start_history_server, stop_history_server
+from utils.zabbix_sender import (
+    close_spool,
+    preflight_check,
+    start_aggregator,
+    start_batcher,
+    start_self_report,
+    stop_aggregator,
+    stop_batcher,
+    stop_self_report,
+)
 
 if __name__ == "__main__":
     setup_logging()
+    if sys.argv[1:2] == ["backfill"]:
+        # Historical import of the TSV archive instead of the live gateway
+        from utils.zabbix_backfill import main as backfill_main
+        sys.exit(backfill_main(sys.argv[2:]))
+
     logging.info("==================================================")
     logging.info("    Serial Tiltmeter to Zabbix Application Started    ")
     logging.info("==================================================")
+    try:
+        runtime_config = get_runtime_config()
+    except ConfigError as e:
+        logging.critical(str(e))
+        stop_logging()
+        sys.exit(1)
+    logging.info(f"Configuration loaded from {runtime_config.path}")
+
     # Create shutdown event and register signal handlers for graceful termination
     stop_event = threading.Event()
 
@@ -28,9 +71,63 @@ if __name__ == "__main__":
     signal.signal(signal.SIGINT, handle_signal)
     signal.signal(signal.SIGTERM, handle_signal)
 
+    # SIGHUP reloads ports, Zabbix keys and station names (off the signal handler)
+    def handle_reload_signal(signum, frame):
+        threading.Thread(target=reload_runtime_config, name="config-reload", daemon=True).start()
+
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, handle_reload_signal)
+
+    # On-demand diagnostics: SIGUSR1 toggles the sampling profiler, SIGUSR2 dumps
+    # thread stacks and tracemalloc top-N. Files are written off the signal handler.
+    def handle_diagnostics_signal(signum, frame):
+        action = toggle_profiler if signum == signal.SIGUSR1 else dump_diagnostics
+        threading.Thread(target=action, name="diagnostics", daemon=True).start()
+
+    if hasattr(signal, "SIGUSR1"):
+        start_tracemalloc_if_configured()
+        signal.signal(signal.SIGUSR1, handle_diagnostics_signal)
+        signal.signal(signal.SIGUSR2, handle_diagnostics_signal)
+
+    # Runtime metrics: Prometheus endpoint and self-report to Zabbix (if enabled)
+    start_metrics_server()
+    start_self_report()
+
+    # Local JSON API over the recent records kept in memory (if enabled)
+    start_history_server()
+
     # Run Zabbix preflight checks (binary/connectivity/spool)
     preflight_check()
 
+    # Decouple Zabbix sends from the reader threads (if enabled)
+    start_batcher()
+
+    # Aggregate values per station and key over time windows (if enabled)
+    start_aggregator()
+
+    # Periodic per-port summary lines instead of per-frame logging
+    start_port_summaries()
+
+    # Compress finished days and apply the retention limits of the archive (if enabled)
+    start_archive_maintenance()
+
     logging.info("Starting serial port readers...")
-    start_serial_readers(stop_event)
+    try:
+        if worker_processes_enabled():
+            # Readers and parsers in worker processes, storage and sending here
+            start_sharded_readers(stop_event)
+        else:
+            start_serial_readers(stop_event)
+    finally:
+        stop_archive_maintenance()
+        stop_port_summaries()
+        stop_self_report()
+        stop_aggregator()
+        stop_batcher()
+        close_spool()
+        close_storage()
+        close_latest_values()
+        stop_metrics_server()
+        stop_history_server()
     logging.info("Serial Tiltmeter to Zabbix Application stopped.")
+    stop_logging()
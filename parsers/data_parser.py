@@ -3,66 +3,97 @@
 This module is responsible for decoding the specific data format sent by the
 inclinometer and pluviometer sensors. The format is a hybrid of binary and ASCII
 characters, delimited by tilde (`~`) characters.
+
+The decoder works directly on the received buffer (`bytes`, `bytearray` or
+`memoryview`) in a single pass: the `~~` separator and the numeric values are
+located with precompiled bytes patterns using start/end positions, so no
+stripped, split, sliced or decoded copies of the frame are made.
 """
 import re
 import logging
 
-from config.station_mapping import STATION_NAMES
+from config.runtime_config import get_runtime_config
+from utils.metrics import PARSED_FRAMES
+
+# Signed decimal values in the ASCII part of each sub-frame (e.g. b'+12.34')
+_VALUE_RE = re.compile(rb'[+-]\d+\.\d+')
+_SEPARATOR_RE = re.compile(rb'~~')
+
+_TILDE = 0x7E
+# bytes.strip() whitespace: space, \t, \n, \v, \f, \r
+_WHITESPACE = frozenset(b' \t\n\x0b\x0c\r')
+
+# Layout of `~<inclinometer>~~<pluviometer>~\n` (offsets from the start of each sub-frame)
+INCLINOMETER_ASCII_START = 11      # '~' + 10 header bytes
+PLUVIOMETER_ASCII_START = 9        # 9 header bytes after the '~~' separator
+_STATION_TYPE_INDEX = 7
+_STATION_NUMBER_INDEX = 8
+_NETWORK_ID_INDEX = 10
+
+_PARSED_OK = PARSED_FRAMES.labels("ok")
+_PARSED_INVALID = PARSED_FRAMES.labels("invalid")
+
 
 def parse_raw_data(raw_bytes):
     """Parses a raw, hybrid binary/ASCII byte string from the sensors.
 
-    The expected data frame has a structure like `~<inclinometer_frame>~~<pluviometer_frame>~\n`.
-    This function splits the frame into its two main parts, extracts binary header
-    information (like station ID) from the first part, and uses regular expressions
-    to find floating-point values in the ASCII parts of both frames.
+    The expected data frame has a structure like `~<inclinometer_frame>~~<pluviometer_frame>~\\n`.
+    This function locates the `~~` separator between the two sub-frames, reads
+    binary header information (like station ID) from the first part, and uses
+    a precompiled bytes pattern to find floating-point values in the ASCII parts
+    of both frames, all without copying the input.
 
     Args:
-        raw_bytes (bytes): The raw byte string read from the serial port.
+        raw_bytes (bytes | bytearray | memoryview): The raw frame read from the serial port.
 
     Returns:
         dict: A dictionary containing the structured, parsed data if successful.
         None: If the frame is malformed, incomplete, or cannot be parsed.
     """
+    parsed_data = _decode_frame(raw_bytes)
+    if parsed_data is None:
+        _PARSED_INVALID.inc()
+    else:
+        _PARSED_OK.inc()
+    return parsed_data
+
+
+def _decode_frame(raw_bytes):
     try:
         # The full line is expected to be b'~...~~...~\n'
-        if not raw_bytes.startswith(b'~') or b'~~' not in raw_bytes:
+        size = len(raw_bytes)
+        if not size or raw_bytes[0] != _TILDE:
             return None
 
-        # b'~A~~B~\n'.strip() -> b'~A~~B~'
-        # .split(b'~~') -> [b'~A', b'B~']
-        parts = raw_bytes.strip().split(b'~~')
-        if len(parts) != 2:
+        # Ignore trailing whitespace (e.g. b'\r\n') like bytes.strip() would
+        end = size
+        while end and raw_bytes[end - 1] in _WHITESPACE:
+            end -= 1
+
+        # Exactly one '~~' separator is allowed
+        separator = _SEPARATOR_RE.search(raw_bytes, 0, end)
+        if separator is None:
+            return None
+        split_at = separator.start()
+        if _SEPARATOR_RE.search(raw_bytes, split_at + 2, end) is not None:
             return None
 
-        # --- Inclinometer Part ---
-        # parts[0] is b'~A' where A is the inclinometer frame content
-        inclinometer_frame = parts[0]
-        if not inclinometer_frame.startswith(b'~'):
+        # --- Inclinometer Part: raw_bytes[0:split_at] is '~' + header + ASCII values ---
+        if split_at < INCLINOMETER_ASCII_START:
+            return None
+        station_type = raw_bytes[_STATION_TYPE_INDEX]
+        station_number = raw_bytes[_STATION_NUMBER_INDEX]
+        network_id = raw_bytes[_NETWORK_ID_INDEX]
+        inclinometer_values = _VALUE_RE.findall(raw_bytes, INCLINOMETER_ASCII_START, split_at)
+        if len(inclinometer_values) != 4:
             return None
 
-        # Get header data from the inclinometer frame (indices are 0-based from the start of the frame)
-        station_type = inclinometer_frame[7]
-        station_number = inclinometer_frame[8]
-        network_id = inclinometer_frame[10]
-
-        # Decode the ASCII part of the frame (from index 11 onwards) and find values
-        inclinometer_ascii_part = inclinometer_frame[11:].decode('ascii', errors='ignore')
-        pattern = r'([+-]\d+\.\d+)'
-        inclinometer_values = re.findall(pattern, inclinometer_ascii_part)
-
-        # --- Pluviometer Part ---
-        # parts[1] is b'B~'. We reconstruct the full frame to be `~B~`
-        pluviometer_frame = b'~' + parts[1]
-        
-        # The ASCII part starts at index 10 of the pluviometer frame
-        pluviometer_ascii_part = pluviometer_frame[10:].decode('ascii', errors='ignore')
-        pluviometer_values = re.findall(pattern, pluviometer_ascii_part)
-
-        if len(inclinometer_values) != 4 or len(pluviometer_values) != 2:
+        # --- Pluviometer Part: header bytes follow '~~', then ASCII values ---
+        pluviometer_values = _VALUE_RE.findall(raw_bytes, split_at + 2 + PLUVIOMETER_ASCII_START, end)
+        if len(pluviometer_values) != 2:
             return None
 
-        station_name = STATION_NAMES.get(station_number, f"Unknown_{station_number}")
+        station_name = get_runtime_config().station_names.get(station_number, f"Unknown_{station_number}")
 
         parsed_data = {
             "type": "TILT_RAIN",
@@ -83,5 +114,23 @@ def parse_raw_data(raw_bytes):
         }
         return parsed_data
     except (ValueError, IndexError, TypeError) as e:
-        logging.getLogger(__name__).error(f"Failed to parse raw data: {raw_bytes!r}. Error: {e}")
+        logging.getLogger(__name__).error("Failed to parse raw data: %r. Error: %s", bytes(raw_bytes), e)
         return None
+
+
+def parse_many(frames):
+    """Parses an iterable of raw frames, e.g. for replay or backfill.
+
+    Malformed frames are skipped.
+
+    Args:
+        frames (iterable): Raw frames (`bytes`, `bytearray` or `memoryview`).
+
+    Yields:
+        dict: The parsed data of every valid frame, in input order.
+    """
+    parse = parse_raw_data
+    for frame in frames:
+        parsed = parse(frame)
+        if parsed is not None:
+            yield parsed
@@ -0,0 +1,94 @@
+"""A local stand-in for a Zabbix trapper, used by tests and benchmarks.
+
+`FakeTrapperServer` listens on 127.0.0.1, decodes "sender data" requests,
+records every received item, and answers with the same
+"processed/failed/total" info line a real Zabbix server produces.
+"""
+
+import json
+import socketserver
+import threading
+import time
+
+from utils.zabbix_trapper import build_packet, recv_packet, ZabbixTrapperError
+
+
+class _TrapperHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server
+        while True:
+            try:
+                payload = recv_packet(self.request)
+            except (OSError, ZabbixTrapperError):
+                return
+            received_at = time.time()
+            request = json.loads(payload.decode("utf-8"))
+            data = request.get("data", [])
+            failed = sum(1 for item in data if item.get("host") in server.reject_hosts)
+            with server.lock:
+                server.requests.append(request)
+                for item in data:
+                    server.items.append(dict(item, _received_at=received_at))
+                server.connections.add(self.client_address)
+            if server.unanswered_from is not None and len(server.requests) > server.unanswered_from:
+                return  # close the connection without answering
+            if server.response_delay:
+                time.sleep(server.response_delay)
+            info = (
+                f"processed: {len(data) - failed}; failed: {failed}; "
+                f"total: {len(data)}; seconds spent: 0.000100"
+            )
+            answer = {"response": server.response, "info": info}
+            self.request.sendall(build_packet(json.dumps(answer).encode("utf-8")))
+            if not server.keep_alive:
+                return
+
+
+class FakeTrapperServer(socketserver.ThreadingTCPServer):
+    """Threaded fake trapper bound to an ephemeral localhost port.
+
+    Args:
+        keep_alive (bool): Keep the connection open after answering (a real
+            Zabbix server closes it).
+        response (str): Value of the "response" field sent back.
+        reject_hosts (set | None): Hosts whose items are counted as failed.
+        response_delay (float): Seconds to wait before answering.
+        unanswered_from (int | None): Requests after this many are received
+            but not answered (the connection is closed instead).
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, keep_alive=False, response="success", reject_hosts=None, response_delay=0.0,
+                 unanswered_from=None):
+        super().__init__(("127.0.0.1", 0), _TrapperHandler)
+        self.keep_alive = keep_alive
+        self.response = response
+        self.reject_hosts = set(reject_hosts or ())
+        self.response_delay = response_delay
+        self.unanswered_from = unanswered_from
+        self.lock = threading.Lock()
+        self.requests = []
+        self.items = []
+        self.connections = set()
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,194 @@
+"""Unit tests for the compression and retention of the TSV archive.
+
+This test suite builds a small archive with `utils.data_storage`, runs
+maintenance passes with a fixed "today" and checks that finished days are
+gzipped while today's and open files are left alone, that queries, the
+index and backfill offsets see compressed and plain days the same way
+(including rows written after a day was compressed), that the age and size
+limits delete the oldest days, and that an interrupted compression is
+recovered.
+"""
+
+import gzip
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import date, datetime, timedelta
+from unittest import mock
+
+from utils import archive_maintenance, archive_query, data_storage
+from utils.archive_maintenance import get_maintenance_options, run_maintenance
+
+TODAY = date(2025, 9, 20)
+
+
+class TestArchiveMaintenance(unittest.TestCase):
+    """Test suite for `run_maintenance` and the compressed-day reader."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, True)
+        patches = [
+            mock.patch.object(data_storage, "BASE_DIR", self.tmpdir),
+            mock.patch.object(data_storage, "_writer", None),
+            mock.patch.object(archive_query, "BLOCK_ROWS", 10),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(data_storage.close_storage)
+        self.opts = get_maintenance_options()
+        self.opts["idle_seconds"] = 0
+
+    def _save(self, moment, rain, station="CHONTAL"):
+        data_storage.save_pluviometer_data({
+            "station_name": station,
+            "station_number": 3,
+            "timestamp": moment.timestamp(),
+            "pluviometer": {"rain_level": rain, "voltage": 12.5},
+        })
+
+    def _archive(self, day, rows=50, station="CHONTAL"):
+        start = datetime(day.year, day.month, day.day, 10, 0, 0)
+        for minute in range(rows):
+            self._save(start + timedelta(minutes=minute), float(minute), station)
+        data_storage.close_storage()
+
+    def _path(self, day, station="CHONTAL"):
+        return archive_query.daily_file_path(self.tmpdir, "pluviometer", station, day)
+
+    def _query(self, day):
+        start = datetime(day.year, day.month, day.day)
+        rows = archive_query.query("CHONTAL", "pluviometer", start, start + timedelta(days=1), self.tmpdir)
+        return [float(fields[2]) for _, _, fields in rows]
+
+    def _run(self, **retention):
+        self.opts["retention"]["pluviometer"].update(retention)
+        return run_maintenance(self.tmpdir, TODAY, self.opts)
+
+    def test_compresses_finished_days_only(self):
+        """Tests that past days are gzipped and read back unchanged, today and open files are not."""
+        yesterday = TODAY - timedelta(days=1)
+        for day in (TODAY - timedelta(days=2), yesterday, TODAY):
+            self._archive(day)
+        self.assertEqual(len(self._query(yesterday)), 50)  # builds the index of the plain file
+        with open(self._path(yesterday), "rb") as f:
+            plain = f.read()
+        # An open file is left alone even though its day is over
+        self._save(datetime(2025, 9, 18, 12, 0, 0), 99.0)
+
+        stats = self._run()
+        self.assertEqual(stats["compressed"], 1)
+        self.assertTrue(os.path.exists(self._path(TODAY - timedelta(days=2))))
+        self.assertFalse(os.path.exists(self._path(yesterday)))
+        self.assertTrue(os.path.exists(self._path(TODAY)))
+        with gzip.open(self._path(yesterday) + ".gz", "rb") as f:
+            self.assertEqual(f.read(), plain)
+
+        self.assertEqual(self._query(yesterday), [float(m) for m in range(50)])
+        files = archive_query.list_daily_files(self.tmpdir, "pluviometer")
+        self.assertEqual([(day, path) for _, day, path in files],
+                         [(day, self._path(day)) for day in (TODAY - timedelta(days=2), yesterday, TODAY)])
+
+        data_storage.close_storage()
+        self.assertEqual(self._run()["compressed"], 1)
+        self.assertEqual(self._query(TODAY - timedelta(days=2)), [float(m) for m in range(50)] + [99.0])
+
+    def test_late_rows_are_merged_and_offsets_stay_valid(self):
+        """Tests that rows added to a compressed day are read after it and merged by the next pass."""
+        day = TODAY - timedelta(days=3)
+        self._archive(day, rows=30)
+        self._run()
+        self._save(datetime(2025, 9, 17, 23, 0, 0), 300.0)
+        data_storage.close_storage()
+        path = self._path(day)
+        self.assertEqual(archive_query.daily_file_parts(path), [path + ".gz", path])
+        self.assertEqual(self._query(day), [float(m) for m in range(30)] + [300.0])
+
+        rows = list(archive_query.iter_rows_from(path))
+        middle = rows[14][0]
+        self.assertEqual([float(fields[2]) for _, _, fields in archive_query.iter_rows_from(path, middle)][0], 15.0)
+        size = archive_query.daily_file_stat(path)[0]
+
+        self.assertEqual(self._run()["compressed"], 1)
+        self.assertEqual(archive_query.daily_file_parts(path), [path + ".gz"])
+        self.assertEqual(archive_query.daily_file_stat(path)[0], size)
+        self.assertEqual([float(fields[2]) for _, _, fields in archive_query.iter_rows_from(path, middle)][0], 15.0)
+        self.assertEqual(self._query(day), [float(m) for m in range(30)] + [300.0])
+
+    def test_retention_by_age_and_size(self):
+        """Tests that the oldest days beyond the age or size limit are deleted, today never."""
+        for offset in range(6):
+            self._archive(TODAY - timedelta(days=offset), station="CHONTAL")
+            self._archive(TODAY - timedelta(days=offset), station="CAYR")
+        self.opts["compress_after_days"] = 0
+
+        stats = self._run(max_age_days=3)
+        self.assertEqual(stats["deleted"], 4)  # two days of two stations
+        days = sorted({day for _, day, _ in archive_query.list_daily_files(self.tmpdir, "pluviometer")})
+        self.assertEqual(days, [TODAY - timedelta(days=offset) for offset in (3, 2, 1, 0)])
+
+        day_bytes = os.path.getsize(self._path(TODAY))
+        with self.assertLogs("utils.archive_maintenance", level="WARNING"):
+            self._run(max_age_days=0, max_bytes=day_bytes)
+        remaining = archive_query.list_daily_files(self.tmpdir, "pluviometer")
+        self.assertEqual([(station, day) for station, day, _ in remaining], [("CAYR", TODAY), ("CHONTAL", TODAY)])
+
+    def test_interrupted_compression_is_recovered(self):
+        """Tests that leftovers of a crash are cleaned up without losing or repeating rows."""
+        day = TODAY - timedelta(days=1)
+        other = TODAY - timedelta(days=2)
+        self._archive(day)
+        self._archive(other)
+        # Crash after the rename, before the plain file was deleted
+        path = self._path(day)
+        with open(path, "rb") as source, gzip.open(path + ".gz", "wb") as target:
+            shutil.copyfileobj(source, target)
+        self.assertEqual(len(self._query(day)), 100)
+        # Crash while writing the temporary file
+        with open(self._path(other) + ".gz.tmp", "wb") as f:
+            f.write(b"partial")
+
+        self.opts["compress_after_days"] = 0
+        self._run()
+        self.assertEqual(archive_query.daily_file_parts(path), [path + ".gz"])
+        self.assertEqual(archive_query.daily_file_parts(self._path(other)), [self._path(other)])
+        self.assertFalse(os.path.exists(self._path(other) + ".gz.tmp"))
+        self.assertEqual(self._query(day), [float(m) for m in range(50)])
+
+    def test_crash_before_deleting_the_plain_file_keeps_the_rows(self):
+        """Tests that the plain file is deleted only after the compressed file is in place."""
+        day = TODAY - timedelta(days=1)
+        self._archive(day)
+        path = self._path(day)
+        with mock.patch.object(archive_maintenance.os, "unlink", side_effect=OSError("power loss")):
+            with self.assertLogs("utils.archive_maintenance", level="ERROR"):
+                self._run()
+        self.assertEqual(archive_query.daily_file_parts(path), [path + ".gz", path])
+        self._run()
+        self.assertEqual(archive_query.daily_file_parts(path), [path + ".gz"])
+        self.assertEqual(self._query(day), [float(m) for m in range(50)])
+
+    def test_thread_start_and_stop(self):
+        """Tests that the maintenance thread runs a pass and stops."""
+        yesterday = TODAY - timedelta(days=1)
+        self._archive(yesterday)
+        with mock.patch.object(archive_maintenance, "APP_CONFIG", {
+            "base_dir": self.tmpdir,
+            "archive_maintenance": {"enabled": True, "idle_seconds": 0},
+        }):
+            archive_maintenance.start_archive_maintenance()
+            self.addCleanup(archive_maintenance.stop_archive_maintenance)
+            self.assertIsNotNone(archive_maintenance._thread)
+            deadline = time.monotonic() + 10
+            while not os.path.exists(self._path(yesterday) + ".gz") and time.monotonic() < deadline:
+                time.sleep(0.05)
+            archive_maintenance.stop_archive_maintenance()
+        self.assertIsNone(archive_maintenance._thread)
+        self.assertTrue(os.path.exists(self._path(yesterday) + ".gz"))
+
+
+if __name__ == "__main__":
+    unittest.main()
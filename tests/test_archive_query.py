@@ -0,0 +1,92 @@
+"""Unit tests for the indexed TSV archive query module.
+
+This test suite builds a small archive with `utils.data_storage` and checks
+that `utils.archive_query` returns exactly the rows of a time range across
+days, keeps its sidecar index up to date as files grow, and formats output.
+"""
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from utils import archive_query, data_storage
+
+START = datetime(2025, 9, 15, 22, 0, 0)
+
+
+class TestArchiveQuery(unittest.TestCase):
+    """Test suite for `archive_query`."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, True)
+        patches = [
+            mock.patch.object(data_storage, "BASE_DIR", self.tmpdir),
+            mock.patch.object(data_storage, "_writer", None),
+            mock.patch.object(archive_query, "BLOCK_ROWS", 10),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _save(self, moment, rain):
+        data_storage.save_pluviometer_data({
+            "station_name": "CHONTAL",
+            "station_number": 3,
+            "timestamp": moment.timestamp(),
+            "pluviometer": {"rain_level": rain, "voltage": 12.5},
+        })
+
+    def _archive(self, minutes):
+        """One row per minute from START; rain_level is the minute number."""
+        for minute in range(minutes):
+            self._save(START + timedelta(minutes=minute), float(minute))
+        data_storage.close_storage()
+
+    def _query(self, start, end):
+        return list(archive_query.query("CHONTAL", "pluviometer", start, end, self.tmpdir))
+
+    def test_range_across_days(self):
+        """Tests that a range spanning midnight returns exactly its rows, in order."""
+        self._archive(240)  # 22:00 -> 02:00 next day
+        rows = self._query(START + timedelta(minutes=100), START + timedelta(minutes=150))
+        self.assertEqual([float(fields[2]) for _, _, fields in rows], [float(m) for m in range(100, 150)])
+        self.assertEqual(rows[0][1][:3], ["FECHA", "TIEMPO", "NIVEL"])
+        day_file = archive_query.daily_file_path(self.tmpdir, "pluviometer", "CHONTAL", START)
+        self.assertTrue(os.path.exists(day_file + archive_query.INDEX_SUFFIX))
+
+    def test_index_refreshed_when_file_grows(self):
+        """Tests that rows appended after the index was built are found."""
+        self._archive(25)
+        window = (START, START + timedelta(hours=1))
+        self.assertEqual(len(self._query(*window)), 25)
+        self._save(START + timedelta(minutes=30), 30.0)
+        self._save(START + timedelta(minutes=1, seconds=30), 1.5)  # out of order
+        data_storage.close_storage()
+        rows = self._query(START + timedelta(minutes=1), START + timedelta(minutes=2))
+        self.assertEqual(sorted(float(fields[2]) for _, _, fields in rows), [1.0, 1.5])
+        self.assertEqual(len(self._query(*window)), 27)
+
+    def test_output_formats(self):
+        """Tests CSV and JSON Lines output."""
+        self._archive(3)
+        rows = self._query(START, START + timedelta(minutes=2))
+
+        out = io.StringIO()
+        self.assertEqual(archive_query.write_rows(rows, "csv", out), 2)
+        self.assertEqual(out.getvalue().splitlines()[0], "FECHA,TIEMPO,NIVEL,BATERIA")
+
+        out = io.StringIO()
+        archive_query.write_rows(rows, "json", out, "CHONTAL", "pluviometer")
+        record = json.loads(out.getvalue().splitlines()[1])
+        self.assertEqual(record["NIVEL"], 1.0)
+        self.assertEqual(record["timestamp"], "2025-09-15T22:01:00")
+
+
+if __name__ == '__main__':
+    unittest.main()
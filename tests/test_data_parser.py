@@ -6,9 +6,18 @@ data frames.
 """
 
 import unittest
-from parsers.data_parser import parse_raw_data
+from parsers.data_parser import parse_raw_data, parse_many
 from config.station_mapping import STATION_NAMES
 
+# Shared by the buffer and parse_many tests, the frame assembler tests and the benchmarks
+VALID_FRAME = b'~\x00\x01\x02\x03\x04\x05\x01\x01\x00\x01RD+12.34,TD+56.78,T+25.5,V+3.3~~\x00\x01\x02\x03\x04\x05\x06\x07\x08\x09RAIN+1.2,V+3.4~\n'
+
+# Malformed inclinometer part
+MALFORMED_FRAME = b'~\x00\x01\x02\x03\x04\x05\x01\x01\x00\x01RD+12.34,TD+56.78~~\x00\x01\x02\x03\x04\x05\x06\x07\x08\x09RAIN+1.2,V+3.4~\n'
+
+INVALID_FRAMES = [b'invalid data', b'~missing~~parts~', b'~too~~many~~parts~']
+
+
 class TestDataParser(unittest.TestCase):
     """Test suite for the `parse_raw_data` function."""
 
@@ -35,5 +44,19 @@ class TestDataParser(unittest.TestCase):
         raw_data = b'~\x00\x01\x02\x03\x04\x05\x01\x01\x00\x01RD+12.34,TD+56.78~~\x00\x01\x02\x03\x04\x05\x06\x07\x08\x09RAIN+1.2,V+3.4~\n'
         self.assertIsNone(parse_raw_data(raw_data))
 
+    def test_buffer_types(self):
+        """Tests that bytearray and memoryview inputs parse like bytes."""
+        expected = parse_raw_data(VALID_FRAME)
+        self.assertEqual(parse_raw_data(bytearray(VALID_FRAME)), expected)
+        self.assertEqual(parse_raw_data(memoryview(VALID_FRAME)), expected)
+        self.assertEqual(parse_raw_data(VALID_FRAME.rstrip(b'\n') + b'\r\n'), expected)
+
+    def test_parse_many_skips_invalid_frames(self):
+        """Tests that `parse_many` yields only the valid frames, in order."""
+        frames = [VALID_FRAME, MALFORMED_FRAME] + INVALID_FRAMES + [VALID_FRAME]
+        parsed = list(parse_many(frames))
+        self.assertEqual(len(parsed), 2)
+        self.assertEqual(parsed[0]['pluviometer']['voltage'], 3.4)
+
 if __name__ == '__main__':
     unittest.main()
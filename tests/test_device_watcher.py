@@ -0,0 +1,129 @@
+"""Unit tests for event-driven re-enabling of serial ports.
+
+This test suite uses a temporary directory standing in for /dev: it checks
+that `DeviceWatcher` reports nodes created there (also in subdirectories that
+do not exist yet, like /dev/serial/by-id), and that the serial supervisor
+re-enables a disabled port as soon as its node appears, long before its
+fallback probe interval.
+"""
+
+import os
+import tempfile
+import threading
+import time
+import tty
+import unittest
+from unittest import mock
+
+from config import runtime_config
+from utils import serial_reader
+from utils.device_watcher import DeviceWatcher, affects
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+class TestDeviceWatcher(unittest.TestCase):
+    """Test suite for `DeviceWatcher`."""
+
+    def setUp(self):
+        self.watcher = DeviceWatcher.create()
+        if self.watcher is None:
+            self.skipTest("inotify is not available")
+        self.addCleanup(self.watcher.close)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dev = tmp.name
+
+    def test_reports_created_node(self):
+        """Tests that creating a node in a watched directory is reported at once."""
+        port = os.path.join(self.dev, "ttyUSB0")
+        self.watcher.watch([port])
+        self.assertEqual(self.watcher.wait(0.05), [])
+        open(port, "w").close()
+        changed = self.watcher.wait(2.0)
+        self.assertIn(port, changed)
+        self.assertTrue(affects(changed, [port]))
+        self.assertFalse(affects(changed, [os.path.join(self.dev, "ttyUSB1")]))
+
+    def test_missing_directory_is_watched_through_its_parent(self):
+        """Tests that nodes in directories created later are still reported."""
+        port = os.path.join(self.dev, "serial", "by-id", "usb-FTDI-port0")
+        self.watcher.watch([port])
+        self.assertEqual(self.watcher.watched(), [self.dev])
+
+        os.makedirs(os.path.dirname(port))
+        changed = self.watcher.wait(2.0)
+        self.assertTrue(affects(changed, [port]))
+        self.watcher.watch([port])
+        self.assertEqual(self.watcher.watched(), [os.path.dirname(port)])
+
+        os.symlink("/dev/null", port)
+        self.assertIn(port, self.watcher.wait(2.0))
+
+
+class TestSupervisorReenable(unittest.TestCase):
+    """Test suite for the serial supervisor with a watched device directory."""
+
+    def setUp(self):
+        if DeviceWatcher.create() is None:
+            self.skipTest("inotify is not available")
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.port = os.path.join(tmp.name, "ttyUSB0")
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        self.addCleanup(os.close, master)
+        self.addCleanup(os.close, slave)
+        self.slave_path = os.ttyname(slave)
+
+        app_config = {
+            "serial_supervisor": {
+                "auto_reenable": True,
+                "reenable_interval_seconds": 60,
+                "device_watch": True,
+                "fallback_probe_interval_seconds": 60,
+            },
+            "serial_reader": {"engine": "threads"},
+        }
+        config = runtime_config.build_runtime_config({
+            "serial_ports": [{
+                "port": self.port, "baudrate": 9600, "bytesize": 8, "parity": "N", "stopbits": 1,
+                "timeout": 0.2, "max_retries": 1, "retry_delay": 1, "on_fail": "disable",
+            }],
+        })
+        patches = [
+            mock.patch.object(serial_reader, "APP_CONFIG", app_config),
+            mock.patch.object(runtime_config, "_current", config),
+            mock.patch.object(serial_reader, "process_data"),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(serial_reader.DISABLED_PORTS.pop, self.port, None)
+
+    def test_port_is_reenabled_when_its_node_appears(self):
+        """Tests that a disabled port is reopened as soon as its device node is created."""
+        stop_event = threading.Event()
+        thread = threading.Thread(target=serial_reader.start_serial_readers, args=(stop_event,), daemon=True)
+        with self.assertLogs(serial_reader.__name__, level="INFO") as captured:
+            thread.start()
+            try:
+                self.assertTrue(_wait_for(lambda: self.port in serial_reader.DISABLED_PORTS))
+                time.sleep(0.6)  # let the supervisor watch the directory
+                os.symlink(self.slave_path, self.port)
+                self.assertTrue(_wait_for(lambda: self.port not in serial_reader.DISABLED_PORTS, timeout=3.0))
+            finally:
+                stop_event.set()
+                thread.join(timeout=5)
+        self.assertIn(f"Port re-enabled {self.port}", "\n".join(captured.output))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+"""Unit tests for the on-demand profiling and diagnostic dumps.
+
+This test suite verifies that the sampling profiler sees other threads and
+writes its reports, and that diagnostic dumps write thread stacks and, once
+tracemalloc is tracing, an allocation snapshot.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import tracemalloc
+import unittest
+from unittest import mock
+
+from utils import diagnostics
+
+
+def _busy_worker(stop_event):
+    while not stop_event.is_set():
+        sum(range(1000))
+
+
+class TestDiagnostics(unittest.TestCase):
+    """Test suite for `utils.diagnostics`."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, True)
+        patcher = mock.patch.object(diagnostics, "get_diagnostics_options", return_value={
+            "output_dir": self.tmpdir,
+            "sample_interval": 0.002,
+            "tracemalloc_top": 5,
+            "tracemalloc_frames": 1,
+            "tracemalloc_at_startup": False,
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_profiler_toggle_writes_report(self):
+        """Tests that a start/stop cycle profiles a busy worker thread."""
+        stop_event = threading.Event()
+        worker = threading.Thread(target=_busy_worker, args=(stop_event,), name="busy-worker")
+        worker.start()
+        try:
+            self.assertIsNone(diagnostics.toggle_profiler())
+            threading.Event().wait(0.2)
+            report = diagnostics.toggle_profiler()
+        finally:
+            stop_event.set()
+            worker.join()
+        with open(report) as f:
+            text = f.read()
+        self.assertIn("busy-worker", text)
+        self.assertIn("_busy_worker", text)
+        self.assertTrue(os.path.exists(report[:-len(".txt")] + ".folded"))
+
+    def test_dump_starts_tracemalloc_then_snapshots(self):
+        """Tests thread stack dumps and the two-step tracemalloc snapshot."""
+        was_tracing = tracemalloc.is_tracing()
+        self.addCleanup(lambda: was_tracing or tracemalloc.stop())
+        tracemalloc.stop()
+        first = diagnostics.dump_diagnostics()
+        self.assertEqual(len(first), 1)
+        self.assertTrue(tracemalloc.is_tracing())
+        with open(first[0]) as f:
+            self.assertIn("MainThread", f.read())
+
+        data = [bytearray(1024) for _ in range(100)]
+        second = diagnostics.dump_diagnostics()
+        self.assertEqual(len(second), 2)
+        self.assertNotEqual(first[0], second[0])
+        with open(second[1]) as f:
+            self.assertIn("Top 5 allocation sites", f.read())
+        del data
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+"""Unit tests for the serial frame assembler.
+
+This test suite verifies that `FrameAssembler` cuts complete frames out of
+arbitrary chunks, resynchronizes after garbage or truncated frames, and
+counts the bytes it drops.
+"""
+
+import unittest
+
+from parsers.data_parser import parse_raw_data
+from utils.frame_assembler import FrameAssembler
+from test_data_parser import VALID_FRAME
+
+# Station 10 puts 0x0A ('\n') inside the binary header
+STATION_10_FRAME = VALID_FRAME[:8] + b'\x0a' + VALID_FRAME[9:]
+# Station 126 puts 0x7E ('~') inside the inclinometer header
+STATION_126_FRAME = VALID_FRAME[:8] + b'\x7e' + VALID_FRAME[9:]
+# A 0x7E byte inside the pluviometer header
+_PLUVIOMETER_HEADER = VALID_FRAME.index(b'~~') + 2
+TILDE_IN_PLUVIOMETER_HEADER_FRAME = (
+    VALID_FRAME[:_PLUVIOMETER_HEADER + 3] + b'\x7e' + VALID_FRAME[_PLUVIOMETER_HEADER + 4:]
+)
+
+
+class TestFrameAssembler(unittest.TestCase):
+    """Test suite for `FrameAssembler`."""
+
+    def test_frames_split_across_chunks(self):
+        """Tests that frames are returned once complete, whatever the chunking."""
+        stream = VALID_FRAME * 3
+        assembler = FrameAssembler()
+        frames = []
+        for i in range(0, len(stream), 7):
+            frames.extend(assembler.feed(stream[i:i + 7]))
+        self.assertEqual(frames, [VALID_FRAME] * 3)
+        self.assertEqual(assembler.dropped_bytes, 0)
+        self.assertEqual(assembler.pending(), 0)
+
+    def test_resync_after_leading_garbage(self):
+        """Tests that bytes before the first '~' are dropped and counted."""
+        assembler = FrameAssembler()
+        frames = assembler.feed(b'\x00\xffnoise' + VALID_FRAME)
+        self.assertEqual(frames, [VALID_FRAME])
+        self.assertEqual(assembler.dropped_bytes, 7)
+
+    def test_truncated_frame_followed_by_valid_one(self):
+        """Tests that a frame cut mid-line does not swallow the next frame."""
+        truncated = VALID_FRAME[:30]
+        assembler = FrameAssembler()
+        frames = assembler.feed(truncated + VALID_FRAME)
+        self.assertEqual(frames, [VALID_FRAME])
+        self.assertEqual(assembler.dropped_bytes, len(truncated))
+
+    def test_frame_truncated_within_its_header(self):
+        """Tests that a frame cut before its ASCII part is not merged with the next frame."""
+        for length in (1, 5, 10):
+            truncated = VALID_FRAME[:length]
+            assembler = FrameAssembler()
+            frames = assembler.feed(truncated + VALID_FRAME)
+            self.assertEqual(frames, [VALID_FRAME])
+            self.assertEqual(assembler.dropped_bytes, len(truncated))
+            self.assertEqual(parse_raw_data(frames[0])["station_number"], 1)
+
+    def test_truncated_pluviometer_part(self):
+        """Tests resync when the pluviometer part is cut before the next frame."""
+        truncated = VALID_FRAME[:-12]
+        assembler = FrameAssembler()
+        frames = assembler.feed(truncated + VALID_FRAME)
+        self.assertEqual(frames, [VALID_FRAME])
+        self.assertEqual(assembler.dropped_bytes, len(truncated))
+
+    def test_newline_in_header(self):
+        """Tests that a 0x0A header byte does not split the frame."""
+        assembler = FrameAssembler()
+        frames = assembler.feed(STATION_10_FRAME)
+        self.assertEqual(frames, [STATION_10_FRAME])
+        self.assertEqual(parse_raw_data(frames[0])['station_number'], 10)
+
+    def test_tilde_in_headers(self):
+        """Tests that a 0x7E header byte is not taken for the start of a new frame."""
+        for frame in (STATION_126_FRAME, TILDE_IN_PLUVIOMETER_HEADER_FRAME):
+            assembler = FrameAssembler()
+            frames = assembler.feed(frame + VALID_FRAME)
+            self.assertEqual(frames, [frame, VALID_FRAME])
+            self.assertEqual(assembler.dropped_bytes, 0)
+            self.assertIsNotNone(parse_raw_data(frames[0]))
+        self.assertEqual(parse_raw_data(STATION_126_FRAME)['station_number'], 126)
+
+    def test_overlong_garbage_is_discarded(self):
+        """Tests that an endless run without a frame end does not grow the buffer."""
+        assembler = FrameAssembler(max_frame_bytes=128)
+        assembler.feed(b'~' + b'x' * 200)
+        self.assertLess(assembler.pending(), 128)
+        self.assertEqual(assembler.feed(VALID_FRAME), [VALID_FRAME])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+"""Unit tests for the shared-memory table of latest station values.
+
+This test suite publishes parsed frames into a table in a temporary
+directory and checks the snapshots of `LatestValuesReader`, that the record
+sequence continues when the writer reopens the file, that a reader never
+sees a half-written slot while the writer updates it, and that another
+process can read the table through the command line.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+from parsers.data_parser import parse_raw_data
+from utils.latest_values import FILE_SIZE, LatestValuesReader, LatestValuesTable
+from test_data_parser import VALID_FRAME
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _record(station_number, value, timestamp=1700000000.0):
+    return {
+        "station_name": f"ST{station_number}",
+        "station_type": 1,
+        "station_number": station_number,
+        "network_id": 2,
+        "timestamp": timestamp,
+        "inclinometer": {"radial": value, "tangential": value, "temperature": value, "voltage": value},
+        "pluviometer": {"rain_level": value, "voltage": value},
+    }
+
+
+class TestLatestValues(unittest.TestCase):
+    """Test suite for `LatestValuesTable` and `LatestValuesReader`."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "latest")
+        self.table = LatestValuesTable(self.path)
+        self.addCleanup(self.table.close)
+
+    def reader(self):
+        reader = LatestValuesReader(self.path)
+        self.addCleanup(reader.close)
+        return reader
+
+    def test_publish_and_read(self):
+        """Tests that each station's slot holds its latest frame and sequence number."""
+        parsed = parse_raw_data(VALID_FRAME)
+        parsed["timestamp"] = 1700000123.5
+        self.assertEqual(self.table.publish(parsed), 1)
+        self.assertEqual(self.table.publish(parsed), 2)
+        self.table.publish(_record(200, 4.25))
+
+        reader = self.reader()
+        self.assertEqual(reader.writer_pid, os.getpid())
+        self.assertIsNone(reader.read(3))
+        entry = reader.read(parsed["station_number"])
+        self.assertEqual(entry.sequence, 2)
+        self.assertEqual(entry.station_name, "VC1")
+        expected = {key: parsed[key] for key in ("station_name", "station_type", "station_number",
+                                                 "network_id", "timestamp", "inclinometer", "pluviometer")}
+        self.assertEqual(entry.as_dict(), dict(expected, sequence=2))
+        self.assertEqual(sorted(reader.snapshot()), [parsed["station_number"], 200])
+        self.assertEqual(reader.read(200).rain_level, 4.25)
+
+    def test_sequence_continues_after_reopen(self):
+        """Tests that a new writer keeps the file and the record sequence numbers."""
+        self.table.publish(_record(7, 1.0))
+        reader = self.reader()
+        self.table.close()
+        table = LatestValuesTable(self.path)
+        self.addCleanup(table.close)
+        self.assertEqual(table.publish(_record(7, 2.0)), 2)
+        # The reader mapped the same file before the restart
+        self.assertEqual(reader.read(7).radial, 2.0)
+
+    def test_foreign_file_is_replaced(self):
+        """Tests that a file with another layout is replaced by a fresh table."""
+        self.table.close()
+        with open(self.path, "wb") as f:
+            f.write(b"x" * 100)
+        with self.assertLogs("utils.latest_values", level="WARNING"):
+            table = LatestValuesTable(self.path)
+        self.addCleanup(table.close)
+        self.assertEqual(os.path.getsize(self.path), FILE_SIZE)
+        self.assertIsNone(self.reader().read(7))
+
+    def test_reader_never_sees_torn_slot(self):
+        """Tests that snapshots taken during updates are always consistent."""
+        reader = self.reader()
+        stop = threading.Event()
+
+        def write():
+            value = 0
+            while not stop.is_set():
+                value += 1
+                self.table.publish(_record(9, float(value)))
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            reads = 0
+            while reads < 2000:
+                entry = reader.read(9)
+                if entry is None:
+                    continue
+                reads += 1
+                values = {entry.radial, entry.tangential, entry.temperature, entry.inclinometer_voltage,
+                          entry.rain_level, entry.pluviometer_voltage}
+                self.assertEqual(values, {float(entry.sequence)})
+        finally:
+            stop.set()
+            writer.join()
+
+    def test_command_line_reads_from_another_process(self):
+        """Tests that another process reads the table through the command line."""
+        self.table.publish(_record(12, 3.5))
+        result = subprocess.run(
+            [sys.executable, "-m", "utils.latest_values", "--path", self.path, "--station", "12"],
+            cwd=PROJECT_ROOT, capture_output=True, text=True, timeout=30,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        entry = json.loads(result.stdout)
+        self.assertEqual((entry["station_name"], entry["sequence"]), ("ST12", 1))
+        self.assertEqual(entry["pluviometer"]["rain_level"], 3.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+"""Unit tests for the queued logging setup and the per-port summaries.
+
+This test suite checks that `setup_logging` writes records through its
+`QueueListener` to the log file, that a full queue drops records instead of
+blocking the caller, and that `data_processor` reports frames per port in
+periodic summary lines rather than one line per frame.
+"""
+
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from test_data_parser import VALID_FRAME
+from utils import data_processor, logging_config, metrics
+
+
+class TestQueuedLogging(unittest.TestCase):
+    """Test suite for `logging_config`."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, True)
+        self.log_file = os.path.join(self.tmpdir, "app.log")
+        patcher = mock.patch.dict(logging_config.APP_CONFIG, {"log_file": self.log_file})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        root = logging.getLogger()
+        self.addCleanup(root.setLevel, root.level)
+
+    def test_records_reach_file_through_listener(self):
+        """Tests that records are written by the listener and flushed on stop."""
+        with mock.patch("sys.stdout"):
+            logging_config.setup_logging()
+            logging_config.setup_logging()  # second call is a no-op
+            queue_handlers = [h for h in logging.getLogger().handlers if isinstance(h, logging.handlers.QueueHandler)]
+            self.assertEqual(len(queue_handlers), 1)
+            logging.getLogger("test").info("value %d from %s", 42, "port")
+            logging_config.stop_logging()
+        with open(self.log_file) as f:
+            self.assertIn("value 42 from port", f.read())
+        self.assertNotIn(queue_handlers[0], logging.getLogger().handlers)
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        """Tests that a full queue drops records and reports the count later."""
+        log_queue = queue.Queue(maxsize=2)
+        handler = logging_config._DroppingQueueHandler(log_queue)
+        record = logging.LogRecord("test", logging.INFO, __file__, 0, "message", (), None)
+        for _ in range(5):
+            handler.emit(record)
+        self.assertEqual(handler.dropped, 3)
+
+        log_queue.get_nowait()
+        log_queue.get_nowait()
+        handler.emit(record)
+        log_queue.get_nowait()
+        notice = log_queue.get_nowait()
+        self.assertEqual(notice.getMessage(), "Log queue was full: 3 log records dropped.")
+
+
+class TestPortSummaries(unittest.TestCase):
+    """Test suite for the per-port summaries of `data_processor`."""
+
+    def setUp(self):
+        patches = [
+            mock.patch.object(data_processor, "_port_counts", {}),
+            mock.patch.object(data_processor, "save_inclinometer_data"),
+            mock.patch.object(data_processor, "save_pluviometer_data"),
+            mock.patch.object(data_processor, "send_inclinometer_to_zabbix"),
+            mock.patch.object(data_processor, "send_pluviometer_to_zabbix"),
+            mock.patch.object(data_processor, "publish_latest"),
+            mock.patch.object(data_processor, "record_history"),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for metric in (metrics.SERIAL_FRAMES, metrics.SERIAL_BYTES, metrics.SERIAL_DROPPED_BYTES):
+            metric.reset()
+            self.addCleanup(metric.reset)
+
+    def test_frames_are_summarized_per_port(self):
+        """Tests that frames produce no INFO line each, only a summary with counts and rate."""
+        with self.assertLogs(data_processor.logger, level="INFO") as captured:
+            data_processor.logger.info("start")
+            for _ in range(10):
+                metrics.SERIAL_FRAMES.labels("/dev/ttyUSB0").inc()
+                data_processor.process_data(VALID_FRAME, "/dev/ttyUSB0")
+        self.assertEqual(len(captured.records), 1)
+
+        with self.assertLogs(data_processor.logger, level="INFO") as captured:
+            totals = data_processor.log_port_summaries({}, 5.0)
+        ports = [r for r in captured.records if r.getMessage().startswith("Port ")]
+        self.assertEqual(len(ports), 1)
+        message = ports[0].getMessage()
+        self.assertIn("Port /dev/ttyUSB0: 10 frames (10 parsed, 0 invalid)", message)
+        self.assertIn("2.00 frames/s", message)
+        self.assertEqual(ports[0].levelno, logging.INFO)
+
+        with self.assertLogs(data_processor.logger, level="INFO") as captured:
+            metrics.SERIAL_FRAMES.labels("/dev/ttyUSB0").inc()
+            data_processor.process_data(b"~broken~\n", "/dev/ttyUSB0")
+            data_processor.log_port_summaries(totals, 5.0)
+        summary = [r for r in captured.records if r.getMessage().startswith("Port ")][-1]
+        self.assertIn("1 frames (0 parsed, 1 invalid)", summary.getMessage())
+        self.assertEqual(summary.levelno, logging.WARNING)
+
+
+if __name__ == "__main__":
+    unittest.main()
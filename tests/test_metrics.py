@@ -0,0 +1,72 @@
+"""Unit tests for the runtime metrics module.
+
+This test suite verifies the Prometheus text rendering of counters, gauges
+and histograms, the /metrics HTTP endpoint, the conversion into Zabbix items
+for self-reporting, and that the parser updates its counters.
+"""
+
+import unittest
+import urllib.request
+
+from parsers.data_parser import parse_raw_data
+from utils import metrics
+from utils.zabbix_sender import make_item
+from test_data_parser import VALID_FRAME
+
+
+class TestMetrics(unittest.TestCase):
+    """Test suite for `utils.metrics`."""
+
+    def test_prometheus_rendering(self):
+        """Tests the text exposition of each metric type."""
+        registry = metrics.Registry()
+        frames = registry.register(metrics.Counter("frames_total", "Frames.", ("port",)))
+        depth = registry.register(metrics.Gauge("depth", "Depth."))
+        latency = registry.register(metrics.Histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0)))
+        frames.labels('/dev/tty"0').inc(3)
+        depth.set_function(lambda: 7)
+        for value in (0.05, 0.5, 5.0):
+            latency.observe(value)
+
+        text = registry.render()
+        self.assertIn("# TYPE frames_total counter\n", text)
+        self.assertIn('frames_total{port="/dev/tty\\"0"} 3\n', text)
+        self.assertIn("depth 7\n", text)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1\n', text)
+        self.assertIn('latency_seconds_bucket{le="1"} 2\n', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 3\n', text)
+        self.assertIn("latency_seconds_sum 5.55\n", text)
+        self.assertIn("latency_seconds_count 3\n", text)
+
+    def test_parser_counters_and_http_endpoint(self):
+        """Tests that parsing updates counters that the endpoint then serves."""
+        ok = metrics.PARSED_FRAMES.labels("ok")
+        invalid = metrics.PARSED_FRAMES.labels("invalid")
+        before = (ok.value, invalid.value)
+        parse_raw_data(VALID_FRAME)
+        parse_raw_data(b"garbage")
+        self.assertEqual((ok.value, invalid.value), (before[0] + 1, before[1] + 1))
+
+        server = metrics.start_metrics_server("127.0.0.1", 0)
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+            with urllib.request.urlopen(url, timeout=5) as response:
+                body = response.read().decode()
+                self.assertTrue(response.headers["Content-Type"].startswith("text/plain; version=0.0.4"))
+        finally:
+            metrics.stop_metrics_server()
+        self.assertIn('parser_frames_total{result="ok"}', body)
+
+    def test_collect_items_for_self_report(self):
+        """Tests that metrics become Zabbix items keyed by name and labels."""
+        metrics.SERIAL_FRAMES.labels("/dev/ttyUSB9").inc(2)
+        metrics.SENDER_SECONDS.labels("native").observe(0.2)
+        items = {item["key"]: item for item in metrics.collect_items("gw_SELF", make_item, 1700000000)}
+        self.assertEqual(items["serial_frames_total[/dev/ttyUSB9]"]["host"], "gw_SELF")
+        self.assertGreaterEqual(items["serial_frames_total[/dev/ttyUSB9]"]["value"], 2)
+        self.assertIn("zabbix_send_seconds_count[native]", items)
+        self.assertEqual(items["zabbix_send_seconds_count[native]"]["clock"], 1700000000)
+
+
+if __name__ == '__main__':
+    unittest.main()
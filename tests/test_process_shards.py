@@ -0,0 +1,145 @@
+"""Unit tests for the multi-process sharded runtime.
+
+This test suite runs `ShardedReaders` with two worker processes reading
+pseudo-terminals: frames written on the master side must be parsed in the
+workers and reach the record handler of the main process, a killed worker
+must be restarted, and setting the stop event must stop every worker.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+import tty
+import unittest
+from unittest import mock
+
+from config import runtime_config
+from utils.process_shards import ShardedReaders, assign_shards
+from test_data_parser import VALID_FRAME
+
+
+def _wait_for(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class TestAssignShards(unittest.TestCase):
+    """Test suite for `assign_shards`."""
+
+    def test_round_robin(self):
+        """Tests that ports are spread round-robin without empty shards."""
+        ports = ["/dev/ttyUSB0", "/dev/ttyUSB1", "/dev/ttyUSB2", "/dev/ttyUSB3", "/dev/ttyUSB4"]
+        self.assertEqual(
+            assign_shards(ports, 3),
+            [("/dev/ttyUSB0", "/dev/ttyUSB3"), ("/dev/ttyUSB1", "/dev/ttyUSB4"), ("/dev/ttyUSB2",)],
+        )
+        self.assertEqual(assign_shards(ports[:2], 4), [("/dev/ttyUSB0",), ("/dev/ttyUSB1",)])
+        self.assertEqual(assign_shards([], 4), [])
+
+
+class TestShardedReaders(unittest.TestCase):
+    """Test suite for `ShardedReaders` with pty-backed ports."""
+
+    def setUp(self):
+        self.masters = []
+        self.paths = []
+        for _ in range(2):
+            master, slave = os.openpty()
+            tty.setraw(slave)
+            self.addCleanup(os.close, master)
+            self.addCleanup(os.close, slave)
+            self.masters.append(master)
+            self.paths.append(os.ttyname(slave))
+
+        config = {
+            "serial_ports": [
+                {"port": path, "baudrate": 9600, "bytesize": 8, "parity": "N", "stopbits": 1, "timeout": 0.2}
+                for path in self.paths
+            ],
+            "serial_supervisor": {"auto_reenable": False},
+        }
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        config_path = os.path.join(tmp.name, "config.json")
+        with open(config_path, "w") as f:
+            json.dump(config, f)
+        patches = [
+            # The workers load the configuration themselves
+            mock.patch.dict(os.environ, {"SERIAL_TILT_ZBX_CONFIG": config_path}),
+            mock.patch.object(runtime_config, "_current", runtime_config.build_runtime_config(config, config_path)),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.records = []
+        self.records_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.readers = ShardedReaders(
+            self.stop_event,
+            workers=2,
+            on_record=self.on_record,
+            options={"restart_delay": 0.1, "metrics_interval": 0.2},
+        )
+        self.thread = threading.Thread(target=self.readers.run, daemon=True)
+
+    def tearDown(self):
+        self.stop_event.set()
+        self.thread.join(timeout=15)
+
+    def on_record(self, parsed_data, port_name):
+        with self.records_lock:
+            self.records.append((port_name, parsed_data))
+
+    def count(self, port_name):
+        with self.records_lock:
+            return len([data for port, data in self.records if port == port_name and data])
+
+    def running(self):
+        pids = self.readers.pids()
+        return len(pids) == 2 and all(pids.values())
+
+    def test_records_crash_restart_and_stop(self):
+        """Tests frames from every shard, the restart of a killed worker and the shutdown."""
+        self.thread.start()
+        self.assertTrue(_wait_for(self.running))
+        self.assertEqual(self.readers.shards(), [(self.paths[0],), (self.paths[1],)])
+
+        # Workers open their ports after starting: write until frames arrive
+        self.assertTrue(_wait_for(
+            lambda: [os.write(master, VALID_FRAME) for master in self.masters]
+            and all(self.count(path) for path in self.paths)
+        ))
+        with self.records_lock:
+            port_name, parsed = self.records[-1]
+        self.assertEqual(parsed["station_name"], "VC1")
+        self.assertIn("timestamp", parsed)
+
+        pid = self.readers.pids()[0]
+        with self.assertLogs("utils.process_shards", level="ERROR") as captured:
+            os.kill(pid, 9)
+            self.assertTrue(_wait_for(lambda: self.readers.pids()[0] not in (None, pid)))
+        self.assertIn("Restarting", "\n".join(captured.output))
+
+        before = self.count(self.paths[0])
+        self.assertTrue(_wait_for(
+            lambda: os.write(self.masters[0], VALID_FRAME) and self.count(self.paths[0]) > before
+        ))
+
+        pids = list(self.readers.pids().values())
+        self.stop_event.set()
+        self.thread.join(timeout=15)
+        self.assertFalse(self.thread.is_alive())
+        for pid in pids:
+            with self.assertRaises(OSError):
+                os.kill(pid, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
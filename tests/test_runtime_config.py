@@ -0,0 +1,156 @@
+"""Unit tests for the immutable runtime configuration and its hot reload.
+
+This test suite checks that `build_runtime_config` validates config.json and
+returns read-only objects with the retry policies resolved, that a reload
+reports only what changed and notifies the listeners, that an invalid file is
+rejected while the running configuration is kept, that concurrent reloads
+are applied one after the other, and that reloaded station names are used by
+the parser.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from config import runtime_config
+from parsers.data_parser import parse_raw_data
+from test_data_parser import VALID_FRAME
+
+PORT = {"port": "/dev/ttyUSB0", "baudrate": 9600, "bytesize": 8, "parity": "N", "stopbits": 1, "timeout": 1}
+CONFIG = {
+    "serial_ports": [PORT],
+    "serial_retry": {"max_attempts": 3, "delay_seconds": 2, "on_fail": "disable"},
+    "zabbix_keys": {"inclinometer": {"radial": "tilt.radial"}},
+}
+
+
+class TestRuntimeConfig(unittest.TestCase):
+    """Test suite for `config.runtime_config`."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, "config.json")
+        self.write_config(CONFIG)
+        patches = [
+            mock.patch.object(runtime_config, "_current", runtime_config.load_runtime_config(self.path)),
+            mock.patch.object(runtime_config, "_listeners", []),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def write_config(self, config):
+        with open(self.path, "w") as f:
+            json.dump(config, f)
+
+    def test_config_is_validated_and_frozen(self):
+        """Tests that policies are precomputed and nothing can be modified."""
+        config = runtime_config.get_runtime_config()
+        self.assertEqual(config.path, self.path)
+        self.assertEqual(dict(config.retry_policies["/dev/ttyUSB0"]),
+                         {"max_retries": 3, "retry_delay": 2, "on_fail": "disable"})
+        self.assertEqual(config.station_names[3], "RETU")
+        with self.assertRaises(TypeError):
+            config.serial_ports[0]["baudrate"] = 115200
+        with self.assertRaises(TypeError):
+            config.zabbix_keys["inclinometer"]["radial"] = "other"
+
+    def test_invalid_values_are_all_reported(self):
+        """Tests that every invalid value is listed in one ConfigError."""
+        bad = dict(CONFIG, serial_ports=[dict(PORT, baudrate="fast", parity="X"), PORT, PORT],
+                   station_names={"twelve": "X"})
+        with self.assertRaises(runtime_config.ConfigError) as ctx:
+            runtime_config.build_runtime_config(bad)
+        message = str(ctx.exception)
+        self.assertIn("baudrate must be a positive integer", message)
+        self.assertIn("parity must be one of", message)
+        self.assertIn("duplicate port /dev/ttyUSB0", message)
+        self.assertIn("'twelve' is not a station number", message)
+
+    def test_reload_reports_changes_to_listeners(self):
+        """Tests that a reload swaps the config and passes only the differences."""
+        calls = []
+        runtime_config.add_reload_listener(lambda old, new, diff: calls.append(diff))
+        self.write_config(dict(
+            CONFIG,
+            serial_ports=[dict(PORT, baudrate=19200), dict(PORT, port="/dev/ttyUSB1")],
+            station_names={"12": "NEWSTN"},
+        ))
+        with self.assertLogs(runtime_config.logger, level="INFO"):
+            diff = runtime_config.reload_runtime_config()
+        self.assertEqual([p["port"] for p in diff.ports_added], ["/dev/ttyUSB1"])
+        self.assertEqual([p["baudrate"] for p in diff.ports_changed], [19200])
+        self.assertEqual(diff.ports_removed, ())
+        self.assertFalse(diff.zabbix_keys_changed)
+        self.assertTrue(diff.station_names_changed)
+        self.assertEqual(calls, [diff])
+        self.assertEqual(runtime_config.get_runtime_config().station_names[12], "NEWSTN")
+
+        self.write_config(dict(CONFIG, serial_ports=[dict(PORT, baudrate=19200), dict(PORT, port="/dev/ttyUSB1")],
+                               station_names={"12": "NEWSTN"}))
+        with self.assertLogs(runtime_config.logger, level="INFO"):
+            self.assertFalse(runtime_config.reload_runtime_config())
+        self.assertEqual(len(calls), 1)
+
+    def test_invalid_reload_keeps_running_config(self):
+        """Tests that a broken or invalid file is rejected without notifying anyone."""
+        listener = mock.Mock()
+        runtime_config.add_reload_listener(listener)
+        running = runtime_config.get_runtime_config()
+        with open(self.path, "w") as f:
+            f.write("{not json")
+        with self.assertLogs(runtime_config.logger, level="ERROR"):
+            self.assertIsNone(runtime_config.reload_runtime_config())
+        self.write_config(dict(CONFIG, zabbix_keys={"barometer": {}}))
+        with self.assertLogs(runtime_config.logger, level="ERROR"):
+            self.assertIsNone(runtime_config.reload_runtime_config())
+        self.assertIs(runtime_config.get_runtime_config(), running)
+        listener.assert_not_called()
+
+    def test_concurrent_reloads_are_serialized(self):
+        """Tests that a second reload waits for the listeners of the first and diffs against its result."""
+        calls = []
+        entered, release = threading.Event(), threading.Event()
+
+        def listener(old, new, diff):
+            calls.append((old, new, diff))
+            if len(calls) == 1:
+                entered.set()
+                release.wait(5)
+
+        runtime_config.add_reload_listener(listener)
+        usb1, usb2 = dict(PORT, port="/dev/ttyUSB1"), dict(PORT, port="/dev/ttyUSB2")
+        self.write_config(dict(CONFIG, serial_ports=[PORT, usb1]))
+        with self.assertLogs(runtime_config.logger, level="INFO"):
+            first = threading.Thread(target=runtime_config.reload_runtime_config)
+            first.start()
+            self.assertTrue(entered.wait(5))
+            self.write_config(dict(CONFIG, serial_ports=[PORT, usb1, usb2]))
+            second = threading.Thread(target=runtime_config.reload_runtime_config)
+            second.start()
+            second.join(0.3)
+            self.assertTrue(second.is_alive())
+            self.assertEqual(len(calls), 1)
+            release.set()
+            first.join(5)
+            second.join(5)
+        self.assertEqual(len(calls), 2)
+        self.assertIs(calls[1][0], calls[0][1])
+        self.assertEqual([p["port"] for p in calls[1][2].ports_added], ["/dev/ttyUSB2"])
+        self.assertIs(runtime_config.get_runtime_config(), calls[1][1])
+
+    def test_parser_uses_reloaded_station_names(self):
+        """Tests that the parser resolves station names from the current config."""
+        self.assertEqual(parse_raw_data(VALID_FRAME)["station_name"], "VC1")
+        self.write_config(dict(CONFIG, station_names={"1": "VC1B"}))
+        with self.assertLogs(runtime_config.logger, level="INFO"):
+            runtime_config.reload_runtime_config()
+        self.assertEqual(parse_raw_data(VALID_FRAME)["station_name"], "VC1B")
+
+
+if __name__ == "__main__":
+    unittest.main()
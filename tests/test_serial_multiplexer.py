@@ -0,0 +1,148 @@
+"""Unit tests for the single event-loop serial multiplexer.
+
+This test suite drives `SerialMultiplexer` with pseudo-terminal pairs: the
+test writes frames on the master side and the multiplexer reads the slave
+devices, exactly like it would read USB serial adapters. It also checks that
+a slow frame handler does not stop the reading of the ports.
+"""
+
+import os
+import threading
+import time
+import tty
+import unittest
+
+from utils import serial_reader
+from utils.metrics import SERIAL_FRAMES
+from utils.serial_multiplexer import SerialMultiplexer
+from test_data_parser import VALID_FRAME
+
+
+def _port_config(path, **overrides):
+    config = {
+        "port": path,
+        "baudrate": 9600,
+        "bytesize": 8,
+        "parity": "N",
+        "stopbits": 1,
+        "timeout": 1,
+    }
+    config.update(overrides)
+    return config
+
+
+class TestSerialMultiplexer(unittest.TestCase):
+    """Test suite for `SerialMultiplexer`."""
+
+    def setUp(self):
+        self.frames = []
+        self.frames_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.ptys = []
+
+    def tearDown(self):
+        self.stop_event.set()
+        if hasattr(self, "thread"):
+            self.thread.join(timeout=5)
+        for master, slave in self.ptys:
+            os.close(master)
+            os.close(slave)
+
+    def _on_frame(self, raw_bytes, port_name, received_at=None, received_mono=None):
+        with self.frames_lock:
+            self.frames.append((port_name, raw_bytes))
+
+    def _open_pty(self):
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        self.ptys.append((master, slave))
+        return master, os.ttyname(slave)
+
+    def _start(self):
+        self.mux = SerialMultiplexer(self.stop_event, on_frame=self._on_frame)
+        self.thread = threading.Thread(target=self.mux.run, daemon=True)
+        self.thread.start()
+
+    def _wait_for(self, predicate, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if predicate():
+                return True
+            time.sleep(0.02)
+        return False
+
+    def test_reads_frames_from_several_ports(self):
+        """Tests that frames written on several ptys reach the handler, per port."""
+        ports = [self._open_pty() for _ in range(3)]
+        self._start()
+        for _, path in ports:
+            self.mux.add_port(_port_config(path))
+        self.assertTrue(self._wait_for(lambda: len(self.mux.port_names()) == 3))
+        time.sleep(0.1)  # let the loop open the devices
+
+        for index, (master, _) in enumerate(ports):
+            # Split frames across writes and prepend garbage on one port
+            payload = (b"noise" if index == 0 else b"") + VALID_FRAME * 2
+            os.write(master, payload[:30])
+            time.sleep(0.02)
+            os.write(master, payload[30:])
+
+        self.assertTrue(self._wait_for(lambda: len(self.frames) == 6))
+        for _, path in ports:
+            received = [raw for port, raw in self.frames if port == path]
+            self.assertEqual(received, [VALID_FRAME] * 2)
+
+    def test_slow_handler_does_not_block_reading(self):
+        """Tests that ports keep being read while the frame handler is stuck."""
+        release = threading.Event()
+        self.addCleanup(release.set)
+        handled = []
+
+        def slow_handler(raw_bytes, port_name, received_at=None, received_mono=None):
+            release.wait(10)  # e.g. a Zabbix send in its retry backoff
+            handled.append(port_name)
+
+        ports = [self._open_pty() for _ in range(2)]
+        self.mux = SerialMultiplexer(self.stop_event, on_frame=slow_handler)
+        self.thread = threading.Thread(target=self.mux.run, daemon=True)
+        self.thread.start()
+        for _, path in ports:
+            self.mux.add_port(_port_config(path))
+        self.assertTrue(self._wait_for(lambda: len(self.mux.port_names()) == 2))
+        time.sleep(0.1)  # let the loop open the devices
+
+        before = [SERIAL_FRAMES.labels(path).value for _, path in ports]
+        for master, _ in ports:
+            os.write(master, VALID_FRAME * 3)
+        self.assertTrue(self._wait_for(
+            lambda: all(SERIAL_FRAMES.labels(path).value - count == 3 for (_, path), count in zip(ports, before))
+        ))
+        self.assertEqual(handled, [])
+
+        release.set()
+        self.assertTrue(self._wait_for(lambda: len(handled) == 6))
+
+    def test_missing_port_is_disabled_after_max_retries(self):
+        """Tests that a port that cannot be opened follows on_fail=disable."""
+        path = "/dev/does-not-exist-serial-tilt"
+        self.addCleanup(serial_reader.DISABLED_PORTS.pop, path, None)
+        self._start()
+        self.mux.add_port(_port_config(path, max_retries=1, on_fail="disable"))
+
+        self.assertTrue(self._wait_for(lambda: path in serial_reader.DISABLED_PORTS))
+        self.assertTrue(self._wait_for(lambda: path not in self.mux.port_names()))
+        self.assertFalse(self.stop_event.is_set())
+
+    def test_stop_event_ends_the_loop(self):
+        """Tests that setting the stop event stops the loop and closes the ports."""
+        _, path = self._open_pty()
+        self._start()
+        self.mux.add_port(_port_config(path))
+        self.assertTrue(self._wait_for(lambda: path in self.mux.port_names()))
+        self.stop_event.set()
+        self.thread.join(timeout=5)
+        self.assertFalse(self.thread.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
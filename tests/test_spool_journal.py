@@ -0,0 +1,86 @@
+"""Unit tests for the segmented spool journal.
+
+This test suite verifies record round-trips, segment rotation and cleanup,
+persisted read offsets, torn-tail recovery and legacy `.spool` migration.
+"""
+
+import os
+import tempfile
+import unittest
+
+from utils.spool_journal import SpoolJournal
+
+
+class TestSpoolJournal(unittest.TestCase):
+    """Test suite for `SpoolJournal`."""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.dir = self._tmp.name
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _segments(self):
+        return sorted(n for n in os.listdir(self.dir) if n.endswith(".jrn"))
+
+    def test_append_and_stream(self):
+        """Tests that records are streamed back in order from the offset."""
+        journal = SpoolJournal(self.dir, fsync="never")
+        for i in range(5):
+            journal.append(f"HOST key {i}".encode())
+        records = [payload for payload, _ in journal.iter_records()]
+        self.assertEqual(records, [f"HOST key {i}".encode() for i in range(5)])
+        self.assertFalse(journal.is_empty())
+        journal.close()
+
+    def test_commit_persists_offset_and_removes_segments(self):
+        """Tests that committed records are not replayed and old segments are deleted."""
+        journal = SpoolJournal(self.dir, segment_size=1024, fsync="always")
+        for i in range(100):
+            journal.append(b"x" * 50 + str(i).encode())
+        self.assertGreater(len(self._segments()), 2)
+        consumed = list(journal.iter_records())
+        journal.commit(consumed[59][1])
+        journal.close()
+
+        reopened = SpoolJournal(self.dir, segment_size=1024, fsync="always")
+        remaining = [payload for payload, _ in reopened.iter_records()]
+        self.assertEqual(remaining[0], b"x" * 50 + b"60")
+        self.assertEqual(len(remaining), 40)
+        self.assertLess(len(self._segments()), 5)
+        reopened.commit(list(reopened.iter_records())[-1][1])
+        self.assertTrue(reopened.is_empty())
+        reopened.close()
+
+    def test_torn_tail_is_truncated(self):
+        """Tests that a partially written last record is dropped on recovery."""
+        journal = SpoolJournal(self.dir, fsync="always")
+        journal.append(b"first")
+        journal.append(b"second")
+        journal.close()
+        path = os.path.join(self.dir, self._segments()[-1])
+        with open(path, "ab") as f:
+            f.write(b"\x40\x00\x00\x00\x00\x00")  # header of a record that never finished
+
+        recovered = SpoolJournal(self.dir, fsync="always")
+        recovered.append(b"third")
+        records = [payload for payload, _ in recovered.iter_records()]
+        self.assertEqual(records, [b"first", b"second", b"third"])
+        recovered.close()
+
+    def test_migrates_legacy_spool_files(self):
+        """Tests that legacy one-file-per-batch spool files are imported and removed."""
+        legacy = os.path.join(self.dir, "zbx_abc.spool")
+        with open(legacy, "w") as f:
+            f.write("RETU_IN tilt.radial 1.0\n")
+        journal = SpoolJournal(self.dir, fsync="never")
+        self.assertEqual(journal.migrate_files([legacy]), 1)
+        self.assertFalse(os.path.exists(legacy))
+        records = [payload for payload, _ in journal.iter_records()]
+        self.assertEqual(records, [b"RETU_IN tilt.radial 1.0\n"])
+        journal.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
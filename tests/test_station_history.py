@@ -0,0 +1,126 @@
+"""Unit tests for the in-memory station history and its HTTP API.
+
+This test suite checks that the per-station ring buffers overwrite their
+oldest records within the configured memory budget, that range queries
+return the records of a time window in order, and that the /stations
+endpoints answer with the expected JSON.
+"""
+
+import json
+import unittest
+import urllib.error
+import urllib.request
+from unittest import mock
+
+from utils import station_history
+from utils.station_history import RECORD_BYTES, StationHistory, StationRing
+
+
+def _record(name, timestamp, value, number=3):
+    return {
+        "station_name": name,
+        "station_number": number,
+        "timestamp": timestamp,
+        "inclinometer": {"radial": value, "tangential": -value, "temperature": 20.0, "voltage": 12.5},
+        "pluviometer": {"rain_level": value / 10, "voltage": 12.4},
+    }
+
+
+class TestStationRing(unittest.TestCase):
+    """Test suite for `StationRing` and `StationHistory`."""
+
+    def test_ring_overwrites_oldest(self):
+        """Tests that a full ring keeps the newest records in order."""
+        ring = StationRing(4)
+        for index in range(10):
+            ring.append(1000.0 + index, [float(index)] * 6)
+        self.assertEqual(len(ring), 4)
+        self.assertEqual(ring.span(), (1006.0, 1009.0))
+        self.assertEqual(ring.latest()["inclinometer"]["radial"], 9.0)
+        records, truncated = ring.range(0, 2000, 10)
+        self.assertEqual([r["timestamp"] for r in records], [1006.0, 1007.0, 1008.0, 1009.0])
+        self.assertFalse(truncated)
+
+    def test_range_bounds_and_limit(self):
+        """Tests that ranges include `from`, exclude `to` and keep the newest on truncation."""
+        ring = StationRing(100)
+        for index in range(50):
+            ring.append(1000.0 + index, [float(index)] * 6)
+        records, truncated = ring.range(1010, 1020, 100)
+        self.assertEqual([r["timestamp"] for r in records], [1010.0 + i for i in range(10)])
+        self.assertFalse(truncated)
+        records, truncated = ring.range(1010, 1020, 3)
+        self.assertEqual([r["timestamp"] for r in records], [1017.0, 1018.0, 1019.0])
+        self.assertTrue(truncated)
+        self.assertEqual(ring.range(2000, 3000, 10), ([], False))
+
+    def test_memory_budget(self):
+        """Tests that the budget sets the ring capacity and the number of stations."""
+        history = StationHistory(max_memory_bytes=2 * 10 * RECORD_BYTES, max_stations=2)
+        self.assertEqual(history.capacity, 10)
+        for index in range(25):
+            history.record(_record("RETU", 1000.0 + index, index))
+            history.record(_record("CAYR", 1000.0 + index, index, number=6))
+        with self.assertLogs("utils.station_history", level="WARNING"):
+            history.record(_record("GGPA", 1000.0, 1.0, number=11))
+        self.assertIsNone(history.find("GGPA"))
+        self.assertEqual([s["records"] for s in history.stations()], [10, 10])
+        self.assertLessEqual(history.memory_bytes(), 2 * 10 * RECORD_BYTES)
+        self.assertIs(history.find("retu"), history.find("RETU"))
+
+
+class TestHistoryServer(unittest.TestCase):
+    """Test suite for the station history HTTP API."""
+
+    def setUp(self):
+        self.history = StationHistory(max_memory_bytes=1024 * 1024, max_stations=4)
+        for index in range(120):
+            self.history.record(_record("RETU", 1700000000.0 + 60 * index, float(index)))
+        patches = [
+            mock.patch.object(station_history, "_history", self.history),
+            mock.patch.object(station_history, "_history_checked", True),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        server = station_history.start_history_server("127.0.0.1", 0)
+        self.assertIsNotNone(server)
+        self.addCleanup(station_history.stop_history_server)
+        self.base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def get(self, path):
+        with urllib.request.urlopen(self.base + path, timeout=5) as response:
+            self.assertEqual(response.headers["Content-Type"], "application/json")
+            return json.loads(response.read())
+
+    def test_stations_latest_and_range(self):
+        """Tests the three endpoints."""
+        stations = self.get("/stations")["stations"]
+        self.assertEqual([(s["station_name"], s["station_number"], s["records"]) for s in stations], [("RETU", 3, 120)])
+
+        latest = self.get("/stations/RETU/latest")
+        self.assertEqual(latest["timestamp"], 1700000000.0 + 60 * 119)
+        self.assertEqual(latest["inclinometer"]["radial"], 119.0)
+        self.assertEqual(latest["station_name"], "RETU")
+
+        # One hour: records 10 to 69
+        result = self.get(f"/stations/retu/range?from={1700000000 + 600}&to={1700000000 + 600 + 3600}")
+        self.assertEqual(result["count"], 60)
+        self.assertEqual(result["records"][0]["pluviometer"]["rain_level"], 1.0)
+        self.assertFalse(result["truncated"])
+
+        # Defaults: the hour before `to`
+        result = self.get(f"/stations/RETU/range?to={1700000000 + 60 * 120}")
+        self.assertEqual(result["count"], 60)
+
+    def test_errors(self):
+        """Tests 404 for unknown stations and paths, 400 for invalid times."""
+        for path, status in (("/stations/NOPE/latest", 404), ("/other", 404), ("/stations/RETU/range?from=yesterday", 400)):
+            with self.assertRaises(urllib.error.HTTPError) as raised:
+                self.get(path)
+            self.assertEqual(raised.exception.code, status)
+            raised.exception.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+"""Unit tests for the cached open-file-handle TSV writer.
+
+This test suite verifies that `TsvWriter` writes headers only when a file is
+created, rolls a stream over to its next file, bounds the number of open
+files, and flushes according to its flush mode.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from utils import data_storage
+from utils.tsv_writer import TsvWriter
+
+HEADER = ["TIPO:TEST\n", "\n"]
+
+
+class TestTsvWriter(unittest.TestCase):
+    """Test suite for `TsvWriter`."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, True)
+
+    def _path(self, *parts):
+        return os.path.join(self.tmpdir, *parts)
+
+    def _read(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def test_header_only_on_creation(self):
+        """Tests that reopening an existing file does not repeat the header."""
+        path = self._path("STA", "2025-1-1.tsv")
+        writer = TsvWriter(flush_mode="always")
+        writer.write("STA", path, "a\n", HEADER)
+        writer.close()
+        writer.write("STA", path, "b\n", HEADER)
+        writer.close()
+        self.assertEqual(self._read(path), "TIPO:TEST\n\na\nb\n")
+
+    def test_rollover_closes_previous_file(self):
+        """Tests that a new path on the same stream closes the previous day's file."""
+        day1, day2 = self._path("2025-1-1.tsv"), self._path("2025-1-2.tsv")
+        writer = TsvWriter(flush_mode="shutdown")
+        writer.write("STA", day1, "a\n", HEADER)
+        writer.write("STA", day2, "b\n", HEADER)
+        self.assertEqual(writer.open_files(), [day2])
+        self.assertEqual(self._read(day1), "TIPO:TEST\n\na\n")
+        writer.close()
+        self.assertEqual(self._read(day2), "TIPO:TEST\n\nb\n")
+
+    def test_lru_eviction(self):
+        """Tests that the least recently used file is closed beyond max_open_files."""
+        writer = TsvWriter(max_open_files=2, flush_mode="shutdown")
+        for name in ("A", "B", "A", "C"):
+            writer.write(name, self._path(name + ".tsv"), "x\n")
+        self.assertEqual(writer.open_files(), [self._path("A.tsv"), self._path("C.tsv")])
+        self.assertEqual(self._read(self._path("B.tsv")), "x\n")
+        writer.close()
+
+    def test_records_flush_mode(self):
+        """Tests that "records" mode flushes every flush_records records."""
+        path = self._path("A.tsv")
+        writer = TsvWriter(flush_mode="records", flush_records=3)
+        for _ in range(2):
+            writer.write("A", path, "x\n")
+        self.assertEqual(self._read(path), "")
+        writer.write("A", path, "x\n")
+        self.assertEqual(self._read(path), "x\n" * 3)
+        writer.close()
+
+    def test_save_functions_keep_tsv_format(self):
+        """Tests the TSV layout written by `save_inclinometer_data`/`save_pluviometer_data`."""
+        timestamp = datetime(2025, 9, 22, 16, 47, 27).timestamp()
+        data = {
+            "station_name": "GGPA",
+            "station_number": 11,
+            "timestamp": timestamp,
+            "inclinometer": {"radial": -427.5, "tangential": 296.3, "temperature": 6.1, "voltage": 13.7},
+            "pluviometer": {"rain_level": 0.0, "voltage": 13.7},
+        }
+        with mock.patch.object(data_storage, "BASE_DIR", self.tmpdir), \
+                mock.patch.object(data_storage, "_writer", TsvWriter(flush_mode="always")):
+            data_storage.save_inclinometer_data(data)
+            data_storage.save_pluviometer_data(data)
+            data_storage.save_pluviometer_data(data)
+            data_storage.close_storage()
+
+        incli = self._read(self._path("INCLINOMETRIA", "GGPA", "2025-9-22.tsv")).splitlines()
+        self.assertEqual(incli[:3], ["TIPO:INCLINOMETRIA", "NOMBRE:GGPA", "IDENTIFICADOR:11"])
+        self.assertEqual(incli[-1], "22/09/2025\t16:47:27\t-427.5\t296.3\t6.1\t13.7")
+        pluvio = self._read(self._path("PLUVIOMETRIA", "GGPA", "2025-9-22.tsv")).splitlines()
+        self.assertEqual(len(pluvio), 8)
+        self.assertEqual(pluvio[4], "FECHA\tTIEMPO\tNIVEL\tBATERIA")
+        self.assertEqual(pluvio[-1], "22/09/2025\t16:47:27\t0.0\t13.7")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+"""Unit tests for the windowed Zabbix aggregation stage.
+
+This test suite verifies that `WindowAggregator` computes min, max, mean and
+last per host and key over clock-aligned windows, closes windows on newer
+data or by time, and that the sender routes values through it in "replace"
+and "both" modes.
+"""
+
+import unittest
+from unittest import mock
+
+import utils.zabbix_sender as zabbix_sender
+from utils.zabbix_aggregator import WindowAggregator
+
+T0 = 1700000100.0  # aligned to 60 s and 300 s windows
+
+
+class TestWindowAggregator(unittest.TestCase):
+    """Test suite for `WindowAggregator`."""
+
+    def setUp(self):
+        self.emitted = []
+        self.aggregator = WindowAggregator(self.emitted.extend, zabbix_sender.make_item, window_seconds=60)
+
+    def _values(self):
+        return {item["key"]: item["value"] for item in self.emitted}
+
+    def test_window_closes_on_next_window(self):
+        """Tests the aggregates emitted when a value for a later window arrives."""
+        for offset, value in ((0, 2.0), (20, -1.0), (59, 5.0)):
+            self.aggregator.add("inclinometer", "RETU_IN", [("tilt.radial", value)], T0 + offset)
+        self.assertEqual(self.emitted, [])
+        self.aggregator.add("inclinometer", "RETU_IN", [("tilt.radial", 9.0)], T0 + 60)
+        self.assertEqual(self._values(), {
+            "tilt.radial.min": -1.0, "tilt.radial.max": 5.0, "tilt.radial.avg": 2.0, "tilt.radial.last": 5.0,
+        })
+        self.assertEqual({item["clock"] for item in self.emitted}, {int(T0 + 59)})
+
+    def test_expired_windows_and_custom_stats(self):
+        """Tests closing by time, per-group windows, stat selection and suffixes."""
+        aggregator = WindowAggregator(
+            self.emitted.extend, zabbix_sender.make_item, window_seconds=60, windows={"pluviometer": 300},
+            stats=["max", "last"], key_suffixes={"last": ""}, grace=2,
+        )
+        aggregator.add("inclinometer", "RETU_IN", [("tilt.temp", 20.0), ("tilt.vbat", "n/a")], T0)
+        aggregator.add("pluviometer", "RETU_PL", [("rain.level", 1.5)], T0)
+        aggregator.flush_expired(now=T0 + 61)
+        self.assertEqual(self.emitted, [])
+        aggregator.flush_expired(now=T0 + 62)
+        self.assertEqual(self._values(), {"tilt.temp.max": 20.0, "tilt.temp": 20.0})
+        aggregator.flush_all()
+        self.assertEqual(self._values()["rain.level"], 1.5)
+
+    def test_sender_modes(self):
+        """Tests that "replace" holds raw values back and "both" forwards them too."""
+        data = {
+            "station_name": "RETU",
+            "timestamp": T0,
+            "pluviometer": {"rain_level": 1.5, "voltage": 12.5},
+        }
+        submitted = []
+        with mock.patch.object(zabbix_sender, "_submit_items", submitted.extend), \
+                mock.patch.object(zabbix_sender, "_aggregator", self.aggregator), \
+                mock.patch.object(zabbix_sender, "_aggregation_mode", "replace"):
+            zabbix_sender.send_pluviometer_to_zabbix(data)
+            self.assertEqual(submitted, [])
+            zabbix_sender._aggregation_mode = "both"
+            zabbix_sender.send_pluviometer_to_zabbix(data)
+            self.assertEqual([item["key"] for item in submitted], ["rain.level", "rain.vbat"])
+        self.aggregator.flush_all()
+        self.assertEqual(self._values()["rain.level.avg"], 1.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
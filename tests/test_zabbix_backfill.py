@@ -0,0 +1,177 @@
+"""Unit tests for the historical backfill of the TSV archive into Zabbix.
+
+This test suite builds a small archive with `utils.data_storage`, replays it
+into a `FakeTrapperServer` with `utils.zabbix_backfill`, and checks the
+items' hosts, keys and timestamps, the time-range filter, that the
+checkpoint makes a second run send only what was appended since, and that
+the `zabbix_endpoints` failover and fan-out modes are honoured.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from config import runtime_config
+from tests.fake_trapper import FakeTrapperServer
+from utils import data_storage, zabbix_backfill
+
+START = datetime(2025, 9, 15, 23, 0, 0)
+KEYS = {
+    "inclinometer": {"radial": "tilt.radial", "tangential": "tilt.tangential",
+                     "temperature": "tilt.temp", "voltage": "tilt.vbat"},
+    "pluviometer": {"rain_level": "rain.level", "voltage": "rain.vbat"},
+}
+
+
+class TestZabbixBackfill(unittest.TestCase):
+    """Test suite for `zabbix_backfill`."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, True)
+        self.base_dir = os.path.join(self.tmpdir, "DTA")
+        self.checkpoint = os.path.join(self.tmpdir, "checkpoint.json")
+        patches = [
+            mock.patch.object(data_storage, "BASE_DIR", self.base_dir),
+            mock.patch.object(data_storage, "_writer", None),
+            mock.patch.object(runtime_config, "_current", runtime_config.build_runtime_config({"zabbix_keys": KEYS})),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.trapper = FakeTrapperServer()
+        self.trapper.start()
+        self.addCleanup(self.trapper.stop)
+
+    def _archive(self, first_minute, minutes):
+        """One inclinometer and one pluviometer row per minute from START."""
+        for minute in range(first_minute, first_minute + minutes):
+            moment = (START + timedelta(minutes=minute)).timestamp()
+            base = {"station_name": "CHONTAL", "station_number": 4, "timestamp": moment}
+            data_storage.save_inclinometer_data(dict(base, inclinometer={
+                "radial": float(minute), "tangential": -1.5, "temperature": 20.0, "voltage": 13.1,
+            }))
+            data_storage.save_pluviometer_data(dict(base, pluviometer={"rain_level": 0.2, "voltage": 12.5}))
+        data_storage.close_storage()
+
+    def _backfill(self, **kwargs):
+        params = dict(
+            base_dir=self.base_dir, server="127.0.0.1", port=self.trapper.port,
+            checkpoint_file=self.checkpoint, workers=2, batch_items=7,
+        )
+        params.update(kwargs)
+        return zabbix_backfill.run_backfill(**params)
+
+    def _items(self, key):
+        with self.trapper.lock:
+            return [item for item in self.trapper.items if item["key"] == key]
+
+    def test_sends_all_rows_with_timestamps(self):
+        """Tests that every archived value is sent to its host and key with the row's time."""
+        self._archive(0, 120)  # 23:00 -> 01:00, two daily files per sensor
+        summary = self._backfill()
+
+        self.assertTrue(summary["complete"])
+        self.assertEqual(summary["files"], 4)
+        self.assertEqual(summary["rows"], 240)
+        self.assertEqual(summary["items"], 120 * 4 + 120 * 2)
+        radial = sorted(self._items("tilt.radial"), key=lambda item: item["clock"])
+        self.assertEqual([float(item["value"]) for item in radial], [float(m) for m in range(120)])
+        self.assertEqual(radial[0]["host"], "CHONTAL_IN")
+        self.assertEqual(radial[0]["clock"], int(START.timestamp()))
+        self.assertEqual(self._items("rain.level")[0]["host"], "CHONTAL_PL")
+
+    def test_time_range_and_sensor_filter(self):
+        """Tests that only rows of the requested sensor and range are sent."""
+        self._archive(0, 120)
+        summary = self._backfill(
+            start=START + timedelta(minutes=50), end=START + timedelta(minutes=70), sensors=["inclinometer"],
+        )
+        self.assertEqual(summary["rows"], 20)
+        self.assertEqual(len(self._items("tilt.radial")), 20)
+        self.assertEqual(self._items("rain.level"), [])
+
+    def test_checkpoint_resumes_after_appended_rows(self):
+        """Tests that a second run only sends the rows appended after the first."""
+        self._archive(0, 30)
+        self._backfill()
+        with open(self.checkpoint) as f:
+            self.assertEqual(len(json.load(f)["files"]), 2)
+
+        data_storage._writer = None
+        self._archive(30, 10)
+        summary = self._backfill()
+        self.assertEqual(summary["rows"], 20)
+        radial = [float(item["value"]) for item in self._items("tilt.radial")]
+        self.assertEqual(sorted(radial), [float(m) for m in range(40)])
+
+    def test_checkpoint_of_another_scope_is_refused(self):
+        """Tests that a checkpoint written for another range is not silently reused."""
+        self._archive(0, 5)
+        self._backfill()
+        with self.assertRaises(ValueError):
+            self._backfill(start=START)
+        self.assertTrue(self._backfill(start=START, restart=True)["complete"])
+
+    def test_unreachable_server_stops_without_advancing(self):
+        """Tests that failed sends leave the checkpoint where the server stopped acknowledging."""
+        self._archive(0, 5)
+        self.trapper.stop()
+        with mock.patch.object(zabbix_backfill, "get_backfill_options", return_value=dict(
+            zabbix_backfill.get_backfill_options(), retries=0,
+        )):
+            summary = self._backfill()
+        self.assertFalse(summary["complete"])
+        self.assertEqual(summary["items"], 0)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def _use_endpoints(self, mode, backup):
+        config = runtime_config.build_runtime_config({"zabbix_keys": KEYS, "zabbix_endpoints": {"mode": mode, "servers": [
+            {"name": "primary", "server": "127.0.0.1", "port": self.trapper.port},
+            {"name": "backup", "server": "127.0.0.1", "port": backup.port},
+        ]}})
+        patcher = mock.patch.object(runtime_config, "_current", config)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_failover_to_backup_endpoint(self):
+        """Tests that without --server the batches fail over to another configured endpoint."""
+        backup = FakeTrapperServer()
+        backup.start()
+        self.addCleanup(backup.stop)
+        self._use_endpoints("failover", backup)
+        self._archive(0, 10)
+        self.trapper.response = "failed"
+        with self.assertLogs(zabbix_backfill.logger, level="WARNING"):
+            summary = self._backfill(server=None, port=None)
+        self.assertTrue(summary["complete"])
+        self.assertEqual(len(backup.items), 10 * 4 + 10 * 2)
+        with open(self.checkpoint) as f:
+            self.assertEqual(json.load(f)["scope"]["server"], f"127.0.0.1:{self.trapper.port},127.0.0.1:{backup.port}")
+
+    def test_fanout_sends_to_every_endpoint(self):
+        """Tests that in fan-out mode every endpoint gets every item and a dead one stops the import."""
+        backup = FakeTrapperServer()
+        backup.start()
+        self.addCleanup(backup.stop)
+        self._use_endpoints("fanout", backup)
+        self._archive(0, 10)
+        summary = self._backfill(server=None, port=None)
+        self.assertTrue(summary["complete"])
+        self.assertEqual(len(self.trapper.items), 60)
+        self.assertEqual(len(backup.items), 60)
+
+        backup.stop()
+        with mock.patch.object(zabbix_backfill, "get_backfill_options", return_value=dict(
+            zabbix_backfill.get_backfill_options(), retries=0,
+        )):
+            summary = self._backfill(server=None, port=None, restart=True)
+        self.assertFalse(summary["complete"])
+
+
+if __name__ == "__main__":
+    unittest.main()
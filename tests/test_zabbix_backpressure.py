@@ -0,0 +1,103 @@
+"""Unit tests for the spool limits and load-shedding policies.
+
+This test suite fills a small spool journal and checks that `SpoolLimiter`
+brings it back under its size limit by thinning or filtering the oldest
+segments first, drops data that was already shed or is too old, and counts
+every discarded item by reason.
+"""
+
+import os
+import tempfile
+import time
+import unittest
+
+from utils import metrics
+from utils.spool_journal import SpoolJournal
+from utils.zabbix_backpressure import SpoolLimiter
+from utils.zabbix_sender import _decode_spool_entry, _encode_spool_record, make_item
+
+
+def _record(index: int) -> bytes:
+    clock = 1700000000 + index
+    return _encode_spool_record([
+        make_item("RETU_IN", "tilt.radial", index, clock),
+        make_item("RETU_IN", "tilt.temp", 20.5, clock),
+        make_item("RETU_PL", "rain.level", 0.2, clock),
+    ])
+
+
+class TestSpoolLimiter(unittest.TestCase):
+    """Test suite for `SpoolLimiter`."""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.journal = SpoolJournal(self._tmp.name, segment_size=4096, fsync="never")
+        self.addCleanup(self.journal.close)
+        for index in range(200):
+            self.journal.append(_record(index))
+        metrics.SHED_ITEMS.reset()
+        self.addCleanup(metrics.SHED_ITEMS.reset)
+
+    def remaining(self):
+        items = []
+        for payload, _ in self.journal.iter_records():
+            items.extend(_decode_spool_entry(payload)[0])
+        return items
+
+    def enforce(self, limiter, max_bytes=None):
+        return limiter.enforce(self.journal, _decode_spool_entry, _encode_spool_record, max_bytes)
+
+    def test_downsample_thins_oldest_then_drops(self):
+        """Tests that old data is first downsampled, then dropped, until under the limit."""
+        size = self.journal.pending_bytes()
+        limiter = SpoolLimiter(max_bytes=size // 2, policy="downsample", downsample_factor=10)
+        with self.assertLogs("utils.zabbix_backpressure", level="WARNING"):
+            shed = self.enforce(limiter)
+        self.assertGreater(shed["downsample"], 0)
+        self.assertLessEqual(self.journal.pending_bytes(), size // 2 + 4096)
+
+        remaining = self.remaining()
+        radial = sorted(int(item["value"]) for item in remaining if item["key"] == "tilt.radial")
+        # Recent data is complete, old data keeps 1 value out of 10 per series
+        self.assertEqual(radial[-1], 199)
+        self.assertLess(len(radial), 200)
+        self.assertEqual(sum(shed.values()), 600 - len(remaining))
+        self.assertEqual(metrics.SHED_ITEMS.labels("downsample").value, shed["downsample"])
+
+        # Under a much lower limit the data that was already thinned goes as well
+        with self.assertLogs("utils.zabbix_backpressure", level="WARNING"):
+            shed = self.enforce(limiter, max_bytes=1)
+        self.assertIn("drop_oldest", shed)
+        self.assertEqual(self.journal.sealed_segments(), [])
+
+    def test_pluviometer_only_keeps_rain_data(self):
+        """Tests that the oldest segments keep only pluviometer items."""
+        limiter = SpoolLimiter(max_bytes=self.journal.pending_bytes() - 1, policy="pluviometer_only")
+        with self.assertLogs("utils.zabbix_backpressure", level="WARNING"):
+            shed = self.enforce(limiter)
+        self.assertEqual(list(shed), ["pluviometer_only"])
+        self.assertEqual(len([item for item in self.remaining() if item["host"] == "RETU_PL"]), 200)
+
+    def test_old_segments_are_dropped(self):
+        """Tests that sealed segments older than the age limit are dropped."""
+        sealed = self.journal.sealed_segments()
+        old = time.time() - 7200
+        for segment_id, _, _ in sealed[:2]:
+            os.utime(self.journal._segment_path(segment_id), (old, old))
+        limiter = SpoolLimiter(max_age=3600)
+        with self.assertLogs("utils.zabbix_backpressure", level="WARNING"):
+            shed = self.enforce(limiter)
+        self.assertEqual(list(shed), ["age"])
+        self.assertEqual(len(self.journal.sealed_segments()), len(sealed) - 2)
+        self.assertEqual(len(self.remaining()), 600 - shed["age"])
+
+    def test_within_limits_is_untouched(self):
+        """Tests that nothing is shed while the journal is within its limits."""
+        limiter = SpoolLimiter(max_bytes=10 * 1024 * 1024, max_age=3600)
+        self.assertEqual(self.enforce(limiter), {})
+        self.assertEqual(len(self.remaining()), 600)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+"""Unit tests for the background Zabbix batcher.
+
+This test suite verifies that `ZabbixBatcher` merges submissions of Zabbix
+items (as built by `zabbix_sender.make_item`), flushes on size and on delay
+with the items and their timestamps unchanged, refuses work when its queue is
+full, and drains pending items on stop.
+"""
+
+import threading
+import time
+import unittest
+
+from utils.zabbix_batcher import ZabbixBatcher
+from utils.zabbix_sender import make_item
+
+TIMESTAMP = 1700000000.25
+
+
+def _items(host, count, start=0):
+    return [make_item(host, f"tilt.k{index}", float(index), TIMESTAMP + index) for index in range(start, start + count)]
+
+
+class TestZabbixBatcher(unittest.TestCase):
+    """Test suite for `ZabbixBatcher`."""
+
+    def setUp(self):
+        self.batches = []
+        self.flushed = threading.Event()
+
+    def _send(self, items):
+        self.batches.append(list(items))
+        self.flushed.set()
+
+    def test_flush_on_max_items(self):
+        """Tests that submissions from several hosts are merged into one batch of items."""
+        first, second = _items("A_IN", 4), _items("B_PL", 2)
+        batcher = ZabbixBatcher(self._send, max_items=6, max_delay=60)
+        batcher.start()
+        batcher.submit(first)
+        batcher.submit(second)
+        self.assertTrue(self.flushed.wait(2))
+        batcher.stop()
+        self.assertEqual(self.batches, [first + second])
+        item = self.batches[0][1]
+        self.assertEqual(item, {"host": "A_IN", "key": "tilt.k1", "value": 1.0, "clock": 1700000001, "ns": 250000000})
+
+    def test_flush_on_max_delay(self):
+        """Tests that a partial batch is flushed once the delay expires."""
+        items = _items("A_IN", 1)
+        batcher = ZabbixBatcher(self._send, max_items=1000, max_delay=0.1)
+        batcher.start()
+        start = time.monotonic()
+        batcher.submit(items)
+        self.assertTrue(self.flushed.wait(2))
+        self.assertLess(time.monotonic() - start, 1.0)
+        batcher.stop()
+        self.assertEqual(self.batches, [items])
+        self.assertEqual((self.batches[0][0]["clock"], self.batches[0][0]["ns"]), (1700000000, 250000000))
+
+    def test_submit_rejects_when_full(self):
+        """Tests that a full queue refuses items instead of blocking."""
+        batcher = ZabbixBatcher(self._send, queue_size=1)  # not started: nothing drains
+        self.assertTrue(batcher.submit(_items("A_IN", 1)))
+        self.assertFalse(batcher.submit(_items("A_IN", 1, start=1)))
+
+    def test_stop_flushes_pending(self):
+        """Tests that stop() sends whatever is still queued, in order."""
+        batcher = ZabbixBatcher(self._send, max_items=3, max_delay=60)
+        batcher.start()
+        batcher.submit(_items("A_IN", 2))
+        batcher.submit(_items("A_IN", 2, start=2))
+        batcher.submit(_items("A_IN", 1, start=4))
+        batcher.stop()
+        sent = [item for batch in self.batches for item in batch]
+        self.assertEqual(sent, _items("A_IN", 5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+"""Unit tests for the deadband/heartbeat Zabbix item filter.
+
+This test suite verifies that `DeadbandFilter` sends the first value of an
+item, suppresses changes within its absolute or relative threshold, sends
+again on a larger move or when the heartbeat is due, and that rules are
+built from the config fields mapped through `zabbix_keys`.
+"""
+
+import unittest
+
+from utils.zabbix_deadband import DeadbandFilter
+
+KEY_MAPS = {
+    "inclinometer": {"temperature": "tilt.temp", "voltage": "tilt.vbat", "radial": "tilt.radial"},
+}
+CONFIG = {
+    "enabled": True,
+    "heartbeat_seconds": 300,
+    "inclinometer": {
+        "temperature": {"absolute": 0.2},
+        "voltage": {"relative": 0.01, "heartbeat_seconds": 60},
+    },
+}
+
+
+class TestDeadbandFilter(unittest.TestCase):
+    """Test suite for `DeadbandFilter`."""
+
+    def setUp(self):
+        self.deadband = DeadbandFilter.from_config(CONFIG, KEY_MAPS)
+
+    def _sent(self, key, value, timestamp, host="RETU_IN"):
+        return self.deadband.filter("inclinometer", host, [(key, value)], timestamp) != []
+
+    def test_rules_from_config(self):
+        """Tests that field rules are keyed by their Zabbix key."""
+        self.assertEqual(self.deadband.rules, {
+            ("inclinometer", "tilt.temp"): (0.2, None, 300.0),
+            ("inclinometer", "tilt.vbat"): (None, 0.01, 60.0),
+        })
+
+    def test_absolute_threshold_and_heartbeat(self):
+        """Tests absolute deadband suppression, a real move, and the heartbeat."""
+        self.assertTrue(self._sent("tilt.temp", 20.0, 0))
+        self.assertFalse(self._sent("tilt.temp", 20.15, 1))
+        self.assertTrue(self._sent("tilt.temp", 20.3, 2))
+        self.assertFalse(self._sent("tilt.temp", 20.3, 301))
+        self.assertTrue(self._sent("tilt.temp", 20.3, 302))
+        self.assertTrue(self._sent("tilt.temp", 20.3, 302, host="GGPA_IN"))
+
+    def test_relative_threshold_and_unfiltered_keys(self):
+        """Tests relative thresholds and that keys without a rule always pass."""
+        self.assertTrue(self._sent("tilt.vbat", 13.0, 0))
+        self.assertFalse(self._sent("tilt.vbat", 13.1, 1))
+        self.assertTrue(self._sent("tilt.vbat", 13.2, 2))
+        for t in range(3):
+            self.assertTrue(self._sent("tilt.radial", 1.0, t))
+
+    def test_slow_values_volume_reduction(self):
+        """Tests that a slowly drifting signal is cut by an order of magnitude."""
+        total = 3600
+        for t in range(total):
+            self.deadband.filter("inclinometer", "RETU_IN", [("tilt.temp", 20.0 + t * 0.0005)], float(t))
+        self.assertEqual(self.deadband.passed + self.deadband.suppressed, total)
+        self.assertLess(self.deadband.passed * 10, total)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+"""Unit tests for delivery to several Zabbix endpoints.
+
+This test suite checks the rolling health score and ranking of
+`utils.zabbix_endpoints`, and, against local fake trappers, that failover
+moves batches to a working endpoint and that fan-out sends every batch to
+all endpoints while spooling and replaying it only for the one that failed.
+"""
+
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from config import runtime_config
+from fake_trapper import FakeTrapperServer
+from utils import zabbix_sender
+from utils.zabbix_endpoints import Endpoint, EndpointSet
+
+
+class TestEndpointScore(unittest.TestCase):
+    """Test suite for `Endpoint` and `EndpointSet` ranking."""
+
+    def test_failures_move_endpoint_down_until_decayed(self):
+        """Tests that a failing endpoint is ranked last and recovers with time."""
+        primary = Endpoint("primary", "10.0.0.1", 10051, alpha=0.5, error_half_life=10)
+        backup = Endpoint("backup", "10.0.0.2", 10051, alpha=0.5, error_half_life=10)
+        endpoints = EndpointSet([primary, backup], error_penalty=10)
+        self.assertEqual(endpoints.ranked(), [primary, backup])
+
+        primary.record(False, 3.0, 10)
+        backup.record(True, 0.05, 10)
+        self.assertEqual(endpoints.ranked(), [backup, primary])
+        self.assertEqual(primary.stats(10)["failed_items"], 10)
+
+        primary._error_at -= 100  # ten half-lives without sends
+        primary.latency = 0.04
+        self.assertLess(primary.error_level(), 0.001)
+        self.assertEqual(endpoints.ranked()[0], primary)
+
+    def test_active_endpoint_is_kept_within_margin(self):
+        """Tests that failover does not switch for a small score difference."""
+        primary = Endpoint("primary", "10.0.0.1", 10051, initial_latency=0.02)
+        backup = Endpoint("backup", "10.0.0.2", 10051, initial_latency=0.01)
+        endpoints = EndpointSet([primary, backup], switch_margin=0.1)
+        self.assertTrue(endpoints.set_active(primary))
+        self.assertEqual(endpoints.ranked()[0], primary)
+        primary.latency = 0.5
+        self.assertEqual(endpoints.ranked()[0], backup)
+
+
+class TestEndpointDelivery(unittest.TestCase):
+    """Test suite for failover and fan-out in `zabbix_sender`."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.spool_dir = tmp.name
+        self.primary = FakeTrapperServer().start()
+        self.backup = FakeTrapperServer().start()
+        self.addCleanup(self.primary.stop)
+        self.addCleanup(self.backup.stop)
+        patches = [
+            mock.patch.dict(os.environ, {
+                "ZBX_SPOOL_DIR": self.spool_dir,
+                "ZBX_SENDER_TRANSPORT": "native",
+                "ZBX_SENDER_RETRIES": "0",
+                "ZBX_SPOOL_FSYNC": "never",
+            }),
+            mock.patch.object(zabbix_sender, "_sender_options", None),
+            mock.patch.object(zabbix_sender, "_endpoints", None),
+            mock.patch.object(zabbix_sender, "_schedule_drain"),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(zabbix_sender.close_spool)
+
+    def use_endpoints(self, mode):
+        config = runtime_config.build_runtime_config({"zabbix_endpoints": {"mode": mode, "servers": [
+            {"name": "primary", "server": "127.0.0.1", "port": self.primary.port},
+            {"name": "backup", "server": "127.0.0.1", "port": self.backup.port},
+        ]}})
+        patcher = mock.patch.object(runtime_config, "_current", config)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def items(self, count=3):
+        now = time.time()
+        return [zabbix_sender.make_item("RETU_IN", "tilt.radial", i, now) for i in range(count)]
+
+    def test_failover_moves_to_working_endpoint(self):
+        """Tests that batches go to the backup while the primary refuses them."""
+        self.use_endpoints("failover")
+        self.assertTrue(zabbix_sender._send_items_batch(self.items()))
+        self.assertEqual(len(self.primary.items), 3)
+
+        self.primary.response = "failed"
+        with self.assertLogs(zabbix_sender.logger, level="WARNING") as captured:
+            self.assertTrue(zabbix_sender._send_items_batch(self.items()))
+        self.assertIn("Zabbix failover: sending to backup", "\n".join(captured.output))
+        self.assertEqual(len(self.backup.items), 3)
+
+        # The primary now ranks last: the next batch goes straight to the backup
+        requests = len(self.primary.requests)
+        self.assertTrue(zabbix_sender._send_items_batch(self.items()))
+        self.assertEqual(len(self.primary.requests), requests)
+        self.assertEqual(len(self.backup.items), 6)
+        stats = {entry["name"]: entry for entry in zabbix_sender.get_endpoint_stats()}
+        self.assertEqual(stats["primary"]["failures"], 1)
+        self.assertEqual(stats["backup"]["sent_items"], 6)
+
+    def test_fanout_spools_per_endpoint(self):
+        """Tests that fan-out delivers to all and replays only what an endpoint missed."""
+        self.use_endpoints("fanout")
+        self.assertTrue(zabbix_sender._send_items_batch(self.items()))
+        self.assertEqual((len(self.primary.items), len(self.backup.items)), (3, 3))
+
+        self.backup.response = "failed"
+        with self.assertLogs(zabbix_sender.logger, level="WARNING"):
+            self.assertFalse(zabbix_sender._send_items_batch(self.items(5)))
+        self.assertEqual(len(self.primary.items), 8)
+        endpoints = zabbix_sender._get_endpoints()
+        primary, backup = endpoints.endpoints
+        self.assertTrue(zabbix_sender._get_spool_journal(primary).is_empty())
+        self.assertFalse(zabbix_sender._get_spool_journal(backup).is_empty())
+        self.assertTrue(os.path.isdir(os.path.join(self.spool_dir, "backup")))
+
+        self.backup.response = "success"
+        with self.backup.lock:
+            self.backup.items.clear()
+        zabbix_sender.drain_spool()
+        self.assertEqual(len(self.backup.items), 5)
+        self.assertEqual(len(self.primary.items), 8)
+        self.assertTrue(zabbix_sender._get_spool_journal(backup).is_empty())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+"""Unit tests for the Zabbix sender spool replay.
+
+This test suite verifies that spooled items keep their acquisition time,
+that legacy text records are still readable, and that `drain_spool` replays
+a backlog in merged, timestamped batches against a local fake trapper.
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from fake_trapper import FakeTrapperServer
+from config import runtime_config
+import utils.zabbix_sender as zabbix_sender
+
+
+class TestSpoolReplay(unittest.TestCase):
+    """Test suite for spooling and replaying items."""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self._env = mock.patch.dict(os.environ, {
+            "ZBX_SPOOL_DIR": self._tmp.name,
+            "ZBX_SENDER_TRANSPORT": "native",
+            "ZBX_SENDER_RETRIES": "0",
+            "ZBX_SPOOL_FSYNC": "never",
+        })
+        self._env.start()
+        # Options are resolved once per runtime config: resolve them again with this environment
+        self._options = mock.patch.object(zabbix_sender, "_sender_options", None)
+        self._options.start()
+        self._endpoints = mock.patch.object(zabbix_sender, "_endpoints", None)
+        self._endpoints.start()
+
+    def tearDown(self):
+        zabbix_sender.close_spool()
+        self._endpoints.stop()
+        self._options.stop()
+        self._env.stop()
+        self._tmp.cleanup()
+
+    def test_record_round_trip_keeps_clock(self):
+        """Tests that spool records preserve clock and ns."""
+        items = [zabbix_sender.make_item("RETU_IN", "tilt.radial", -427.5, 1700000000.5)]
+        decoded = zabbix_sender._decode_spool_record(zabbix_sender._encode_spool_record(items))
+        self.assertEqual(decoded[0]["clock"], 1700000000)
+        self.assertEqual(decoded[0]["ns"], 500000000)
+        self.assertEqual(decoded[0]["value"], "-427.5")
+
+    def test_legacy_text_record(self):
+        """Tests that pre-timestamp text records decode without a clock."""
+        decoded = zabbix_sender._decode_spool_record(b"RETU_PL rain.level 1.5\n")
+        self.assertEqual(decoded, [
+            {"host": "RETU_PL", "key": "rain.level", "value": "1.5", "clock": None, "ns": None}
+        ])
+
+    def test_drain_replays_in_merged_timestamped_batches(self):
+        """Tests that many spool records are merged into few timestamped sends."""
+        with FakeTrapperServer() as server, \
+                mock.patch.object(zabbix_sender, "ZABBIX_SERVER", "127.0.0.1"), \
+                mock.patch.object(zabbix_sender, "ZABBIX_PORT", server.port), \
+                mock.patch.object(zabbix_sender, "_schedule_drain"), \
+                mock.patch.object(runtime_config, "_current", runtime_config.build_runtime_config(
+                    {"zabbix_sender": {"drain_batch_items": 25}})):
+            for i in range(30):
+                zabbix_sender._spool_items([
+                    zabbix_sender.make_item("RETU_IN", "tilt.radial", i, 1700000000 + i),
+                    zabbix_sender.make_item("RETU_IN", "tilt.temp", 20.0, 1700000000 + i),
+                ])
+            zabbix_sender.drain_spool()
+        self.assertEqual(len(server.items), 60)
+        self.assertEqual(len(server.requests), 3)
+        self.assertEqual(server.items[0]["clock"], 1700000000)
+        self.assertEqual(server.items[-1]["clock"], 1700000029)
+        self.assertTrue(zabbix_sender._get_spool_journal().is_empty())
+
+
+if __name__ == '__main__':
+    unittest.main()
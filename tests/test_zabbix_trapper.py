@@ -0,0 +1,104 @@
+"""Unit tests for the native Zabbix trapper client.
+
+These tests run `ZabbixTrapperClient` against `FakeTrapperServer`, a local
+stand-in for a Zabbix trapper, to verify framing, response parsing and
+connection reuse.
+"""
+
+import unittest
+
+from fake_trapper import FakeTrapperServer
+from utils.zabbix_trapper import (
+    ZabbixTrapperClient,
+    ZabbixTrapperError,
+    build_packet,
+    parse_sender_response,
+)
+
+ITEMS = [
+    {"host": "RETU_IN", "key": "tilt.radial", "value": -427.5},
+    {"host": "RETU_IN", "key": "tilt.tangential", "value": 296.3},
+    {"host": "RETU_PL", "key": "rain.level", "value": 0.0},
+]
+
+
+class TestZabbixTrapper(unittest.TestCase):
+    """Test suite for `utils.zabbix_trapper`."""
+
+    def test_packet_header(self):
+        """Tests that packets carry the ZBXD header, flags and payload length."""
+        packet = build_packet(b'{"a":1}')
+        self.assertEqual(packet[:5], b"ZBXD\x01")
+        self.assertEqual(int.from_bytes(packet[5:9], "little"), 7)
+        self.assertEqual(packet[13:], b'{"a":1}')
+
+    def test_parse_response(self):
+        """Tests that the processed/failed/total info line is parsed."""
+        result = parse_sender_response(
+            b'{"response":"success","info":"processed: 5; failed: 1; total: 6; seconds spent: 0.000104"}'
+        )
+        self.assertEqual((result.processed, result.failed, result.total), (5, 1, 6))
+        with self.assertRaises(ZabbixTrapperError):
+            parse_sender_response(b'{"response":"failed","info":"bad request"}')
+
+    def test_send_batch(self):
+        """Tests that a batch is delivered in one request with string values."""
+        with FakeTrapperServer() as server:
+            client = ZabbixTrapperClient("127.0.0.1", server.port, timeout=2)
+            result = client.send(ITEMS)
+            client.close()
+        self.assertEqual((result.processed, result.failed, result.total), (3, 0, 3))
+        self.assertEqual(len(server.requests), 1)
+        self.assertEqual(server.requests[0]["request"], "sender data")
+        self.assertEqual(server.items[0]["value"], "-427.5")
+
+    def test_failed_items_are_reported(self):
+        """Tests that items rejected by the server show up in `failed`."""
+        with FakeTrapperServer(reject_hosts={"RETU_PL"}) as server:
+            client = ZabbixTrapperClient("127.0.0.1", server.port, timeout=2)
+            result = client.send(ITEMS)
+            client.close()
+        self.assertEqual((result.processed, result.failed), (2, 1))
+
+    def test_connection_is_reused(self):
+        """Tests that consecutive batches share one TCP connection when possible."""
+        with FakeTrapperServer(keep_alive=True) as server:
+            client = ZabbixTrapperClient("127.0.0.1", server.port, timeout=2)
+            for _ in range(3):
+                client.send(ITEMS)
+            client.close()
+        self.assertEqual(len(server.requests), 3)
+        self.assertEqual(len(server.connections), 1)
+
+    def test_reconnects_after_server_close(self):
+        """Tests that a connection closed by the server is transparently replaced."""
+        with FakeTrapperServer(keep_alive=False) as server:
+            client = ZabbixTrapperClient("127.0.0.1", server.port, timeout=2)
+            for _ in range(3):
+                self.assertEqual(client.send(ITEMS).processed, 3)
+            client.close()
+        self.assertEqual(len(server.requests), 3)
+
+    def test_no_resend_after_request_was_written(self):
+        """Tests that a batch is not sent again when the answer is lost on a reused connection."""
+        with FakeTrapperServer(keep_alive=True, unanswered_from=1) as server:
+            client = ZabbixTrapperClient("127.0.0.1", server.port, timeout=2)
+            client.send(ITEMS)
+            with self.assertRaises(ZabbixTrapperError):
+                client.send(ITEMS)
+            client.close()
+        self.assertEqual(len(server.requests), 2)
+        self.assertEqual(len(server.items), 2 * len(ITEMS))
+
+    def test_connection_refused_raises(self):
+        """Tests that an unreachable trapper raises `ZabbixTrapperError`."""
+        server = FakeTrapperServer()
+        port = server.port
+        server.server_close()
+        client = ZabbixTrapperClient("127.0.0.1", port, timeout=1)
+        with self.assertRaises(ZabbixTrapperError):
+            client.send(ITEMS)
+
+
+if __name__ == '__main__':
+    unittest.main()
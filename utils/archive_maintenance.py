@@ -0,0 +1,328 @@
+"""Compression and retention of the daily TSV archive.
+
+`utils.data_storage` writes one file per sensor type, station and day and
+never removes anything, so on a gateway the archive grows until the SD card
+is full. A background thread (`start_archive_maintenance`) runs a pass every
+`interval_seconds`:
+
+1. Finished days are gzipped: `YYYY-M-D.tsv` becomes `YYYY-M-D.tsv.gz`
+   once the day is at least `compress_after_days` old, the file is not open
+   in the TSV writer and it was not modified in the last `idle_seconds`.
+   Rows written for a compressed day later on (e.g. after a clock step) go to
+   a new plain file, which the next pass appends to the compressed one.
+2. Retention per sensor type: days older than `max_age_days` are deleted,
+   then the oldest days (of any station) until the sensor's files take at
+   most `max_size_mb`. Zero disables a limit.
+
+Today's and future days and files the writer keeps open are never touched.
+Readers open a day with `archive_query.open_daily_file`, which streams the
+compressed and plain parts as one file, so queries and backfills see no
+difference.
+
+Compression is crash-safe: the new `.gz` is written and fsynced as
+`.tsv.gz.tmp` and renamed over the old one before the plain file is
+deleted, so the rows are on the card in at least one file at every moment.
+The next pass deletes a leftover temporary file, and a plain file whose
+content already ends the compressed one (a crash between the rename and the
+deletion; readers see those rows twice until then).
+
+The thread lowers its CPU priority (`nice`) and, on Linux, sets its I/O
+class to idle, so it only uses the SD card when nothing else does.
+
+Configuration (config.json → archive_maintenance): enabled (default False),
+interval_seconds (3600), compress_after_days (1, 0 disables compression),
+compresslevel (6), idle_seconds (600), nice (10), idle_io (True),
+retention: {"inclinometer": {"max_age_days": 0, "max_size_mb": 0},
+"pluviometer": {...}}.
+"""
+
+import ctypes
+import ctypes.util
+import gzip
+import logging
+import os
+import platform
+import shutil
+import threading
+import time
+from datetime import date, timedelta
+from typing import Optional
+
+from config.app_config import APP_CONFIG
+from utils.archive_query import (
+    COMPRESSED_SUFFIX,
+    INDEX_SUFFIX,
+    SENSOR_DIRS,
+    daily_file_parts,
+    gzip_size,
+    list_daily_files,
+    open_daily_file,
+)
+from utils.data_storage import open_storage_files
+from utils.metrics import ARCHIVE_COMPRESSED, ARCHIVE_DELETED
+
+logger = logging.getLogger(__name__)
+
+TMP_SUFFIX = ".tmp"
+
+# ioprio_set(2) syscall numbers; the I/O class is left alone on other machines
+_IOPRIO_SET = {"x86_64": 251, "i386": 289, "i686": 289, "aarch64": 30, "armv6l": 314, "armv7l": 314}
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_IDLE = 3
+_IOPRIO_CLASS_SHIFT = 13
+
+
+def get_maintenance_options() -> dict:
+    """Options from `APP_CONFIG['archive_maintenance']`."""
+    cfg = APP_CONFIG.get("archive_maintenance", {}) if isinstance(APP_CONFIG, dict) else {}
+    retention_cfg = cfg.get("retention", {}) or {}
+    retention = {}
+    for sensor in SENSOR_DIRS:
+        limits = retention_cfg.get(sensor, {}) or {}
+        retention[sensor] = {
+            "max_age_days": max(0, int(limits.get("max_age_days", 0))),
+            "max_bytes": int(max(0.0, float(limits.get("max_size_mb", 0))) * 1024 * 1024),
+        }
+    return {
+        "enabled": bool(cfg.get("enabled", False)),
+        "interval": max(1.0, float(cfg.get("interval_seconds", 3600))),
+        "compress_after_days": max(0, int(cfg.get("compress_after_days", 1))),
+        "compresslevel": min(9, max(1, int(cfg.get("compresslevel", 6)))),
+        "idle_seconds": max(0.0, float(cfg.get("idle_seconds", 600))),
+        "nice": max(0, int(cfg.get("nice", 10))),
+        "idle_io": bool(cfg.get("idle_io", True)),
+        "retention": retention,
+    }
+
+
+def _lower_thread_priority(nice: int, idle_io: bool) -> None:
+    """Lower the CPU and I/O priority of the calling thread (Linux: per thread)."""
+    tid = threading.get_native_id()
+    if nice and hasattr(os, "setpriority"):
+        try:
+            os.setpriority(os.PRIO_PROCESS, tid, min(19, os.getpriority(os.PRIO_PROCESS, tid) + nice))
+        except OSError as e:
+            logger.debug(f"Cannot lower the CPU priority of the archive maintenance: {e}")
+    syscall = _IOPRIO_SET.get(platform.machine())
+    if idle_io and syscall is not None and platform.system() == "Linux":
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            value = _IOPRIO_CLASS_IDLE << _IOPRIO_CLASS_SHIFT
+            if libc.syscall(syscall, _IOPRIO_WHO_PROCESS, tid, value) != 0:
+                logger.debug(f"Cannot set the idle I/O class: {os.strerror(ctypes.get_errno())}")
+        except OSError as e:
+            logger.debug(f"Cannot set the idle I/O class: {e}")
+
+
+def _open_files() -> set:
+    return {os.path.abspath(path) for path in open_storage_files()}
+
+
+def _day_bytes(path: str) -> int:
+    total = 0
+    for part in daily_file_parts(path) + [path + INDEX_SUFFIX]:
+        try:
+            total += os.path.getsize(part)
+        except OSError:
+            pass
+    return total
+
+
+def _merged(path: str) -> bool:
+    """True if the content of the plain file of a day already ends its compressed file."""
+    size = os.path.getsize(path)
+    compressed_size = gzip_size(path + COMPRESSED_SUFFIX)
+    if compressed_size < size:
+        return False
+    with open(path, "rb") as plain, gzip.open(path + COMPRESSED_SUFFIX, "rb") as compressed:
+        compressed.seek(compressed_size - size)
+        while True:
+            chunk = plain.read(1024 * 1024)
+            if not chunk:
+                return True
+            if compressed.read(len(chunk)) != chunk:
+                return False
+
+
+def recover_interrupted(base_dir: str, sensor: str) -> None:
+    """Clean up after compressions of a sensor's files interrupted by a crash."""
+    suffix = COMPRESSED_SUFFIX + TMP_SUFFIX
+    open_files = _open_files()
+    for directory, _, names in os.walk(os.path.join(base_dir, SENSOR_DIRS[sensor])):
+        names = set(names)
+        for name in sorted(names):
+            path = os.path.join(directory, name)
+            try:
+                if name.endswith(suffix):
+                    os.unlink(path)  # never renamed: the plain file is still there
+                elif (name + COMPRESSED_SUFFIX in names and os.path.abspath(path) not in open_files
+                      and _merged(path)):
+                    os.unlink(path)
+                    logger.info(f"Completed the interrupted compression of {path}")
+            except (OSError, EOFError) as e:
+                logger.error(f"Cannot recover the compression of {path}: {e}")
+
+
+def compress_day(path: str, compresslevel: int = 6) -> bool:
+    """Gzip the plain part of a day, appending it to the compressed part if any.
+
+    Returns:
+        bool: True if compressed, False if the file changed meanwhile (try again later).
+    """
+    compressed = path + COMPRESSED_SUFFIX
+    tmp = compressed + TMP_SUFFIX
+    before = os.stat(path)
+    try:
+        with open_daily_file(path) as source, open(tmp, "wb") as raw:
+            with gzip.GzipFile(filename=os.path.basename(path), mode="wb",
+                               compresslevel=compresslevel, fileobj=raw) as target:
+                shutil.copyfileobj(source, target, 1024 * 1024)
+            raw.flush()
+            os.fsync(raw.fileno())
+        after = os.stat(path)
+        changed = (after.st_size, after.st_mtime_ns) != (before.st_size, before.st_mtime_ns)
+        if changed or os.path.abspath(path) in _open_files():
+            os.unlink(tmp)
+            return False
+        os.replace(tmp, compressed)
+        os.unlink(path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return True
+
+
+def delete_day(path: str) -> None:
+    """Delete every file of a day (compressed, plain and index)."""
+    for part in daily_file_parts(path) + [path + INDEX_SUFFIX]:
+        try:
+            os.unlink(part)
+        except FileNotFoundError:
+            pass
+
+
+def run_maintenance(base_dir: Optional[str] = None, today: Optional[date] = None,
+                    opts: Optional[dict] = None, stop_event: Optional[threading.Event] = None) -> dict:
+    """One compression and retention pass over the archive.
+
+    Args:
+        base_dir (str | None): Archive root; defaults to APP_CONFIG["base_dir"].
+        today (date | None): The current day (default: local date).
+        opts (dict | None): Options as returned by `get_maintenance_options`.
+        stop_event (threading.Event | None): Set to stop between files.
+
+    Returns:
+        dict: compressed, deleted and freed_bytes of the pass.
+    """
+    opts = opts or get_maintenance_options()
+    base_dir = base_dir or APP_CONFIG.get("base_dir", "./DTA")
+    today = today or date.today()
+    stats = {"compressed": 0, "deleted": 0, "freed_bytes": 0}
+    after_days = opts["compress_after_days"]
+
+    for sensor in SENSOR_DIRS:
+        recover_interrupted(base_dir, sensor)
+        days = list_daily_files(base_dir, sensor)
+        open_files = _open_files()
+        idle_before = time.time() - opts["idle_seconds"]
+
+        # 1. Compress finished days
+        for station, day, path in days:
+            if stop_event is not None and stop_event.is_set():
+                return stats
+            if not after_days or day > today - timedelta(days=after_days):
+                continue
+            try:
+                if os.path.abspath(path) in open_files or not os.path.exists(path):
+                    continue
+                if os.path.getmtime(path) > idle_before:
+                    continue
+                size = _day_bytes(path)
+                if compress_day(path, opts["compresslevel"]):
+                    stats["compressed"] += 1
+                    stats["freed_bytes"] += size - _day_bytes(path)
+                    ARCHIVE_COMPRESSED.labels(sensor).inc()
+            except OSError as e:
+                logger.error(f"Cannot compress {path}: {e}")
+
+        # 2. Retention: age, then total size (oldest days first, any station)
+        limits = opts["retention"][sensor]
+        if not limits["max_age_days"] and not limits["max_bytes"]:
+            continue
+        candidates = sorted(
+            ((day, station, path, _day_bytes(path)) for station, day, path in list_daily_files(base_dir, sensor)),
+            key=lambda entry: (entry[0], entry[1]),
+        )
+        total = sum(entry[3] for entry in candidates)
+        oldest_kept = today - timedelta(days=limits["max_age_days"])
+        for day, station, path, size in candidates:
+            if stop_event is not None and stop_event.is_set():
+                return stats
+            if day >= today or os.path.abspath(path) in open_files:
+                continue
+            if limits["max_age_days"] and day < oldest_kept:
+                reason = "age"
+            elif limits["max_bytes"] and total > limits["max_bytes"]:
+                reason = "size"
+            else:
+                continue
+            try:
+                delete_day(path)
+            except OSError as e:
+                logger.error(f"Cannot delete {path}: {e}")
+                continue
+            total -= size
+            stats["deleted"] += 1
+            stats["freed_bytes"] += size
+            ARCHIVE_DELETED.labels(sensor, reason).inc()
+            logger.info(f"Deleted {SENSOR_DIRS[sensor]}/{station} {day.isoformat()} ({reason} limit)")
+        if limits["max_bytes"] and total > limits["max_bytes"]:
+            logger.warning(
+                f"{SENSOR_DIRS[sensor]} still takes {total} bytes, over its {limits['max_bytes']} byte "
+                f"limit, without deleting today's or open files."
+            )
+    return stats
+
+
+_thread: Optional[threading.Thread] = None
+_stop = threading.Event()
+
+
+def _run(opts: dict) -> None:
+    _lower_thread_priority(opts["nice"], opts["idle_io"])
+    while True:
+        started = time.monotonic()
+        try:
+            stats = run_maintenance(opts=opts, stop_event=_stop)
+            if stats["compressed"] or stats["deleted"]:
+                logger.info(
+                    f"Archive maintenance: {stats['compressed']} files compressed, {stats['deleted']} days "
+                    f"deleted, {stats['freed_bytes'] / 1e6:.1f} MB freed in {time.monotonic() - started:.1f} s"
+                )
+        except Exception as e:
+            logger.error(f"Archive maintenance pass failed: {e}")
+        if _stop.wait(opts["interval"]):
+            return
+
+
+def start_archive_maintenance() -> None:
+    """Start the low-priority maintenance thread (if enabled)."""
+    global _thread
+    opts = get_maintenance_options()
+    if not opts["enabled"] or _thread is not None:
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_run, args=(opts,), name="archive-maintenance", daemon=True)
+    _thread.start()
+    logger.info(f"Archive maintenance every {opts['interval']:.0f} s (compress after {opts['compress_after_days']} days)")
+
+
+def stop_archive_maintenance() -> None:
+    """Stop the maintenance thread after the file in progress."""
+    global _thread
+    if _thread is None:
+        return
+    _stop.set()
+    _thread.join(timeout=30)
+    _thread = None
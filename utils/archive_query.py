@@ -0,0 +1,445 @@
+"""Time-range queries over the daily TSV archive.
+
+The archive written by `utils.data_storage` has one file per sensor type,
+station and day (`<base_dir>/INCLINOMETRIA/<station>/YYYY-M-D.tsv`). To avoid
+scanning whole files, every daily file gets a sparse index: the data rows are
+grouped in blocks of `BLOCK_ROWS` rows and, for each block, the byte offset
+of its first row and the earliest and latest timestamp in it are recorded. A
+query only reads the blocks whose time span overlaps the requested range, so
+rows written out of order (e.g. after a clock adjustment) are still found.
+
+The index is cached next to the data file as `<file>.idx` (JSON) together
+with the file size and modification time it was built from. When the file
+changed, the index is refreshed: since the archive is append-only, a file
+that grew is indexed incrementally from its last block, and a file that
+shrank is indexed again from scratch. If the sidecar cannot be written the
+index is simply rebuilt in memory.
+
+Finished days may be compressed by `utils.archive_maintenance` to
+`YYYY-M-D.tsv.gz`. Readers always address a day by its `.tsv` path and open
+it with `open_daily_file`, which streams the compressed part of the day
+followed by the plain part (rows written for the day after it was
+compressed). Offsets, including the ones in the index and in backfill
+checkpoints, refer to this uncompressed stream, which compression keeps
+byte for byte, so they stay valid when a day is compressed.
+
+Command line (from the project root):
+    python -m utils.archive_query CHONTAL inclinometer \\
+        --from "2025-09-16 02:00" --to "2025-09-16 03:00" [--format tsv|csv|json]
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import struct
+import sys
+from datetime import date, datetime, timedelta
+from typing import Iterator, List, Optional, Tuple
+
+from config.app_config import APP_CONFIG
+
+logger = logging.getLogger(__name__)
+
+SENSOR_DIRS = {
+    "inclinometer": "INCLINOMETRIA",
+    "pluviometer": "PLUVIOMETRIA",
+}
+FORMATS = ("tsv", "csv", "json")
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".idx"
+COMPRESSED_SUFFIX = ".gz"
+BLOCK_ROWS = 256
+
+# Rows start with "DD/MM/YYYY\tHH:MM:SS\t"
+_STAMP_LENGTH = 19
+
+
+def parse_row_timestamp(line: bytes) -> Optional[float]:
+    """Epoch seconds of a data row, or None for header/blank/corrupt lines."""
+    if len(line) < _STAMP_LENGTH or line[2:3] != b"/" or line[10:11] != b"\t":
+        return None
+    try:
+        return datetime(
+            int(line[6:10]), int(line[3:5]), int(line[0:2]),
+            int(line[11:13]), int(line[14:16]), int(line[17:19]),
+        ).timestamp()
+    except ValueError:
+        return None
+
+
+def daily_file_path(base_dir: str, sensor: str, station: str, day) -> str:
+    """Path of the archive file of one station and day (same naming as data_storage)."""
+    return os.path.join(base_dir, SENSOR_DIRS[sensor], station, f"{day.year}-{day.month}-{day.day}.tsv")
+
+
+def parse_file_day(name: str) -> Optional[date]:
+    """Day of a daily file name such as "2025-9-16.tsv" or "2025-9-16.tsv.gz", or None."""
+    if name.endswith(COMPRESSED_SUFFIX):
+        name = name[:-len(COMPRESSED_SUFFIX)]
+    if not name.endswith(".tsv"):
+        return None
+    try:
+        year, month, day = (int(part) for part in name[:-len(".tsv")].split("-"))
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def list_daily_files(base_dir: str, sensor: str, stations=None) -> List[Tuple[str, date, str]]:
+    """Archive days of a sensor as (station, day, path), sorted by station and day.
+
+    `path` is the `.tsv` path of the day, also when the day is compressed
+    (open it with `open_daily_file`).
+
+    Args:
+        stations (iterable[str] | None): Only these stations (default: all).
+    """
+    sensor_dir = os.path.join(base_dir, SENSOR_DIRS[sensor])
+    try:
+        names = sorted(stations) if stations else sorted(os.listdir(sensor_dir))
+    except FileNotFoundError:
+        return []
+    files = {}
+    for station in names:
+        station_dir = os.path.join(sensor_dir, station)
+        if not os.path.isdir(station_dir):
+            continue
+        for name in os.listdir(station_dir):
+            day = parse_file_day(name)
+            if day is not None:
+                if name.endswith(COMPRESSED_SUFFIX):
+                    name = name[:-len(COMPRESSED_SUFFIX)]
+                files[(station, day)] = os.path.join(station_dir, name)
+    return [(station, day, path) for (station, day), path in sorted(files.items())]
+
+
+def daily_file_parts(path: str) -> List[str]:
+    """Existing files of a day in stream order: the compressed part, then the plain one."""
+    return [part for part in (path + COMPRESSED_SUFFIX, path) if os.path.exists(part)]
+
+
+def daily_file_exists(path: str) -> bool:
+    return bool(daily_file_parts(path))
+
+
+def gzip_size(path: str) -> int:
+    """Uncompressed size of a single-member gzip file, from its ISIZE trailer."""
+    with open(path, "rb") as f:
+        f.seek(-4, os.SEEK_END)
+        return struct.unpack("<I", f.read(4))[0]
+
+
+def daily_file_stat(path: str) -> Tuple[int, int]:
+    """(size, mtime_ns) of a day's uncompressed stream.
+
+    Raises:
+        FileNotFoundError: If the day has no file.
+    """
+    parts = daily_file_parts(path)
+    if not parts:
+        raise FileNotFoundError(f"No archive file for {path}")
+    size = mtime_ns = 0
+    for part in parts:
+        stat = os.stat(part)
+        size += gzip_size(part) if part.endswith(COMPRESSED_SUFFIX) else stat.st_size
+        mtime_ns = max(mtime_ns, stat.st_mtime_ns)
+    return size, mtime_ns
+
+
+class _DayStream(io.RawIOBase):
+    """The parts of a day read as one seekable byte stream (forward seeks are cheap)."""
+
+    def __init__(self, parts: List[str]):
+        super().__init__()
+        self._parts = []
+        try:
+            for part in parts:
+                if part.endswith(COMPRESSED_SUFFIX):
+                    self._parts.append((gzip.open(part, "rb"), None))
+                else:
+                    handle = open(part, "rb")
+                    self._parts.append((handle, os.fstat(handle.fileno()).st_size))
+        except BaseException:
+            self.close()
+            raise
+        self._current = 0
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while self._current < len(self._parts):
+            count = self._parts[self._current][0].readinto(buffer)
+            if count:
+                self._position += count
+                return count
+            self._current += 1
+        return 0
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("only SEEK_SET and SEEK_CUR are supported")
+        if offset < self._position:
+            for handle, _ in self._parts:
+                handle.seek(0)
+            self._current = self._position = 0
+        while self._position < offset and self._current < len(self._parts):
+            handle, size = self._parts[self._current]
+            before = handle.tell()
+            target = before + offset - self._position
+            if size is not None and self._current + 1 < len(self._parts):
+                target = min(target, max(size, before))
+            # A gzip part stops at its end when seeking past it
+            self._position += handle.seek(target) - before
+            if self._position < offset:
+                self._current += 1
+        return self._position
+
+    def close(self) -> None:
+        for handle, _ in self._parts:
+            handle.close()
+        super().close()
+
+
+def open_daily_file(path: str) -> io.BufferedReader:
+    """Open a day for binary reading, whether it is compressed, plain or both.
+
+    Args:
+        path (str): The `.tsv` path of the day.
+
+    Raises:
+        FileNotFoundError: If the day has no file.
+    """
+    parts = daily_file_parts(path)
+    if not parts:
+        raise FileNotFoundError(f"No archive file for {path}")
+    return io.BufferedReader(_DayStream(parts))
+
+
+def _scan(path: str, start_offset: int, blocks: list) -> int:
+    """Index the complete lines of `path` from `start_offset`, appending to `blocks`.
+
+    Returns:
+        int: Offset just after the last complete line.
+    """
+    offset = start_offset
+    current = None  # [offset, min_ts, max_ts, rows]
+    with open_daily_file(path) as f:
+        f.seek(start_offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # partial line still being written
+            ts = parse_row_timestamp(line)
+            if ts is not None:
+                if current is None:
+                    current = [offset, ts, ts, 0]
+                elif ts < current[1]:
+                    current[1] = ts
+                elif ts > current[2]:
+                    current[2] = ts
+                current[3] += 1
+                if current[3] >= BLOCK_ROWS:
+                    blocks.append(current)
+                    current = None
+            offset += len(line)
+    if current is not None:
+        blocks.append(current)
+    return offset
+
+
+def load_index(path: str) -> dict:
+    """Return the up-to-date sparse index of a daily file, refreshing its sidecar if needed.
+
+    Returns:
+        dict: {"version", "size", "mtime_ns", "indexed", "blocks": [[offset, min_ts, max_ts, rows], ...]}
+    """
+    size, mtime_ns = daily_file_stat(path)
+    sidecar = path + INDEX_SUFFIX
+    index = None
+    try:
+        with open(sidecar, "r") as f:
+            index = json.load(f)
+        if index.get("version") != INDEX_VERSION:
+            index = None
+    except (OSError, ValueError):
+        index = None
+
+    if index is not None and index["size"] == size and index["mtime_ns"] == mtime_ns:
+        return index
+
+    if index is not None and size >= index["indexed"] and index["blocks"]:
+        # Append-only file grew: re-scan from the start of the last (possibly partial) block
+        blocks = index["blocks"]
+        start = blocks.pop()[0]
+    elif index is not None and size >= index["indexed"]:
+        blocks, start = [], index["indexed"]
+    else:
+        blocks, start = [], 0
+    indexed = _scan(path, start, blocks)
+    index = {
+        "version": INDEX_VERSION,
+        "size": size,
+        "mtime_ns": mtime_ns,
+        "indexed": indexed,
+        "blocks": blocks,
+    }
+    tmp = sidecar + ".tmp"
+    try:
+        with open(tmp, "w") as f:
+            json.dump(index, f, separators=(",", ":"))
+        os.replace(tmp, sidecar)
+    except OSError as e:
+        logger.debug(f"Could not write index {sidecar}: {e}")
+    return index
+
+
+def read_columns(path: str) -> List[str]:
+    """Column names of a daily file (the header line starting with FECHA)."""
+    with open_daily_file(path) as f:
+        for _ in range(8):
+            line = f.readline()
+            if line.startswith(b"FECHA\t"):
+                return line.rstrip(b"\r\n").decode("utf-8", errors="replace").split("\t")
+    return []
+
+
+def iter_file_rows(path: str, start: float, end: float) -> Iterator[Tuple[float, List[str]]]:
+    """Yield (timestamp, fields) of the rows of one daily file with start <= timestamp < end."""
+    index = load_index(path)
+    blocks = index["blocks"]
+    with open_daily_file(path) as f:
+        for i, (offset, min_ts, max_ts, _) in enumerate(blocks):
+            if max_ts < start or min_ts >= end:
+                continue
+            stop = blocks[i + 1][0] if i + 1 < len(blocks) else index["indexed"]
+            f.seek(offset)
+            position = offset
+            while position < stop:
+                line = f.readline()
+                if not line:
+                    break
+                position += len(line)
+                ts = parse_row_timestamp(line)
+                if ts is not None and start <= ts < end:
+                    yield ts, line.rstrip(b"\r\n").decode("utf-8", errors="replace").split("\t")
+
+
+def iter_rows_from(path: str, offset: int = 0) -> Iterator[Tuple[int, float, List[str]]]:
+    """Yield (end_offset, timestamp, fields) of the data rows of a file from `offset`.
+
+    Only complete lines are returned, and `end_offset` is the byte offset
+    just after the row, so a caller can record how far it got and resume
+    there later (the archive is append-only).
+    """
+    with open_daily_file(path) as f:
+        f.seek(offset)
+        position = offset
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # partial line still being written
+            position += len(line)
+            ts = parse_row_timestamp(line)
+            if ts is not None:
+                yield position, ts, line.rstrip(b"\r\n").decode("utf-8", errors="replace").split("\t")
+
+
+def query(station: str, sensor: str, start: datetime, end: datetime, base_dir: Optional[str] = None):
+    """Stream the archived rows of a station and sensor in [start, end), day by day.
+
+    Args:
+        station (str): Station name (directory under the sensor folder).
+        sensor (str): "inclinometer" or "pluviometer".
+        start (datetime): Inclusive start (local time, like the archive).
+        end (datetime): Exclusive end.
+        base_dir (str | None): Archive root; defaults to APP_CONFIG["base_dir"].
+
+    Yields:
+        tuple: (timestamp, columns, fields) where `columns` are the names from
+        the file header and `fields` the row values as strings.
+    """
+    if sensor not in SENSOR_DIRS:
+        raise ValueError(f"Unknown sensor '{sensor}'. Expected one of {tuple(SENSOR_DIRS)}.")
+    base_dir = base_dir or APP_CONFIG.get("base_dir", "./DTA")
+    start_ts, end_ts = start.timestamp(), end.timestamp()
+    day = start.date()
+    while day <= end.date():
+        path = daily_file_path(base_dir, sensor, station, day)
+        if daily_file_exists(path):
+            columns = read_columns(path)
+            for ts, fields in iter_file_rows(path, start_ts, end_ts):
+                yield ts, columns, fields
+        day += timedelta(days=1)
+
+
+def write_rows(rows, fmt: str, out, station: str = "", sensor: str = "") -> int:
+    """Write query results as TSV, CSV or JSON Lines and return the row count."""
+    count = 0
+    writer = csv.writer(out) if fmt == "csv" else None
+    header_written = False
+    for ts, columns, fields in rows:
+        if fmt == "json":
+            record = {"station": station, "sensor": sensor, "timestamp": datetime.fromtimestamp(ts).isoformat()}
+            for name, value in zip(columns[2:], fields[2:]):
+                try:
+                    record[name] = float(value)
+                except ValueError:
+                    record[name] = value
+            out.write(json.dumps(record) + "\n")
+        else:
+            if not header_written and columns:
+                if writer is not None:
+                    writer.writerow(columns)
+                else:
+                    out.write("\t".join(columns) + "\n")
+                header_written = True
+            if writer is not None:
+                writer.writerow(fields)
+            else:
+                out.write("\t".join(fields) + "\n")
+        count += 1
+    return count
+
+
+def _parse_time(value: str) -> datetime:
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid time '{value}' (expected e.g. 2025-09-16 02:00)")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Query the local TSV archive by station, sensor and time range.",
+    )
+    parser.add_argument("station", help="station name, e.g. CHONTAL")
+    parser.add_argument("sensor", choices=tuple(SENSOR_DIRS), help="sensor type")
+    parser.add_argument("--from", dest="start", type=_parse_time, required=True, help="inclusive start (local time)")
+    parser.add_argument("--to", dest="end", type=_parse_time, required=True, help="exclusive end (local time)")
+    parser.add_argument("--format", choices=FORMATS, default="tsv", help="output format (json = one object per line)")
+    parser.add_argument("--base-dir", default=None, help="archive root (default: base_dir from config.json)")
+    args = parser.parse_args(argv)
+
+    rows = query(args.station, args.sensor, args.start, args.end, args.base_dir)
+    try:
+        write_rows(rows, args.format, sys.stdout, args.station, args.sensor)
+    except BrokenPipeError:
+        pass  # e.g. piped into head
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,39 +1,93 @@
 """Orchestrates the processing of raw data from serial ports.
 
 This module acts as a central hub after data is read from a serial port.
-It receives raw byte data, logs it, passes it to the parser, and then
-distributes the parsed data to other utilities for storage and submission
-to Zabbix.
+It receives raw byte data, passes it to the parser, and then distributes the
+parsed data to other utilities for storage and submission to Zabbix, and to
+the shared-memory table of latest values (`utils.latest_values`) and the
+in-memory recent history of each station (`utils.station_history`).
+
+Frames are not logged one by one at INFO level. Each port's parse results are
+counted, and a background thread (`start_port_summaries`) logs one summary
+line per port every `summary_interval_seconds` with the frame counts and
+rates, so the per-frame path does no log I/O. The raw bytes of every frame
+are only formatted when DEBUG logging is enabled.
+
+Parsing (`parse_frame`) and storing/sending (`process_parsed_data`) are
+separate steps so that, in the multi-process runtime (`utils.process_shards`),
+frames can be parsed in the reader processes and stored and sent by one
+process.
 """
 
 import logging
-from datetime import datetime
+import threading
+import time
+from typing import Dict, Optional
 
 from parsers.data_parser import parse_raw_data
+from utils import metrics
+from utils.logging_config import get_logging_options
 from utils.data_storage import save_inclinometer_data, save_pluviometer_data
+from utils.latest_values import publish_latest
+from utils.station_history import record as record_history
 from utils.zabbix_sender import send_inclinometer_to_zabbix, send_pluviometer_to_zabbix
 
+logger = logging.getLogger(__name__)
 
-def process_data(raw_bytes, port_name):
-    """Receives raw bytes, parses them, and sends the data for storage and monitoring.
 
-    This is the main data processing function. It takes the raw byte string from
-    the serial reader, logs the raw and hex representations, and calls the
-    `parse_raw_data` function. If parsing is successful, it logs the parsed
-    data and then calls functions to save the data locally and send it to Zabbix.
+class _PortCounts:
+    """Parse results of one port since startup."""
 
-    Args:
-        raw_bytes (bytes): The raw byte string read from the serial port.
-        port_name (str): The name of the port from which the data was read (e.g., '/dev/ttyUSB0').
+    __slots__ = ("parsed", "invalid", "station")
+
+    def __init__(self):
+        self.parsed = 0
+        self.invalid = 0
+        self.station = ""
+
+
+_port_counts: Dict[str, _PortCounts] = {}
+_summary_stop = threading.Event()
+_summary_thread: Optional[threading.Thread] = None
+
+
+def parse_frame(raw_bytes, received_at=None, received_mono=None) -> Optional[dict]:
+    """Parse one frame and stamp it with its source timestamp.
+
+    The source timestamp is stored in the parsed data as `timestamp` (epoch
+    seconds, used for the TSV archive and as the Zabbix clock) and `monotonic`
+    (for measuring pipeline delays), so batched or deferred delivery keeps the
+    time at which the frame was actually read.
+
+    Returns:
+        dict | None: The parsed data, None if the frame is not valid.
     """
-    logger = logging.getLogger(__name__)
-    hex_representation = raw_bytes.hex(' ')
-    logger.debug(f"Received raw bytes from {port_name}: {raw_bytes!r}")
-    logger.debug(f"Hex data from {port_name}: {hex_representation}")
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     parsed_data = parse_raw_data(raw_bytes)
     if parsed_data:
-        logger.info(f"{timestamp} - {port_name}: {parsed_data}")
+        parsed_data["timestamp"] = time.time() if received_at is None else received_at
+        parsed_data["monotonic"] = time.monotonic() if received_mono is None else received_mono
+    return parsed_data
+
+
+def process_parsed_data(parsed_data, port_name):
+    """Count a parse result for its port, publish, store and send the parsed data.
+
+    Args:
+        parsed_data (dict | None): Result of `parse_frame` (None if the frame
+            did not parse).
+        port_name (str): The port the frame was read from.
+    """
+    counts = _port_counts.get(port_name)
+    if counts is None:
+        counts = _port_counts.setdefault(port_name, _PortCounts())
+    if parsed_data:
+        counts.parsed += 1
+        counts.station = parsed_data["station_name"]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Parsed frame from %s: %s", port_name, parsed_data)
+        # Latest values and recent records for local consumers
+        publish_latest(parsed_data)
+        record_history(parsed_data)
+
         # Save the data to the respective files
         save_inclinometer_data(parsed_data)
         save_pluviometer_data(parsed_data)
@@ -41,3 +95,113 @@ def process_data(raw_bytes, port_name):
         # Send the data to Zabbix
         send_inclinometer_to_zabbix(parsed_data)
         send_pluviometer_to_zabbix(parsed_data)
+    else:
+        counts.invalid += 1
+
+
+def process_data(raw_bytes, port_name, received_at=None, received_mono=None):
+    """Receives raw bytes, parses them, and sends the data for storage and monitoring.
+
+    This is the main data processing function. It takes the raw byte string from
+    the serial reader and parses it with `parse_frame`, which stamps the parsed
+    data with its source timestamp. If parsing is successful, it then calls
+    functions to save the data locally and send it to Zabbix
+    (`process_parsed_data`). The result is counted for the port's periodic
+    summary line.
+
+    Args:
+        raw_bytes (bytes): The raw byte string read from the serial port.
+        port_name (str): The name of the port from which the data was read (e.g., '/dev/ttyUSB0').
+        received_at (float | None): Wall-clock time (`time.time()`) when the frame
+            was read. Defaults to now.
+        received_mono (float | None): Monotonic time (`time.monotonic()`) when the
+            frame was read. Defaults to now.
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Received raw bytes from %s: %r (hex %s)", port_name, raw_bytes, raw_bytes.hex(" "))
+    process_parsed_data(parse_frame(raw_bytes, received_at, received_mono), port_name)
+
+
+def _metric_values(metric) -> Dict[str, float]:
+    return {labels[0]: child.value for labels, child in metric.children()}
+
+
+def log_port_summaries(previous: dict, elapsed: float) -> dict:
+    """Log one line per port with the counts since the previous call.
+
+    Args:
+        previous (dict): Totals returned by the previous call ({} the first time).
+        elapsed (float): Seconds since the previous call.
+
+    Returns:
+        dict: Current totals per port, to pass to the next call.
+    """
+    frames = _metric_values(metrics.SERIAL_FRAMES)
+    read_bytes = _metric_values(metrics.SERIAL_BYTES)
+    dropped = _metric_values(metrics.SERIAL_DROPPED_BYTES)
+    totals = {}
+    for port_name in sorted(set(frames) | set(_port_counts)):
+        counts = _port_counts.get(port_name) or _PortCounts()
+        current = (
+            frames.get(port_name, 0), counts.parsed, counts.invalid,
+            read_bytes.get(port_name, 0), dropped.get(port_name, 0),
+        )
+        totals[port_name] = current
+        last = previous.get(port_name, (0, 0, 0, 0, 0))
+        n_frames, n_parsed, n_invalid, n_bytes, n_dropped = (now - before for now, before in zip(current, last))
+        level = logging.WARNING if n_invalid or n_dropped else logging.INFO
+        logger.log(
+            level,
+            "Port %s: %d frames (%d parsed, %d invalid), %d bytes, %d garbage bytes in %.0fs "
+            "(%.2f frames/s)%s",
+            port_name, n_frames, n_parsed, n_invalid, n_bytes, n_dropped, elapsed,
+            n_frames / elapsed if elapsed > 0 else 0.0,
+            f"; last station {counts.station}" if counts.station else "",
+        )
+    sent = _metric_values(metrics.SENDER_ITEMS)
+    current = (
+        sent.get("sent", 0), sent.get("failed", 0), metrics.SPOOLED_ITEMS.labels().value,
+        sum(_metric_values(metrics.SHED_ITEMS).values()),
+    )
+    last = previous.get(None, (0, 0, 0, 0))
+    n_sent, n_failed, n_spooled, n_shed = (now - before for now, before in zip(current, last))
+    if n_sent or n_failed or n_spooled or n_shed:
+        logger.log(
+            logging.WARNING if n_failed or n_shed else logging.INFO,
+            "Zabbix: %d items sent, %d failed, %d spooled, %d shed in %.0fs (%.1f items/s).",
+            n_sent, n_failed, n_spooled, n_shed, elapsed, n_sent / elapsed if elapsed > 0 else 0.0,
+        )
+    totals[None] = current
+    return totals
+
+
+def _run_port_summaries(interval: float) -> None:
+    previous = {}
+    last = time.monotonic()
+    while not _summary_stop.wait(interval):
+        now = time.monotonic()
+        previous = log_port_summaries(previous, now - last)
+        last = now
+
+
+def start_port_summaries() -> None:
+    """Start the thread that logs per-port summaries (if `summary_interval_seconds` > 0)."""
+    global _summary_thread
+    interval = get_logging_options()["summary_interval"]
+    if interval <= 0 or _summary_thread is not None:
+        return
+    _summary_stop.clear()
+    _summary_thread = threading.Thread(
+        target=_run_port_summaries, args=(interval,), name="port-summaries", daemon=True,
+    )
+    _summary_thread.start()
+
+
+def stop_port_summaries() -> None:
+    """Stop the summary thread."""
+    global _summary_thread
+    if _summary_thread is None:
+        return
+    _summary_stop.set()
+    _summary_thread.join(timeout=5)
+    _summary_thread = None
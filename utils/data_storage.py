@@ -3,81 +3,143 @@
 This module is responsible for writing the parsed inclinometer and pluviometer
 data into structured, daily log files in a Tab-Separated Values (TSV) format.
 It automatically manages directory creation based on sensor type and station name.
+
+Records are appended through one shared `utils.tsv_writer.TsvWriter`, which
+keeps the current daily file of each station open, rolls over at midnight and
+flushes according to `APP_CONFIG['data_storage']` (max_open_files, flush_mode,
+flush_interval_seconds, flush_records, fsync). Call `close_storage()` on
+shutdown so buffered lines are written.
 """
 import os
 import logging
 import threading
+import time
 from datetime import datetime
 from config.app_config import APP_CONFIG
+from utils.metrics import TSV_OPEN_FILES, TSV_RECORDS
+from utils.tsv_writer import FLUSH_MODES, TsvWriter
 
 BASE_DIR = APP_CONFIG.get("base_dir", "./DTA")
 
-# In-memory locks to protect per-file writes across threads
-_file_locks = {}
-_file_locks_lock = threading.Lock()
-
-def _get_file_lock(path):
-    with _file_locks_lock:
-        lock = _file_locks.get(path)
-        if lock is None:
-            lock = threading.Lock()
-            _file_locks[path] = lock
-        return lock
+INCLINOMETER_HEADER = (
+    "TIPO:INCLINOMETRIA\n",
+    "NOMBRE:{station_name}\n",
+    "IDENTIFICADOR:{station_number}\n",
+    "\n",
+    "FECHA\tTIEMPO\tX RADIAL\tY TANGENCIAL\tTEMPERATURA\tBATERIA\n",
+    "\t\tmicro radianes\tmicro radianes\tgrados centigrados\tvoltios\n",
+)
+PLUVIOMETER_HEADER = (
+    "TIPO:PLUVIOMETRIA\n",
+    "NOMBRE:{station_name}\n",
+    "IDENTIFICADOR:{station_number}\n",
+    "\n",
+    "FECHA\tTIEMPO\tNIVEL\tBATERIA\n",
+    "\t\tmilimetros\tvoltios\n",
+)
+
+# Shared cached-handle writer, created on first use from APP_CONFIG['data_storage']
+_writer = None
+_writer_lock = threading.Lock()
+
+# (second, file name, "date\ttime") of the last formatted timestamp
+_last_stamp = (None, "", "")
+
+
+_RECORDS_WRITTEN = {
+    "INCLINOMETRIA": TSV_RECORDS.labels("inclinometer"),
+    "PLUVIOMETRIA": TSV_RECORDS.labels("pluviometer"),
+}
+TSV_OPEN_FILES.set_function(lambda: len(_writer.open_files()) if _writer is not None else 0)
+
+
+def _get_storage_options() -> dict:
+    """TSV writer options from `APP_CONFIG['data_storage']`."""
+    cfg = APP_CONFIG.get("data_storage", {}) if isinstance(APP_CONFIG, dict) else {}
+    flush_mode = str(cfg.get("flush_mode", "interval")).strip().lower()
+    if flush_mode not in FLUSH_MODES:
+        logging.getLogger(__name__).warning(f"Unknown data_storage flush_mode '{flush_mode}'. Using 'interval'.")
+        flush_mode = "interval"
+    return {
+        "max_open_files": int(cfg.get("max_open_files", 64)),
+        "flush_mode": flush_mode,
+        "flush_interval": float(cfg.get("flush_interval_seconds", 1.0)),
+        "flush_records": int(cfg.get("flush_records", 100)),
+        "fsync": bool(cfg.get("fsync", False)),
+    }
+
+
+def _get_writer() -> TsvWriter:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = TsvWriter(**_get_storage_options())
+        return _writer
+
+
+def flush_storage() -> None:
+    """Flush every open TSV file."""
+    if _writer is not None:
+        _writer.flush()
+
+
+def open_storage_files() -> list:
+    """Paths of the TSV files currently kept open by the writer."""
+    return _writer.open_files() if _writer is not None else []
+
+
+def close_storage() -> None:
+    """Flush and close every open TSV file (call on clean shutdown)."""
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.close()
+
+
+def _format_timestamp(timestamp):
+    """Return (file name, "DD/MM/YYYY\tHH:MM:SS") for a record, formatting each second once."""
+    global _last_stamp
+    second = int(timestamp)
+    cached = _last_stamp
+    if cached[0] == second:
+        return cached[1], cached[2]
+    moment = datetime.fromtimestamp(second)
+    cached = (second, moment.strftime("%Y-%-m-%-d") + ".tsv", moment.strftime("%d/%m/%Y\t%H:%M:%S"))
+    _last_stamp = cached
+    return cached[1], cached[2]
+
+
+def _write_record(sensor_dir, header, data, values):
+    station_name = data['station_name']
+    file_name, stamp = _format_timestamp(data.get('timestamp') or time.time())
+    file_path = os.path.join(BASE_DIR, sensor_dir, station_name, file_name)
+    # Generator: the header is only formatted if the writer creates the file
+    header_lines = (line.format(station_name=station_name, station_number=data['station_number']) for line in header)
+    line = stamp + "".join(f"\t{value}" for value in values) + "\n"
+    _get_writer().write((sensor_dir, station_name), file_path, line, header_lines)
+    _RECORDS_WRITTEN[sensor_dir].inc()
 
-def _ensure_dir_exists(path):
-    """Ensures that a directory exists, creating it if necessary.
-
-    This is a helper function that uses `os.makedirs` with `exist_ok=True`
-    to prevent errors if the directory already exists.
-
-    Args:
-        path (str): The full path of the directory to create.
-    """
-    os.makedirs(path, exist_ok=True)
 
 def save_inclinometer_data(data):
     """Saves inclinometer data to a daily TSV file.
 
     Extracts inclinometer data from the parsed data dictionary, creates a
     directory structure (`<BASE_DIR>/INCLINOMETRIA/<station_name>/`),
-    and appends a new line to a file named with the current date (YYYY-M-D.tsv).
+    and appends a new line to a file named with the record's date (YYYY-M-D.tsv).
+    The date and time written come from the record's source `timestamp`
+    (falling back to the current time when absent).
     If the file doesn't exist, it adds a multi-line header first.
 
     Args:
         data (dict): The dictionary of parsed data containing 'station_name',
-                     'station_number', and 'inclinometer' keys.
+                     'station_number', 'inclinometer' and optionally 'timestamp' keys.
     """
     try:
-        station_name = data['station_name']
-        station_number = data['station_number']
         incli_data = data['inclinometer']
-        
-        # Create directory
-        today = datetime.now()
-        dir_path = os.path.join(BASE_DIR, "INCLINOMETRIA", station_name)
-        _ensure_dir_exists(dir_path)
-        
-        # File path
-        file_path = os.path.join(dir_path, today.strftime("%Y-%-m-%-d") + ".tsv")
-
-        # Guarded write to avoid race conditions across threads
-        lock = _get_file_lock(file_path)
-        with lock:
-            write_header = not os.path.exists(file_path)
-            with open(file_path, 'a') as f:
-                if write_header:
-                    f.write(f"TIPO:INCLINOMETRIA\n")
-                    f.write(f"NOMBRE:{station_name}\n")
-                    f.write(f"IDENTIFICADOR:{station_number}\n")
-                    f.write("\n")
-                    f.write("FECHA\tTIEMPO\tX RADIAL\tY TANGENCIAL\tTEMPERATURA\tBATERIA\n")
-                    f.write("\t\tmicro radianes\tmicro radianes\tgrados centigrados\tvoltios\n")
-                
-                # Write data
-                date_str = today.strftime("%d/%m/%Y")
-                time_str = today.strftime("%H:%M:%S")
-                f.write(f"{date_str}\t{time_str}\t{incli_data['radial']}\t{incli_data['tangential']}\t{incli_data['temperature']}\t{incli_data['voltage']}\n")
-            
+        _write_record("INCLINOMETRIA", INCLINOMETER_HEADER, data, (
+            incli_data['radial'], incli_data['tangential'], incli_data['temperature'], incli_data['voltage'],
+        ))
     except (KeyError, IOError) as e:
         logging.getLogger(__name__).error(f"Error saving inclinometer data: {e}")
 
@@ -86,43 +148,17 @@ def save_pluviometer_data(data):
 
     Extracts pluviometer data from the parsed data dictionary, creates a
     directory structure (`<BASE_DIR>/PLUVIOMETRIA/<station_name>/`),
-    and appends a new line to a file named with the current date (YYYY-M-D.tsv).
+    and appends a new line to a file named with the record's date (YYYY-M-D.tsv).
+    The date and time written come from the record's source `timestamp`
+    (falling back to the current time when absent).
     If the file doesn't exist, it adds a multi-line header first.
 
     Args:
         data (dict): The dictionary of parsed data containing 'station_name',
-                     'station_number', and 'pluviometer' keys.
+                     'station_number', 'pluviometer' and optionally 'timestamp' keys.
     """
     try:
-        station_name = data['station_name']
-        station_number = data['station_number']
         pluvio_data = data['pluviometer']
-        
-        # Create directory
-        today = datetime.now()
-        dir_path = os.path.join(BASE_DIR, "PLUVIOMETRIA", station_name)
-        _ensure_dir_exists(dir_path)
-        
-        # File path
-        file_path = os.path.join(dir_path, today.strftime("%Y-%-m-%-d") + ".tsv")
-
-        # Guarded write to avoid race conditions across threads
-        lock = _get_file_lock(file_path)
-        with lock:
-            write_header = not os.path.exists(file_path)
-            with open(file_path, 'a') as f:
-                if write_header:
-                    f.write(f"TIPO:PLUVIOMETRIA\n")
-                    f.write(f"NOMBRE:{station_name}\n")
-                    f.write(f"IDENTIFICADOR:{station_number}\n")
-                    f.write("\n")
-                    f.write("FECHA\tTIEMPO\tNIVEL\tBATERIA\n")
-                    f.write("\t\tmilimetros\tvoltios\n")
-                
-                # Write data
-                date_str = today.strftime("%d/%m/%Y")
-                time_str = today.strftime("%H:%M:%S")
-                f.write(f"{date_str}\t{time_str}\t{pluvio_data['rain_level']}\t{pluvio_data['voltage']}\n")
-
+        _write_record("PLUVIOMETRIA", PLUVIOMETER_HEADER, data, (pluvio_data['rain_level'], pluvio_data['voltage']))
     except (KeyError, IOError) as e:
         logging.getLogger(__name__).error(f"Error saving pluviometer data: {e}")
@@ -0,0 +1,173 @@
+"""Event-driven detection of serial device nodes appearing under /dev.
+
+`DeviceWatcher` uses Linux inotify (through ctypes, no extra dependency) to
+watch the directories of the ports the serial supervisor is waiting for.
+When a node such as `/dev/ttyUSB0` or a udev symlink such as
+`/dev/serial/by-id/usb-FTDI...` is created, or its permissions are set,
+`wait` returns at once and the supervisor tries to reopen the port, instead
+of finding out at its next timed probe.
+
+A directory that does not exist yet (`/dev/serial/by-id` only exists while a
+USB serial adapter is plugged in) is covered by watching its nearest existing
+parent; the watches are refreshed on every `watch` call. Where inotify is not
+available (not Linux, or the watch limit is reached), `DeviceWatcher.create`
+returns None and the supervisor keeps probing on a timer.
+
+The directory is just a path, so tests can use a temporary directory
+standing in for /dev.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+from typing import Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# inotify(7) constants
+IN_ATTRIB = 0x00000004
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = IN_CREATE | IN_ATTRIB | IN_MOVED_TO | IN_ONLYDIR
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+_libc = _load_libc()
+
+
+def _existing_ancestor(path: str) -> str:
+    """`path` if it is a directory, else its nearest existing parent directory."""
+    path = os.path.abspath(path)
+    while not os.path.isdir(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+class DeviceWatcher:
+    """Watches the directories of device paths for newly created nodes.
+
+    Use `DeviceWatcher.create()`, which returns None where inotify is not
+    available.
+    """
+
+    def __init__(self, fd: int):
+        self._fd = fd
+        self._watches: Dict[str, int] = {}  # directory -> watch descriptor
+        self._directories: Dict[int, str] = {}  # watch descriptor -> directory
+
+    @classmethod
+    def create(cls) -> Optional["DeviceWatcher"]:
+        """A new watcher, or None if inotify is not available."""
+        if _libc is None:
+            return None
+        fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            logger.warning(f"inotify unavailable: {os.strerror(ctypes.get_errno())}")
+            return None
+        return cls(fd)
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def watch(self, paths: Iterable[str]) -> None:
+        """Watch the directories where `paths` will appear (replacing earlier watches)."""
+        wanted: Set[str] = {_existing_ancestor(os.path.dirname(os.path.abspath(p))) for p in paths}
+        for directory in list(self._watches):
+            if directory not in wanted:
+                wd = self._watches.pop(directory)
+                self._directories.pop(wd, None)
+                _libc.inotify_rm_watch(self._fd, wd)
+        for directory in wanted - set(self._watches):
+            wd = _libc.inotify_add_watch(self._fd, os.fsencode(directory), _WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                level = logging.WARNING if err == errno.ENOSPC else logging.DEBUG
+                logger.log(level, f"Cannot watch {directory}: {os.strerror(err)}")
+                continue
+            self._watches[directory] = wd
+            self._directories[wd] = directory
+
+    def watched(self) -> List[str]:
+        """Directories currently watched."""
+        return sorted(self._watches)
+
+    def wait(self, timeout: float) -> List[str]:
+        """Wait up to `timeout` seconds for changes.
+
+        Returns:
+            list[str]: Paths created, moved in or changed in the watched
+            directories (empty on timeout). After an event queue overflow the
+            watched directories themselves are returned.
+        """
+        try:
+            ready, _, _ = select.select([self._fd], [], [], max(0.0, timeout))
+        except (OSError, ValueError):
+            return []
+        if not ready:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        changed = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].split(b"\0", 1)[0]
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                changed.extend(self._watches)
+            elif mask & IN_IGNORED:
+                # The directory was removed; `watch` re-adds its parent
+                directory = self._directories.pop(wd, None)
+                if directory is not None:
+                    self._watches.pop(directory, None)
+            elif wd in self._directories and name:
+                changed.append(os.path.join(self._directories[wd], os.fsdecode(name)))
+        return changed
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+        self._watches.clear()
+        self._directories.clear()
+
+
+def affects(changed: Iterable[str], paths: Iterable[str]) -> bool:
+    """True if a changed path is one of `paths` or one of their parent directories."""
+    changed = [os.path.abspath(p) for p in changed]
+    for path in paths:
+        path = os.path.abspath(path)
+        for item in changed:
+            if path == item or path.startswith(item.rstrip(os.sep) + os.sep):
+                return True
+    return False
@@ -0,0 +1,235 @@
+"""On-demand profiling and diagnostic dumps for a running gateway.
+
+`main.py` wires these to signals so a lagging box can be inspected under
+real load without a restart:
+
+- SIGUSR1 → `toggle_profiler()`: starts a sampling profiler, or stops it and
+  writes its report. The profiler is a daemon thread that samples the stack
+  of every other thread (`sys._current_frames()`) every
+  `sample_interval_seconds`, so it sees the reader, batcher and sender
+  threads alike (cProfile would only see the thread it was enabled in). The
+  report (`profile-<timestamp>.txt`) lists the functions seen most often on
+  top of a stack (self) and anywhere in it (total); the raw samples are also
+  written in collapsed-stack format (`profile-<timestamp>.folded`) for flame
+  graph tools.
+- SIGUSR2 → `dump_diagnostics()`: writes the stack of every thread
+  (`threads-<timestamp>.txt`) and, if `tracemalloc` is tracing, the top-N
+  allocation sites (`tracemalloc-<timestamp>.txt`). The first dump starts
+  tracing when it was not enabled at startup, so the next one has data.
+
+Configuration (config.json → diagnostics): output_dir (default
+"./diagnostics"), sample_interval_seconds (0.01), tracemalloc_top (25),
+tracemalloc_frames (1), tracemalloc_at_startup (false).
+"""
+
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+from datetime import datetime
+from typing import Optional
+
+from config.app_config import APP_CONFIG
+
+logger = logging.getLogger(__name__)
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def get_diagnostics_options() -> dict:
+    """Options from `APP_CONFIG['diagnostics']`."""
+    cfg = APP_CONFIG.get("diagnostics", {}) if isinstance(APP_CONFIG, dict) else {}
+    return {
+        "output_dir": str(cfg.get("output_dir", "./diagnostics")),
+        "sample_interval": max(0.001, float(cfg.get("sample_interval_seconds", 0.01))),
+        "tracemalloc_top": int(cfg.get("tracemalloc_top", 25)),
+        "tracemalloc_frames": max(1, int(cfg.get("tracemalloc_frames", 1))),
+        "tracemalloc_at_startup": bool(cfg.get("tracemalloc_at_startup", False)),
+    }
+
+
+def _output_path(output_dir: str, prefix: str, extension: str) -> str:
+    os.makedirs(output_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(output_dir, f"{prefix}-{stamp}.{extension}")
+    suffix = 1
+    while os.path.exists(path):
+        path = os.path.join(output_dir, f"{prefix}-{stamp}-{suffix}.{extension}")
+        suffix += 1
+    return path
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples the stacks of all threads at a fixed interval.
+
+    Args:
+        interval (float): Seconds between samples.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples = 0
+        self.stacks = collections.Counter()  # tuple of labels (outermost first) -> count
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.started_at = None
+
+    def start(self) -> None:
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                stack.reverse()
+                self.stacks[tuple(stack)] += 1
+            self.samples += 1
+
+    def write_report(self, output_dir: str, top: int = 40) -> str:
+        """Write the text report and collapsed stacks; return the report path."""
+        report_path = _output_path(output_dir, "profile", "txt")
+        elapsed = time.monotonic() - (self.started_at or time.monotonic())
+        self_counts = collections.Counter()
+        total_counts = collections.Counter()
+        thread_counts = collections.Counter()
+        for stack, count in self.stacks.items():
+            thread_counts[stack[0]] += count
+            if len(stack) > 1:
+                self_counts[stack[-1]] += count
+            for label in set(stack[1:]):
+                total_counts[label] += count
+        stack_samples = sum(self.stacks.values()) or 1
+
+        with open(report_path, "w") as f:
+            f.write(f"Sampling profile: {self.samples} samples every {self.interval}s over {elapsed:.1f}s\n\n")
+            f.write("Samples per thread:\n")
+            for name, count in thread_counts.most_common():
+                f.write(f"  {count:>8}  {name}\n")
+            f.write(f"\nTop {top} functions by self samples (on top of the stack):\n")
+            for label, count in self_counts.most_common(top):
+                f.write(f"  {count:>8}  {100.0 * count / stack_samples:5.1f}%  {label}\n")
+            f.write(f"\nTop {top} functions by total samples (anywhere in the stack):\n")
+            for label, count in total_counts.most_common(top):
+                f.write(f"  {count:>8}  {100.0 * count / stack_samples:5.1f}%  {label}\n")
+
+        folded_path = report_path[:-len(".txt")] + ".folded"
+        with open(folded_path, "w") as f:
+            for stack, count in self.stacks.items():
+                f.write(";".join(label.replace(";", ":") for label in stack) + f" {count}\n")
+        return report_path
+
+
+def toggle_profiler() -> Optional[str]:
+    """Start the sampling profiler, or stop it and write its report.
+
+    Returns:
+        str | None: The report path when the profiler was stopped.
+    """
+    global _profiler
+    opts = get_diagnostics_options()
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = SamplingProfiler(opts["sample_interval"])
+            _profiler.start()
+            logger.info(f"Sampling profiler started (interval {opts['sample_interval']}s).")
+            return None
+        profiler, _profiler = _profiler, None
+    profiler.stop()
+    try:
+        path = profiler.write_report(opts["output_dir"])
+    except OSError as e:
+        logger.error(f"Could not write profiler report: {e}")
+        return None
+    logger.info(f"Sampling profiler stopped after {profiler.samples} samples. Report: {path}")
+    return path
+
+
+def dump_thread_stacks(output_dir: str) -> str:
+    """Write the current stack of every thread; return the file path."""
+    path = _output_path(output_dir, "threads", "txt")
+    frames = sys._current_frames()
+    with open(path, "w") as f:
+        for thread in threading.enumerate():
+            frame = frames.get(thread.ident)
+            f.write(f"Thread {thread.name} (id {thread.ident}, daemon={thread.daemon}):\n")
+            if frame is not None:
+                f.write("".join(traceback.format_stack(frame)))
+            f.write("\n")
+    return path
+
+
+def dump_tracemalloc(output_dir: str, top: int) -> Optional[str]:
+    """Write the top allocation sites if tracemalloc is tracing; return the file path."""
+    if not tracemalloc.is_tracing():
+        return None
+    snapshot = tracemalloc.take_snapshot()
+    snapshot = snapshot.filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+    stats = snapshot.statistics("traceback" if tracemalloc.get_traceback_limit() > 1 else "lineno")
+    current, peak = tracemalloc.get_traced_memory()
+    path = _output_path(output_dir, "tracemalloc", "txt")
+    with open(path, "w") as f:
+        f.write(f"Traced memory: current {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB\n")
+        f.write(f"Top {top} allocation sites:\n\n")
+        for index, stat in enumerate(stats[:top], 1):
+            f.write(f"#{index}: {stat.size / 1024:.1f} KiB in {stat.count} blocks\n")
+            for line in stat.traceback.format():
+                f.write(f"    {line}\n")
+    return path
+
+
+def dump_diagnostics() -> list:
+    """Write thread stacks and a tracemalloc snapshot; start tracing if it is off.
+
+    Returns:
+        list[str]: Paths of the files written.
+    """
+    opts = get_diagnostics_options()
+    paths = []
+    try:
+        paths.append(dump_thread_stacks(opts["output_dir"]))
+        tracemalloc_path = dump_tracemalloc(opts["output_dir"], opts["tracemalloc_top"])
+        if tracemalloc_path is not None:
+            paths.append(tracemalloc_path)
+        else:
+            tracemalloc.start(opts["tracemalloc_frames"])
+            logger.info("tracemalloc started; send SIGUSR2 again for an allocation snapshot.")
+    except OSError as e:
+        logger.error(f"Could not write diagnostics: {e}")
+    if paths:
+        logger.info(f"Diagnostics written: {', '.join(paths)}")
+    return paths
+
+
+def start_tracemalloc_if_configured() -> None:
+    """Start tracemalloc at startup when `tracemalloc_at_startup` is set."""
+    opts = get_diagnostics_options()
+    if opts["tracemalloc_at_startup"] and not tracemalloc.is_tracing():
+        tracemalloc.start(opts["tracemalloc_frames"])
@@ -0,0 +1,141 @@
+"""Reassembles sensor frames from a raw serial byte stream.
+
+Serial reads return arbitrary chunks: a frame may be split across reads, several
+frames may arrive in one read, and line noise can corrupt a frame midway.
+`FrameAssembler` keeps a reusable buffer, cuts complete
+`~<inclinometer>~~<pluviometer>~\\n` frames out of it and resynchronizes on the
+next `~` after garbage.
+
+The frame layout is used to scan safely: the separator is only searched for
+after the 10-byte inclinometer header and the line end only after the 9-byte
+pluviometer header, so binary header bytes such as 0x0A (station 10) do not
+end a frame early. A `~` inside the ASCII part of either sub-frame means a
+truncated frame was followed by a new one; the assembler drops the broken part
+and resumes at that `~`. A frame cut within a header hides the next frame's
+`~` among the header bytes, so a candidate is also rejected when its
+inclinometer ASCII part does not start right after the header (a
+non-printable byte in it): the
+assembler then resumes at the next `~` after the rejected start. Bytes that
+are discarded are counted in `dropped_bytes`.
+"""
+
+import re
+from typing import List
+
+from parsers.data_parser import INCLINOMETER_ASCII_START, PLUVIOMETER_ASCII_START
+
+_TILDE = 0x7E
+_CR = 0x0D
+# A byte that cannot be part of the ASCII values (binary header bytes, NUL, ...)
+_NOT_ASCII_RE = re.compile(rb'[^\x20-\x7e]')
+
+
+class FrameAssembler:
+    """Incremental `~...~~...~\\n` frame extractor with resync and drop counters.
+
+    Args:
+        max_frame_bytes (int): A candidate frame that grows beyond this size
+            without completing is treated as garbage.
+
+    Attributes:
+        frames (int): Number of complete frames returned so far.
+        dropped_bytes (int): Number of bytes discarded while resynchronizing.
+        resyncs (int): Number of times garbage was skipped.
+    """
+
+    def __init__(self, max_frame_bytes: int = 256):
+        self.max_frame_bytes = max(64, int(max_frame_bytes))
+        self._buf = bytearray()
+        self.frames = 0
+        self.dropped_bytes = 0
+        self.resyncs = 0
+
+    def pending(self) -> int:
+        """Number of buffered bytes belonging to an incomplete frame."""
+        return len(self._buf)
+
+    def reset(self) -> None:
+        """Discard any partial frame (e.g. after the port was reopened)."""
+        self._buf.clear()
+
+    def _drop(self, count: int) -> None:
+        if count > 0:
+            self.dropped_bytes += count
+            self.resyncs += 1
+
+    def feed(self, data) -> List[bytes]:
+        """Append received bytes and return every frame completed by them.
+
+        Args:
+            data (bytes | bytearray | memoryview): The chunk just read.
+
+        Returns:
+            list[bytes]: Complete frames including the trailing newline.
+        """
+        buf = self._buf
+        buf += data
+        frames = []
+        size = len(buf)
+        pos = 0
+        limit = self.max_frame_bytes
+
+        while pos < size:
+            start = buf.find(b'~', pos)
+            if start < 0:
+                self._drop(size - pos)
+                pos = size
+                break
+            if start > pos:
+                self._drop(start - pos)
+                pos = start
+
+            window_end = min(size, pos + limit)
+            separator = buf.find(b'~~', pos + INCLINOMETER_ASCII_START, window_end)
+            newline = -1
+            if separator >= 0:
+                newline = buf.find(b'\n', separator + 2 + PLUVIOMETER_ASCII_START, window_end)
+            if newline < 0:
+                if size - pos >= limit:
+                    self._drop(1)  # no frame starts here; resync on the next '~'
+                    pos += 1
+                    continue
+                break  # incomplete: wait for more data
+
+            # A '~' inside the inclinometer part: a new frame started there
+            restart = buf.find(b'~', pos + INCLINOMETER_ASCII_START, separator)
+            if restart >= 0:
+                self._drop(restart - pos)
+                pos = restart
+                continue
+
+            # Header bytes where the inclinometer values should be: cut within its header
+            if _NOT_ASCII_RE.search(buf, pos + INCLINOMETER_ASCII_START, separator) is not None:
+                restart = buf.find(b'~', pos + 1, newline)
+                if restart < 0:
+                    restart = newline + 1
+                self._drop(restart - pos)
+                pos = restart
+                continue
+
+            end = newline
+            if end > separator + 2 and buf[end - 1] == _CR:
+                end -= 1
+            if buf[end - 1] != _TILDE or end - 1 < separator + 2:
+                self._drop(newline + 1 - pos)  # corrupted line: skip it entirely
+                pos = newline + 1
+                continue
+
+            # A '~' inside the pluviometer part: truncated frame followed by a new one
+            restart = buf.find(b'~', separator + 2 + PLUVIOMETER_ASCII_START, end - 1)
+            if restart >= 0:
+                self._drop(restart - pos)
+                pos = restart
+                continue
+
+            frames.append(bytes(buf[pos:newline + 1]))
+            pos = newline + 1
+
+        if pos:
+            del buf[:pos]
+        self.frames += len(frames)
+        return frames
@@ -0,0 +1,354 @@
+"""Shared-memory table of the latest reading of every station.
+
+Local tools on the gateway (a status display, a watchdog, an alerting
+daemon) can read the current values without tailing `app.log` or the TSV
+archive: `process_data` publishes every parsed frame into a fixed-layout,
+memory-mapped file (by default in /dev/shm, so it never touches the SD card)
+with one slot per `station_number` (0-255).
+
+Layout (little-endian):
+
+- Header, 64 bytes: magic b"STZLATV1", version (u32), slot count (u32),
+  slot size (u32), header size (u32), writer pid (u64).
+- Slot `n` at `header_size + n * slot_size`: seqlock counter (u64), CRC-32 of
+  the payload (u32), padding (u32), then the payload: record sequence number
+  (u64), source timestamp (f64, epoch seconds), inclinometer radial,
+  tangential, temperature and voltage, pluviometer rain level and voltage
+  (6 x f64), station type, station number, network id (3 x u8) and the
+  station name (16 bytes UTF-8, NUL padded).
+
+Each slot is a seqlock: the single writer makes the counter odd, writes the
+payload and its CRC, then makes the counter even again. A reader copies the
+payload between two reads of the counter and retries if the counter was odd
+or changed; the CRC also catches a torn copy on CPUs that reorder stores
+(Python has no memory barriers). Readers take no lock and never block the
+writer. The record sequence number counts the frames published for the
+station and continues across restarts, as the writer reuses an existing file
+with the same layout (a file with another layout is replaced atomically).
+
+Reader API: `LatestValuesReader(path).read(station_number)` or `.snapshot()`.
+
+Command line (from the project root):
+    python -m utils.latest_values [--station N] [--path FILE]
+
+Configuration (config.json → latest_values): enabled (default False), path
+(default /dev/shm/serial_tilt_zbx_latest, or the temp directory when
+/dev/shm does not exist).
+"""
+
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from typing import Dict, NamedTuple, Optional
+
+from config.app_config import APP_CONFIG
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"STZLATV1"
+VERSION = 1
+SLOTS = 256  # station_number is one byte of the frame
+SLOT_SIZE = 128
+HEADER_SIZE = 64
+NAME_BYTES = 16
+
+_HEADER = struct.Struct("<8sIIIIQ")
+_SEQ = struct.Struct("<Q")
+_CRC = struct.Struct("<I")
+_PAYLOAD = struct.Struct("<Qd6dBBB16s")
+_PAYLOAD_OFFSET = 16
+FILE_SIZE = HEADER_SIZE + SLOTS * SLOT_SIZE
+
+
+class StationSnapshot(NamedTuple):
+    """A consistent copy of one station's slot."""
+
+    station_number: int
+    station_name: str
+    station_type: int
+    network_id: int
+    sequence: int  # frames published for this station
+    timestamp: float  # source time of the frame (epoch seconds)
+    radial: float
+    tangential: float
+    temperature: float
+    inclinometer_voltage: float
+    rain_level: float
+    pluviometer_voltage: float
+
+    def as_dict(self) -> dict:
+        """The values in the layout of the parsed data (plus `sequence`)."""
+        return {
+            "station_name": self.station_name,
+            "station_type": self.station_type,
+            "station_number": self.station_number,
+            "network_id": self.network_id,
+            "sequence": self.sequence,
+            "timestamp": self.timestamp,
+            "inclinometer": {
+                "radial": self.radial,
+                "tangential": self.tangential,
+                "temperature": self.temperature,
+                "voltage": self.inclinometer_voltage,
+            },
+            "pluviometer": {
+                "rain_level": self.rain_level,
+                "voltage": self.pluviometer_voltage,
+            },
+        }
+
+
+def default_path() -> str:
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, "serial_tilt_zbx_latest")
+
+
+def get_latest_values_options() -> dict:
+    """Options from `APP_CONFIG['latest_values']`."""
+    cfg = APP_CONFIG.get("latest_values", {}) if isinstance(APP_CONFIG, dict) else {}
+    return {
+        "enabled": bool(cfg.get("enabled", False)),
+        "path": str(cfg.get("path") or default_path()),
+    }
+
+
+def _slot_offset(station_number: int) -> int:
+    if not 0 <= station_number < SLOTS:
+        raise ValueError(f"station_number must be in 0..{SLOTS - 1}, got {station_number}")
+    return HEADER_SIZE + station_number * SLOT_SIZE
+
+
+def _valid_header(buffer) -> bool:
+    magic, version, slots, slot_size, header_size, _ = _HEADER.unpack_from(buffer, 0)
+    return (magic, version, slots, slot_size, header_size) == (MAGIC, VERSION, SLOTS, SLOT_SIZE, HEADER_SIZE)
+
+
+class LatestValuesTable:
+    """The writer side: publishes parsed frames into the memory-mapped file.
+
+    There must be one writer per file; concurrent `publish` calls of this
+    process are serialized.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._map = self._open(path)
+        self._sequences = [
+            _PAYLOAD.unpack_from(self._map, _slot_offset(n) + _PAYLOAD_OFFSET)[0] for n in range(SLOTS)
+        ]
+        _HEADER.pack_into(self._map, 0, MAGIC, VERSION, SLOTS, SLOT_SIZE, HEADER_SIZE, os.getpid())
+
+    @staticmethod
+    def _open(path: str) -> mmap.mmap:
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        try:
+            fd = os.open(path, os.O_RDWR)
+        except FileNotFoundError:
+            fd = -1
+        if fd >= 0:
+            try:
+                if os.fstat(fd).st_size == FILE_SIZE:
+                    mapped = mmap.mmap(fd, FILE_SIZE)
+                    if _valid_header(mapped):
+                        return mapped
+                    mapped.close()
+            finally:
+                os.close(fd)
+            logger.warning(f"Replacing {path}: it does not have the expected layout.")
+        # Build the file aside and rename it, so readers never map a partial header
+        fd, tmp_path = tempfile.mkstemp(prefix=".latest-", dir=directory)
+        try:
+            os.ftruncate(fd, FILE_SIZE)
+            os.pwrite(fd, _HEADER.pack(MAGIC, VERSION, SLOTS, SLOT_SIZE, HEADER_SIZE, os.getpid()), 0)
+            os.fchmod(fd, 0o644)
+            mapped = mmap.mmap(fd, FILE_SIZE)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        finally:
+            os.close(fd)
+        return mapped
+
+    def publish(self, parsed_data: dict) -> int:
+        """Write one parsed frame into its station's slot.
+
+        Returns:
+            int: The record sequence number of the station.
+        """
+        number = int(parsed_data["station_number"])
+        offset = _slot_offset(number)
+        incli = parsed_data["inclinometer"]
+        pluvio = parsed_data["pluviometer"]
+        with self._lock:
+            sequence = self._sequences[number] + 1
+            payload = _PAYLOAD.pack(
+                sequence,
+                float(parsed_data.get("timestamp") or time.time()),
+                incli["radial"], incli["tangential"], incli["temperature"], incli["voltage"],
+                pluvio["rain_level"], pluvio["voltage"],
+                int(parsed_data.get("station_type", 0)) & 0xFF,
+                number,
+                int(parsed_data.get("network_id", 0)) & 0xFF,
+                str(parsed_data.get("station_name", "")).encode("utf-8")[:NAME_BYTES],
+            )
+            seq = _SEQ.unpack_from(self._map, offset)[0]
+            _SEQ.pack_into(self._map, offset, seq | 1)  # odd: write in progress
+            _CRC.pack_into(self._map, offset + 8, zlib.crc32(payload))
+            self._map[offset + _PAYLOAD_OFFSET:offset + _PAYLOAD_OFFSET + _PAYLOAD.size] = payload
+            _SEQ.pack_into(self._map, offset, (seq | 1) + 1)
+            self._sequences[number] = sequence
+        return sequence
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._map.closed:
+                self._map.close()
+
+
+class LatestValuesReader:
+    """The reader side, for any process: lock-free consistent snapshots.
+
+    Args:
+        path (str | None): The table file (default from config.json).
+        retries (int): Attempts per slot while the writer is updating it.
+    """
+
+    def __init__(self, path: Optional[str] = None, retries: int = 100):
+        self.path = path or get_latest_values_options()["path"]
+        self.retries = max(1, int(retries))
+        with open(self.path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), FILE_SIZE, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        if not _valid_header(self._view):
+            self.close()
+            raise ValueError(f"{self.path} is not a latest-values table (version {VERSION})")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def writer_pid(self) -> int:
+        return _HEADER.unpack_from(self._view, 0)[5]
+
+    def read(self, station_number: int) -> Optional[StationSnapshot]:
+        """The latest values of one station, None if it never published.
+
+        Raises:
+            TimeoutError: If no consistent copy could be made in `retries` attempts.
+        """
+        offset = _slot_offset(station_number)
+        payload_at = offset + _PAYLOAD_OFFSET
+        view = self._view
+        for attempt in range(self.retries):
+            before = _SEQ.unpack_from(view, offset)[0]
+            if before == 0:
+                return None
+            if before & 1 == 0:
+                crc = _CRC.unpack_from(view, offset + 8)[0]
+                fields = _PAYLOAD.unpack_from(view, payload_at)
+                valid = zlib.crc32(view[payload_at:payload_at + _PAYLOAD.size]) == crc
+                if valid and _SEQ.unpack_from(view, offset)[0] == before:
+                    sequence, timestamp, *values, station_type, number, network_id, name = fields
+                    return StationSnapshot(
+                        number, name.rstrip(b"\0").decode("utf-8", "replace"), station_type, network_id,
+                        sequence, timestamp, *values,
+                    )
+            if attempt:
+                time.sleep(0)  # let the writer finish
+        raise TimeoutError(f"Slot {station_number} of {self.path} kept changing while being read")
+
+    def snapshot(self) -> Dict[int, StationSnapshot]:
+        """The latest values of every station that published, by station number."""
+        result = {}
+        for number in range(SLOTS):
+            entry = self.read(number)
+            if entry is not None:
+                result[number] = entry
+        return result
+
+    def close(self) -> None:
+        self._view.release()
+        self._map.close()
+
+
+_table: Optional[LatestValuesTable] = None
+_table_failed = False
+_table_lock = threading.Lock()
+
+
+def _get_table() -> Optional[LatestValuesTable]:
+    global _table, _table_failed
+    if _table is not None or _table_failed:
+        return _table
+    with _table_lock:
+        if _table is None and not _table_failed:
+            opts = get_latest_values_options()
+            if not opts["enabled"]:
+                _table_failed = True
+                return None
+            try:
+                _table = LatestValuesTable(opts["path"])
+                logger.info(f"Publishing latest station values to {opts['path']}")
+            except (OSError, ValueError) as e:
+                logger.error(f"Cannot create the latest-values table {opts['path']}: {e}")
+                _table_failed = True
+    return _table
+
+
+def publish_latest(parsed_data: dict) -> None:
+    """Publish a parsed frame to the shared table (if enabled)."""
+    table = _get_table()
+    if table is None:
+        return
+    try:
+        table.publish(parsed_data)
+    except (KeyError, TypeError, ValueError, struct.error) as e:
+        logger.error(f"Cannot publish latest values of {parsed_data.get('station_name')}: {e}")
+
+
+def close_latest_values() -> None:
+    """Unmap the table (the file stays for readers)."""
+    global _table, _table_failed
+    with _table_lock:
+        table, _table = _table, None
+        _table_failed = False
+    if table is not None:
+        table.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Print the latest values of every station as JSON lines.")
+    parser.add_argument("--station", type=int, default=None, help="only this station number")
+    parser.add_argument("--path", default=None, help="table file (default: latest_values.path from config.json)")
+    args = parser.parse_args(argv)
+    try:
+        reader = LatestValuesReader(args.path)
+    except (OSError, ValueError) as e:
+        print(f"Cannot open the latest-values table: {e}", file=sys.stderr)
+        return 1
+    with reader:
+        if args.station is not None:
+            entries = [reader.read(args.station)]
+        else:
+            entries = list(reader.snapshot().values())
+        for entry in filter(None, entries):
+            print(json.dumps(entry.as_dict()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
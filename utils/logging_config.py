@@ -3,38 +3,130 @@
 This module provides a centralized function to configure the root logger.
 It sets up logging to both a rotating file and the console (stdout), ensuring
 that log messages are captured and managed effectively.
+
+Log records are not written by the threads that emit them: the root logger
+only has a `QueueHandler` that puts each record on an in-memory queue, and a
+`QueueListener` thread formats them and writes them to the rotating file and
+the console. A reader thread therefore never waits on the SD card. If the
+queue is full (the disk stalls while something logs heavily), new records
+are dropped and counted instead of blocking the caller; the number dropped
+is reported once the queue has room again.
+
+Configuration (config.json): log_file ("app.log"), and under `logging`:
+level ("INFO"), queue_size (10000), summary_interval_seconds (60, see
+`utils.data_processor.start_port_summaries`).
 """
 
+import atexit
 import logging
+import queue
 import sys
-from logging.handlers import RotatingFileHandler
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
+
 from config.app_config import APP_CONFIG
 
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional["_DroppingQueueHandler"] = None
+_lock = threading.Lock()
+
+
+def get_logging_options() -> dict:
+    """Options from `APP_CONFIG['logging']` (and the top-level `log_file`)."""
+    cfg = APP_CONFIG.get("logging", {}) if isinstance(APP_CONFIG, dict) else {}
+    level = str(cfg.get("level", "INFO")).strip().upper()
+    if not isinstance(logging.getLevelName(level), int):
+        level = "INFO"
+    return {
+        "log_file": APP_CONFIG.get("log_file", "app.log") if isinstance(APP_CONFIG, dict) else "app.log",
+        "level": logging.getLevelName(level),
+        "queue_size": max(0, int(cfg.get("queue_size", 10000))),
+        "summary_interval": max(0.0, float(cfg.get("summary_interval_seconds", 60))),
+    }
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records when the queue is full instead of blocking."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._reported = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self.dropped != self._reported:
+            lost, self._reported = self.dropped - self._reported, self.dropped
+            notice = logging.LogRecord(
+                "utils.logging_config", logging.WARNING, __file__, 0,
+                "Log queue was full: %d log records dropped.", (lost,), None,
+            )
+            try:
+                self.queue.put_nowait(notice)
+            except queue.Full:
+                pass
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # The queue may be full at shutdown; wait for the listener to make room
+        self.queue.put(self._sentinel)
+
+
 def setup_logging():
     """Sets up the root logger with file and console handlers.
 
     This function configures the application's logging to output messages to both
     a rotating log file (`app.log` by default) and the standard output.
     The log file rotates when it reaches a certain size to prevent it from
-    growing indefinitely.
+    growing indefinitely. Both handlers run in a `QueueListener` thread; the
+    root logger only enqueues records. Calling it again has no effect.
 
     Configuration details (like log file name) are pulled from `APP_CONFIG`.
     """
-    log_formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-    log_file = APP_CONFIG.get("log_file", "app.log")
-
-    # Configure rotating file handler
-    file_handler = RotatingFileHandler(log_file, maxBytes=5*1024*1024, backupCount=5) # 5 MB per file, 5 backup files
-    file_handler.setFormatter(log_formatter)
-    file_handler.setLevel(logging.INFO)
-
-    # Configure stream handler for console output
-    stream_handler = logging.StreamHandler(sys.stdout)
-    stream_handler.setFormatter(log_formatter)
-    stream_handler.setLevel(logging.INFO)
-
-    # Get the root logger and add handlers
-    root_logger = logging.getLogger()
-    root_logger.setLevel(logging.INFO)
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(stream_handler)
+    global _listener, _queue_handler
+    with _lock:
+        if _listener is not None:
+            return
+        opts = get_logging_options()
+        log_formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+        # Configure rotating file handler
+        file_handler = RotatingFileHandler(opts["log_file"], maxBytes=5*1024*1024, backupCount=5) # 5 MB per file, 5 backup files
+        file_handler.setFormatter(log_formatter)
+        file_handler.setLevel(opts["level"])
+
+        # Configure stream handler for console output
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(log_formatter)
+        stream_handler.setLevel(opts["level"])
+
+        # Writes happen in the listener thread; the root logger only enqueues
+        log_queue = queue.Queue(maxsize=opts["queue_size"])
+        _queue_handler = _DroppingQueueHandler(log_queue)
+        _listener = _Listener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+        _listener.start()
+
+        root_logger = logging.getLogger()
+        root_logger.setLevel(opts["level"])
+        root_logger.addHandler(_queue_handler)
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Write the queued records, stop the listener thread and close the handlers."""
+    global _listener, _queue_handler
+    with _lock:
+        listener, handler = _listener, _queue_handler
+        _listener = _queue_handler = None
+    if listener is None:
+        return
+    logging.getLogger().removeHandler(handler)
+    listener.stop()
+    for target in listener.handlers:
+        target.close()
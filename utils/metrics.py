@@ -0,0 +1,376 @@
+"""Low-overhead runtime metrics with a Prometheus text endpoint.
+
+The pipeline stages update module-level metrics defined here (frames and
+bytes per port, parse results, sender latency and retries, spool traffic,
+TSV writes). Hot paths bind the labelled child once, so an update is a plain
+attribute addition. Updates take no lock: a lock made every update about
+seven times slower, while without it an update can only be lost if two
+threads update the same child at the same instant, which is acceptable for
+monitoring (counters still never decrease). See
+`benchmarks/bench_metrics.py` for the measured overhead.
+
+Metrics are exposed in the Prometheus text format (version 0.0.4) by a small
+HTTP server (`start_metrics_server`) and can also be converted into Zabbix
+items for a `<gateway>_SELF` host (`collect_items`, used by the sender's
+self-report thread).
+
+Configuration (config.json → metrics):
+- http_enabled (bool, default False), http_host (default "127.0.0.1"),
+  http_port (default 9108): the /metrics endpoint.
+- self_report_enabled (bool, default False), self_report_interval_seconds
+  (default 60), gateway_name (default: the machine's hostname): internal
+  items sent to `<gateway_name>_SELF`.
+"""
+
+import bisect
+import logging
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from config.app_config import APP_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers fast local sends up to retries with backoff
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value != value:
+        return "NaN"
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ("value", "function")
+
+    def __init__(self):
+        self.value = 0.0
+        self.function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Read the value from `function` at collection time."""
+        self.function = function
+
+    def get(self) -> float:
+        if self.function is not None:
+            try:
+                return float(self.function())
+            except Exception:
+                return float("nan")
+        return self.value
+
+
+class _HistogramChild:
+    __slots__ = ("_upper_bounds", "counts", "sum", "count")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self._upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self._upper_bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Return the child for these label values (bind it once on hot paths)."""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def children(self) -> List[Tuple[Tuple[str, ...], object]]:
+        with self._lock:
+            return list(self._children.items())
+
+    def reset(self) -> None:
+        """Drop every child (used by tests)."""
+        with self._lock:
+            self._children.clear()
+
+
+class Counter(_Metric):
+    """Monotonic counter."""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def render(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+            for key, child in self.children()
+        ]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, or be read from a function at collection time."""
+
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self.labels().set_function(function)
+
+    def render(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.get())}"
+            for key, child in self.children()
+        ]
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram (Prometheus semantics)."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, child in self.children():
+            counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """Ordered collection of metrics."""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def metrics(self) -> List[_Metric]:
+        with self._lock:
+            return list(self._metrics)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics():
+            samples = metric.render()
+            if not samples:
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# --- Pipeline metrics -------------------------------------------------------
+
+SERIAL_BYTES = counter("serial_bytes_total", "Bytes read from serial ports.", ("port",))
+SERIAL_FRAMES = counter("serial_frames_total", "Complete frames cut from the serial stream.", ("port",))
+SERIAL_DROPPED_BYTES = counter("serial_dropped_bytes_total", "Garbage bytes discarded while resynchronizing.", ("port",))
+SERIAL_QUEUE_DROPS = counter("serial_queue_dropped_frames_total", "Frames discarded because the frame processing queue was full.", ("port",))
+SERIAL_ERRORS = counter("serial_errors_total", "Failed opens or reads of serial ports.", ("port",))
+PARSED_FRAMES = counter("parser_frames_total", "Frames handled by the parser by result.", ("result",))
+SENDER_SECONDS = histogram("zabbix_send_seconds", "Latency of one Zabbix send call, retries included.", ("transport",))
+SENDER_ITEMS = counter("zabbix_sent_items_total", "Items handed to Zabbix by result.", ("result",))
+SENDER_RETRIES = counter("zabbix_send_retries_total", "Zabbix send retries after a failed attempt.", ("transport",))
+SPOOLED_ITEMS = counter("zabbix_spooled_items_total", "Items written to the spool journal.")
+SHED_ITEMS = counter("zabbix_shed_items_total", "Spooled items discarded by the spool limits, by reason.", ("reason",))
+DRAINED_ITEMS = counter("zabbix_drained_items_total", "Spooled items replayed to Zabbix.")
+SPOOL_PENDING_BYTES = gauge("zabbix_spool_pending_bytes", "Bytes in the spool journal not yet replayed.")
+ENDPOINT_ITEMS = counter("zabbix_endpoint_items_total", "Items sent to each Zabbix endpoint by result.", ("endpoint", "result"))
+ENDPOINT_SECONDS = histogram("zabbix_endpoint_send_seconds", "Latency of one send to a Zabbix endpoint, retries included.", ("endpoint",))
+ENDPOINT_SCORE = gauge("zabbix_endpoint_score", "Health score of each Zabbix endpoint in seconds (lower is better).", ("endpoint",))
+ENDPOINT_SPOOL_BYTES = gauge("zabbix_endpoint_spool_pending_bytes", "Bytes in each endpoint's spool journal not yet replayed.", ("endpoint",))
+BATCHER_QUEUE = gauge("zabbix_batcher_queue_size", "Submissions waiting in the Zabbix batcher queue.")
+TSV_RECORDS = counter("tsv_records_total", "Records appended to the TSV archive.", ("sensor",))
+TSV_FLUSHES = counter("tsv_flushes_total", "Flushes of TSV archive files.")
+TSV_OPEN_FILES = gauge("tsv_open_files", "TSV archive files currently kept open.")
+ARCHIVE_COMPRESSED = counter("archive_compressed_files_total", "Daily archive files compressed.", ("sensor",))
+ARCHIVE_DELETED = counter("archive_deleted_days_total", "Archive days deleted by the retention limits, by reason.", ("sensor", "reason"))
+
+
+# --- Self-report as Zabbix items -------------------------------------------
+
+def collect_items(host: str, make_item: Callable, timestamp: Optional[float] = None) -> list:
+    """Convert the current metric values into Zabbix items for `host`.
+
+    Keys are the metric names with label values as key parameters, e.g.
+    `serial_frames_total[/dev/ttyUSB0]`; histograms report `<name>_count` and
+    `<name>_sum`.
+    """
+    items = []
+
+    def key_for(name, values):
+        return f"{name}[{','.join(values)}]" if values else name
+
+    for metric in REGISTRY.metrics():
+        for values, child in metric.children():
+            if isinstance(child, _HistogramChild):
+                items.append(make_item(host, key_for(metric.name + "_count", values), child.count, timestamp))
+                items.append(make_item(host, key_for(metric.name + "_sum", values), round(child.sum, 6), timestamp))
+            elif isinstance(child, _GaugeChild):
+                items.append(make_item(host, key_for(metric.name, values), child.get(), timestamp))
+            else:
+                items.append(make_item(host, key_for(metric.name, values), child.value, timestamp))
+    return items
+
+
+def get_metrics_options() -> dict:
+    """Options from `APP_CONFIG['metrics']`."""
+    cfg = APP_CONFIG.get("metrics", {}) if isinstance(APP_CONFIG, dict) else {}
+    return {
+        "http_enabled": bool(cfg.get("http_enabled", False)),
+        "http_host": str(cfg.get("http_host", "127.0.0.1")),
+        "http_port": int(cfg.get("http_port", 9108)),
+        "self_report_enabled": bool(cfg.get("self_report_enabled", False)),
+        "self_report_interval": float(cfg.get("self_report_interval_seconds", 60)),
+        "gateway_name": str(cfg.get("gateway_name") or socket.gethostname()),
+    }
+
+
+# --- HTTP endpoint ----------------------------------------------------------
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"metrics endpoint: {format % args}")
+
+
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def start_metrics_server(host: Optional[str] = None, port: Optional[int] = None) -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics in a daemon thread if enabled (or when host/port are given).
+
+    Returns:
+        ThreadingHTTPServer | None: The running server, None when disabled or on error.
+    """
+    global _server
+    opts = get_metrics_options()
+    if host is None and port is None and not opts["http_enabled"]:
+        return None
+    if _server is not None:
+        return _server
+    host = opts["http_host"] if host is None else host
+    port = opts["http_port"] if port is None else port
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logger.error(f"Cannot start metrics endpoint on {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics-http")
+    thread.daemon = True
+    thread.start()
+    _server = server
+    logger.info(f"Metrics endpoint listening on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+def stop_metrics_server() -> None:
+    global _server
+    if _server is not None:
+        server, _server = _server, None
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,491 @@
+"""Multi-process runtime: serial readers and parsers sharded over worker processes.
+
+In the default runtime every stage (reading, frame assembly, parsing, TSV
+writing, Zabbix sending, logging) runs in threads of one Python process, so
+the GIL limits the gateway to one CPU core. With `worker_processes.enabled`,
+`main.py` instead:
+
+- splits the configured serial ports into shards, round-robin in config
+  order, one per worker process (`workers`, default one per CPU core except
+  the one left to the main process, at most one per port);
+- runs `utils.serial_reader.start_serial_readers` for its shard in each
+  worker, which assembles and parses the frames (`data_processor.parse_frame`)
+  and sends the parsed records in batches over a pipe;
+- stores and sends every record in the main process
+  (`data_processor.process_parsed_data`), which keeps the only TSV writer,
+  Zabbix sender, spool and metrics endpoint.
+
+Shutdown follows the `stop_event` semantics of the threaded runtime: the
+workers share one `multiprocessing.Event`. Setting the application stop event
+sets it, and a port whose `on_fail` is "stop_app" sets it in a worker, which
+stops the whole application. SIGINT is ignored by the workers (Ctrl-C goes
+through the main process) and SIGTERM stops only the worker that receives it,
+after it has sent its pending records. A worker that exits while the
+application is running is restarted after `restart_delay_seconds` (doubling
+on consecutive failures up to `max_restart_delay_seconds`).
+
+Worker logs are forwarded over the pipe to the main process's log handlers,
+and the serial and parser counters of the workers are added to the main
+process's metrics every `metrics_interval_seconds`. On SIGHUP the main
+process forwards the reload to the workers, which apply port changes within
+their shard; shards that gain a new port are restarted with it.
+
+Configuration (config.json → worker_processes): enabled (default False),
+workers (0 = automatic), batch_items (200), queue_size (10000),
+restart_delay_seconds (2), max_restart_delay_seconds (60),
+metrics_interval_seconds (5).
+"""
+
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from logging.handlers import QueueHandler
+from multiprocessing.connection import wait as wait_connections
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from config.app_config import APP_CONFIG
+from config.runtime_config import (
+    ConfigError,
+    add_reload_listener,
+    get_runtime_config,
+    reload_runtime_config,
+    remove_reload_listener,
+)
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Counters updated in the worker processes and forwarded to the main process
+_FORWARDED_METRICS = (
+    metrics.SERIAL_BYTES,
+    metrics.SERIAL_FRAMES,
+    metrics.SERIAL_DROPPED_BYTES,
+    metrics.SERIAL_ERRORS,
+    metrics.PARSED_FRAMES,
+)
+
+
+def get_worker_options() -> dict:
+    """Options from `APP_CONFIG['worker_processes']`."""
+    cfg = APP_CONFIG.get("worker_processes", {}) if isinstance(APP_CONFIG, dict) else {}
+    return {
+        "enabled": bool(cfg.get("enabled", False)),
+        "workers": max(0, int(cfg.get("workers", 0) or 0)),
+        "batch_items": max(1, int(cfg.get("batch_items", 200))),
+        "queue_size": max(1, int(cfg.get("queue_size", 10000))),
+        "restart_delay": max(0.0, float(cfg.get("restart_delay_seconds", 2))),
+        "max_restart_delay": max(0.0, float(cfg.get("max_restart_delay_seconds", 60))),
+        "metrics_interval": max(0.1, float(cfg.get("metrics_interval_seconds", 5))),
+    }
+
+
+def assign_shards(port_names: Sequence[str], workers: int) -> List[Tuple[str, ...]]:
+    """Split ports round-robin into at most `workers` non-empty shards."""
+    count = max(1, min(workers, len(port_names)))
+    return [tuple(port_names[index::count]) for index in range(count)] if port_names else []
+
+
+def _default_workers() -> int:
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+# --- Worker process ---------------------------------------------------------
+
+class _OutboxLogHandler(QueueHandler):
+    """Puts log records on the worker's outbox to be sent to the main process."""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(("log", record))
+        except queue.Full:
+            pass
+
+
+def _metrics_snapshot() -> Dict[Tuple[str, Tuple[str, ...]], float]:
+    return {
+        (metric.name, labels): child.value
+        for metric in _FORWARDED_METRICS
+        for labels, child in metric.children()
+    }
+
+
+class _WorkerStop:
+    """Stop signal of a worker: its own SIGTERM, or the application's shared event.
+
+    Setting it (a port with on_fail "stop_app") stops the whole application.
+    """
+
+    def __init__(self, shared):
+        self.shared = shared
+        self.local = threading.Event()
+
+    def is_set(self) -> bool:
+        return self.local.is_set() or self.shared.is_set()
+
+    def set(self) -> None:
+        self.shared.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.is_set():
+            remaining = 0.2 if deadline is None else min(0.2, deadline - time.monotonic())
+            if remaining <= 0:
+                break
+            self.local.wait(remaining)
+        return self.is_set()
+
+
+def _run_outbox(outbox: "queue.Queue", conn, batch_items: int, metrics_interval: float) -> None:
+    """Send the outbox to the main process in batches until the None sentinel."""
+    next_metrics = time.monotonic() + metrics_interval
+    done = False
+    while not done:
+        batch = []
+        try:
+            batch.append(outbox.get(timeout=max(0.0, next_metrics - time.monotonic())))
+            while len(batch) < batch_items:
+                batch.append(outbox.get_nowait())
+        except queue.Empty:
+            pass
+        if None in batch:
+            batch.remove(None)
+            done = True
+        if done or time.monotonic() >= next_metrics:
+            batch.append(("metrics", _metrics_snapshot()))
+            next_metrics = time.monotonic() + metrics_interval
+        if batch:
+            try:
+                conn.send(batch)
+            except (OSError, ValueError):
+                return  # The main process is gone
+
+
+def _worker_main(shard: int, port_names: Tuple[str, ...], conn, shared_stop, options: dict) -> None:
+    """Entry point of a worker process: read and parse the ports of one shard."""
+    # Imported here: the main process only needs them through its own imports
+    from utils.data_processor import parse_frame
+    from utils.serial_reader import start_serial_readers
+
+    stop_event = _WorkerStop(shared_stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.local.set())
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(
+            signal.SIGHUP,
+            lambda signum, frame: threading.Thread(target=reload_runtime_config, daemon=True).start(),
+        )
+
+    outbox = queue.Queue(maxsize=options["queue_size"])
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(_OutboxLogHandler(outbox))
+    root_logger.setLevel(options.get("log_level", logging.INFO))
+
+    sender = threading.Thread(
+        target=_run_outbox, args=(outbox, conn, options["batch_items"], options["metrics_interval"]),
+        name="shard-outbox", daemon=True,
+    )
+    sender.start()
+
+    def on_frame(raw_bytes, port_name, received_at=None, received_mono=None):
+        record = ("frame", port_name, parse_frame(raw_bytes, received_at, received_mono))
+        # Block the reader while the main process is behind, like a slow process_data would
+        while not stop_event.is_set():
+            try:
+                outbox.put(record, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    try:
+        get_runtime_config()
+        logger.info(f"Worker {shard} (pid {os.getpid()}) reading {', '.join(port_names)}")
+        start_serial_readers(stop_event, ports=frozenset(port_names), on_frame=on_frame)
+    except ConfigError as e:
+        logger.critical(f"Worker {shard} cannot load the configuration: {e}")
+    finally:
+        try:
+            outbox.put(None, timeout=5)
+        except queue.Full:
+            pass
+        sender.join(timeout=5)
+        conn.close()
+
+
+# --- Main process -----------------------------------------------------------
+
+class _Worker:
+    """State of one shard in the main process."""
+
+    def __init__(self, shard: int, port_names: Tuple[str, ...]):
+        self.shard = shard
+        self.port_names = port_names
+        self.process = None
+        self.conn = None
+        self.failures = 0  # consecutive exits, for the restart backoff
+        self.restart_at: Optional[float] = None
+        self.started_at = 0.0
+        self.counters: Dict[Tuple[str, Tuple[str, ...]], float] = {}  # last forwarded metric values
+
+
+class ShardedReaders:
+    """Runs the serial readers in worker processes and handles their records here.
+
+    Args:
+        stop_event (threading.Event): The application stop signal.
+        workers (int): Number of worker processes (0 = automatic).
+        on_record (callable | None): Called in the main process with
+            (parsed_data or None, port_name) for every frame. Defaults to
+            `data_processor.process_parsed_data`.
+        options (dict | None): Overrides of `get_worker_options()`.
+    """
+
+    def __init__(
+        self,
+        stop_event: threading.Event,
+        workers: int = 0,
+        on_record: Optional[Callable] = None,
+        options: Optional[dict] = None,
+    ):
+        if on_record is None:
+            from utils.data_processor import process_parsed_data
+
+            on_record = process_parsed_data
+        self.stop_event = stop_event
+        self.options = dict(get_worker_options(), **(options or {}))
+        self.options["log_level"] = logging.getLogger().getEffectiveLevel()
+        self.workers = workers or self.options["workers"] or _default_workers()
+        self.on_record = on_record
+        self._context = multiprocessing.get_context("spawn")
+        self._shared_stop = self._context.Event()
+        self._shards: List[_Worker] = []
+        self._lock = threading.Lock()
+
+    # -- worker lifecycle
+
+    def _spawn(self, worker: _Worker) -> None:
+        receiver, sender = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=_worker_main,
+            args=(worker.shard, worker.port_names, sender, self._shared_stop, self.options),
+            name=f"shard-{worker.shard}",
+            daemon=True,
+        )
+        process.start()
+        sender.close()  # Only the worker writes: EOF on the receiver when it exits
+        worker.process, worker.conn = process, receiver
+        worker.restart_at = None
+        worker.started_at = time.monotonic()
+        worker.counters = {}
+
+    def _stop_worker(self, worker: _Worker, timeout: float = 5.0) -> None:
+        """Stop one worker, handling the records it sends until it exits."""
+        process = worker.process
+        if process is None:
+            return
+        process.terminate()
+        deadline = time.monotonic() + timeout
+        while process.is_alive() and time.monotonic() < deadline:
+            wait_connections([worker.conn, process.sentinel], 0.2)
+            self._receive(worker)
+        if process.is_alive():
+            process.kill()
+        process.join(1)
+        self._receive(worker)
+        worker.process = None
+        worker.conn = None
+
+    def pids(self) -> Dict[int, Optional[int]]:
+        """Process id of each shard's worker (None while it is restarting)."""
+        with self._lock:
+            return {
+                worker.shard: worker.process.pid if worker.process is not None and worker.process.is_alive() else None
+                for worker in self._shards
+            }
+
+    def shards(self) -> List[Tuple[str, ...]]:
+        with self._lock:
+            return [worker.port_names for worker in self._shards]
+
+    # -- records from the workers
+
+    def _apply_metrics(self, worker: _Worker, snapshot: dict) -> None:
+        by_name = {metric.name: metric for metric in _FORWARDED_METRICS}
+        for (name, labels), value in snapshot.items():
+            delta = value - worker.counters.get((name, labels), 0.0)
+            worker.counters[(name, labels)] = value
+            if delta > 0 and name in by_name:
+                by_name[name].labels(*labels).inc(delta)
+
+    def _handle(self, worker: _Worker, batch: list) -> None:
+        for message in batch:
+            kind = message[0]
+            if kind == "frame":
+                try:
+                    self.on_record(message[2], message[1])
+                except Exception as e:
+                    logger.error(f"Error handling a record from {message[1]}: {e}")
+            elif kind == "log":
+                record = message[1]
+                record_logger = logging.getLogger(record.name)
+                if record_logger.isEnabledFor(record.levelno):
+                    record_logger.handle(record)
+            elif kind == "metrics":
+                self._apply_metrics(worker, message[1])
+
+    def _receive(self, worker: _Worker) -> bool:
+        """Handle every batch waiting on the worker's pipe; False at EOF."""
+        conn = worker.conn
+        if conn is None:
+            return False
+        try:
+            while conn.poll():
+                self._handle(worker, conn.recv())
+        except (EOFError, OSError):
+            return False
+        return True
+
+    # -- main loop
+
+    def _on_exit(self, worker: _Worker) -> None:
+        self._receive(worker)
+        process = worker.process
+        worker.process.join(1)
+        worker.process = None
+        worker.conn = None
+        if self.stop_event.is_set() or self._shared_stop.is_set():
+            return
+        # A worker that ran for a while starts over with the shortest delay
+        if time.monotonic() - worker.started_at > self.options["max_restart_delay"]:
+            worker.failures = 0
+        delay = min(self.options["restart_delay"] * (2 ** worker.failures), self.options["max_restart_delay"])
+        worker.failures += 1
+        worker.restart_at = time.monotonic() + delay
+        logger.error(
+            f"Worker {worker.shard} ({', '.join(worker.port_names)}) exited with code "
+            f"{process.exitcode}. Restarting in {delay:.1f}s."
+        )
+
+    def _apply_reload(self, old, new, diff) -> None:
+        """Forward a reload to the workers; restart the shards that get new ports."""
+        with self._lock:
+            owned = {name for worker in self._shards for name in worker.port_names}
+            added = [pcfg["port"] for pcfg in diff.ports_added if pcfg["port"] not in owned]
+            restart = set()
+            if added:
+                if not self._shards:
+                    self._shards.append(_Worker(0, ()))
+                for name in added:
+                    worker = min(self._shards, key=lambda w: len(w.port_names))
+                    worker.port_names = worker.port_names + (name,)
+                    restart.add(worker.shard)
+            for worker in self._shards:
+                worker.port_names = tuple(name for name in worker.port_names if name not in diff.ports_removed)
+            for worker in self._shards:
+                if worker.shard in restart:
+                    logger.info(f"Restarting worker {worker.shard} for its new ports: {', '.join(worker.port_names)}")
+                    self._stop_worker(worker)
+                    worker.failures = 0
+                    worker.restart_at = time.monotonic()
+                elif worker.process is not None and worker.process.is_alive() and hasattr(signal, "SIGHUP"):
+                    os.kill(worker.process.pid, signal.SIGHUP)
+
+    def run(self) -> None:
+        """Start the workers and handle their records until the application stops."""
+        port_names = [pcfg["port"] for pcfg in get_runtime_config().serial_ports]
+        with self._lock:
+            self._shards = [_Worker(index, shard) for index, shard in enumerate(assign_shards(port_names, self.workers))]
+            for worker in self._shards:
+                self._spawn(worker)
+        logger.info(
+            f"Serial reader engine: {len(self._shards)} worker processes "
+            f"({', '.join('[' + ', '.join(w.port_names) + ']' for w in self._shards)})."
+        )
+        add_reload_listener(self._apply_reload)
+        try:
+            while not self.stop_event.is_set():
+                if self._shared_stop.is_set():
+                    logger.critical("A worker process requested the application to stop.")
+                    self.stop_event.set()
+                    break
+                self._poll(0.5)
+        finally:
+            remove_reload_listener(self._apply_reload)
+            self._shutdown()
+
+    def _poll(self, timeout: float) -> None:
+        with self._lock:
+            now = time.monotonic()
+            for worker in self._shards:
+                if worker.process is None and worker.restart_at is not None and now >= worker.restart_at:
+                    if worker.port_names:
+                        self._spawn(worker)
+                    else:
+                        worker.restart_at = None
+            running = [worker for worker in self._shards if worker.process is not None]
+        waitables = {}
+        for worker in running:
+            waitables[worker.conn] = worker
+            waitables[worker.process.sentinel] = worker
+        if not waitables:
+            self.stop_event.wait(timeout)
+            return
+        ready = wait_connections(list(waitables), timeout)
+        with self._lock:
+            exited = []
+            for item in ready:
+                worker = waitables[item]
+                if worker.process is None:
+                    continue
+                if item is worker.conn:
+                    if not self._receive(worker) and worker not in exited:
+                        exited.append(worker)
+                elif worker not in exited:
+                    exited.append(worker)
+            for worker in exited:
+                worker.process.join(1)
+                if worker.process.is_alive():
+                    # The pipe closed but the process is still exiting
+                    continue
+                self._on_exit(worker)
+
+    def _shutdown(self, timeout: float = 5.0) -> None:
+        """Stop every worker, handling the records they send until they exit."""
+        self._shared_stop.set()
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            workers = [worker for worker in self._shards if worker.process is not None]
+        while workers and time.monotonic() < deadline:
+            wait_connections([w.conn for w in workers] + [w.process.sentinel for w in workers], 0.2)
+            for worker in list(workers):
+                self._receive(worker)
+                if not worker.process.is_alive():
+                    self._receive(worker)
+                    workers.remove(worker)
+        for worker in workers:
+            logger.warning(f"Worker {worker.shard} did not stop within {timeout:.0f}s; killing it.")
+            worker.process.kill()
+            worker.process.join(1)
+        with self._lock:
+            for worker in self._shards:
+                worker.process = None
+                worker.conn = None
+        logger.info("Worker processes stopped.")
+
+
+def worker_processes_enabled() -> bool:
+    return get_worker_options()["enabled"]
+
+
+def start_sharded_readers(stop_event: threading.Event) -> None:
+    """Run the serial readers in worker processes until `stop_event` is set.
+
+    The counterpart of `utils.serial_reader.start_serial_readers` for the
+    multi-process runtime; the records are stored and sent in this process.
+    """
+    ShardedReaders(stop_event).run()
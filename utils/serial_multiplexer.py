@@ -0,0 +1,288 @@
+"""Single event-loop serial reader for many ports.
+
+`SerialMultiplexer` registers the file descriptor of every open serial port
+with a `selectors` loop and reads all of them from one thread, instead of one
+OS thread per port. Each port keeps its own `FrameAssembler`, so frames are
+cut exactly like the threaded reader does.
+
+The loop only reads and assembles: complete frames go through a bounded
+queue (`frame_queue_size`) to one processing thread that calls
+`process_data` (parsing, TSV writes, Zabbix submit). A slow Zabbix send,
+with its retries and backoff, therefore never stops the reading of the
+ports, so their kernel buffers do not overflow. If the queue is full, new
+frames are discarded and counted per port.
+
+Failure handling is shared with `utils.serial_reader`: the per-port retry
+policy (max_retries, retry_delay, on_fail) is applied by
+`_handle_port_failure`, ports that exhaust their retries with on_fail
+"disable" are recorded in `DISABLED_PORTS` for the supervisor, and the
+supervisor re-enables them by calling `add_port` again. Retries are scheduled
+as timers in the loop rather than blocking sleeps.
+
+Selection requires real file descriptors, so this engine is POSIX only.
+"""
+
+import logging
+import os
+import queue
+import selectors
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import serial
+
+from utils.data_processor import process_data
+from utils.frame_assembler import FrameAssembler
+from utils.metrics import SERIAL_BYTES, SERIAL_DROPPED_BYTES, SERIAL_FRAMES, SERIAL_QUEUE_DROPS
+from utils.serial_reader import (
+    _get_reader_options,
+    _get_retry_policy,
+    _handle_port_failure,
+    _open_serial,
+)
+
+logger = logging.getLogger(__name__)
+
+# Upper bound for one select() call, so a stop request is noticed promptly
+_MAX_WAIT = 0.5
+
+# Ends the frame processing thread
+_STOP = object()
+
+
+class _PortState:
+    """Book-keeping for one port handled by the multiplexer."""
+
+    __slots__ = (
+        "config", "name", "policy", "attempts", "ser", "assembler", "reported_drops", "retry_at",
+        "bytes_metric", "frames_metric", "dropped_metric", "queue_drops_metric",
+    )
+
+    def __init__(self, config: dict, max_frame_bytes: int):
+        self.config = dict(config)
+        self.name = config["port"]
+        self.policy = _get_retry_policy(config)
+        self.attempts = 0
+        self.ser = None
+        self.assembler = FrameAssembler(max_frame_bytes)
+        self.reported_drops = 0
+        self.retry_at = 0.0  # monotonic time of the next open attempt
+        self.bytes_metric = SERIAL_BYTES.labels(self.name)
+        self.frames_metric = SERIAL_FRAMES.labels(self.name)
+        self.dropped_metric = SERIAL_DROPPED_BYTES.labels(self.name)
+        self.queue_drops_metric = SERIAL_QUEUE_DROPS.labels(self.name)
+
+
+class SerialMultiplexer:
+    """Reads every registered serial port from a single `selectors` loop.
+
+    Args:
+        stop_event (threading.Event | None): Shared stop signal; `run` returns
+            once it is set.
+        on_frame (callable | None): Frame handler with the signature of
+            `process_data`. Defaults to `process_data`. It runs in the frame
+            processing thread, not in the loop.
+    """
+
+    def __init__(self, stop_event: Optional[threading.Event] = None, on_frame: Optional[Callable] = None):
+        self.stop_event = stop_event or threading.Event()
+        self._on_frame = on_frame or process_data
+        options = _get_reader_options()
+        self._max_frame_bytes = options["max_frame_bytes"]
+        self._poll_interval = options["poll_interval"]
+        self._frames: queue.Queue = queue.Queue(maxsize=options["frame_queue_size"])
+        self._queue_full = False
+        self._selector = selectors.DefaultSelector()
+        self._ports: Dict[str, _PortState] = {}
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+
+    # ------------------------------------------------------------- public API
+
+    def add_port(self, port_config: dict) -> None:
+        """Register a port (thread-safe). It is opened on the next loop iteration."""
+        with self._pending_lock:
+            self._pending.append(("add", dict(port_config)))
+        self._wake()
+
+    def remove_port(self, port_name: str) -> None:
+        """Close and forget a port (thread-safe)."""
+        with self._pending_lock:
+            self._pending.append(("remove", port_name))
+        self._wake()
+
+    def port_names(self):
+        """Names of the ports currently handled (open or waiting to retry)."""
+        return list(self._ports)
+
+    def run(self) -> None:
+        """Run the event loop until `stop_event` is set, then close every port.
+
+        The frames still queued are processed before returning.
+        """
+        processor = threading.Thread(target=self._process_frames, name="mux-frames", daemon=True)
+        processor.start()
+        try:
+            while not self.stop_event.is_set():
+                self._apply_pending()
+                self._open_due_ports()
+                events = self._selector.select(self._next_timeout())
+                got_data = False
+                got_frames = False
+                for key, _ in events:
+                    if key.data is None:
+                        self._drain_wake_pipe()
+                        continue
+                    state = key.data
+                    frames = self._read_port(state)
+                    got_data = True
+                    got_frames = got_frames or bool(frames)
+                if got_data and not got_frames and self._poll_interval > 0:
+                    # Only partial frames: let more bytes accumulate before the next wakeup
+                    time.sleep(self._poll_interval)
+        finally:
+            for state in list(self._ports.values()):
+                self._close_port(state)
+            self._ports.clear()
+            self._selector.close()
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+            try:
+                self._frames.put(_STOP, timeout=10)  # the processing thread is draining
+                processor.join(timeout=10)
+            except queue.Full:
+                pass
+            if processor.is_alive():
+                logger.warning("Frame processing did not finish within timeout; queued frames may be lost.")
+
+    # -------------------------------------------------------------- internals
+
+    def _process_frames(self) -> None:
+        while True:
+            entry = self._frames.get()
+            if entry is _STOP:
+                return
+            raw_bytes, port_name, received_at, received_mono = entry
+            try:
+                self._on_frame(raw_bytes, port_name, received_at, received_mono)
+            except Exception as e:
+                logger.error("Error processing frame from %s: %s", port_name, e)
+
+    def _wake(self) -> None:
+        try:
+            os.write(self._wake_w, b"\0")
+        except (BlockingIOError, OSError):
+            pass  # pipe full (a wakeup is already pending) or closed
+
+    def _drain_wake_pipe(self) -> None:
+        try:
+            while os.read(self._wake_r, 512):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def _apply_pending(self) -> None:
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+        for action, arg in pending:
+            if action == "add":
+                if arg["port"] in self._ports:
+                    continue
+                self._ports[arg["port"]] = _PortState(arg, self._max_frame_bytes)
+            elif action == "remove":
+                state = self._ports.pop(arg, None)
+                if state is not None:
+                    self._close_port(state)
+                    logger.info(f"Stopped reading port {arg}")
+
+    def _next_timeout(self) -> float:
+        now = time.monotonic()
+        timeout = _MAX_WAIT
+        for state in self._ports.values():
+            if state.ser is None:
+                timeout = min(timeout, max(0.0, state.retry_at - now))
+        return timeout
+
+    def _open_due_ports(self) -> None:
+        now = time.monotonic()
+        for state in list(self._ports.values()):
+            if state.ser is not None or state.retry_at > now:
+                continue
+            try:
+                ser = _open_serial(state.config, timeout=0)
+            except Exception as e:
+                self._on_port_failure(state, e)
+                continue
+            state.ser = ser
+            state.attempts = 0  # reset attempts after a successful open
+            state.assembler.reset()
+            self._selector.register(ser.fileno(), selectors.EVENT_READ, state)
+            logger.info(f"Successfully opened port {state.name}")
+
+    def _read_port(self, state: _PortState):
+        try:
+            chunk = state.ser.read(state.ser.in_waiting or 1)
+        except Exception as e:
+            self._on_port_failure(state, e)
+            return []
+        received_at = time.time()
+        received_mono = time.monotonic()
+        if not chunk:
+            return []
+        state.bytes_metric.inc(len(chunk))
+        assembler = state.assembler
+        frames = assembler.feed(chunk)
+        if frames:
+            state.frames_metric.inc(len(frames))
+        for raw_bytes in frames:
+            try:
+                self._frames.put_nowait((raw_bytes, state.name, received_at, received_mono))
+                self._queue_full = False
+            except queue.Full:
+                state.queue_drops_metric.inc()
+                if not self._queue_full:
+                    self._queue_full = True
+                    logger.warning(
+                        f"Frame processing queue is full ({self._frames.maxsize} frames): discarding new frames."
+                    )
+        if assembler.dropped_bytes != state.reported_drops:
+            state.dropped_metric.inc(assembler.dropped_bytes - state.reported_drops)
+            if logger.isEnabledFor(logging.DEBUG):
+                # Reported per port in the periodic summary (utils.data_processor)
+                logger.debug(
+                    "Dropped %d garbage bytes on %s while resynchronizing (total %d, frames %d).",
+                    assembler.dropped_bytes - state.reported_drops, state.name,
+                    assembler.dropped_bytes, assembler.frames,
+                )
+            state.reported_drops = assembler.dropped_bytes
+        return frames
+
+    def _close_port(self, state: _PortState) -> None:
+        if state.ser is None:
+            return
+        try:
+            self._selector.unregister(state.ser.fileno())
+        except (KeyError, ValueError, OSError):
+            pass
+        try:
+            state.ser.close()
+        except Exception:
+            pass
+        state.ser = None
+
+    def _on_port_failure(self, state: _PortState, error: Exception) -> None:
+        self._close_port(state)
+        state.attempts += 1
+        unexpected = not isinstance(error, serial.SerialException)
+        action = _handle_port_failure(
+            state.config, state.policy, state.attempts, error, self.stop_event, unexpected=unexpected
+        )
+        if action == "retry":
+            state.retry_at = time.monotonic() + state.policy["retry_delay"]
+        else:
+            self._ports.pop(state.name, None)
@@ -2,28 +2,51 @@
 
 This module:
 - Creates a thread per serial port from configuration.
-- Reads data continuously and passes raw bytes to the data processor.
+- Reads data continuously in bulk chunks, reassembles `~...~~...~` frames
+  (see `utils.frame_assembler`) and passes them to the data processor.
 - Handles errors with a configurable retry policy (global and per-port):
   - max attempts, delay between attempts, and on-fail action
     (keep retrying | disable thread | stop app).
-- Maintains a supervisor that probes disabled ports periodically and
-  re-enables them when available.
+- Maintains a supervisor that re-enables disabled ports when they become
+  available again: on Linux as soon as their device node appears under /dev
+  (inotify, see `utils.device_watcher`), with a timed probe as a fallback.
 
 Configuration (config.json):
 - serial_ports: list of port dicts (port, baudrate, bytesize, parity, stopbits, timeout).
   Optional per-port overrides: max_retries, retry_delay, on_fail.
 - serial_retry: { max_attempts, delay_seconds, on_fail } defaults for retries.
-- serial_supervisor: { auto_reenable, reenable_interval_seconds } controls the supervisor.
+- serial_supervisor: { auto_reenable, reenable_interval_seconds, device_watch,
+  fallback_probe_interval_seconds } controls the supervisor.
+- serial_reader: { engine, max_frame_bytes, poll_interval_seconds } selects the
+  reader engine ("threads": one thread per port, "selector": one event loop for
+  all ports, see `utils.serial_multiplexer`), frame assembly limits, and how
+  long to let bytes accumulate while a frame is incomplete.
+
+Ports and their retry policies come from the validated runtime configuration
+(`config.runtime_config`). When it is reloaded (SIGHUP), only the readers of
+ports that were removed or whose settings changed are stopped, and only new
+or changed ports are (re)started; the other ports keep reading.
 """
 
 import logging
+import os
 import serial
 import threading
 import time
 
-from config.serial_config import SERIAL_PORTS
 from config.app_config import APP_CONFIG
+from config.runtime_config import (
+    add_reload_listener,
+    derive_retry_policy,
+    get_runtime_config,
+    remove_reload_listener,
+)
 from utils.data_processor import process_data
+from utils.device_watcher import DeviceWatcher, affects
+from utils.frame_assembler import FrameAssembler
+from utils.metrics import SERIAL_BYTES, SERIAL_DROPPED_BYTES, SERIAL_ERRORS, SERIAL_FRAMES
+
+ENGINES = ("threads", "selector")
 
 # Supervisor state for disabled ports
 _disabled_ports_lock = threading.Lock()
@@ -42,13 +65,100 @@ def _mark_port_disabled(port_config, reason: str = "") -> None:
     logger.warning(f"Port {port_config['port']} marked as disabled. Reason: {reason}")
 
 
-def read_serial_port(port_config, stop_event=None):
+def _open_serial(port_config, timeout=None):
+    """Open a serial port from a port config dict (optionally overriding the timeout)."""
+    return serial.Serial(
+        port=port_config["port"],
+        baudrate=port_config["baudrate"],
+        bytesize=port_config["bytesize"],
+        parity=port_config["parity"],
+        stopbits=port_config["stopbits"],
+        timeout=port_config["timeout"] if timeout is None else timeout,
+    )
+
+
+def _get_retry_policy(port_config):
+    """Retry policy of a port: precomputed in the runtime config for configured
+    ports, else derived from per-port overrides and the `serial_retry` defaults.
+
+    Returns:
+        Mapping: {"max_retries": int (0 = infinite), "retry_delay": int, "on_fail": str}
+    """
+    config = get_runtime_config()
+    policy = config.retry_policies.get(port_config["port"])
+    if policy is None:
+        policy = derive_retry_policy(port_config, config.section("serial_retry"))
+    return policy
+
+
+def _get_reader_options() -> dict:
+    """Frame assembly and engine options from `APP_CONFIG['serial_reader']`."""
+    reader_cfg = APP_CONFIG.get("serial_reader", {}) if isinstance(APP_CONFIG, dict) else {}
+    engine = str(reader_cfg.get("engine", "threads")).strip().lower()
+    if engine not in ENGINES:
+        logging.getLogger(__name__).warning(f"Unknown serial_reader engine '{engine}'. Using 'threads'.")
+        engine = "threads"
+    return {
+        "engine": engine,
+        "max_frame_bytes": int(reader_cfg.get("max_frame_bytes", 256)),
+        "poll_interval": float(reader_cfg.get("poll_interval_seconds", 0.01)),
+        "frame_queue_size": max(1, int(reader_cfg.get("frame_queue_size", 10000))),
+    }
+
+
+def _handle_port_failure(port_config, policy, attempts, error, stop_event=None, unexpected=False) -> str:
+    """Apply the retry policy after a failed open/read and return the action to take.
+
+    Returns:
+        str: "retry" (wait `retry_delay` and try again), "disable" (the port was
+        marked disabled for the supervisor) or "stop" (the app stop signal was set).
+
+    Raises:
+        SystemExit: When on_fail asks to stop the app and there is no stop_event.
+    """
+    logger = logging.getLogger(__name__)
+    port_name = port_config["port"]
+    max_retries = policy["max_retries"]
+    on_fail = policy["on_fail"]
+    SERIAL_ERRORS.labels(port_name).inc()
+
+    if unexpected:
+        logger.critical(f"An unexpected error occurred on port {port_name}: {error}")
+    else:
+        logger.error(
+            f"Error with port {port_name}: {error} (attempt {attempts}{'/' + str(max_retries) if max_retries > 0 else ''})"
+        )
+    suffix = " after unexpected error" if unexpected else ""
+    if max_retries > 0 and attempts >= max_retries:
+        if on_fail in ("stop_app", "exit_app", "exit"):
+            logger.critical(f"Max retries reached for {port_name}{suffix}. Stopping application as configured.")
+            if stop_event is not None:
+                stop_event.set()
+                return "stop"
+            raise SystemExit(1)
+        elif on_fail in ("disable", "disable_thread", "stop_thread"):
+            logger.error(f"Max retries reached for {port_name}{suffix}. Disabling this port's reader.")
+            _mark_port_disabled(port_config, reason=str(error))
+            return "disable"
+        else:
+            logger.warning(
+                f"Max retries reached for {port_name}{suffix}. Continuing to retry indefinitely as configured."
+            )
+    logger.info(f"Retrying to connect to {port_name} in {policy['retry_delay']} seconds...")
+    return "retry"
+
+
+def read_serial_port(port_config, stop_event=None, on_frame=None, port_stop=None):
     """Read from a single serial port in a loop with configurable retries.
 
-    Opens the port, reads line-by-line, and dispatches to `process_data`.
+    Opens the port, reads whatever bytes are waiting in bulk, cuts complete
+    frames out of them with a `FrameAssembler` (resynchronizing after garbage
+    and reporting dropped bytes), and dispatches each frame to `process_data`
+    together with the wall-clock and monotonic time at which the data arrived.
     On open/read error, applies retry policy derived from:
     - Per-port overrides in `port_config`: max_retries, retry_delay, on_fail.
     - Global defaults in `APP_CONFIG['serial_retry']` when overrides are absent.
+    The policy is resolved once, when the runtime configuration is built.
 
     Behavior:
     - Attempts counter resets after a successful open.
@@ -61,151 +171,267 @@ def read_serial_port(port_config, stop_event=None):
     Args:
         port_config (dict): Serial parameters; may include retry overrides.
         stop_event (threading.Event | None): Optional shared stop signal.
+        on_frame (callable | None): Frame handler with the signature of
+            `process_data` (raw_bytes, port_name, received_at, received_mono).
+            Defaults to `process_data`.
+        port_stop (threading.Event | None): Stops only this reader (used when a
+            reload removes or changes the port). The frames of the last read
+            are still dispatched.
 
     Returns:
         None
     """
     logger = logging.getLogger(__name__)
     port_name = port_config['port']
+    handle_frame = on_frame or process_data
+    policy = _get_retry_policy(port_config)
 
-    # Retry configuration: per-port override, else app-wide defaults
-    retry_cfg = APP_CONFIG.get("serial_retry", {}) if isinstance(APP_CONFIG, dict) else {}
-    default_max_retries = int(retry_cfg.get("max_attempts", 0) or 0)  # 0 means infinite
-    default_retry_delay = int(retry_cfg.get("delay_seconds", 5) or 5)
-    default_on_fail = str(retry_cfg.get("on_fail", "keep_retrying"))
+    # Chunked reading: frames are cut out of bulk reads by a resynchronizing assembler
+    options = _get_reader_options()
+    assembler = FrameAssembler(options["max_frame_bytes"])
+    poll_interval = options["poll_interval"]
 
-    max_retries = int(port_config.get("max_retries", default_max_retries) or 0)
-    retry_delay = int(port_config.get("retry_delay", default_retry_delay) or default_retry_delay)
-    on_fail = str(port_config.get("on_fail", default_on_fail) or default_on_fail).lower()
+    # Metric children bound once, outside the read loop
+    bytes_metric = SERIAL_BYTES.labels(port_name)
+    frames_metric = SERIAL_FRAMES.labels(port_name)
+    dropped_metric = SERIAL_DROPPED_BYTES.labels(port_name)
 
     attempts = 0
 
-    while stop_event is None or not stop_event.is_set():
+    def stopped():
+        return (stop_event is not None and stop_event.is_set()) or (port_stop is not None and port_stop.is_set())
+
+    # A port stop is also set when the app stops (see start_serial_readers)
+    waiter = port_stop or stop_event
+
+    while not stopped():
         try:
-            with serial.Serial(
-                port=port_config["port"],
-                baudrate=port_config["baudrate"],
-                bytesize=port_config["bytesize"],
-                parity=port_config["parity"],
-                stopbits=port_config["stopbits"],
-                timeout=port_config["timeout"],
-            ) as ser:
+            with _open_serial(port_config) as ser:
                 logger.info(f"Successfully opened port {port_name}")
                 attempts = 0  # reset attempts after a successful open
-                while stop_event is None or not stop_event.is_set():
-                    raw_bytes = ser.readline()
-                    if stop_event and stop_event.is_set():
-                        break
-                    if raw_bytes:
-                        process_data(raw_bytes, port_name)
+                assembler.reset()
+                reported_drops = assembler.dropped_bytes
+                while not stopped():
+                    # Bulk read: everything already buffered, or block for the first byte
+                    chunk = ser.read(ser.in_waiting or 1)
+                    # Source timestamp, taken once when the data arrives
+                    received_at = time.time()
+                    received_mono = time.monotonic()
+                    if not chunk:
+                        if stopped():
+                            break
+                        continue
+                    bytes_metric.inc(len(chunk))
+                    frames = assembler.feed(chunk)
+                    if frames:
+                        frames_metric.inc(len(frames))
+                    for raw_bytes in frames:
+                        handle_frame(raw_bytes, port_name, received_at, received_mono)
+                    if assembler.dropped_bytes != reported_drops:
+                        dropped_metric.inc(assembler.dropped_bytes - reported_drops)
+                        if logger.isEnabledFor(logging.DEBUG):
+                            # Reported per port in the periodic summary (utils.data_processor)
+                            logger.debug(
+                                "Dropped %d garbage bytes on %s while resynchronizing (total %d, frames %d).",
+                                assembler.dropped_bytes - reported_drops, port_name,
+                                assembler.dropped_bytes, assembler.frames,
+                            )
+                        reported_drops = assembler.dropped_bytes
+                    if not frames and assembler.pending() and poll_interval > 0:
+                        # Partial frame: let more bytes accumulate instead of reading them one by one
+                        time.sleep(poll_interval)
         except serial.SerialException as e:
             attempts += 1
-            logger.error(
-                f"Error with port {port_name}: {e} (attempt {attempts}{'/' + str(max_retries) if max_retries > 0 else ''})"
-            )
-            if max_retries > 0 and attempts >= max_retries:
-                if on_fail in ("stop_app", "exit_app", "exit"):
-                    logger.critical(f"Max retries reached for {port_name}. Stopping application as configured.")
-                    if stop_event is not None:
-                        stop_event.set()
-                        break
-                    else:
-                        raise SystemExit(1)
-                elif on_fail in ("disable", "disable_thread", "stop_thread"):
-                    logger.error(f"Max retries reached for {port_name}. Disabling this port's reader thread.")
-                    _mark_port_disabled(port_config, reason=str(e))
-                    break
-                else:
-                    logger.warning(
-                        f"Max retries reached for {port_name}. Continuing to retry indefinitely as configured."
-                    )
-                    # fall through to wait
-            logger.info(f"Retrying to connect to {port_name} in {retry_delay} seconds...")
-            if stop_event and stop_event.wait(retry_delay):
+            action = _handle_port_failure(port_config, policy, attempts, e, stop_event)
+            if action != "retry":
+                break
+            if waiter and waiter.wait(policy["retry_delay"]):
                 break
         except Exception as e:
             attempts += 1
-            logger.critical(f"An unexpected error occurred on port {port_name}: {e}")
-            if max_retries > 0 and attempts >= max_retries:
-                if on_fail in ("stop_app", "exit_app", "exit"):
-                    logger.critical(f"Max retries reached for {port_name} after unexpected error. Stopping app.")
-                    if stop_event is not None:
-                        stop_event.set()
-                        break
-                    else:
-                        raise SystemExit(1)
-                elif on_fail in ("disable", "disable_thread", "stop_thread"):
-                    logger.error(f"Max retries reached for {port_name} after unexpected error. Disabling thread.")
-                    _mark_port_disabled(port_config, reason=str(e))
-                    break
-                else:
-                    logger.warning(
-                        f"Max retries reached for {port_name} after unexpected error. Continuing to retry indefinitely."
-                    )
-            logger.info(f"Retrying to connect to {port_name} in {retry_delay} seconds...")
-            if stop_event and stop_event.wait(retry_delay):
+            action = _handle_port_failure(port_config, policy, attempts, e, stop_event, unexpected=True)
+            if action != "retry":
+                break
+            if waiter and waiter.wait(policy["retry_delay"]):
                 break
 
-def start_serial_readers(stop_event=None):
+def start_serial_readers(stop_event=None, ports=None, on_frame=None):
     """Start reader threads for all configured ports and the supervisor.
 
-    - Spawns a daemon thread per entry in `SERIAL_PORTS` running `read_serial_port`.
-    - Starts a supervisor daemon that periodically attempts to reopen ports
-      that were disabled after exceeding retry limits.
+    - Spawns a daemon thread per port of the runtime configuration running
+      `read_serial_port`, or, with `serial_reader.engine = "selector"`,
+      registers every port with a single `SerialMultiplexer` event-loop thread.
+    - Starts a supervisor daemon that reopens ports that were disabled after
+      exceeding retry limits, when their device node appears (inotify) or at
+      the fallback probe interval. Ports whose node is missing are not opened.
+    - While running, applies configuration reloads: readers of removed ports
+      are stopped, readers of changed ports restarted with the new settings,
+      and new ports started, without touching the other ports.
 
     Supervisor configuration via `APP_CONFIG['serial_supervisor']`:
     - auto_reenable (bool, default True): enable/disable automatic re-enabling.
-    - reenable_interval_seconds (int, default 30): probe interval in seconds.
+    - reenable_interval_seconds (int, default 30): probe interval in seconds
+      when device nodes cannot be watched.
+    - device_watch (bool, default True): re-enable ports on device node
+      events (Linux inotify).
+    - fallback_probe_interval_seconds (int, default 300): probe interval in
+      seconds while device nodes are watched.
 
     Keeps the process alive until `stop_event` is set or a KeyboardInterrupt occurs.
+
+    Args:
+        stop_event (threading.Event | None): Shared stop signal (any object
+            with `is_set`/`wait`/`set`, e.g. a `multiprocessing.Event`).
+        ports (Collection[str] | None): Names of the ports to read; other
+            configured ports, also after a reload, are left to another process
+            (see `utils.process_shards`). Defaults to all ports.
+        on_frame (callable | None): Frame handler passed to the readers.
+            Defaults to `process_data`.
     """
     logger = logging.getLogger(__name__)
     threads = []
+    engine = _get_reader_options()["engine"]
+    multiplexer = None
+    # Threads engine: port name -> (reader thread, port stop event)
+    readers = {}
+    readers_lock = threading.Lock()
+
+    if engine == "selector":
+        # One event-loop thread reads every port (imported here: it builds on this module)
+        from utils.serial_multiplexer import SerialMultiplexer
+
+        multiplexer = SerialMultiplexer(stop_event, on_frame=on_frame)
+        mux_thread = threading.Thread(target=multiplexer.run, name="serial-multiplexer")
+        mux_thread.daemon = True
+        mux_thread.start()
+        threads.append(mux_thread)
+        logger.info("Serial reader engine: selector (single event loop for all ports).")
 
     def _start_port_thread(pcfg):
-        th = threading.Thread(target=read_serial_port, args=(pcfg, stop_event,))
+        if multiplexer is not None:
+            multiplexer.add_port(pcfg)
+            return
+        port_stop = threading.Event()
+        th = threading.Thread(target=read_serial_port, args=(pcfg, stop_event, on_frame, port_stop))
         th.daemon = True  # Daemon threads will exit when the main program exits
-        th.start()
-        threads.append(th)
+        with readers_lock:
+            entry = readers.get(pcfg["port"])
+            if entry is not None and entry[0].is_alive():
+                # Already read (e.g. re-enabled and added by a reload at once): never two readers
+                return
+            readers[pcfg["port"]] = (th, port_stop)
+            th.start()
 
-    for port_config in SERIAL_PORTS:
-        _start_port_thread(port_config)
+    def _stop_port_thread(port_name):
+        with _disabled_ports_lock:
+            DISABLED_PORTS.pop(port_name, None)
+        if multiplexer is not None:
+            multiplexer.remove_port(port_name)
+            return
+        with readers_lock:
+            entry = readers.pop(port_name, None)
+        if entry is None:
+            return
+        th, port_stop = entry
+        port_stop.set()
+        # The reader dispatches the frames of its last read before it exits
+        th.join(timeout=5)
+        if th.is_alive():
+            logger.warning(f"Reader of port {port_name} did not stop within 5s.")
+        else:
+            logger.info(f"Stopped reading port {port_name}")
+
+    def _owned(port_name):
+        return ports is None or port_name in ports
+
+    def _apply_reload(old, new, diff):
+        for port_name in diff.ports_removed:
+            if _owned(port_name):
+                _stop_port_thread(port_name)
+        for pcfg in diff.ports_changed:
+            if _owned(pcfg["port"]):
+                _stop_port_thread(pcfg["port"])
+                _start_port_thread(pcfg)
+        for pcfg in diff.ports_added:
+            if _owned(pcfg["port"]):
+                _start_port_thread(pcfg)
+
+    for port_config in get_runtime_config().serial_ports:
+        if _owned(port_config["port"]):
+            _start_port_thread(port_config)
+    add_reload_listener(_apply_reload)
 
     # Start supervisor to re-enable disabled ports if configured
     sup_cfg = APP_CONFIG.get("serial_supervisor", {}) if isinstance(APP_CONFIG, dict) else {}
     auto_reenable = bool(sup_cfg.get("auto_reenable", True))
     reenable_interval = int(sup_cfg.get("reenable_interval_seconds", 30) or 30)
+    device_watch = bool(sup_cfg.get("device_watch", True))
+    fallback_interval = int(sup_cfg.get("fallback_probe_interval_seconds", 300) or 300)
+
+    def _reenable_ports(only_new_nodes=False):
+        """Reopen disabled ports whose device node exists and restart their readers.
+
+        With `only_new_nodes`, only ports whose node changed after they were
+        disabled are tried (a port that was just disabled is not reopened at once).
+        """
+        s_logger = logging.getLogger(__name__)
+        with _disabled_ports_lock:
+            disabled_items = list(DISABLED_PORTS.items())
+        for port_name, meta in disabled_items:
+            cfg = meta.get("config", {})
+            if os.path.isabs(port_name):
+                try:
+                    changed_at = os.stat(port_name).st_ctime
+                except OSError:
+                    continue  # No device node: nothing to open
+                if only_new_nodes and changed_at < meta.get("ts", 0):
+                    continue
+            try:
+                with _open_serial(cfg):
+                    s_logger.info(f"Port re-enabled {port_name}")
+                    with _disabled_ports_lock:
+                        DISABLED_PORTS.pop(port_name, None)
+                    _start_port_thread(cfg)
+            except Exception:
+                # Still unavailable; will retry on the next event or interval
+                pass
 
     def _supervisor_loop():
         s_logger = logging.getLogger(__name__)
         if not auto_reenable:
             s_logger.info("Serial supervisor auto_reenable disabled by configuration.")
-        while stop_event is None or not stop_event.is_set():
-            if auto_reenable:
+        watcher = DeviceWatcher.create() if auto_reenable and device_watch else None
+        interval = fallback_interval if watcher is not None else reenable_interval
+        if watcher is not None:
+            s_logger.info(f"Serial supervisor watching device nodes (fallback probe every {interval}s).")
+        watched = set()
+        next_probe = time.monotonic() + interval
+        try:
+            while stop_event is None or not stop_event.is_set():
+                if auto_reenable and time.monotonic() >= next_probe:
+                    _reenable_ports()
+                    next_probe = time.monotonic() + interval
+                if watcher is None:
+                    # Short slices keep the loop responsive to the stop signal
+                    if stop_event is not None:
+                        stop_event.wait(min(0.5, max(0.0, next_probe - time.monotonic())))
+                    else:
+                        time.sleep(min(0.5, max(0.0, next_probe - time.monotonic())))
+                    continue
                 with _disabled_ports_lock:
-                    disabled_items = list(DISABLED_PORTS.items())
-                for port_name, meta in disabled_items:
-                    cfg = meta.get("config", {})
-                    try:
-                        with serial.Serial(
-                            port=cfg["port"],
-                            baudrate=cfg["baudrate"],
-                            bytesize=cfg["bytesize"],
-                            parity=cfg["parity"],
-                            stopbits=cfg["stopbits"],
-                            timeout=cfg["timeout"],
-                        ) as ser:
-                            s_logger.info(f"Port re-enabled {port_name}")
-                            with _disabled_ports_lock:
-                                DISABLED_PORTS.pop(port_name, None)
-                            _start_port_thread(cfg)
-                    except Exception:
-                        # Still unavailable; will retry on next interval
-                        pass
-            if stop_event and stop_event.wait(reenable_interval):
-                break
-            if stop_event is None:
-                time.sleep(reenable_interval)
+                    paths = {name for name in DISABLED_PORTS if os.path.isabs(name)}
+                directories = watcher.watched()
+                watcher.watch(paths)
+                if paths - watched or watcher.watched() != directories:
+                    # A node may have appeared before its directory was watched
+                    _reenable_ports(only_new_nodes=True)
+                watched = paths
+                changed = watcher.wait(min(0.5, max(0.0, next_probe - time.monotonic())))
+                if changed and affects(changed, paths):
+                    _reenable_ports()
+        finally:
+            if watcher is not None:
+                watcher.close()
 
     supervisor_thread = threading.Thread(target=_supervisor_loop)
     supervisor_thread.daemon = True
@@ -216,8 +442,8 @@ def start_serial_readers(stop_event=None):
         if stop_event is None:
             # Keep the main thread alive, allowing daemon threads to run
             # and to catch KeyboardInterrupt gracefully.
-            for thread in threads:
-                thread.join()
+            while True:
+                time.sleep(0.5)
         else:
             # Wait until a stop is requested
             while not stop_event.is_set():
@@ -227,6 +453,11 @@ def start_serial_readers(stop_event=None):
         if stop_event is not None:
             stop_event.set()
     finally:
+        remove_reload_listener(_apply_reload)
         logger.info("Joining serial port reader threads...")
-        for thread in threads:
+        with readers_lock:
+            entries = list(readers.values())
+        for _, port_stop in entries:
+            port_stop.set()
+        for thread in threads + [th for th, _ in entries]:
             thread.join(timeout=2)
@@ -0,0 +1,377 @@
+"""Append-only segmented write-ahead journal for the Zabbix spool.
+
+Failed batches are appended as records to fixed-size segment files instead of
+one temporary file per batch:
+
+    <dir>/segment_000000000001.jrn
+    <dir>/segment_000000000002.jrn
+    <dir>/read.offset              -> {"segment": 2, "offset": 8192}
+
+Each record is `uint32 length | uint32 crc32 | payload` (little endian). A
+segment is sealed once it reaches `segment_size` bytes and a new one is
+started. Readers stream records from the persisted read offset; committing a
+position atomically rewrites `read.offset` (temp file + fsync + rename) and
+deletes the segments that were fully consumed.
+
+Durability (`fsync` policy):
+- "always": fsync after every append. Nothing acknowledged is lost on power failure.
+- "interval": fsync at most every `fsync_interval` seconds (and on close). A power
+  failure can lose the last interval of spooled batches.
+- "never": leave flushing to the OS page cache. Survives process crashes, not
+  power failures.
+
+For load shedding (`utils.zabbix_backpressure`), sealed segments can be
+listed with their size and age and the oldest one dropped unread.
+
+Crash recovery: on open, the tail of the newest segment is validated and any
+torn or corrupt record at its end is truncated. Delivery is at-least-once: a
+crash between a send and the offset commit replays those records.
+"""
+
+import json
+import logging
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_RECORD_HEADER = struct.Struct("<II")
+_SEGMENT_RE = re.compile(r"^segment_(\d{12})\.jrn$")
+_OFFSET_FILE = "read.offset"
+
+FSYNC_POLICIES = ("always", "interval", "never")
+
+# Sanity bound for a single record (a corrupt length field must not trigger huge reads)
+MAX_RECORD_SIZE = 64 * 1024 * 1024
+
+
+class JournalPosition(NamedTuple):
+    """A byte position inside the journal: segment id and offset in it."""
+
+    segment: int
+    offset: int
+
+
+def _segment_name(segment_id: int) -> str:
+    return f"segment_{segment_id:012d}.jrn"
+
+
+def _fsync_dir(path: str) -> None:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _read_record(f, limit: int) -> Tuple[Optional[bytes], str]:
+    """Read one record at the current file position.
+
+    Returns:
+        tuple: (payload, status) where status is "ok", "eof" (clean end),
+        "torn" (incomplete record) or "corrupt" (bad length or CRC).
+    """
+    start = f.tell()
+    header = f.read(_RECORD_HEADER.size)
+    if not header:
+        return None, "eof"
+    if len(header) < _RECORD_HEADER.size:
+        return None, "torn"
+    length, crc = _RECORD_HEADER.unpack(header)
+    if length > MAX_RECORD_SIZE:
+        return None, "corrupt"
+    if start + _RECORD_HEADER.size + length > limit:
+        return None, "torn"
+    payload = f.read(length)
+    if len(payload) < length:
+        return None, "torn"
+    if zlib.crc32(payload) & 0xFFFFFFFF != crc:
+        return None, "corrupt"
+    return payload, "ok"
+
+
+class SpoolJournal:
+    """Segmented append-only journal with a persisted read offset.
+
+    Args:
+        directory (str): Directory holding the segment files.
+        segment_size (int): Size in bytes after which a segment is sealed.
+        fsync (str): Durability policy, one of FSYNC_POLICIES.
+        fsync_interval (float): Seconds between fsyncs for the "interval" policy.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_size: int = 4 * 1024 * 1024,
+        fsync: str = "interval",
+        fsync_interval: float = 1.0,
+    ):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy '{fsync}' (expected one of {FSYNC_POLICIES})")
+        self.directory = directory
+        self.segment_size = max(1024, int(segment_size))
+        self.fsync = fsync
+        self.fsync_interval = float(fsync_interval)
+        self._lock = threading.Lock()
+        self._writer = None
+        self._writer_id = 0
+        self._writer_size = 0
+        self._last_fsync = 0.0
+        self._dirty = False
+        os.makedirs(directory, exist_ok=True)
+        self._position = self._load_offset()
+        self._recover()
+
+    # ------------------------------------------------------------------ layout
+
+    def _segment_path(self, segment_id: int) -> str:
+        return os.path.join(self.directory, _segment_name(segment_id))
+
+    def _list_segments(self) -> List[int]:
+        ids = []
+        for name in os.listdir(self.directory):
+            m = _SEGMENT_RE.match(name)
+            if m:
+                ids.append(int(m.group(1)))
+        ids.sort()
+        return ids
+
+    def _load_offset(self) -> JournalPosition:
+        try:
+            with open(os.path.join(self.directory, _OFFSET_FILE), "r") as f:
+                doc = json.load(f)
+            return JournalPosition(int(doc["segment"]), int(doc["offset"]))
+        except FileNotFoundError:
+            return JournalPosition(0, 0)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Spool journal offset file unreadable ({e}); replaying from the oldest segment.")
+            return JournalPosition(0, 0)
+
+    def _store_offset(self, position: JournalPosition) -> None:
+        path = os.path.join(self.directory, _OFFSET_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"segment": position.segment, "offset": position.offset}, f)
+            f.flush()
+            if self.fsync != "never":
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+        if self.fsync != "never":
+            _fsync_dir(self.directory)
+
+    # ---------------------------------------------------------------- recovery
+
+    def _recover(self) -> None:
+        """Validate the newest segment, truncate a torn tail and open it for appends."""
+        segments = self._list_segments()
+        if not segments:
+            self._open_writer(1)
+            return
+        last = segments[-1]
+        path = self._segment_path(last)
+        size = os.path.getsize(path)
+        valid_end = 0
+        with open(path, "rb") as f:
+            while True:
+                payload, status = _read_record(f, size)
+                if status != "ok":
+                    break
+                valid_end = f.tell()
+        if valid_end < size:
+            logger.warning(
+                f"Spool journal: truncating {size - valid_end} bytes of torn/corrupt data at end of {path}."
+            )
+            with open(path, "r+b") as f:
+                f.truncate(valid_end)
+                f.flush()
+                os.fsync(f.fileno())
+        if self._position.segment == last and self._position.offset > valid_end:
+            self._position = JournalPosition(last, valid_end)
+        self._open_writer(last)
+
+    def _open_writer(self, segment_id: int) -> None:
+        if self._writer is not None:
+            self._sync_writer(force=True)
+            self._writer.close()
+        path = self._segment_path(segment_id)
+        created = not os.path.exists(path)
+        self._writer = open(path, "ab", buffering=0)
+        self._writer_id = segment_id
+        self._writer_size = self._writer.tell()
+        if created and self.fsync != "never":
+            _fsync_dir(self.directory)
+
+    def _sync_writer(self, force: bool = False) -> None:
+        if self._writer is None or not self._dirty or self.fsync == "never":
+            return
+        now = time.monotonic()
+        if force or self.fsync == "always" or now - self._last_fsync >= self.fsync_interval:
+            os.fsync(self._writer.fileno())
+            self._last_fsync = now
+            self._dirty = False
+
+    # ------------------------------------------------------------------ writes
+
+    def append(self, payload: bytes) -> None:
+        """Append one record, rotating to a new segment when the current one is full."""
+        if len(payload) > MAX_RECORD_SIZE:
+            raise ValueError(f"Spool record too large: {len(payload)} bytes")
+        record = _RECORD_HEADER.pack(len(payload), zlib.crc32(payload) & 0xFFFFFFFF) + payload
+        with self._lock:
+            if self._writer_size > 0 and self._writer_size + len(record) > self.segment_size:
+                self._open_writer(self._writer_id + 1)
+            self._writer.write(record)
+            self._writer_size += len(record)
+            self._dirty = True
+            self._sync_writer()
+
+    def flush(self) -> None:
+        """Force an fsync of pending appends (unless the policy is "never")."""
+        with self._lock:
+            self._sync_writer(force=True)
+
+    def close(self) -> None:
+        """Sync and close the active segment."""
+        with self._lock:
+            if self._writer is not None:
+                self._sync_writer(force=True)
+                self._writer.close()
+                self._writer = None
+
+    # ------------------------------------------------------------------- reads
+
+    def read_position(self) -> JournalPosition:
+        """Return the committed read position, clamped to existing segments."""
+        position = self._position
+        segments = self._list_segments()
+        if segments and position.segment < segments[0]:
+            return JournalPosition(segments[0], 0)
+        return position
+
+    def iter_records(self) -> Iterator[Tuple[bytes, JournalPosition]]:
+        """Stream records from the committed read offset.
+
+        Yields:
+            tuple: (payload, position just after the record). Pass the position
+            of the last record that was handled successfully to `commit`.
+        """
+        position = self.read_position()
+        while True:
+            segments = [s for s in self._list_segments() if s >= position.segment]
+            if not segments:
+                return
+            segment_id = segments[0]
+            offset = position.offset if segment_id == position.segment else 0
+            is_last = segment_id == segments[-1]
+            path = self._segment_path(segment_id)
+            try:
+                size = os.path.getsize(path)
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    while True:
+                        payload, status = _read_record(f, size)
+                        if status == "ok":
+                            yield payload, JournalPosition(segment_id, f.tell())
+                            continue
+                        if status == "corrupt" or (status == "torn" and not is_last):
+                            logger.error(
+                                f"Spool journal: skipping corrupt data in {path} at offset {f.tell()}."
+                            )
+                        break
+            except FileNotFoundError:
+                pass  # consumed and removed concurrently
+            if is_last:
+                return
+            position = JournalPosition(segment_id + 1, 0)
+
+    def commit(self, position: JournalPosition) -> None:
+        """Persist `position` as the read offset and delete fully consumed segments."""
+        with self._lock:
+            self._store_offset(position)
+            self._position = position
+            for segment_id in self._list_segments():
+                if segment_id >= position.segment or segment_id == self._writer_id:
+                    break
+                try:
+                    os.remove(self._segment_path(segment_id))
+                except OSError as e:
+                    logger.warning(f"Spool journal: could not remove consumed segment {segment_id}: {e}")
+
+    def pending_bytes(self) -> int:
+        """Approximate number of journal bytes not yet consumed."""
+        position = self.read_position()
+        total = 0
+        for segment_id in self._list_segments():
+            if segment_id < position.segment:
+                continue
+            try:
+                size = os.path.getsize(self._segment_path(segment_id))
+            except OSError:
+                continue
+            total += size - (position.offset if segment_id == position.segment else 0)
+        return max(0, total)
+
+    def sealed_segments(self) -> List[Tuple[int, int, float]]:
+        """Unconsumed segments other than the one being appended to, oldest first.
+
+        Returns:
+            list: (segment id, size in bytes, modification time) tuples.
+        """
+        position = self.read_position()
+        sealed = []
+        for segment_id in self._list_segments():
+            if segment_id < position.segment or segment_id >= self._writer_id:
+                continue
+            try:
+                stat = os.stat(self._segment_path(segment_id))
+            except OSError:
+                continue
+            sealed.append((segment_id, stat.st_size, stat.st_mtime))
+        return sealed
+
+    def drop_segment(self, segment_id: int) -> None:
+        """Consume the oldest unconsumed segment without replaying it (load shedding)."""
+        if segment_id >= self._writer_id:
+            raise ValueError(f"Segment {segment_id} is still being appended to")
+        if self.read_position().segment != segment_id:
+            raise ValueError(f"Segment {segment_id} is not the oldest unconsumed segment")
+        self.commit(JournalPosition(segment_id + 1, 0))
+
+    def is_empty(self) -> bool:
+        """True if every appended record has been committed."""
+        with self._lock:
+            caught_up = self._position == (self._writer_id, self._writer_size)
+        return caught_up or self.pending_bytes() == 0
+
+    # --------------------------------------------------------------- migration
+
+    def migrate_files(self, paths: List[str]) -> int:
+        """Import legacy one-batch-per-file spool files as journal records.
+
+        Files are imported oldest first and removed once their record has been
+        synced to disk. Returns the number of migrated files.
+        """
+        migrated = 0
+        for path in sorted(paths, key=lambda p: os.path.getmtime(p)):
+            try:
+                with open(path, "rb") as f:
+                    payload = f.read()
+                if payload.strip():
+                    self.append(payload)
+                    self.flush()
+                os.remove(path)
+                migrated += 1
+            except OSError as e:
+                logger.error(f"Spool journal: failed to migrate legacy spool file {path}: {e}")
+        return migrated
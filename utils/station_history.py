@@ -0,0 +1,348 @@
+"""Recent records of every station in memory, with a local HTTP query API.
+
+Questions like "the last hour of tilt for RETU" are answered from memory
+instead of the TSV archive on the SD card. `record` (called by
+`process_data` for every parsed frame) appends the values to a ring buffer of
+the station. A ring keeps one preallocated `array('d')` per column
+(timestamp, the four inclinometer and the two pluviometer values), so a
+record costs 56 bytes and no Python object; when the ring is full the oldest
+record is overwritten.
+
+Memory is capped: `max_memory_mb` is split evenly over at most
+`max_stations` rings, which gives the capacity of each ring. Records of
+further stations are not kept. Range queries use a binary search on the
+timestamps, which are in arrival order (after a backward clock step a range
+may miss records until they age out).
+
+A small threaded HTTP server (`start_history_server`) answers with JSON:
+
+- `GET /stations`: the stations kept, with their record count and the
+  timestamps of their oldest and newest record.
+- `GET /stations/<name>/latest`: the newest record of a station.
+- `GET /stations/<name>/range?from=&to=`: the records with `from <= t < to`;
+  times are epoch seconds or ISO 8601 local times, `to` defaults to now and
+  `from` to one hour before `to`. At most `max_response_records` records are
+  returned (the newest ones) and `truncated` tells if more matched.
+
+Configuration (config.json → station_history): enabled (default False),
+max_memory_mb (32), max_stations (32), http_enabled (False), http_host
+("127.0.0.1"), http_port (9110), max_response_records (20000).
+"""
+
+import json
+import logging
+import threading
+import time
+from array import array
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from config.app_config import APP_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Columns of a ring after the timestamp: (sensor, field) of the parsed data
+COLUMNS = (
+    ("inclinometer", "radial"),
+    ("inclinometer", "tangential"),
+    ("inclinometer", "temperature"),
+    ("inclinometer", "voltage"),
+    ("pluviometer", "rain_level"),
+    ("pluviometer", "voltage"),
+)
+RECORD_BYTES = 8 * (1 + len(COLUMNS))
+
+
+def get_history_options() -> dict:
+    """Options from `APP_CONFIG['station_history']`."""
+    cfg = APP_CONFIG.get("station_history", {}) if isinstance(APP_CONFIG, dict) else {}
+    return {
+        "enabled": bool(cfg.get("enabled", False)),
+        "max_memory_mb": max(0.0, float(cfg.get("max_memory_mb", 32))),
+        "max_stations": max(1, int(cfg.get("max_stations", 32))),
+        "http_enabled": bool(cfg.get("http_enabled", False)),
+        "http_host": str(cfg.get("http_host", "127.0.0.1")),
+        "http_port": int(cfg.get("http_port", 9110)),
+        "max_response_records": max(1, int(cfg.get("max_response_records", 20000))),
+    }
+
+
+class StationRing:
+    """Fixed-capacity ring buffer of one station's records, one array per column."""
+
+    def __init__(self, capacity: int, station_name: str = "", station_number: Optional[int] = None):
+        self.station_name = station_name
+        self.station_number = station_number
+        self.capacity = max(1, int(capacity))
+        self.timestamps = array("d", bytes(8 * self.capacity))
+        self.columns = [array("d", bytes(8 * self.capacity)) for _ in COLUMNS]
+        self.start = 0  # physical index of the oldest record
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def append(self, timestamp: float, values) -> None:
+        with self.lock:
+            if self.size < self.capacity:
+                index = (self.start + self.size) % self.capacity
+                self.size += 1
+            else:
+                index = self.start
+                self.start = (self.start + 1) % self.capacity
+            self.timestamps[index] = timestamp
+            for column, value in zip(self.columns, values):
+                column[index] = value
+
+    def _record(self, index: int) -> dict:
+        record = {"timestamp": self.timestamps[index]}
+        for (sensor, field), column in zip(COLUMNS, self.columns):
+            record.setdefault(sensor, {})[field] = column[index]
+        return record
+
+    def _bisect(self, timestamp: float) -> int:
+        """Logical position of the first record with a timestamp >= `timestamp`."""
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self.timestamps[(self.start + middle) % self.capacity] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def latest(self) -> Optional[dict]:
+        with self.lock:
+            if not self.size:
+                return None
+            return self._record((self.start + self.size - 1) % self.capacity)
+
+    def span(self) -> Tuple[Optional[float], Optional[float]]:
+        """Timestamps of the oldest and the newest record."""
+        with self.lock:
+            if not self.size:
+                return None, None
+            return self.timestamps[self.start], self.timestamps[(self.start + self.size - 1) % self.capacity]
+
+    def range(self, start: float, end: float, limit: int) -> Tuple[List[dict], bool]:
+        """Records with `start <= timestamp < end`, oldest first.
+
+        Returns:
+            tuple: (records, truncated); at most `limit` records, the newest ones.
+        """
+        with self.lock:
+            first = self._bisect(start)
+            last = self._bisect(end)
+            truncated = last - first > limit
+            first = max(first, last - limit)
+            records = [self._record((self.start + position) % self.capacity) for position in range(first, last)]
+        return records, truncated
+
+
+class StationHistory:
+    """The rings of all stations, within a memory budget.
+
+    Args:
+        max_memory_bytes (int): Memory for all rings together.
+        max_stations (int): Stations that get a ring; later ones are ignored.
+    """
+
+    def __init__(self, max_memory_bytes: int, max_stations: int):
+        self.max_stations = max(1, int(max_stations))
+        self.capacity = max(1, int(max_memory_bytes) // (self.max_stations * RECORD_BYTES))
+        self._rings: Dict[str, StationRing] = {}
+        self._lock = threading.Lock()
+        self._ignored = set()
+
+    def _ring(self, name: str, number: int) -> Optional[StationRing]:
+        ring = self._rings.get(name)
+        if ring is not None:
+            return ring
+        with self._lock:
+            ring = self._rings.get(name)
+            if ring is None:
+                if len(self._rings) >= self.max_stations:
+                    if name not in self._ignored:
+                        self._ignored.add(name)
+                        logger.warning(
+                            f"Station history is full ({self.max_stations} stations): not keeping {name}."
+                        )
+                    return None
+                ring = self._rings[name] = StationRing(self.capacity, name, number)
+        return ring
+
+    def record(self, parsed_data: dict) -> None:
+        """Append one parsed frame to its station's ring."""
+        ring = self._ring(parsed_data["station_name"], parsed_data.get("station_number"))
+        if ring is None:
+            return
+        timestamp = parsed_data.get("timestamp") or time.time()
+        ring.append(timestamp, [parsed_data[sensor][field] for sensor, field in COLUMNS])
+
+    def find(self, name: str) -> Optional[StationRing]:
+        """The ring of a station by name (case-insensitive)."""
+        ring = self._rings.get(name)
+        if ring is None:
+            lowered = name.lower()
+            for station, candidate in list(self._rings.items()):
+                if station.lower() == lowered:
+                    return candidate
+        return ring
+
+    def stations(self) -> List[dict]:
+        result = []
+        for name, ring in sorted(list(self._rings.items())):
+            oldest, newest = ring.span()
+            result.append({
+                "station_name": name,
+                "station_number": ring.station_number,
+                "records": len(ring),
+                "capacity": ring.capacity,
+                "oldest": oldest,
+                "newest": newest,
+            })
+        return result
+
+    def memory_bytes(self) -> int:
+        """Bytes allocated by the rings (at most the configured budget)."""
+        return len(self._rings) * self.capacity * RECORD_BYTES
+
+
+_history: Optional[StationHistory] = None
+_history_checked = False
+_history_lock = threading.Lock()
+
+
+def get_history() -> Optional[StationHistory]:
+    """The shared history, created on first use (None when disabled)."""
+    global _history, _history_checked
+    if _history_checked:
+        return _history
+    with _history_lock:
+        if not _history_checked:
+            opts = get_history_options()
+            if opts["enabled"]:
+                _history = StationHistory(int(opts["max_memory_mb"] * 1024 * 1024), opts["max_stations"])
+            _history_checked = True
+    return _history
+
+
+def record(parsed_data: dict) -> None:
+    """Keep a parsed frame in its station's ring buffer (if enabled)."""
+    history = get_history()
+    if history is None:
+        return
+    try:
+        history.record(parsed_data)
+    except (KeyError, TypeError, ValueError) as e:
+        logger.error(f"Cannot keep the record of {parsed_data.get('station_name')} in memory: {e}")
+
+
+# --- HTTP API ---------------------------------------------------------------
+
+def _parse_time(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+class _HistoryHandler(BaseHTTPRequestHandler):
+    history: StationHistory = None  # set on the subclass built by start_history_server
+    max_records = 20000
+
+    def _send_json(self, status: int, body) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status: int, message: str) -> None:
+        self._send_json(status, {"error": message})
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parts = [unquote(part) for part in url.path.strip("/").split("/") if part]
+        if parts == ["stations"]:
+            self._send_json(200, {"stations": self.history.stations()})
+            return
+        if len(parts) != 3 or parts[0] != "stations" or parts[2] not in ("latest", "range"):
+            self._error(404, "not found")
+            return
+        ring = self.history.find(parts[1])
+        if ring is None:
+            self._error(404, f"unknown station '{parts[1]}'")
+            return
+        if parts[2] == "latest":
+            latest = ring.latest()
+            if latest is None:
+                self._error(404, "no records")
+            else:
+                self._send_json(200, dict(latest, station_name=ring.station_name))
+            return
+        query = parse_qs(url.query)
+        try:
+            end = _parse_time(query["to"][0]) if "to" in query else time.time()
+            start = _parse_time(query["from"][0]) if "from" in query else end - 3600
+        except ValueError as e:
+            self._error(400, f"invalid time: {e}")
+            return
+        records, truncated = ring.range(start, end, self.max_records)
+        self._send_json(200, {
+            "station_name": ring.station_name, "from": start, "to": end,
+            "count": len(records), "truncated": truncated, "records": records,
+        })
+
+    def log_message(self, format, *args):
+        logger.debug(f"history endpoint: {format % args}")
+
+
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def start_history_server(host: Optional[str] = None, port: Optional[int] = None) -> Optional[ThreadingHTTPServer]:
+    """Serve the query API in a daemon thread if enabled (or when host/port are given).
+
+    Returns:
+        ThreadingHTTPServer | None: The running server, None when disabled or on error.
+    """
+    global _server
+    opts = get_history_options()
+    history = get_history()
+    if history is None or (host is None and port is None and not opts["http_enabled"]):
+        return None
+    if _server is not None:
+        return _server
+    host = opts["http_host"] if host is None else host
+    port = opts["http_port"] if port is None else port
+    handler = type("HistoryHandler", (_HistoryHandler,), {
+        "history": history, "max_records": opts["max_response_records"],
+    })
+    try:
+        server = ThreadingHTTPServer((host, port), handler)
+    except OSError as e:
+        logger.error(f"Cannot start the station history endpoint on {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="history-http")
+    thread.daemon = True
+    thread.start()
+    _server = server
+    logger.info(
+        f"Station history API listening on http://{host}:{server.server_address[1]}/stations "
+        f"({history.capacity} records per station, up to {history.max_stations} stations)"
+    )
+    return server
+
+
+def stop_history_server() -> None:
+    global _server
+    if _server is not None:
+        server, _server = _server, None
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,183 @@
+"""Cached open-file-handle writer for the daily TSV archive.
+
+`TsvWriter` keeps the files that are being appended to open in an LRU cache
+instead of opening, appending and closing a file for every record. Each
+stream (e.g. one sensor type of one station) has at most one open file: when a
+record for a different path arrives on the same stream (the date changed at
+midnight), the previous day's file is flushed and closed. When more than
+`max_open_files` files are open, the least recently used one is closed.
+Directories are created and headers written only when a file is created
+(a missing or empty file).
+
+Buffered lines are flushed according to `flush_mode`, which also defines
+what survives a failure:
+
+- "always": flush after every record. Data is in the OS page cache right
+  away, so it survives a crash of this process; a power loss may lose what
+  the kernel has not written back yet.
+- "records": flush a file after `flush_records` records. A process crash
+  may lose up to `flush_records - 1` records per open file.
+- "interval" (default): a background thread flushes every
+  `flush_interval` seconds. A process crash may lose the last interval.
+- "shutdown": flush only when a file is closed (rollover, eviction or
+  `close`). Cheapest, but a process crash loses everything not yet closed.
+
+In every mode `close` (clean shutdown) flushes everything. With `fsync`
+enabled every flush is followed by `os.fsync`, which extends the guarantee
+of that flush to power loss at the cost of an SD card write per flush.
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Hashable, Iterable, Optional
+
+from utils.metrics import TSV_FLUSHES
+
+logger = logging.getLogger(__name__)
+
+FLUSH_MODES = ("always", "records", "interval", "shutdown")
+
+
+class _OpenFile:
+    """An open append handle and its unflushed record count."""
+
+    __slots__ = ("path", "handle", "pending")
+
+    def __init__(self, path: str, handle):
+        self.path = path
+        self.handle = handle
+        self.pending = 0
+
+
+class TsvWriter:
+    """Appends lines to many files through an LRU cache of open handles.
+
+    Args:
+        max_open_files (int): Maximum number of files kept open at once.
+        flush_mode (str): One of FLUSH_MODES (see module docstring).
+        flush_interval (float): Seconds between flushes in "interval" mode.
+        flush_records (int): Records per file between flushes in "records" mode.
+        fsync (bool): Call `os.fsync` after every flush.
+    """
+
+    def __init__(
+        self,
+        max_open_files: int = 64,
+        flush_mode: str = "interval",
+        flush_interval: float = 1.0,
+        flush_records: int = 100,
+        fsync: bool = False,
+    ):
+        if flush_mode not in FLUSH_MODES:
+            raise ValueError(f"Unknown flush mode '{flush_mode}'. Expected one of {FLUSH_MODES}.")
+        self.max_open_files = max(1, int(max_open_files))
+        self.flush_mode = flush_mode
+        self.flush_interval = max(0.01, float(flush_interval))
+        self.flush_records = max(1, int(flush_records))
+        self.fsync = bool(fsync)
+        self._files: "OrderedDict[Hashable, _OpenFile]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    def write(self, stream: Hashable, path: str, line: str, header: Iterable[str] = ()) -> None:
+        """Append one line to `path`, the current file of `stream`.
+
+        Args:
+            stream: Identifies the sequence of daily files (e.g. (type, station)).
+            path (str): File the line belongs to.
+            line (str): The record, including its trailing newline.
+            header (iterable[str]): Lines written first if the file is created.
+        """
+        with self._lock:
+            entry = self._files.get(stream)
+            if entry is not None and entry.path != path:
+                self._close_entry(self._files.pop(stream))  # day rollover
+                entry = None
+            if entry is None:
+                entry = self._open(stream, path, header)
+            else:
+                self._files.move_to_end(stream)
+            entry.handle.write(line)
+            entry.pending += 1
+            if self.flush_mode == "always" or (
+                self.flush_mode == "records" and entry.pending >= self.flush_records
+            ):
+                self._flush_entry(entry)
+        if self.flush_mode == "interval" and self._flusher is None:
+            self._start_flusher()
+
+    def flush(self) -> None:
+        """Flush every open file."""
+        with self._lock:
+            for entry in self._files.values():
+                self._flush_entry(entry)
+
+    def close(self) -> None:
+        """Stop the flusher thread, then flush and close every open file."""
+        self._stop.set()
+        flusher = self._flusher
+        if flusher is not None and flusher is not threading.current_thread():
+            flusher.join(timeout=5)
+        with self._lock:
+            while self._files:
+                _, entry = self._files.popitem(last=False)
+                self._close_entry(entry)
+            self._flusher = None
+        self._stop.clear()
+
+    def open_files(self) -> list:
+        """Paths of the files currently open, least recently used first."""
+        with self._lock:
+            return [entry.path for entry in self._files.values()]
+
+    def _open(self, stream: Hashable, path: str, header: Iterable[str]) -> _OpenFile:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handle = open(path, "a")
+        try:
+            if handle.tell() == 0:
+                handle.writelines(header)
+        except Exception:
+            handle.close()
+            raise
+        entry = _OpenFile(path, handle)
+        self._files[stream] = entry
+        while len(self._files) > self.max_open_files:
+            _, evicted = self._files.popitem(last=False)
+            self._close_entry(evicted)
+        return entry
+
+    def _flush_entry(self, entry: _OpenFile) -> None:
+        if not entry.pending:
+            return
+        try:
+            entry.handle.flush()
+            if self.fsync:
+                os.fsync(entry.handle.fileno())
+            TSV_FLUSHES.inc()
+        except OSError as e:
+            logger.error(f"Error flushing {entry.path}: {e}")
+        entry.pending = 0
+
+    def _close_entry(self, entry: _OpenFile) -> None:
+        self._flush_entry(entry)
+        try:
+            entry.handle.close()
+        except OSError as e:
+            logger.error(f"Error closing {entry.path}: {e}")
+
+    def _start_flusher(self) -> None:
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._run_flusher, name="tsv-flusher")
+            self._flusher.daemon = True
+            self._flusher.start()
+
+    def _run_flusher(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
@@ -0,0 +1,176 @@
+"""Windowed per-station aggregation of Zabbix items.
+
+Sensors send a frame about every second, which is far more than the Zabbix
+history needs. `WindowAggregator` folds the values of every (host, key) into
+fixed, clock-aligned windows (e.g. 60 s: 12:00:00-12:01:00) using the source
+timestamp of each value, and emits one item per configured statistic when a
+window closes:
+
+- min, max, mean and last of the values in the window, sent under the raw
+  key plus a configurable suffix (e.g. `tilt.radial.min`). An empty suffix
+  sends that statistic under the raw key itself.
+- Aggregates are stamped with the timestamp of the last value in the window.
+
+A window closes when a value for a later window arrives, or at the latest
+`grace` seconds after its end (checked by a background thread), so a station
+that goes silent still gets its last window reported. `stop` emits every open
+window. Values that arrive for a window that is already closed are folded
+into the current one.
+
+Only the Zabbix submission is aggregated; the TSV archive keeps full rate.
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STATS = ("min", "max", "mean", "last")
+DEFAULT_KEY_SUFFIXES = {"min": ".min", "max": ".max", "mean": ".avg", "last": ".last"}
+
+# Per (host, key) state: [window_start, min, max, sum, count, last, last_ts]
+_START, _MIN, _MAX, _SUM, _COUNT, _LAST, _LAST_TS = range(7)
+
+
+class WindowAggregator:
+    """Min/max/mean/last aggregation per (host, key) over fixed windows.
+
+    Args:
+        emit_func (callable): Called with a list of aggregate items.
+        item_factory (callable): Builds one item from (host, key, value, timestamp).
+        window_seconds (float): Default window length.
+        windows (dict | None): Window length per group (e.g. {"pluviometer": 300}).
+        stats (iterable[str]): Statistics to emit, a subset of STATS.
+        key_suffixes (dict | None): Key suffix per statistic.
+        grace (float): Seconds after a window's end before it is closed by time.
+    """
+
+    def __init__(
+        self,
+        emit_func: Callable[[list], object],
+        item_factory: Callable[[str, str, object, float], dict],
+        window_seconds: float = 60.0,
+        windows: Optional[Dict[str, float]] = None,
+        stats: Iterable[str] = STATS,
+        key_suffixes: Optional[Dict[str, str]] = None,
+        grace: float = 2.0,
+    ):
+        self._emit_func = emit_func
+        self._item_factory = item_factory
+        self.window_seconds = max(1.0, float(window_seconds))
+        self.windows = {group: max(1.0, float(seconds)) for group, seconds in (windows or {}).items()}
+        stats = list(stats)
+        self.stats = tuple(stat for stat in STATS if stat in stats)
+        unknown = set(stats) - set(STATS)
+        if unknown:
+            raise ValueError(f"Unknown aggregation stats {sorted(unknown)}. Expected a subset of {STATS}.")
+        suffixes = dict(DEFAULT_KEY_SUFFIXES)
+        suffixes.update(key_suffixes or {})
+        self.key_suffixes = suffixes
+        self.grace = max(0.0, float(grace))
+        # (host, key) -> (window length, state list)
+        self._state: Dict[Tuple[str, str], Tuple[float, list]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start the thread that closes windows by time (idempotent)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="zabbix-aggregator")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the timer thread and emit every open window."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        self.flush_all()
+
+    def add(self, group: str, host: str, pairs: List[Tuple[str, object]], timestamp: Optional[float]) -> None:
+        """Fold the (key, value) pairs of one record into their windows.
+
+        Args:
+            group (str): Window group of the record (e.g. "inclinometer").
+            host (str): Zabbix host name.
+            pairs (list): (zabbix_key, value) pairs; non-numeric values are ignored.
+            timestamp (float | None): Source timestamp (epoch seconds); defaults to now.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        window = self.windows.get(group, self.window_seconds)
+        window_start = timestamp - (timestamp % window)
+        closed = []
+        with self._lock:
+            for key, value in pairs:
+                try:
+                    value = float(value)
+                except (TypeError, ValueError):
+                    continue
+                entry = self._state.get((host, key))
+                if entry is not None and entry[1][_START] < window_start:
+                    closed.append((host, key, entry[1]))
+                    entry = None
+                if entry is None:
+                    self._state[(host, key)] = (window, [window_start, value, value, value, 1, value, timestamp])
+                    continue
+                state = entry[1]
+                if value < state[_MIN]:
+                    state[_MIN] = value
+                if value > state[_MAX]:
+                    state[_MAX] = value
+                state[_SUM] += value
+                state[_COUNT] += 1
+                state[_LAST] = value
+                state[_LAST_TS] = max(state[_LAST_TS], timestamp)
+        self._emit(closed)
+
+    def flush_expired(self, now: Optional[float] = None) -> None:
+        """Emit the windows that ended more than `grace` seconds before `now`."""
+        if now is None:
+            now = time.time()
+        closed = []
+        with self._lock:
+            for (host, key), (window, state) in list(self._state.items()):
+                if state[_START] + window + self.grace <= now:
+                    del self._state[(host, key)]
+                    closed.append((host, key, state))
+        self._emit(closed)
+
+    def flush_all(self) -> None:
+        """Emit every open window (e.g. on shutdown)."""
+        with self._lock:
+            closed = [(host, key, state) for (host, key), (_, state) in self._state.items()]
+            self._state.clear()
+        self._emit(closed)
+
+    def _emit(self, closed) -> None:
+        if not closed:
+            return
+        items = []
+        make = self._item_factory
+        suffixes = self.key_suffixes
+        for host, key, state in closed:
+            values = {
+                "min": state[_MIN],
+                "max": state[_MAX],
+                "mean": round(state[_SUM] / state[_COUNT], 6),
+                "last": state[_LAST],
+            }
+            for stat in self.stats:
+                items.append(make(host, key + suffixes.get(stat, ""), values[stat], state[_LAST_TS]))
+        try:
+            self._emit_func(items)
+        except Exception as e:
+            logger.error(f"Error submitting {len(items)} aggregated items: {e}")
+
+    def _run(self) -> None:
+        interval = min(1.0, self.grace or 1.0)
+        while not self._stop.wait(interval):
+            self.flush_expired()
@@ -0,0 +1,471 @@
+"""Bulk import of the TSV archive into Zabbix (historical backfill).
+
+After a long outage, or when a new Zabbix server is commissioned, the values
+already archived by `utils.data_storage` can be pushed to Zabbix with their
+original timestamps:
+
+    python main.py backfill [--from 2025-09-01] [--to 2025-09-20]
+        [--station CHONTAL ...] [--sensor inclinometer|pluviometer ...]
+        [--workers 4] [--batch-items 5000] [--checkpoint FILE] [--restart]
+        [--server HOST] [--port 10051]
+
+The daily files are streamed row by row (`archive_query.iter_rows_from`),
+the columns are mapped back to item keys through `zabbix_keys`, and the
+items (stamped with the row's date and time) are sent with the native
+trapper protocol in large batches. Files are distributed over `workers`
+threads, each with its own connections, so several batches are in flight at
+once.
+
+The targets are the `zabbix_endpoints` of the live sender: in "failover"
+mode each batch goes to the healthiest endpoint that takes it, in "fanout"
+mode to every endpoint, and a file only advances once all of them have
+acknowledged the batch. `--server`/`--port` send to that single endpoint
+instead. The live-path aggregation and deadband filters are not applied: the
+archive is replayed as raw values.
+
+Progress is kept in a checkpoint file: for every daily file, the byte offset
+just after the last row that Zabbix acknowledged (in the uncompressed
+stream, so it stays valid when the day is compressed). It is written atomically
+every `checkpoint_interval_seconds` and when the import stops, so an
+interrupted import (Ctrl+C, SIGTERM, lost connection) resumes where it left
+off, and a later run only sends the rows appended since. The checkpoint also
+records the endpoints and time range it belongs to; a run with different ones
+must use `--restart` or another `--checkpoint` file.
+
+Zabbix only stores values for existing hosts and trapper items; historical
+timestamps are accepted as sent, but values older than the item's history
+storage period are discarded by the housekeeper.
+
+Configuration (config.json → zabbix_backfill): workers (4), batch_items
+(5000), checkpoint_file ("./backfill_checkpoint.json"),
+checkpoint_interval_seconds (5), timeout (30), retries (5).
+"""
+
+import argparse
+import json
+import logging
+import os
+import queue
+import signal
+import threading
+import time
+from datetime import date, datetime
+from typing import List, Optional
+
+from config.app_config import APP_CONFIG
+from config.runtime_config import get_runtime_config
+from config.zabbix_config import ZABBIX_PORT, ZABBIX_SERVER
+from utils.archive_query import SENSOR_DIRS, daily_file_stat, iter_rows_from, list_daily_files
+from utils.zabbix_endpoints import Endpoint, EndpointSet, build_endpoint_set
+from utils.zabbix_trapper import ZabbixTrapperClient, ZabbixTrapperError
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_VERSION = 1
+
+# Archive columns after FECHA/TIEMPO, in order, as parsed data keys (see data_storage)
+COLUMN_FIELDS = {
+    "inclinometer": ("radial", "tangential", "temperature", "voltage"),
+    "pluviometer": ("rain_level", "voltage"),
+}
+HOST_SUFFIXES = {
+    "inclinometer": "_IN",
+    "pluviometer": "_PL",
+}
+
+
+def get_backfill_options() -> dict:
+    """Options from `APP_CONFIG['zabbix_backfill']`."""
+    cfg = APP_CONFIG.get("zabbix_backfill", {}) if isinstance(APP_CONFIG, dict) else {}
+    return {
+        "workers": max(1, int(cfg.get("workers", 4))),
+        "batch_items": max(1, int(cfg.get("batch_items", 5000))),
+        "checkpoint_file": str(cfg.get("checkpoint_file", "./backfill_checkpoint.json")),
+        "checkpoint_interval": max(0.1, float(cfg.get("checkpoint_interval_seconds", 5.0))),
+        "timeout": float(cfg.get("timeout", 30)),
+        "retries": max(0, int(cfg.get("retries", 5))),
+    }
+
+
+class BackfillCheckpoint:
+    """Byte offsets reached in each archive file, persisted as JSON.
+
+    Args:
+        path (str): Checkpoint file.
+        scope (dict): Endpoints and time range of the import; a stored
+            checkpoint with a different scope is refused.
+        restart (bool): Ignore (and overwrite) a stored checkpoint.
+    """
+
+    def __init__(self, path: str, scope: dict, restart: bool = False):
+        self.path = path
+        self.scope = scope
+        self.offsets = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        if restart or not os.path.exists(path):
+            return
+        with open(path, "r") as f:
+            stored = json.load(f)
+        if stored.get("version") != CHECKPOINT_VERSION or stored.get("scope") != scope:
+            raise ValueError(
+                f"Checkpoint {path} belongs to another import ({stored.get('scope')}); "
+                f"use --restart or a different --checkpoint file."
+            )
+        self.offsets = dict(stored.get("files", {}))
+
+    def get(self, name: str) -> int:
+        with self._lock:
+            return self.offsets.get(name, 0)
+
+    def set(self, name: str, offset: int) -> None:
+        with self._lock:
+            self.offsets[name] = offset
+            self._dirty = True
+
+    def save(self) -> None:
+        """Write the checkpoint atomically if it changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            document = {"version": CHECKPOINT_VERSION, "scope": self.scope, "files": dict(self.offsets)}
+            self._dirty = False
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(document, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+class _Progress:
+    """Counters shared by the worker threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rows = 0
+        self.items = 0
+        self.rejected = 0
+        self.files = 0
+        self.failed_files = 0
+
+    def add(self, rows: int, items: int, rejected: int) -> None:
+        with self.lock:
+            self.rows += rows
+            self.items += items
+            self.rejected += rejected
+
+
+def _get_endpoints(server: Optional[str], port: Optional[int], timeout: float) -> EndpointSet:
+    """The trapper endpoints to import into.
+
+    `server`/`port` name a single endpoint; otherwise they are the
+    `zabbix_endpoints` of the live sender, or the single
+    `ZABBIX_SERVER:ZABBIX_PORT` of `config/zabbix_config.py`.
+    """
+    if server or port:
+        server = server or ZABBIX_SERVER
+        port = int(port or ZABBIX_PORT)
+        return EndpointSet([Endpoint(f"{server}:{port}", server, port)])
+    return build_endpoint_set(
+        get_runtime_config().section("zabbix_endpoints"), ZABBIX_SERVER, int(ZABBIX_PORT), timeout
+    )
+
+
+def _send_once(endpoint: Endpoint, client: ZabbixTrapperClient, items: List[dict]) -> Optional[int]:
+    """Send one batch to one endpoint; return the number of rejected items, or None if it failed."""
+    started = time.monotonic()
+    try:
+        rejected = client.send(items).failed
+    except ZabbixTrapperError as e:
+        logger.error(f"Backfill send to {endpoint.name} ({endpoint.address}) failed: {e}")
+        endpoint.record(False, time.monotonic() - started, len(items))
+        return None
+    endpoint.record(True, time.monotonic() - started, len(items))
+    return rejected
+
+
+def _send_with_retries(
+    endpoints: EndpointSet, clients: dict, items: List[dict], retries: int, stop_event,
+) -> Optional[int]:
+    """Send one batch; return the number of rejected items, or None if it could not be sent.
+
+    In failover mode each round tries the endpoints from the best score down
+    until one takes the batch; in fan-out mode it goes to every endpoint in
+    parallel, and later rounds only retry the endpoints that failed.
+    `clients` maps each endpoint to the worker's connection to it.
+    """
+    accepted = {}  # endpoint -> rejected items (fan-out)
+
+    def send(endpoint: Endpoint) -> bool:
+        if endpoint not in accepted:
+            rejected = _send_once(endpoint, clients[endpoint], items)
+            if rejected is None:
+                return False
+            accepted[endpoint] = rejected
+        return True
+
+    attempt = 0
+    while True:
+        if endpoints.fanout:
+            if all(endpoints.fan_out(send)):
+                return max(accepted.values())
+        else:
+            for endpoint in endpoints.ranked():
+                rejected = _send_once(endpoint, clients[endpoint], items)
+                if rejected is not None:
+                    previous = endpoints.active
+                    if endpoints.set_active(endpoint) and previous is not None:
+                        logger.warning(
+                            f"Backfill failover: sending to {endpoint.name} ({endpoint.address}) instead of {previous.name}."
+                        )
+                    return rejected
+        if attempt >= retries or stop_event.is_set():
+            return None
+        backoff = min(60, 2 ** attempt)
+        logger.info(f"Retrying backfill batch in {backoff}s (attempt {attempt + 1}/{retries})...")
+        if stop_event.wait(backoff):
+            return None
+        attempt += 1
+
+
+def _backfill_file(
+    endpoints: EndpointSet, clients: dict, sensor: str, station: str, path: str, name: str,
+    checkpoint: BackfillCheckpoint, start: float, end: float,
+    opts: dict, progress: _Progress, stop_event,
+) -> bool:
+    """Send the rows of one daily file from its checkpoint offset. Returns False on failure."""
+    key_map = get_runtime_config().zabbix_keys.get(sensor, {})
+    columns = [(index, key_map.get(field)) for index, field in enumerate(COLUMN_FIELDS[sensor], 2)]
+    columns = [(index, key) for index, key in columns if key]
+    host = f"{station}{HOST_SUFFIXES[sensor]}"
+
+    offset = checkpoint.get(name)
+    if offset > daily_file_stat(path)[0]:
+        logger.warning(f"{path} is shorter than its checkpoint offset; sending it again from the start.")
+        offset = 0
+
+    batch: List[dict] = []
+    rows = 0
+    batch_end = offset
+
+    def flush() -> bool:
+        nonlocal batch, rows
+        if batch:
+            rejected = _send_with_retries(endpoints, clients, batch, opts["retries"], stop_event)
+            if rejected is None:
+                return False
+            if rejected:
+                logger.warning(f"Zabbix rejected {rejected} of {len(batch)} items from {path} (check host {host} and its item keys).")
+            progress.add(rows, len(batch), rejected)
+        checkpoint.set(name, batch_end)
+        batch, rows = [], 0
+        return True
+
+    for row_end, ts, fields in iter_rows_from(path, offset):
+        if start <= ts < end:
+            clock = int(ts)
+            for index, key in columns:
+                if index < len(fields) and fields[index] != "":
+                    batch.append({"host": host, "key": key, "value": fields[index], "clock": clock, "ns": 0})
+            rows += 1
+        batch_end = row_end
+        if len(batch) >= opts["batch_items"]:
+            if stop_event.is_set() or not flush():
+                return False
+    return flush()
+
+
+def run_backfill(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    stations=None,
+    sensors=None,
+    base_dir: Optional[str] = None,
+    server: Optional[str] = None,
+    port: Optional[int] = None,
+    checkpoint_file: Optional[str] = None,
+    restart: bool = False,
+    workers: Optional[int] = None,
+    batch_items: Optional[int] = None,
+    stop_event: Optional[threading.Event] = None,
+    progress_interval: float = 10.0,
+) -> dict:
+    """Import archived rows into Zabbix; arguments override `zabbix_backfill` options.
+
+    Args:
+        start (datetime | None): Inclusive start (local time); default: everything.
+        end (datetime | None): Exclusive end; default: everything.
+        stations (iterable[str] | None): Station names; default: all found.
+        sensors (iterable[str] | None): "inclinometer" and/or "pluviometer".
+        stop_event (threading.Event | None): Set to stop after the batches in flight.
+
+    Returns:
+        dict: rows, items, rejected, files, failed_files, seconds, complete.
+    """
+    opts = get_backfill_options()
+    if workers is not None:
+        opts["workers"] = max(1, int(workers))
+    if batch_items is not None:
+        opts["batch_items"] = max(1, int(batch_items))
+    base_dir = base_dir or APP_CONFIG.get("base_dir", "./DTA")
+    endpoints = _get_endpoints(server, port, opts["timeout"])
+    stop_event = stop_event or threading.Event()
+    sensors = list(sensors or SENSOR_DIRS)
+    start_ts = start.timestamp() if start else float("-inf")
+    end_ts = end.timestamp() if end else float("inf")
+    first_day = start.date() if start else date.min
+    last_day = end.date() if end else date.max
+
+    scope = {
+        "server": ",".join(endpoint.address for endpoint in endpoints),
+        "from": start.isoformat() if start else None,
+        "to": end.isoformat() if end else None,
+    }
+    checkpoint = BackfillCheckpoint(checkpoint_file or opts["checkpoint_file"], scope, restart)
+
+    work = queue.Queue()
+    for sensor in sensors:
+        for station, day, path in list_daily_files(base_dir, sensor, stations):
+            if first_day <= day <= last_day:
+                work.put((sensor, station, path, os.path.relpath(path, base_dir)))
+    total_files = work.qsize()
+    logger.info(
+        f"Backfill of {total_files} archive files to Zabbix {scope['server']} ({endpoints.mode}) "
+        f"with {opts['workers']} connections, {opts['batch_items']} items per batch."
+    )
+
+    progress = _Progress()
+
+    def worker():
+        clients = {
+            endpoint: ZabbixTrapperClient(endpoint.server, endpoint.port, timeout=opts["timeout"])
+            for endpoint in endpoints
+        }
+        try:
+            while not stop_event.is_set():
+                try:
+                    sensor, station, path, name = work.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    ok = _backfill_file(
+                        endpoints, clients, sensor, station, path, name, checkpoint,
+                        start_ts, end_ts, opts, progress, stop_event,
+                    )
+                except OSError as e:
+                    logger.error(f"Cannot read {path}: {e}")
+                    ok = None
+                with progress.lock:
+                    if ok:
+                        progress.files += 1
+                    else:
+                        progress.failed_files += 1
+                if ok is False and not stop_event.is_set():
+                    # Zabbix is unreachable: stop everything, the next run resumes
+                    logger.error(f"Backfill stopped at {path}; run it again to resume from the checkpoint.")
+                    stop_event.set()
+        finally:
+            for client in clients.values():
+                client.close()
+
+    started = time.monotonic()
+    threads = [
+        threading.Thread(target=worker, name=f"backfill-{index}", daemon=True)
+        for index in range(min(opts["workers"], max(1, total_files)))
+    ]
+    for thread in threads:
+        thread.start()
+
+    last_save = last_report = started
+    try:
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=0.2)
+            now = time.monotonic()
+            if now - last_save >= opts["checkpoint_interval"]:
+                checkpoint.save()
+                last_save = now
+            if now - last_report >= progress_interval:
+                last_report = now
+                with progress.lock:
+                    items, files = progress.items, progress.files + progress.failed_files
+                logger.info(
+                    f"Backfill progress: {files}/{total_files} files, {items} items "
+                    f"({items / (now - started):.0f} items/s)."
+                )
+    except KeyboardInterrupt:
+        logger.info("Backfill interrupted; finishing the batches in flight...")
+        stop_event.set()
+        for thread in threads:
+            thread.join()
+    finally:
+        checkpoint.save()
+        endpoints.close()
+
+    seconds = time.monotonic() - started
+    summary = {
+        "rows": progress.rows,
+        "items": progress.items,
+        "rejected": progress.rejected,
+        "files": progress.files,
+        "failed_files": progress.failed_files,
+        "seconds": seconds,
+        "complete": progress.files == total_files,
+    }
+    logger.info(
+        f"Backfill {'complete' if summary['complete'] else 'incomplete'}: {summary['rows']} rows, "
+        f"{summary['items']} items ({summary['rejected']} rejected) from {summary['files']}/{total_files} files "
+        f"in {seconds:.1f}s ({summary['items'] / max(seconds, 1e-9):.0f} items/s)."
+    )
+    return summary
+
+
+def _parse_time(value: str) -> datetime:
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid time '{value}' (expected e.g. 2025-09-16 or 2025-09-16 02:00)")
+
+
+def main(argv=None) -> int:
+    """Command line of `python main.py backfill`; returns the exit status."""
+    parser = argparse.ArgumentParser(
+        prog="main.py backfill",
+        description="Send the local TSV archive to Zabbix with the original timestamps (resumable).",
+    )
+    parser.add_argument("--from", dest="start", type=_parse_time, help="inclusive start (local time)")
+    parser.add_argument("--to", dest="end", type=_parse_time, help="exclusive end (local time)")
+    parser.add_argument("--station", action="append", help="station name (repeatable; default: all)")
+    parser.add_argument("--sensor", action="append", choices=tuple(SENSOR_DIRS), help="sensor type (repeatable; default: both)")
+    parser.add_argument("--base-dir", help="archive root (default: base_dir from config.json)")
+    parser.add_argument("--server", help="single Zabbix server (default: zabbix_endpoints or config/zabbix_config.py)")
+    parser.add_argument("--port", type=int, help="Zabbix trapper port")
+    parser.add_argument("--workers", type=int, help="parallel connections")
+    parser.add_argument("--batch-items", type=int, help="items per trapper request")
+    parser.add_argument("--checkpoint", help="checkpoint file")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and send everything again")
+    args = parser.parse_args(argv)
+    if args.start and args.end and args.start >= args.end:
+        parser.error("--from must be earlier than --to")
+
+    stop_event = threading.Event()
+
+    def handle_signal(signum, frame):
+        logger.info(f"Received signal {signum}. Stopping backfill after the batches in flight...")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    try:
+        summary = run_backfill(
+            start=args.start, end=args.end, stations=args.station, sensors=args.sensor,
+            base_dir=args.base_dir, server=args.server, port=args.port,
+            checkpoint_file=args.checkpoint, restart=args.restart,
+            workers=args.workers, batch_items=args.batch_items, stop_event=stop_event,
+        )
+    except (OSError, ValueError) as e:
+        logger.error(f"Backfill cannot start: {e}")
+        return 2
+    return 0 if summary["complete"] else 1
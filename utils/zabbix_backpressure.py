@@ -0,0 +1,157 @@
+"""Capacity limits and load shedding for the Zabbix spool.
+
+During a long Zabbix outage the spool journal (`utils.spool_journal`) would
+grow until the SD card is full. A `SpoolLimiter` keeps a journal within a
+size and an age limit and degrades the oldest data first:
+
+- Sealed segments last written more than `max_age` seconds ago are dropped.
+- While the journal is larger than `max_bytes`, its oldest sealed segment is
+  shed according to the policy:
+  - "drop_oldest": the segment is dropped.
+  - "downsample": only every `downsample_factor`-th value of each host and
+    key is kept.
+  - "pluviometer_only": only the items of pluviometer hosts (`_PL`) are kept.
+
+  The items kept are appended again as records marked as shed, and the
+  segment is dropped. Records already marked as shed are discarded when
+  their segment is shed again, and so is a segment where the policy would
+  remove nothing, so every step shrinks the journal: old data is first
+  thinned once, then discarded.
+
+Every discarded item is counted in `zabbix_shed_items_total` by reason
+("age", "drop_oldest", "downsample", "pluviometer_only"). The in-memory
+limit is the batcher queue (`zabbix_batcher.queue_size`, submissions that do
+not fit are spooled) and the replay rate is `drain_max_items_per_second`.
+"""
+
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config.runtime_config import SHED_POLICIES
+from utils import metrics
+from utils.spool_journal import SpoolJournal
+
+logger = logging.getLogger(__name__)
+
+# Host suffix of pluviometer items (see zabbix_sender.send_pluviometer_to_zabbix)
+PLUVIOMETER_HOST_SUFFIX = "_PL"
+
+# Items per record when shed survivors are written back
+_RECORD_ITEMS = 1000
+
+Decoder = Callable[[bytes], Tuple[List[dict], bool]]  # payload -> (items, already shed)
+Encoder = Callable[[List[dict], bool], bytes]  # (items, shed) -> payload
+
+
+class SpoolLimiter:
+    """Keeps spool journals within a size and an age limit.
+
+    Args:
+        max_bytes (int): Size limit of a journal in bytes (0 = unlimited).
+        max_age (float): Age limit of sealed segments in seconds (0 = unlimited).
+        policy (str): One of SHED_POLICIES.
+        downsample_factor (int): Keep 1 of N values per host and key ("downsample").
+        check_interval (float): Minimum seconds between two checks (see `due`).
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 0,
+        max_age: float = 0.0,
+        policy: str = "downsample",
+        downsample_factor: int = 10,
+        check_interval: float = 10.0,
+    ):
+        if policy not in SHED_POLICIES:
+            raise ValueError(f"Unknown shedding policy '{policy}' (expected one of {SHED_POLICIES})")
+        self.max_bytes = max(0, int(max_bytes))
+        self.max_age = max(0.0, float(max_age))
+        self.policy = policy
+        self.downsample_factor = max(2, int(downsample_factor))
+        self.check_interval = max(0.0, float(check_interval))
+        self._last_check: Optional[float] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 or self.max_age > 0
+
+    def due(self, now: Optional[float] = None) -> bool:
+        """True (and restart the interval) if the limits should be checked now."""
+        if not self.enabled:
+            return False
+        now = time.monotonic() if now is None else now
+        if self._last_check is not None and now - self._last_check < self.check_interval:
+            return False
+        self._last_check = now
+        return True
+
+    def shed(self, items: List[dict]) -> List[dict]:
+        """The items the policy keeps, in their original order."""
+        if self.policy == "pluviometer_only":
+            return [item for item in items if str(item["host"]).endswith(PLUVIOMETER_HOST_SUFFIX)]
+        if self.policy == "downsample":
+            seen: Dict[Tuple[str, str], int] = {}
+            kept = []
+            for item in items:
+                series = (item["host"], item["key"])
+                count = seen.get(series, 0)
+                seen[series] = count + 1
+                if count % self.downsample_factor == 0:
+                    kept.append(item)
+            return kept
+        return []
+
+    def enforce(
+        self, journal: SpoolJournal, decode: Decoder, encode: Encoder, max_bytes: Optional[int] = None
+    ) -> Dict[str, int]:
+        """Shed sealed segments of `journal`, oldest first, until it is within the limits.
+
+        Must not run while the journal is being replayed.
+
+        Args:
+            max_bytes (int | None): Size limit for this journal (default `self.max_bytes`).
+
+        Returns:
+            dict: Items discarded per reason.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max(0, int(max_bytes))
+        shed: Dict[str, int] = {}
+        oldest_allowed = time.time() - self.max_age
+        for segment_id, _, mtime in journal.sealed_segments():
+            too_old = self.max_age > 0 and mtime < oldest_allowed
+            if not too_old and not (max_bytes > 0 and journal.pending_bytes() > max_bytes):
+                break
+            records = []
+            for payload, position in journal.iter_records():
+                if position.segment != segment_id:
+                    break
+                try:
+                    records.append(decode(payload))
+                except (ValueError, TypeError) as e:
+                    logger.error(f"Skipping undecodable spool record while shedding: {e}")
+            previously_shed = sum(len(items) for items, was_shed in records if was_shed)
+            fresh = [item for items, was_shed in records if not was_shed for item in items]
+            kept = [] if too_old or self.policy == "drop_oldest" else self.shed(fresh)
+            if len(kept) == len(fresh):
+                kept = []  # nothing to thin out in this segment: drop it
+            if too_old:
+                discarded = {"age": previously_shed + len(fresh)}
+            elif kept:
+                discarded = {"drop_oldest": previously_shed, self.policy: len(fresh) - len(kept)}
+            else:
+                discarded = {"drop_oldest": previously_shed + len(fresh)}
+            for start in range(0, len(kept), _RECORD_ITEMS):
+                journal.append(encode(kept[start:start + _RECORD_ITEMS], True))
+            journal.drop_segment(segment_id)
+            for reason, count in discarded.items():
+                if count:
+                    shed[reason] = shed.get(reason, 0) + count
+                    metrics.SHED_ITEMS.labels(reason).inc(count)
+        if shed:
+            logger.warning(
+                f"Spool limits reached for {journal.directory}: shed "
+                + ", ".join(f"{count} items ({reason})" for reason, count in sorted(shed.items()))
+                + f"; {journal.pending_bytes()} bytes pending."
+            )
+        return shed
@@ -0,0 +1,122 @@
+"""Background write-combining batcher for Zabbix sends.
+
+Serial reader threads hand their Zabbix items to a `ZabbixBatcher` instead of
+sending them inline. A single flusher thread drains a bounded in-memory queue,
+merges the items of every port and station into one batch, and sends it when
+either `max_items` items are pending or `max_delay` seconds have passed since
+the first pending item, whichever comes first. Readers therefore never block
+on the network, retries or backoff sleeps.
+
+When the queue is full, `submit` returns False immediately so the caller can
+fall back (e.g. spool the items to disk) without stalling the reader.
+"""
+
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class ZabbixBatcher:
+    """Bounded queue plus one flusher thread that combines sends.
+
+    Args:
+        send_func (callable): Called with a list of items for every flush.
+        max_items (int): Flush as soon as this many items are pending.
+        max_delay (float): Maximum seconds an item waits before being flushed.
+        queue_size (int): Maximum number of pending submissions in memory.
+    """
+
+    def __init__(
+        self,
+        send_func: Callable[[list], object],
+        max_items: int = 500,
+        max_delay: float = 1.0,
+        queue_size: int = 10000,
+    ):
+        self._send_func = send_func
+        self.max_items = max(1, int(max_items))
+        self.max_delay = max(0.0, float(max_delay))
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start the flusher thread (idempotent)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="zabbix-batcher")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Flush everything still queued and stop the flusher thread."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)  # blocking put: the flusher is draining
+        self._thread.join(timeout=timeout)
+        if self._thread.is_alive():
+            logger.warning("Zabbix batcher did not stop within timeout; pending items may be lost.")
+        self._thread = None
+
+    def submit(self, items: list) -> bool:
+        """Queue items for the next batch without blocking.
+
+        Returns:
+            bool: False if the queue is full and the items were not accepted.
+        """
+        if not items:
+            return True
+        try:
+            self._queue.put_nowait(items)
+            return True
+        except queue.Full:
+            return False
+
+    def qsize(self) -> int:
+        """Approximate number of submissions waiting in the queue."""
+        return self._queue.qsize()
+
+    def _flush(self, batch: list) -> None:
+        try:
+            self._send_func(batch)
+        except Exception as e:
+            logger.error(f"Zabbix batcher flush of {len(batch)} items failed: {e}")
+
+    def _run(self) -> None:
+        batch: list = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                entry = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                entry = None
+
+            if entry is _STOP:
+                # Drain whatever is left before exiting
+                while True:
+                    try:
+                        rest = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if rest is not _STOP:
+                        batch.extend(rest)
+                while batch:
+                    self._flush(batch[:self.max_items])
+                    batch = batch[self.max_items:]
+                return
+
+            if entry is not None:
+                if not batch:
+                    deadline = time.monotonic() + self.max_delay
+                batch.extend(entry)
+
+            if batch and (len(batch) >= self.max_items or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+                deadline = None
@@ -0,0 +1,112 @@
+"""Deadband and heartbeat filter for raw Zabbix items.
+
+Slow-moving values such as tilt temperature or battery voltage hardly change
+from one frame to the next. `DeadbandFilter` only lets an item through when
+its value moved past the item's threshold since the value last sent for the
+same host and key, or when `heartbeat` seconds passed since that send, so
+Zabbix still receives a value regularly (and `nodata()` triggers keep
+working). Thresholds can be absolute (`|v - last| > absolute`) and/or
+relative to the last sent value (`|v - last| > relative * |last|`); an item
+without any threshold is always sent. Time is measured with the records'
+source timestamps.
+
+The last-sent table is compact: a dict maps (host, key) to a slot in two
+`array('d')` columns holding the last sent value and its timestamp.
+"""
+
+import threading
+import time
+from array import array
+from typing import Dict, List, Mapping, Optional, Tuple
+
+# Rule: (absolute threshold or None, relative threshold or None, heartbeat seconds)
+Rule = Tuple[Optional[float], Optional[float], float]
+
+
+class DeadbandFilter:
+    """Change-only reporting per (host, key) with a heartbeat.
+
+    Args:
+        rules (dict): {(group, zabbix_key): (absolute, relative, heartbeat)}.
+            Items without a rule are always sent.
+    """
+
+    def __init__(self, rules: Dict[Tuple[str, str], Rule]):
+        self.rules = dict(rules)
+        self._slots: Dict[Tuple[str, str], int] = {}
+        self._values = array("d")
+        self._times = array("d")
+        self._lock = threading.Lock()
+        self.passed = 0
+        self.suppressed = 0
+
+    @classmethod
+    def from_config(cls, deadband_cfg: dict, key_maps: dict) -> "DeadbandFilter":
+        """Build the rules from the `zabbix_deadband` config section.
+
+        Args:
+            deadband_cfg (dict): {"heartbeat_seconds": float, "<group>": {"<field>":
+                {"absolute": float, "relative": float, "heartbeat_seconds": float}}}.
+            key_maps (dict): The `zabbix_keys` section, mapping fields to Zabbix keys.
+        """
+        default_heartbeat = float(deadband_cfg.get("heartbeat_seconds", 300))
+        rules = {}
+        for group, fields in deadband_cfg.items():
+            if not isinstance(fields, Mapping):
+                continue
+            key_map = key_maps.get(group, {})
+            for field, rule in fields.items():
+                zabbix_key = key_map.get(field)
+                if zabbix_key is None or not isinstance(rule, Mapping):
+                    continue
+                absolute = rule.get("absolute")
+                relative = rule.get("relative")
+                if absolute is None and relative is None:
+                    continue
+                rules[(group, zabbix_key)] = (
+                    None if absolute is None else float(absolute),
+                    None if relative is None else float(relative),
+                    float(rule.get("heartbeat_seconds", default_heartbeat)),
+                )
+        return cls(rules)
+
+    def filter(
+        self, group: str, host: str, pairs: List[Tuple[str, object]], timestamp: Optional[float]
+    ) -> List[Tuple[str, object]]:
+        """Return the (key, value) pairs of one record that should be sent."""
+        if timestamp is None:
+            timestamp = time.time()
+        rules = self.rules
+        selected = []
+        with self._lock:
+            for key, value in pairs:
+                rule = rules.get((group, key))
+                if rule is None:
+                    selected.append((key, value))
+                    continue
+                try:
+                    number = float(value)
+                except (TypeError, ValueError):
+                    selected.append((key, value))
+                    continue
+                slot = self._slots.get((host, key))
+                if slot is None:
+                    self._slots[(host, key)] = len(self._values)
+                    self._values.append(number)
+                    self._times.append(timestamp)
+                    selected.append((key, value))
+                    continue
+                absolute, relative, heartbeat = rule
+                last = self._values[slot]
+                delta = abs(number - last)
+                if (
+                    timestamp - self._times[slot] >= heartbeat
+                    or (absolute is not None and delta > absolute)
+                    or (relative is not None and delta > relative * abs(last))
+                ):
+                    self._values[slot] = number
+                    self._times[slot] = timestamp
+                    selected.append((key, value))
+            self.passed += len(selected)
+            self.suppressed += len(pairs) - len(selected)
+        return selected
@@ -0,0 +1,262 @@
+"""Several Zabbix trapper endpoints with health scoring, failover and fan-out.
+
+An `EndpointSet` holds the configured trapper endpoints (servers or proxies)
+in one of two modes:
+
+- "failover": every batch goes to one endpoint, the healthiest according to
+  a rolling score. A slow or failing endpoint drops down the ranking, so the
+  next batch goes to another one instead of waiting for the whole timeout and
+  retry ladder again.
+- "fanout": every batch goes to all endpoints at the same time (e.g. the
+  primary proxy plus a DR proxy) through a small worker pool, so the slowest
+  endpoint does not delay the others.
+
+The score of an endpoint is its latency, an exponentially weighted moving
+average of its send times (`initial_latency` until its first send), plus an
+error level times `error_penalty` seconds. The error level moves towards 1
+on each failure and towards 0 on each success, and halves every
+`error_half_life` seconds without sends, so an endpoint that failed is tried
+again after a while. In failover mode the current endpoint is kept until
+another one scores better by more than `switch_margin` seconds, so batches
+do not alternate between two healthy endpoints; equal scores keep the
+configured order.
+
+The transport (native client or zabbix_sender), the spool journal of each
+endpoint and the retries are handled by `utils.zabbix_sender`; this module
+only keeps the endpoints, their statistics and the worker pool.
+"""
+
+import math
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Mapping, Optional, Sequence
+
+from config.runtime_config import ENDPOINT_MODES
+
+
+class Endpoint:
+    """One trapper endpoint with its rolling health score and statistics.
+
+    Args:
+        name (str): Label used in logs, metrics and the spool directory.
+        server (str): Host name or address of the Zabbix server or proxy.
+        port (int): Trapper port.
+        alpha (float): Weight of the newest sample in the moving averages.
+        error_half_life (float): Seconds for the error level to halve
+            while no sends are made.
+        initial_latency (float): Latency assumed before the first send.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        server: str,
+        port: int,
+        alpha: float = 0.2,
+        error_half_life: float = 60.0,
+        initial_latency: float = 1.0,
+    ):
+        self.name = name
+        self.server = server
+        self.port = int(port)
+        self.alpha = min(1.0, max(0.01, float(alpha)))
+        self.error_half_life = max(0.0, float(error_half_life))
+        self.latency = max(0.0, float(initial_latency))  # seconds, moving average of the send times
+        self._error = 0.0
+        self._error_at = 0.0  # monotonic time of the last error update
+        self.sent_items = 0
+        self.failed_items = 0
+        self.sends = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+        # Managed by utils.zabbix_sender: native client and spool journal
+        self.client = None
+        self.journal = None
+        self.spool_dir = ""
+
+    def __repr__(self) -> str:
+        return f"Endpoint({self.name!r}, {self.server}:{self.port})"
+
+    @property
+    def address(self) -> str:
+        return f"{self.server}:{self.port}"
+
+    def error_level(self, now: Optional[float] = None) -> float:
+        """Error level in [0, 1], decayed for the time since the last send."""
+        if self._error == 0.0 or self.error_half_life <= 0:
+            return self._error
+        now = time.monotonic() if now is None else now
+        return self._error * math.pow(0.5, max(0.0, now - self._error_at) / self.error_half_life)
+
+    def score(self, error_penalty: float, now: Optional[float] = None) -> float:
+        """Lower is better: latency plus the error level times `error_penalty` seconds."""
+        return self.latency + self.error_level(now) * error_penalty
+
+    def record(self, ok: bool, seconds: float, items: int) -> None:
+        """Account one send (retries included) of `items` items that took `seconds`."""
+        now = time.monotonic()
+        with self._lock:
+            level = self.error_level(now)
+            self._error = level + self.alpha * ((0.0 if ok else 1.0) - level)
+            self._error_at = now
+            if self.sends == 0:
+                self.latency = seconds
+            else:
+                self.latency += self.alpha * (seconds - self.latency)
+            self.sends += 1
+            if ok:
+                self.sent_items += items
+            else:
+                self.failures += 1
+                self.failed_items += items
+
+    def stats(self, error_penalty: float) -> dict:
+        """A snapshot of the statistics of this endpoint."""
+        return {
+            "name": self.name,
+            "address": self.address,
+            "score": round(self.score(error_penalty), 6),
+            "latency_seconds": round(self.latency, 6),
+            "error_level": round(self.error_level(), 6),
+            "sends": self.sends,
+            "failures": self.failures,
+            "sent_items": self.sent_items,
+            "failed_items": self.failed_items,
+            "spool_pending_bytes": self.journal.pending_bytes() if self.journal is not None else 0,
+        }
+
+
+class EndpointSet:
+    """The configured endpoints, their ranking and the fan-out worker pool.
+
+    Args:
+        endpoints (list[Endpoint]): In order of preference.
+        mode (str): "failover" or "fanout".
+        workers (int): Threads of the fan-out pool.
+        error_penalty (float): Seconds added to the score at error level 1.
+        switch_margin (float): Seconds by which another endpoint must score
+            better than the current one to take over (failover).
+    """
+
+    def __init__(
+        self,
+        endpoints: Sequence[Endpoint],
+        mode: str = "failover",
+        workers: int = 4,
+        error_penalty: float = 10.0,
+        switch_margin: float = 0.1,
+    ):
+        if not endpoints:
+            raise ValueError("at least one endpoint is required")
+        if mode not in ENDPOINT_MODES:
+            raise ValueError(f"unknown endpoint mode '{mode}'")
+        self.endpoints = list(endpoints)
+        self.mode = mode
+        self.workers = max(1, int(workers))
+        self.error_penalty = max(0.0, float(error_penalty))
+        self.switch_margin = max(0.0, float(switch_margin))
+        self.active: Optional[Endpoint] = None  # last endpoint that took a failover batch
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    def __iter__(self):
+        return iter(self.endpoints)
+
+    @property
+    def fanout(self) -> bool:
+        return self.mode == "fanout" and len(self.endpoints) > 1
+
+    def ranked(self) -> List[Endpoint]:
+        """Endpoints from the best score to the worst (stable for equal scores).
+
+        The active endpoint comes first while it is within `switch_margin`
+        seconds of the best score.
+        """
+        now = time.monotonic()
+        scores = {id(endpoint): endpoint.score(self.error_penalty, now) for endpoint in self.endpoints}
+        ranked = sorted(self.endpoints, key=lambda endpoint: scores[id(endpoint)])
+        active = self.active
+        if active is not None and active is not ranked[0]:
+            if scores[id(active)] <= scores[id(ranked[0])] + self.switch_margin:
+                ranked.remove(active)
+                ranked.insert(0, active)
+        return ranked
+
+    def set_active(self, endpoint: Endpoint) -> bool:
+        """Record the endpoint that took a failover batch; True if it changed."""
+        changed = endpoint is not self.active
+        self.active = endpoint
+        return changed
+
+    def fan_out(self, func: Callable[[Endpoint], bool]) -> List[bool]:
+        """Run `func(endpoint)` for every endpoint concurrently and wait for all.
+
+        Returns:
+            list[bool]: The results in endpoint order (False if `func` raised).
+        """
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=min(self.workers, len(self.endpoints)), thread_name_prefix="zabbix-fanout"
+                )
+            pool = self._pool
+        futures = [pool.submit(func, endpoint) for endpoint in self.endpoints]
+        results = []
+        for future in futures:
+            try:
+                results.append(bool(future.result()))
+            except Exception:
+                results.append(False)
+        return results
+
+    def stats(self) -> List[dict]:
+        """Statistics of every endpoint, in configured order."""
+        return [endpoint.stats(self.error_penalty) for endpoint in self.endpoints]
+
+    def close(self) -> None:
+        """Stop the worker pool (waiting for running sends)."""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+def spool_dir_name(name: str) -> str:
+    """A directory name for the spool journal of endpoint `name`."""
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name) or "endpoint"
+
+
+def build_endpoint_set(cfg: Mapping, default_server: str, default_port: int, timeout: float) -> EndpointSet:
+    """Build the endpoints from `APP_CONFIG['zabbix_endpoints']`.
+
+    Without `servers`, the single endpoint is `default_server:default_port`
+    (`config/zabbix_config.py`). The error penalty defaults to `timeout`, the
+    time a failed send typically costs.
+    """
+    alpha = float(cfg.get("score_alpha", 0.2))
+    half_life = float(cfg.get("error_half_life_seconds", 60))
+    initial_latency = float(cfg.get("initial_latency_seconds", 1.0))
+    servers = cfg.get("servers") or [{"name": "default", "server": default_server, "port": default_port}]
+    endpoints = [
+        Endpoint(
+            str(entry.get("name") or f"{entry['server']}:{entry.get('port', 10051)}"),
+            str(entry["server"]),
+            int(entry.get("port", 10051)),
+            alpha=alpha,
+            error_half_life=half_life,
+            initial_latency=initial_latency,
+        )
+        for entry in servers
+    ]
+    return EndpointSet(
+        endpoints,
+        mode=str(cfg.get("mode", "failover")).lower(),
+        workers=int(cfg.get("workers", 4)),
+        error_penalty=float(cfg.get("error_penalty_seconds", timeout)),
+        switch_margin=float(cfg.get("switch_margin_seconds", 0.1)),
+    )
@@ -1,32 +1,101 @@
 """Zabbix sending utilities with batching, retries/backoff, and preflight.
 
-This module provides robust functions to send data points to a Zabbix server
-using the `zabbix_sender` command-line utility.
+This module provides robust functions to send data points to a Zabbix server,
+either with the built-in trapper protocol client (`utils.zabbix_trapper`,
+transport "native") or with the `zabbix_sender` command-line utility
+(transport "subprocess").
 
 Enhancements:
+- Native transport: one reused TCP connection, no fork/exec or temp files
+- Several trapper endpoints (`utils.zabbix_endpoints`): failover to the
+  healthiest endpoint by a rolling latency/error score, or fan-out of every
+  batch to all endpoints in parallel, each with its own statistics and spool
+- Optional background batcher (`utils.zabbix_batcher`) that merges the sends
+  of all ports and stations so reader threads never block on the network
+- Optional windowed aggregation (`utils.zabbix_aggregator`) that sends
+  min/max/mean/last per station and key instead of, or besides, raw values
+- Optional deadband/heartbeat filter (`utils.zabbix_deadband`) so raw items
+  are only sent when they change meaningfully or a heartbeat is due
 - Batch sending per host using input file (-i) to reduce overhead
+- Every item carries its acquisition time (`clock`/`ns` in the native
+  protocol, `-T` for zabbix_sender), so late or replayed data keeps its
+  original timestamps
 - Retries with exponential backoff on failure/timeouts
-- Optional on-disk spool for failed batches and automatic draining
-- Configurable timeout, retries, verbosity and spool directory via config.json
-  with environment variable overrides
+- On-disk spool journal (`utils.spool_journal`) for failed batches, replayed
+  in a background thread as large merged batches with throughput pacing, and
+  kept within a size and age limit by load shedding
+  (`utils.zabbix_backpressure`)
+- Configurable transport, timeout, retries, verbosity and spool directory via
+  config.json with environment variable overrides, resolved once per runtime
+  configuration (`config.runtime_config`) instead of on every send
+- Key maps read from the current runtime configuration, so a reload (SIGHUP)
+  swaps them atomically between two records
 - Preflight checks on startup: presence of zabbix_sender and TCP connectivity
+- Runtime metrics (`utils.metrics`) for send latency, retries, spool traffic,
+  optionally self-reported as items of a `<gateway>_SELF` host
 """
 from __future__ import annotations
 
 import os
 import logging
+import glob
 import tempfile
 import subprocess
 import time
 import shutil
+import json
 import socket
-from typing import List, Tuple
+import threading
+from typing import List, Mapping, Optional, Tuple
 
-from config.app_config import APP_CONFIG
+from types import MappingProxyType
+
+from config.runtime_config import RuntimeConfig, add_reload_listener, get_runtime_config
 from config.zabbix_config import ZABBIX_SERVER, ZABBIX_PORT
+from utils.spool_journal import FSYNC_POLICIES, SpoolJournal
+from utils import metrics
+from utils.zabbix_aggregator import STATS, WindowAggregator
+from utils.zabbix_backpressure import SpoolLimiter
+from utils.zabbix_batcher import ZabbixBatcher
+from utils.zabbix_deadband import DeadbandFilter
+from utils.zabbix_endpoints import Endpoint, EndpointSet, build_endpoint_set, spool_dir_name
+from utils.zabbix_trapper import ZabbixTrapperClient, ZabbixTrapperError
 
 logger = logging.getLogger(__name__)
 
+TRANSPORTS = ("native", "subprocess")
+
+# Trapper endpoints, each with its native client (one reused TCP connection)
+# and its spool journal, created on first use
+_endpoints: Optional[EndpointSet] = None
+_endpoints_lock = threading.Lock()
+_trapper_client_lock = threading.Lock()
+
+# Disk spool journals for failed batches (opened lazily) and drain guard
+_spool_journal_lock = threading.Lock()
+_drain_lock = threading.Lock()
+_drain_thread: Optional[threading.Thread] = None
+_spool_limiter: Optional[SpoolLimiter] = None
+
+# Background batcher shared by all reader threads (None when not running)
+_batcher: Optional[ZabbixBatcher] = None
+
+AGGREGATION_MODES = ("replace", "both")
+_aggregator: Optional[WindowAggregator] = None
+_aggregation_mode = "replace"
+_deadband: Optional[DeadbandFilter] = None
+_deadband_loaded = False
+_deadband_lock = threading.Lock()
+_self_report_stop = threading.Event()
+_self_report_thread: Optional[threading.Thread] = None
+
+# (runtime config, options) of the last `_get_sender_options` call
+_sender_options: Optional[Tuple[RuntimeConfig, Mapping]] = None
+
+_SENT_ITEMS = metrics.SENDER_ITEMS.labels("sent")
+_FAILED_ITEMS = metrics.SENDER_ITEMS.labels("failed")
+_REJECTED_ITEMS = metrics.SENDER_ITEMS.labels("rejected")
+
 
 def _env_bool(name: str, default: bool) -> bool:
     val = os.getenv(name)
@@ -35,67 +104,188 @@ def _env_bool(name: str, default: bool) -> bool:
     return val.strip().lower() in ("1", "true", "yes", "on")
 
 
-def _get_sender_options():
+def _get_sender_options() -> Mapping:
     """Retrieve zabbix_sender options from config and environment.
 
+    The options are resolved once per runtime configuration and returned
+    read-only; a configuration reload resolves them again.
+
     Environment overrides (take precedence over config):
+      - ZBX_SENDER_TRANSPORT ("native" | "subprocess")
       - ZBX_SENDER_TIMEOUT (int seconds)
       - ZBX_SENDER_RETRIES (int)
       - ZBX_SENDER_VERBOSE (bool: 0/1, true/false, yes/no)
       - ZBX_SPOOL_DIR (path)
+      - ZBX_SPOOL_FSYNC ("always" | "interval" | "never")
     """
-    cfg = APP_CONFIG.get("zabbix_sender", {}) if isinstance(APP_CONFIG, dict) else {}
-
+    global _sender_options
+    config = get_runtime_config()
+    cached = _sender_options
+    if cached is not None and cached[0] is config:
+        return cached[1]
+    cfg = config.section("zabbix_sender")
+
+    transport = str(os.getenv("ZBX_SENDER_TRANSPORT", cfg.get("transport", "subprocess"))).strip().lower()
+    if transport not in TRANSPORTS:
+        logger.warning(f"Unknown zabbix_sender transport '{transport}'. Falling back to 'subprocess'.")
+        transport = "subprocess"
     timeout = int(os.getenv("ZBX_SENDER_TIMEOUT", cfg.get("timeout", 10)))
     retries = int(os.getenv("ZBX_SENDER_RETRIES", cfg.get("retries", 3)))
     verbose = _env_bool("ZBX_SENDER_VERBOSE", bool(cfg.get("verbose", False)))
     spool_dir = os.getenv("ZBX_SPOOL_DIR", cfg.get("spool_dir", "./zbx_spool"))
+    spool_fsync = str(os.getenv("ZBX_SPOOL_FSYNC", cfg.get("spool_fsync", "interval"))).strip().lower()
+    if spool_fsync not in FSYNC_POLICIES:
+        logger.warning(f"Unknown spool_fsync policy '{spool_fsync}'. Falling back to 'interval'.")
+        spool_fsync = "interval"
 
-    return {
+    options = MappingProxyType({
+        "transport": transport,
         "timeout": timeout,
         "retries": retries,
         "verbose": verbose,
         "spool_dir": spool_dir,
-    }
+        "spool_fsync": spool_fsync,
+        "spool_fsync_interval": float(cfg.get("spool_fsync_interval_seconds", 1.0)),
+        "spool_segment_bytes": int(cfg.get("spool_segment_bytes", 4 * 1024 * 1024)),
+        "drain_batch_items": max(1, int(cfg.get("drain_batch_items", 1000))),
+        "drain_max_items_per_second": max(0.0, float(cfg.get("drain_max_items_per_second", 2000))),
+    })
+    _sender_options = (config, options)
+    return options
 
 
 def preflight_check():
     """Run startup checks and attempt draining local spool.
 
-    - Verify `zabbix_sender` binary is available in PATH.
-    - Verify TCP connectivity to Zabbix server/port.
-    - Attempt to drain local spool directory if present.
+    - Verify `zabbix_sender` binary is available in PATH (subprocess transport).
+    - Verify TCP connectivity to every Zabbix endpoint.
+    - Shed spooled data beyond the spool limits, then attempt to drain the
+      local spool directory if present.
     """
     opts = _get_sender_options()
 
     # Check binary
-    if shutil.which("zabbix_sender") is None:
+    if opts["transport"] == "native":
+        logger.info("Using native Zabbix trapper protocol (zabbix_sender binary not required).")
+    elif shutil.which("zabbix_sender") is None:
         logger.warning("'zabbix_sender' binary not found in PATH. Data sending will fail until installed.")
     else:
         logger.info("zabbix_sender binary found.")
 
     # Check connectivity
-    try:
-        with socket.create_connection((ZABBIX_SERVER, int(ZABBIX_PORT)), timeout=opts["timeout"]) as _:
-            logger.info(f"Connectivity to Zabbix {ZABBIX_SERVER}:{ZABBIX_PORT} OK.")
-    except Exception as e:
-        logger.warning(f"Cannot connect to Zabbix {ZABBIX_SERVER}:{ZABBIX_PORT}: {e}. Will retry upon sends.")
+    endpoints = _get_endpoints()
+    if len(endpoints) > 1:
+        logger.info(
+            f"Zabbix endpoints ({endpoints.mode}): "
+            + ", ".join(f"{endpoint.name} {endpoint.address}" for endpoint in endpoints)
+        )
+    for endpoint in endpoints:
+        try:
+            with socket.create_connection((endpoint.server, endpoint.port), timeout=opts["timeout"]) as _:
+                logger.info(f"Connectivity to Zabbix {endpoint.address} OK.")
+        except Exception as e:
+            logger.warning(f"Cannot connect to Zabbix {endpoint.address}: {e}. Will retry upon sends.")
 
-    # Try draining spool
+    # Apply the spool limits, then try draining it (in the background: a large backlog is paced)
     try:
-        drain_spool()
+        _enforce_spool_limits(force=True)
+        _schedule_drain()
     except Exception as e:
         logger.warning(f"Failed draining spool at startup: {e}")
 
 
-def _run_sender_with_retries(file_path: str, verbose: bool, timeout: int, retries: int) -> bool:
-    """Execute zabbix_sender with retries and exponential backoff."""
+def make_item(host: str, key: str, value, timestamp: Optional[float] = None) -> dict:
+    """Build one Zabbix item, stamped with `timestamp` (epoch seconds) or now."""
+    if timestamp is None:
+        timestamp = time.time()
+    clock = int(timestamp)
+    return {
+        "host": host,
+        "key": key,
+        "value": value,
+        "clock": clock,
+        "ns": int((timestamp - clock) * 1e9),
+    }
+
+
+def _quote(token) -> str:
+    """Quote a zabbix_sender input-file token when it contains whitespace or quotes."""
+    text = str(token)
+    if text and not any(c.isspace() or c in '"\\' for c in text):
+        return text
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _items_to_sender_lines(items: List[dict]) -> Tuple[List[str], bool]:
+    """Format items for `zabbix_sender -i`.
+
+    Returns:
+        tuple: (lines, with_timestamps). When any item has a clock, every line
+        is written as "<host> <key> <clock> <value>" for use with `-T`
+        (items without a clock get the current time).
+    """
+    with_timestamps = any(item.get("clock") is not None for item in items)
+    now = int(time.time())
+    lines = []
+    for item in items:
+        host, key, value = _quote(item["host"]), _quote(item["key"]), _quote(item["value"])
+        if with_timestamps:
+            clock = item.get("clock")
+            lines.append(f"{host} {key} {int(clock) if clock is not None else now} {value}")
+        else:
+            lines.append(f"{host} {key} {value}")
+    return lines, with_timestamps
+
+
+def _get_endpoints() -> EndpointSet:
+    """Return the trapper endpoints, built on first use.
+
+    They come from the runtime `zabbix_endpoints` section, or are the single
+    `ZABBIX_SERVER:ZABBIX_PORT` of `config/zabbix_config.py`. The first
+    endpoint spools into `spool_dir` itself, the others into a subdirectory
+    named after them.
+    """
+    global _endpoints
+    endpoints = _endpoints
+    if endpoints is not None:
+        return endpoints
+    with _endpoints_lock:
+        if _endpoints is None:
+            opts = _get_sender_options()
+            endpoints = build_endpoint_set(
+                get_runtime_config().section("zabbix_endpoints"), ZABBIX_SERVER, int(ZABBIX_PORT), opts["timeout"]
+            )
+            for index, endpoint in enumerate(endpoints):
+                endpoint.spool_dir = opts["spool_dir"] if index == 0 else os.path.join(
+                    opts["spool_dir"], spool_dir_name(endpoint.name)
+                )
+                metrics.ENDPOINT_SCORE.labels(endpoint.name).set_function(
+                    lambda endpoint=endpoint: endpoint.score(endpoints.error_penalty)
+                )
+                metrics.ENDPOINT_SPOOL_BYTES.labels(endpoint.name).set_function(
+                    lambda endpoint=endpoint: endpoint.journal.pending_bytes() if endpoint.journal is not None else 0
+                )
+            _endpoints = endpoints
+        return _endpoints
+
+
+def get_endpoint_stats() -> List[dict]:
+    """Statistics of every Zabbix endpoint: score, latency, error level, items and spool backlog."""
+    return _get_endpoints().stats()
+
+
+def _run_sender_with_retries(
+    endpoint: Endpoint, file_path: str, verbose: bool, timeout: int, retries: int, with_timestamps: bool = False
+) -> bool:
+    """Execute zabbix_sender against `endpoint` with retries and exponential backoff."""
     base_cmd = [
         "zabbix_sender",
-        "-z", str(ZABBIX_SERVER),
-        "-p", str(ZABBIX_PORT),
+        "-z", endpoint.server,
+        "-p", str(endpoint.port),
         "-i", file_path,
     ]
+    if with_timestamps:
+        base_cmd.append("-T")
     if verbose:
         base_cmd.append("-vv")
 
@@ -112,9 +302,9 @@ def _run_sender_with_retries(file_path: str, verbose: bool, timeout: int, retrie
             logger.error("'zabbix_sender' command not found. Install it and ensure it is in PATH.")
             return False
         except subprocess.TimeoutExpired:
-            logger.error("zabbix_sender command timed out.")
+            logger.error(f"zabbix_sender command to {endpoint.address} timed out.")
         except subprocess.CalledProcessError as e:
-            logger.error("zabbix_sender failed. Output:")
+            logger.error(f"zabbix_sender to {endpoint.address} failed. Output:")
             if e.stdout:
                 logger.error(f"  stdout: {e.stdout.strip()}")
             if e.stderr:
@@ -123,138 +313,654 @@ def _run_sender_with_retries(file_path: str, verbose: bool, timeout: int, retrie
         if attempt >= retries:
             return False
         backoff = min(60, 2 ** attempt)
+        metrics.SENDER_RETRIES.labels("subprocess").inc()
         logger.info(f"Retrying zabbix_sender in {backoff}s (attempt {attempt + 1}/{retries})...")
         time.sleep(backoff)
         attempt += 1
 
 
-def _send_lines_batch(lines: List[str], allow_spool_on_fail: bool = True) -> bool:
-    """Send a batch of lines using zabbix_sender -i <tempfile>.
+def _get_trapper_client(endpoint: Endpoint, timeout: int) -> ZabbixTrapperClient:
+    """Return the native client of `endpoint`, creating it on first use."""
+    with _trapper_client_lock:
+        if endpoint.client is None:
+            endpoint.client = ZabbixTrapperClient(endpoint.server, endpoint.port, timeout=timeout)
+        else:
+            endpoint.client.timeout = float(timeout)
+        return endpoint.client
+
+
+def _run_native_with_retries(endpoint: Endpoint, items: List[dict], timeout: int, retries: int) -> bool:
+    """Send items to `endpoint` over the native trapper protocol with exponential backoff.
 
-    Each line must be in the format: "<host> <key> <value>".
+    Items rejected by the server (the "failed" count, e.g. unknown host or
+    key) are logged but not retried, since resending cannot fix them.
     """
-    if not lines:
-        return True
+    client = _get_trapper_client(endpoint, timeout)
 
-    opts = _get_sender_options()
+    attempt = 0
+    while True:
+        try:
+            result = client.send(items)
+            logger.debug(
+                "Zabbix trapper response: processed=%d failed=%d total=%d seconds=%s",
+                result.processed, result.failed, result.total, result.seconds,
+            )
+            if result.failed:
+                _REJECTED_ITEMS.inc(result.failed)
+                logger.warning(
+                    f"Zabbix {endpoint.address} rejected {result.failed} of {result.total} items "
+                    f"(check host names and item keys)."
+                )
+            return True
+        except ZabbixTrapperError as e:
+            logger.error(f"Native Zabbix send to {endpoint.address} failed: {e}")
 
-    # Write lines to a temporary file for zabbix_sender -i
+        if attempt >= retries:
+            return False
+        backoff = min(60, 2 ** attempt)
+        metrics.SENDER_RETRIES.labels("native").inc()
+        logger.info(f"Retrying native Zabbix send in {backoff}s (attempt {attempt + 1}/{retries})...")
+        time.sleep(backoff)
+        attempt += 1
+
+
+def _send_to_endpoint(endpoint: Endpoint, items: List[dict], opts: Mapping, retries: int) -> bool:
+    """Send items to one endpoint with the configured transport and update its score."""
     tmp_file = None
+    started = time.monotonic()
     try:
-        with tempfile.NamedTemporaryFile("w", delete=False) as tf:
-            tmp_file = tf.name
-            tf.write("\n".join(lines) + "\n")
-
-        ok = _run_sender_with_retries(tmp_file, opts["verbose"], opts["timeout"], opts["retries"])
-        if ok:
-            # Success: log a concise confirmation (include host(s))
-            try:
-                hosts = sorted({ln.split()[0] for ln in lines if ln.strip()})
-                if len(hosts) == 1:
-                    logger.info(
-                        f"Sent {len(lines)} metrics to Zabbix {ZABBIX_SERVER}:{ZABBIX_PORT} for host {hosts[0]}."
-                    )
-                else:
-                    preview = ", ".join(hosts[:3])
-                    suffix = "..." if len(hosts) > 3 else ""
-                    logger.info(
-                        f"Sent {len(lines)} metrics to Zabbix {ZABBIX_SERVER}:{ZABBIX_PORT} for {len(hosts)} hosts ({preview}{suffix})."
-                    )
-            except Exception:
-                logger.info(f"Sent {len(lines)} metrics to Zabbix {ZABBIX_SERVER}:{ZABBIX_PORT}.")
-            # On success, try drain spool as well
-            try:
-                drain_spool()
-            except Exception as e:
-                logger.debug(f"Drain spool after success failed: {e}")
-            return True
+        if opts["transport"] == "native":
+            ok = _run_native_with_retries(endpoint, items, opts["timeout"], retries)
         else:
-            if allow_spool_on_fail:
-                _spool_lines(lines)
-            return False
+            # Write lines to a temporary file for zabbix_sender -i
+            lines, with_timestamps = _items_to_sender_lines(items)
+            with tempfile.NamedTemporaryFile("w", delete=False) as tf:
+                tmp_file = tf.name
+                tf.write("\n".join(lines) + "\n")
+
+            ok = _run_sender_with_retries(
+                endpoint, tmp_file, opts["verbose"], opts["timeout"], retries, with_timestamps
+            )
     finally:
         if tmp_file and os.path.exists(tmp_file):
             try:
                 os.remove(tmp_file)
             except OSError:
                 pass
+    elapsed = time.monotonic() - started
+    endpoint.record(ok, elapsed, len(items))
+    metrics.ENDPOINT_SECONDS.labels(endpoint.name).observe(elapsed)
+    metrics.ENDPOINT_ITEMS.labels(endpoint.name, "sent" if ok else "failed").inc(len(items))
+    return ok
 
 
-def _spool_lines(lines: List[str]) -> None:
+def _send_failover(endpoints: EndpointSet, items: List[dict], opts: Mapping) -> Optional[Endpoint]:
+    """Send items to the healthiest endpoint that accepts them.
+
+    Each round tries every endpoint once, from the best score down; after a
+    round in which all failed, the round is repeated up to `retries` times
+    with exponential backoff.
+
+    Returns:
+        Endpoint | None: The endpoint that took the items, None if all failed.
+    """
+    retries = opts["retries"]
+    attempt = 0
+    while True:
+        for endpoint in endpoints.ranked():
+            if _send_to_endpoint(endpoint, items, opts, 0):
+                previous = endpoints.active
+                if endpoints.set_active(endpoint) and previous is not None:
+                    logger.warning(
+                        f"Zabbix failover: sending to {endpoint.name} ({endpoint.address}) instead of {previous.name}."
+                    )
+                return endpoint
+        if attempt >= retries:
+            return None
+        backoff = min(60, 2 ** attempt)
+        metrics.SENDER_RETRIES.labels(opts["transport"]).inc()
+        logger.info(f"Retrying all Zabbix endpoints in {backoff}s (attempt {attempt + 1}/{retries})...")
+        time.sleep(backoff)
+        attempt += 1
+
+
+def _send_items_batch(
+    items: List[dict], allow_spool_on_fail: bool = True, endpoint: Optional[Endpoint] = None
+) -> bool:
+    """Send a batch of items with the configured transport and endpoints.
+
+    Each item is a dict with `host`, `key`, `value` and optional `clock`/`ns`
+    (see `make_item`). The native transport sends them in one trapper request;
+    the subprocess transport uses zabbix_sender -i <tempfile> (with -T when
+    items are timestamped).
+
+    With several endpoints, "failover" sends to the healthiest endpoint that
+    accepts the batch and spools it into the first endpoint's journal if none
+    does; "fanout" sends to all endpoints in parallel and spools the batch
+    only for the endpoints that failed. `endpoint` sends to that endpoint
+    only (replay of its journal in fan-out mode).
+
+    Returns:
+        bool: True if every target endpoint accepted the items.
+    """
+    if not items:
+        return True
+
     opts = _get_sender_options()
-    spool_dir = opts["spool_dir"]
-    os.makedirs(spool_dir, exist_ok=True)
+    endpoints = _get_endpoints()
+
+    started = time.monotonic()
+    if endpoint is not None or len(endpoints) == 1:
+        target = endpoint or endpoints.endpoints[0]
+        ok = _send_to_endpoint(target, items, opts, opts["retries"])
+        delivered = ok
+        failed = [] if ok else [target]
+    elif endpoints.fanout:
+        results = endpoints.fan_out(lambda target: _send_to_endpoint(target, items, opts, opts["retries"]))
+        ok = all(results)
+        delivered = any(results)
+        failed = [target for target, sent in zip(endpoints, results) if not sent]
+    else:
+        target = _send_failover(endpoints, items, opts)
+        ok = delivered = target is not None
+        failed = [] if ok else [endpoints.endpoints[0]]
+    metrics.SENDER_SECONDS.labels(opts["transport"]).observe(time.monotonic() - started)
+
+    if delivered:
+        _SENT_ITEMS.inc(len(items))
+        # Success is counted for the periodic summary; details only at DEBUG
+        if logger.isEnabledFor(logging.DEBUG):
+            hosts = sorted({item["host"] for item in items})
+            logger.debug(
+                "Sent %d metrics to Zabbix (%s) for %d host(s) (%s%s).",
+                len(items), endpoint.name if endpoint is not None else endpoints.mode, len(hosts),
+                ", ".join(hosts[:3]), "..." if len(hosts) > 3 else "",
+            )
+    else:
+        _FAILED_ITEMS.inc(len(items))
+    if allow_spool_on_fail:
+        for target in failed:
+            _spool_items(items, target)
+    if delivered:
+        # On success, replay the spool in the background as well
+        try:
+            _schedule_drain()
+        except Exception as e:
+            logger.debug(f"Drain spool after success failed: {e}")
+    return ok
 
+
+def _get_spool_journal(endpoint: Optional[Endpoint] = None) -> SpoolJournal:
+    """Return the spool journal of `endpoint` (default: the first endpoint), opening it on first use.
+
+    Legacy `.spool` files are migrated into the first endpoint's journal.
+    """
+    endpoints = _get_endpoints()
+    endpoint = endpoint or endpoints.endpoints[0]
+    with _spool_journal_lock:
+        if endpoint.journal is None:
+            opts = _get_sender_options()
+            endpoint.journal = SpoolJournal(
+                endpoint.spool_dir,
+                segment_size=opts["spool_segment_bytes"],
+                fsync=opts["spool_fsync"],
+                fsync_interval=opts["spool_fsync_interval"],
+            )
+            if endpoint is endpoints.endpoints[0]:
+                legacy = glob.glob(os.path.join(endpoint.spool_dir, "*.spool"))
+                if legacy:
+                    migrated = endpoint.journal.migrate_files(legacy)
+                    logger.info(f"Migrated {migrated} legacy .spool files into the spool journal.")
+        return endpoint.journal
+
+
+def _spool_pending_bytes() -> int:
+    endpoints = _endpoints
+    if endpoints is None:
+        return 0
+    return sum(endpoint.journal.pending_bytes() for endpoint in endpoints if endpoint.journal is not None)
+
+
+def _batcher_queue_size() -> int:
+    batcher = _batcher
+    return batcher.qsize() if batcher is not None else 0
+
+
+metrics.SPOOL_PENDING_BYTES.set_function(_spool_pending_bytes)
+metrics.BATCHER_QUEUE.set_function(_batcher_queue_size)
+
+
+def close_spool() -> None:
+    """Stop the fan-out pool and sync and close the spool journals (call on shutdown)."""
+    endpoints = _endpoints
+    if endpoints is None:
+        return
+    endpoints.close()
+    with _spool_journal_lock:
+        for endpoint in endpoints:
+            if endpoint.journal is not None:
+                endpoint.journal.close()
+                endpoint.journal = None
+
+
+def _encode_spool_record(items: List[dict], shed: bool = False) -> bytes:
+    """Serialize items (with their acquisition time) as one journal record.
+
+    `shed` marks the items kept by load shedding, which are not thinned again.
+    """
+    rows = [[it["host"], it["key"], str(it["value"]), it.get("clock"), it.get("ns")] for it in items]
+    doc = {"v": 1, "shed": 1, "items": rows} if shed else {"v": 1, "items": rows}
+    return json.dumps(doc, separators=(",", ":")).encode("utf-8")
+
+
+def _decode_spool_entry(payload: bytes) -> Tuple[List[dict], bool]:
+    """Decode a journal record back into items and its shed mark.
+
+    Records written before timestamps were kept are plain
+    "<host> <key> <value>" lines; their items have no clock.
+    """
+    if payload[:1] == b"{":
+        doc = json.loads(payload.decode("utf-8"))
+        items = [
+            {"host": host, "key": key, "value": value, "clock": clock, "ns": ns}
+            for host, key, value, clock, ns in doc.get("items", [])
+        ]
+        return items, bool(doc.get("shed"))
+    items = []
+    for ln in payload.decode("utf-8", errors="replace").splitlines():
+        parts = ln.split(None, 2)
+        if len(parts) == 3:
+            items.append({"host": parts[0], "key": parts[1], "value": parts[2], "clock": None, "ns": None})
+    return items, False
+
+
+def _decode_spool_record(payload: bytes) -> List[dict]:
+    """Decode a journal record back into items (see `_decode_spool_entry`)."""
+    return _decode_spool_entry(payload)[0]
+
+
+def _get_spool_limiter() -> SpoolLimiter:
+    """The spool limits from the runtime `zabbix_backpressure` section, built on first use.
+
+    Configuration keys:
+    - max_spool_bytes (int, default 512 MiB, 0 = unlimited): total size of
+      the spool journals, shared evenly between the endpoints.
+    - max_spool_age_seconds (float, default 30 days, 0 = unlimited): sealed
+      journal segments older than this are dropped.
+    - policy ("drop_oldest" | "downsample" | "pluviometer_only", default
+      "downsample") and downsample_factor (int, default 10): how the oldest
+      data is shed when the size limit is reached.
+    - check_interval_seconds (float, default 10): minimum time between checks.
+    """
+    global _spool_limiter
+    if _spool_limiter is None:
+        cfg = get_runtime_config().section("zabbix_backpressure")
+        _spool_limiter = SpoolLimiter(
+            max_bytes=int(cfg.get("max_spool_bytes", 512 * 1024 * 1024)),
+            max_age=float(cfg.get("max_spool_age_seconds", 30 * 86400)),
+            policy=str(cfg.get("policy", "downsample")),
+            downsample_factor=int(cfg.get("downsample_factor", 10)),
+            check_interval=float(cfg.get("check_interval_seconds", 10)),
+        )
+    return _spool_limiter
+
+
+def _enforce_spool_limits(force: bool = False) -> None:
+    """Shed spooled data of every endpoint journal that exceeds the limits.
+
+    Runs at most every `check_interval_seconds` unless `force`, and is skipped
+    while a replay is running (which shrinks the spool anyway).
+    """
+    limiter = _get_spool_limiter()
+    if not limiter.due() and not (force and limiter.enabled):
+        return
+    if not _drain_lock.acquire(blocking=False):
+        return
+    try:
+        endpoints = _get_endpoints()
+        for endpoint in endpoints:
+            try:
+                limiter.enforce(
+                    _get_spool_journal(endpoint), _decode_spool_entry, _encode_spool_record,
+                    max_bytes=limiter.max_bytes // len(endpoints),
+                )
+            except Exception as e:
+                logger.error(f"Failed to apply spool limits to {endpoint.spool_dir}: {e}")
+    finally:
+        _drain_lock.release()
+
+
+def _spool_items(items: List[dict], endpoint: Optional[Endpoint] = None) -> None:
     try:
-        with tempfile.NamedTemporaryFile("w", delete=False, dir=spool_dir, prefix="zbx_", suffix=".spool") as sf:
-            sf.write("\n".join(lines) + "\n")
-            path = sf.name
-        logger.warning(f"Batch spooled to disk: {path}")
+        journal = _get_spool_journal(endpoint)
+        journal.append(_encode_spool_record(items))
+        metrics.SPOOLED_ITEMS.inc(len(items))
+        logger.warning(
+            f"Batch of {len(items)} items spooled to disk journal"
+            + (f" of {endpoint.name}." if endpoint is not None and len(_get_endpoints()) > 1 else ".")
+        )
     except Exception as e:
-        logger.error(f"Failed to write spool file: {e}")
+        logger.error(f"Failed to write spool record: {e}")
+        return
+    _enforce_spool_limits()
+
+
+def _schedule_drain() -> None:
+    """Start a background spool replay unless one is running or the spool is empty."""
+    global _drain_thread
+    if _drain_lock.locked():
+        return
+    if all(_get_spool_journal(endpoint).is_empty() for endpoint in _get_endpoints()):
+        return
+    if _drain_thread is not None and _drain_thread.is_alive():
+        return
+    _drain_thread = threading.Thread(target=drain_spool, name="zabbix-spool-drain")
+    _drain_thread.daemon = True
+    _drain_thread.start()
+
+
+def _drain_journal(journal: SpoolJournal, endpoint: Optional[Endpoint], opts: Mapping) -> bool:
+    """Replay one journal; `endpoint` pins the sends to that endpoint (fan-out mode).
+
+    Returns:
+        bool: False if a send failed (the rest is left for a later replay).
+    """
+    if journal.is_empty():
+        return True
+    batch_items = opts["drain_batch_items"]
+    rate = opts["drain_max_items_per_second"]
+
+    started = time.monotonic()
+    batch: List[dict] = []
+    last_position = None
+    sent = 0
+
+    def _send_paced() -> bool:
+        nonlocal sent
+        if rate > 0:
+            # Wait until the items already sent fit within the rate budget
+            delay = started + sent / rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        if not _send_items_batch(batch, allow_spool_on_fail=False, endpoint=endpoint):
+            logger.warning("Failed to send spooled batch. Will retry later.")
+            return False
+        journal.commit(last_position)
+        sent += len(batch)
+        metrics.DRAINED_ITEMS.inc(len(batch))
+        return True
+
+    for payload, position in journal.iter_records():
+        try:
+            batch.extend(_decode_spool_record(payload))
+        except (ValueError, TypeError) as e:
+            logger.error(f"Skipping undecodable spool record: {e}")
+        last_position = position
+        if len(batch) >= batch_items:
+            if not _send_paced():
+                return False
+            batch = []
+    if batch:
+        if not _send_paced():
+            return False
+    elif last_position is not None:
+        journal.commit(last_position)
+    if sent:
+        elapsed = max(time.monotonic() - started, 1e-6)
+        target = f" to {endpoint.name}" if endpoint is not None else ""
+        logger.info(f"Drained {sent} spooled items from disk journal{target} ({sent / elapsed:.0f} items/s).")
+    return True
 
 
 def drain_spool() -> None:
-    """Attempt to resend any spooled batches from disk.
+    """Replay spooled items from the disk journals with their original timestamps.
+
+    Records are streamed from the committed read offset and merged into
+    batches of up to `drain_batch_items` items; the offset is committed after
+    every successful send. Sends are paced to at most
+    `drain_max_items_per_second` items per second (0 = unpaced) so a large
+    backlog does not flood the server. Stops on first failure to avoid tight
+    loops. Concurrent calls return immediately.
+
+    In fan-out mode each endpoint's journal is replayed to that endpoint
+    only, and a failing endpoint does not hold back the others; otherwise the
+    journals are replayed through failover.
+    """
+    if not _drain_lock.acquire(blocking=False):
+        return
+    try:
+        opts = _get_sender_options()
+        endpoints = _get_endpoints()
+        for endpoint in endpoints:
+            journal = _get_spool_journal(endpoint)
+            if endpoints.fanout:
+                _drain_journal(journal, endpoint, opts)
+            elif not _drain_journal(journal, None, opts):
+                return
+    finally:
+        _drain_lock.release()
+
 
-    Stops on first failure to avoid tight loops.
+def start_batcher() -> None:
+    """Start the background batcher if enabled in the runtime `zabbix_batcher` section.
+
+    Configuration keys:
+    - enabled (bool, default False): route sends through the batcher.
+    - max_items (int, default 500): flush when this many items are pending.
+    - max_delay_seconds (float, default 1.0): max time an item waits.
+    - queue_size (int, default 10000): max pending submissions in memory.
     """
-    opts = _get_sender_options()
-    spool_dir = opts["spool_dir"]
-    if not os.path.isdir(spool_dir):
+    global _batcher
+    cfg = get_runtime_config().section("zabbix_batcher")
+    if not bool(cfg.get("enabled", False)) or _batcher is not None:
         return
+    _batcher = ZabbixBatcher(
+        _send_items_batch,
+        max_items=int(cfg.get("max_items", 500)),
+        max_delay=float(cfg.get("max_delay_seconds", 1.0)),
+        queue_size=int(cfg.get("queue_size", 10000)),
+    )
+    _batcher.start()
+    logger.info(
+        f"Zabbix batcher started (max_items={_batcher.max_items}, max_delay={_batcher.max_delay}s)."
+    )
+
 
-    entries = sorted(
-        (os.path.join(spool_dir, f) for f in os.listdir(spool_dir) if f.endswith(".spool")),
-        key=lambda p: os.path.getmtime(p),
+def stop_batcher() -> None:
+    """Flush pending items and stop the background batcher, if running."""
+    global _batcher
+    if _batcher is None:
+        return
+    batcher, _batcher = _batcher, None
+    logger.info("Flushing Zabbix batcher...")
+    batcher.stop()
+
+
+def _submit_items(items: List[dict]) -> None:
+    """Hand items to the batcher, or send them inline when it is not running.
+
+    If the batcher queue is full the items are spooled to disk right away so
+    the calling reader thread is never blocked.
+    """
+    batcher = _batcher
+    if batcher is None:
+        _send_items_batch(items)
+    elif not batcher.submit(items):
+        logger.warning(f"Zabbix batcher queue full; spooling {len(items)} items.")
+        _spool_items(items)
+
+
+def start_aggregator() -> None:
+    """Start windowed aggregation if enabled in the runtime `zabbix_aggregation` section.
+
+    Configuration keys:
+    - enabled (bool, default False): aggregate values before sending.
+    - mode (str, default "replace"): "replace" sends only the aggregates,
+      "both" sends the raw values as well.
+    - window_seconds (float, default 60): window length.
+    - windows (dict, optional): window length per sensor ("inclinometer", "pluviometer").
+    - stats (list, default ["min", "max", "mean", "last"]): statistics to send.
+    - key_suffixes (dict, optional): key suffix per statistic
+      (defaults ".min", ".max", ".avg", ".last").
+    - grace_seconds (float, default 2): wait after a window ends before closing it.
+    """
+    global _aggregator, _aggregation_mode
+    cfg = get_runtime_config().section("zabbix_aggregation")
+    if not bool(cfg.get("enabled", False)) or _aggregator is not None:
+        return
+    mode = str(cfg.get("mode", "replace")).strip().lower()
+    if mode not in AGGREGATION_MODES:
+        logger.warning(f"Unknown zabbix_aggregation mode '{mode}'. Using 'replace'.")
+        mode = "replace"
+    aggregator = WindowAggregator(
+        _submit_items,
+        make_item,
+        window_seconds=float(cfg.get("window_seconds", 60)),
+        windows=cfg.get("windows") or {},
+        stats=cfg.get("stats") or STATS,
+        key_suffixes=cfg.get("key_suffixes") or {},
+        grace=float(cfg.get("grace_seconds", 2.0)),
     )
+    aggregator.start()
+    _aggregation_mode = mode
+    _aggregator = aggregator
+    logger.info(
+        f"Zabbix aggregation started (window={aggregator.window_seconds}s, stats={list(aggregator.stats)}, mode={mode})."
+    )
+
 
-    for path in entries:
+def stop_aggregator() -> None:
+    """Send every open aggregation window and stop the aggregator, if running."""
+    global _aggregator
+    if _aggregator is None:
+        return
+    aggregator, _aggregator = _aggregator, None
+    logger.info("Flushing Zabbix aggregation windows...")
+    aggregator.stop()
+
+
+def _run_self_report(host: str, interval: float) -> None:
+    while not _self_report_stop.wait(interval):
         try:
-            with open(path, "r") as f:
-                lines = [ln.strip() for ln in f if ln.strip()]
-            ok = _send_lines_batch(lines, allow_spool_on_fail=False)
-            if ok:
-                try:
-                    os.remove(path)
-                    logger.info(f"Sent and removed spooled batch: {path}")
-                except OSError as e:
-                    logger.warning(f"Sent spooled batch but could not remove {path}: {e}")
-            else:
-                logger.warning(f"Failed to send spooled batch {path}. Will retry later.")
-                break  # stop draining on first failure
+            _submit_items(metrics.collect_items(host, make_item))
         except Exception as e:
-            logger.error(f"Error processing spool file {path}: {e}")
+            logger.error(f"Error self-reporting metrics: {e}")
+
+
+def start_self_report() -> None:
+    """Periodically send the runtime metrics as items of `<gateway_name>_SELF`, if enabled.
+
+    Configured in `APP_CONFIG['metrics']` (self_report_enabled,
+    self_report_interval_seconds, gateway_name); see `utils.metrics`.
+    """
+    global _self_report_thread
+    opts = metrics.get_metrics_options()
+    if not opts["self_report_enabled"] or _self_report_thread is not None:
+        return
+    host = f"{opts['gateway_name']}_SELF"
+    _self_report_stop.clear()
+    _self_report_thread = threading.Thread(
+        target=_run_self_report, args=(host, max(1.0, opts["self_report_interval"])), name="zabbix-self-report"
+    )
+    _self_report_thread.daemon = True
+    _self_report_thread.start()
+    logger.info(f"Self-reporting runtime metrics to Zabbix host {host} every {opts['self_report_interval']}s.")
+
+
+def stop_self_report() -> None:
+    """Stop the metrics self-report thread, if running."""
+    global _self_report_thread
+    if _self_report_thread is None:
+        return
+    _self_report_stop.set()
+    _self_report_thread.join(timeout=5)
+    _self_report_thread = None
+
+
+def _get_deadband() -> Optional[DeadbandFilter]:
+    """The deadband filter from the runtime `zabbix_deadband` section, or None when disabled.
+
+    The section sits next to `zabbix_keys` and uses the same field names:
+    {"enabled": bool, "heartbeat_seconds": float, "inclinometer": {"temperature":
+    {"absolute": 0.2}, "voltage": {"relative": 0.01, "heartbeat_seconds": 600}}, ...}.
+    It is rebuilt when a configuration reload changes `zabbix_keys`.
+    """
+    global _deadband, _deadband_loaded
+    if _deadband_loaded:
+        return _deadband
+    with _deadband_lock:
+        if not _deadband_loaded:
+            config = get_runtime_config()
+            cfg = config.section("zabbix_deadband")
+            _deadband = None
+            if bool(cfg.get("enabled", False)):
+                _deadband = DeadbandFilter.from_config(cfg, config.zabbix_keys)
+                logger.info(f"Zabbix deadband filter enabled for {len(_deadband.rules)} item keys.")
+            _deadband_loaded = True
+    return _deadband
+
+
+def _on_config_reload(old: RuntimeConfig, new: RuntimeConfig, diff) -> None:
+    """Rebuild the deadband rules for new item keys (the key maps themselves are
+    read from the runtime configuration on every record)."""
+    global _deadband_loaded
+    if diff.zabbix_keys_changed:
+        with _deadband_lock:
+            _deadband_loaded = False
+
+
+add_reload_listener(_on_config_reload)
+
+
+def _submit_host_values(
+    group: str, host_name: str, pairs: List[Tuple[str, object]], timestamp: Optional[float]
+) -> None:
+    """Route one record's values through the aggregator (if running) and/or as raw items.
+
+    Raw items pass the deadband filter first, when it is enabled.
+    """
+    aggregator = _aggregator
+    if aggregator is not None:
+        aggregator.add(group, host_name, pairs, timestamp)
+        if _aggregation_mode == "replace":
+            return
+    deadband = _get_deadband()
+    if deadband is not None:
+        pairs = deadband.filter(group, host_name, pairs, timestamp)
+        if not pairs:
+            return
+    _submit_items(_build_host_items(host_name, pairs, timestamp))
 
 
-def _build_host_lines(host_name: str, items: List[Tuple[str, object]]) -> List[str]:
-    lines: List[str] = []
-    for key, value in items:
-        lines.append(f"{host_name} {key} {value}")
-    return lines
+def _build_host_items(
+    host_name: str, pairs: List[Tuple[str, object]], timestamp: Optional[float]
+) -> List[dict]:
+    return [make_item(host_name, key, value, timestamp) for key, value in pairs]
 
 
 def send_inclinometer_to_zabbix(data: dict) -> None:
     """Batch-send inclinometer data points for a given station to Zabbix.
 
-    Groups metrics per host and sends them in one zabbix_sender call using -i.
+    Groups metrics per host and submits them as one batch (through the
+    background batcher when it is running), or folds them into the
+    aggregation windows when aggregation is enabled. Items are stamped with
+    the record's source `timestamp` so Zabbix stores the acquisition time.
     """
     try:
         base_station_name = data["station_name"]
         incli_data = data["inclinometer"]
         host_name = f"{base_station_name}_IN"
 
-        key_map = APP_CONFIG.get("zabbix_keys", {}).get("inclinometer", {})
-        items: List[Tuple[str, object]] = []
+        key_map = get_runtime_config().zabbix_keys.get("inclinometer", {})
+        pairs: List[Tuple[str, object]] = []
         for data_key, value in incli_data.items():
             zabbix_key = key_map.get(data_key)
             if zabbix_key is not None:
-                items.append((zabbix_key, value))
+                pairs.append((zabbix_key, value))
             else:
                 logger.warning(f"No Zabbix key mapping for inclinometer data '{data_key}'.")
 
-        lines = _build_host_lines(host_name, items)
-        _send_lines_batch(lines)
+        _submit_host_values("inclinometer", host_name, pairs, data.get("timestamp"))
     except KeyError as e:
         logger.error(f"Error preparing inclinometer data for Zabbix: Missing key {e}")
 
@@ -262,23 +968,25 @@ def send_inclinometer_to_zabbix(data: dict) -> None:
 def send_pluviometer_to_zabbix(data: dict) -> None:
     """Batch-send pluviometer data points for a given station to Zabbix.
 
-    Groups metrics per host and sends them in one zabbix_sender call using -i.
+    Groups metrics per host and submits them as one batch (through the
+    background batcher when it is running), or folds them into the
+    aggregation windows when aggregation is enabled. Items are stamped with
+    the record's source `timestamp` so Zabbix stores the acquisition time.
     """
     try:
         base_station_name = data["station_name"]
         pluvio_data = data["pluviometer"]
         host_name = f"{base_station_name}_PL"
 
-        key_map = APP_CONFIG.get("zabbix_keys", {}).get("pluviometer", {})
-        items: List[Tuple[str, object]] = []
+        key_map = get_runtime_config().zabbix_keys.get("pluviometer", {})
+        pairs: List[Tuple[str, object]] = []
         for data_key, value in pluvio_data.items():
             zabbix_key = key_map.get(data_key)
             if zabbix_key is not None:
-                items.append((zabbix_key, value))
+                pairs.append((zabbix_key, value))
             else:
                 logger.warning(f"No Zabbix key mapping for pluviometer data '{data_key}'.")
 
-        lines = _build_host_lines(host_name, items)
-        _send_lines_batch(lines)
+        _submit_host_values("pluviometer", host_name, pairs, data.get("timestamp"))
     except KeyError as e:
         logger.error(f"Error preparing pluviometer data for Zabbix: Missing key {e}")
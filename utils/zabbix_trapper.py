@@ -0,0 +1,235 @@
+"""Native client for the Zabbix trapper ("sender data") protocol.
+
+This module talks to a Zabbix server or proxy trapper port directly over TCP,
+without forking the `zabbix_sender` binary. A request is a JSON document
+framed by the `ZBXD` header:
+
+    b"ZBXD" | flags (1 byte) | data length (uint32 LE) | reserved (uint32 LE) | JSON
+
+The server answers with a framed JSON document such as
+`{"response": "success", "info": "processed: 6; failed: 0; total: 6; seconds spent: 0.000104"}`,
+which is parsed into a `SendResult`.
+
+The TCP connection is kept open and reused between batches when the server
+allows it. Zabbix servers usually close the connection after answering: after
+the first answer the client waits briefly for that close, and if it comes
+every later batch uses a new connection, so a batch is never written to a
+socket the server is closing. With a server that keeps connections open, a
+socket found stale before a send is replaced by a new connection.
+"""
+from __future__ import annotations
+
+import json
+import re
+import select
+import socket
+import struct
+import threading
+import zlib
+from typing import Iterable, List, NamedTuple, Optional
+
+ZBX_HEADER = b"ZBXD"
+ZBX_FLAG_PROTOCOL = 0x01
+ZBX_FLAG_COMPRESSED = 0x02
+ZBX_FLAG_LARGE = 0x04
+
+# Hard limit on accepted responses/requests (Zabbix itself caps packets at 1 GB)
+MAX_PACKET_SIZE = 1 << 30
+
+# Wait after the first answer to learn whether the server closes connections
+KEEP_ALIVE_PROBE_SECONDS = 0.2
+
+_INFO_RE = re.compile(
+    r"processed:\s*(\d+);\s*failed:\s*(\d+);\s*total:\s*(\d+);\s*seconds spent:\s*([\d.]+)"
+)
+
+
+class ZabbixTrapperError(Exception):
+    """Raised when a trapper exchange fails (I/O, framing, or server refusal)."""
+
+
+class SendResult(NamedTuple):
+    """Outcome of one trapper batch as reported by the server."""
+
+    processed: int
+    failed: int
+    total: int
+    seconds: float
+    response: str
+
+
+def build_packet(payload: bytes) -> bytes:
+    """Frame a JSON payload with the `ZBXD` protocol header."""
+    if len(payload) > MAX_PACKET_SIZE:
+        raise ZabbixTrapperError(f"Payload too large: {len(payload)} bytes")
+    return ZBX_HEADER + struct.pack("<BII", ZBX_FLAG_PROTOCOL, len(payload), 0) + payload
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise ZabbixTrapperError(
+                f"Connection closed by peer after {len(buf)} of {size} bytes"
+            )
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def recv_packet(sock: socket.socket) -> bytes:
+    """Read one framed packet from `sock` and return its (decompressed) payload."""
+    header = _recv_exact(sock, 5)
+    if header[:4] != ZBX_HEADER:
+        raise ZabbixTrapperError(f"Invalid protocol header: {header!r}")
+    flags = header[4]
+    if flags & ZBX_FLAG_LARGE:
+        data_len, reserved = struct.unpack("<QQ", _recv_exact(sock, 16))
+    else:
+        data_len, reserved = struct.unpack("<II", _recv_exact(sock, 8))
+    if data_len > MAX_PACKET_SIZE:
+        raise ZabbixTrapperError(f"Packet too large: {data_len} bytes")
+    data = _recv_exact(sock, data_len)
+    if flags & ZBX_FLAG_COMPRESSED:
+        data = zlib.decompress(data)
+    return data
+
+
+def build_sender_request(items: Iterable[dict]) -> bytes:
+    """Serialize items into a "sender data" request payload.
+
+    Each item is a dict with `host`, `key` and `value` (and optionally
+    `clock`/`ns`). Values are always sent as strings, as Zabbix expects.
+    """
+    data = []
+    for item in items:
+        entry = {"host": item["host"], "key": item["key"], "value": str(item["value"])}
+        if item.get("clock") is not None:
+            entry["clock"] = int(item["clock"])
+            entry["ns"] = int(item.get("ns") or 0)
+        data.append(entry)
+    return json.dumps({"request": "sender data", "data": data}, separators=(",", ":")).encode("utf-8")
+
+
+def parse_sender_response(payload: bytes) -> SendResult:
+    """Parse the server's JSON answer into a `SendResult`.
+
+    Raises:
+        ZabbixTrapperError: If the payload is not valid JSON or the server
+            did not answer with `"response": "success"`.
+    """
+    try:
+        doc = json.loads(payload.decode("utf-8"))
+    except (UnicodeDecodeError, ValueError) as e:
+        raise ZabbixTrapperError(f"Invalid response from server: {payload[:200]!r}") from e
+
+    response = str(doc.get("response", ""))
+    info = str(doc.get("info", ""))
+    if response != "success":
+        raise ZabbixTrapperError(f"Server refused data: response={response!r} info={info!r}")
+
+    match = _INFO_RE.search(info)
+    if not match:
+        return SendResult(0, 0, 0, 0.0, response)
+    processed, failed, total, seconds = match.groups()
+    return SendResult(int(processed), int(failed), int(total), float(seconds), response)
+
+
+class ZabbixTrapperClient:
+    """Thread-safe trapper client that reuses a single TCP connection.
+
+    Args:
+        server (str): Zabbix server or proxy address.
+        port (int): Trapper port (usually 10051).
+        timeout (float): Connect/read timeout in seconds.
+    """
+
+    def __init__(self, server: str, port: int, timeout: float = 10.0):
+        self.server = server
+        self.port = int(port)
+        self.timeout = float(timeout)
+        self._sock: Optional[socket.socket] = None
+        self._lock = threading.Lock()
+        self._keep_alive: Optional[bool] = None  # unknown until the first answer
+
+    def _connect(self) -> socket.socket:
+        sock = socket.create_connection((self.server, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    @staticmethod
+    def _is_stale(sock: socket.socket) -> bool:
+        """True if the peer closed the connection (or sent unsolicited data)."""
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+            # Readable while idle means EOF or unexpected bytes: not reusable
+            return bool(readable)
+        except (OSError, ValueError):
+            return True
+
+    def close(self) -> None:
+        """Close the cached connection, if any."""
+        with self._lock:
+            self._close_locked()
+
+    def _close_locked(self) -> None:
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def _after_answer(self) -> None:
+        """Close the connection if the server does not keep it open."""
+        if self._keep_alive is None:
+            try:
+                readable, _, _ = select.select([self._sock], [], [], min(self.timeout, KEEP_ALIVE_PROBE_SECONDS))
+            except (OSError, ValueError):
+                readable = [self._sock]
+            self._keep_alive = not readable
+        if not self._keep_alive:
+            self._close_locked()
+
+    def send(self, items: List[dict]) -> SendResult:
+        """Send a batch of items in one request and return the server's counts.
+
+        If a reused connection fails before any byte of the request was
+        written, it is replaced by a new one and the batch is sent once more.
+        Once the request was (partly) written the server may have processed
+        it, so the error is raised instead of risking duplicated items, as
+        are errors on a fresh connection.
+
+        Raises:
+            ZabbixTrapperError: On connection, framing, or server errors.
+        """
+        packet = build_packet(build_sender_request(items))
+        with self._lock:
+            for attempt in (0, 1):
+                reused = self._sock is not None and not self._is_stale(self._sock)
+                if not reused:
+                    self._close_locked()
+                    try:
+                        self._sock = self._connect()
+                    except OSError as e:
+                        raise ZabbixTrapperError(
+                            f"Cannot connect to {self.server}:{self.port}: {e}"
+                        ) from e
+                written = 0
+                try:
+                    view = memoryview(packet)
+                    while written < len(packet):
+                        written += self._sock.send(view[written:])
+                    payload = recv_packet(self._sock)
+                except (OSError, ZabbixTrapperError) as e:
+                    self._close_locked()
+                    if reused and attempt == 0 and not written:
+                        continue
+                    if isinstance(e, ZabbixTrapperError):
+                        raise
+                    raise ZabbixTrapperError(
+                        f"I/O error talking to {self.server}:{self.port}: {e}"
+                    ) from e
+                self._after_answer()
+                return parse_sender_response(payload)
+        raise ZabbixTrapperError("unreachable")  # pragma: no cover